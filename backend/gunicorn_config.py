@@ -16,6 +16,10 @@ workers = int(os.getenv('WORKERS', multiprocessing.cpu_count() * 2 + 1))
 # 'gevent' ou 'eventlet' para aplicações assíncronas
 worker_class = os.getenv('WORKER_CLASS', 'sync')
 
+# Threads por worker (com mais de 1, o worker 'sync' passa a ser 'gthread')
+# Entram no tamanho do pool de conexões de cada processo (ver src/utils/pool_conexoes.py)
+threads = int(os.getenv('THREADS', '1'))
+
 # Timeout em segundos (aumentado para suportar uploads grandes de até 16MB)
 # Uploads grandes podem levar mais tempo, especialmente em conexões lentas
 timeout = int(os.getenv('TIMEOUT', '300'))  # 5 minutos padrão
@@ -44,3 +48,13 @@ max_requests_jitter = int(os.getenv('MAX_REQUESTS_JITTER', '50'))
 # Graceful timeout
 graceful_timeout = int(os.getenv('GRACEFUL_TIMEOUT', '30'))
 
+
+def post_fork(server, worker):
+    """Descarta no worker as conexões do pool herdadas do processo mestre (preload_app)"""
+    from src.main import app
+    from src.models.user import db
+    from src.utils.pool_conexoes import metricas_pool
+    with app.app_context():
+        # close=False: as conexões continuam sendo do mestre, o worker apenas deixa de usá-las
+        db.engine.dispose(close=False)
+    metricas_pool.zerar()
@@ -0,0 +1,48 @@
+"""Add importacoes_extrato table
+
+Revision ID: a7b8c9d0e1f2
+Revises: f6a7b8c9d0e1
+Create Date: 2026-10-17 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'a7b8c9d0e1f2'
+down_revision = 'f6a7b8c9d0e1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Verificar se a tabela já existe (pode ter sido criada por db.create_all())
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    if 'importacoes_extrato' in inspector.get_table_names():
+        return
+
+    op.create_table(
+        'importacoes_extrato',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('projeto_id', sa.Integer(), nullable=False),
+        sa.Column('usuario_id', sa.Integer(), nullable=False),
+        sa.Column('cenario_id', sa.Integer(), nullable=False),
+        sa.Column('nome_arquivo', sa.String(length=255), nullable=False),
+        sa.Column('formato', sa.String(length=10), nullable=False),
+        sa.Column('hash_arquivo', sa.String(length=64), nullable=False),
+        sa.Column('agregacao_mensal', sa.Boolean(), nullable=False, server_default=sa.true()),
+        sa.Column('transacoes_lidas', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('lancamentos_criados', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('relatorio', sa.JSON(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['projeto_id'], ['projetos.id'], ),
+        sa.ForeignKeyConstraint(['usuario_id'], ['usuarios.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        # O mesmo extrato (SHA256) não é importado duas vezes no mesmo projeto
+        sa.UniqueConstraint('projeto_id', 'hash_arquivo', name='uq_importacoes_extrato_projeto_hash')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('importacoes_extrato')
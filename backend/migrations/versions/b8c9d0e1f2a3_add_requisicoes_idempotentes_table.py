@@ -0,0 +1,78 @@
+"""Add requisicoes_idempotentes table
+
+Revision ID: b8c9d0e1f2a3
+Revises: a7b8c9d0e1f2
+Create Date: 2026-10-17 22:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'b8c9d0e1f2a3'
+down_revision = 'a7b8c9d0e1f2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Verificar tipo de banco de dados
+    bind = op.get_bind()
+    is_postgres = bind.dialect.name == 'postgresql'
+
+    # Verificar se a tabela já existe (pode ter sido criada por db.create_all())
+    inspector = sa.inspect(bind)
+    if 'requisicoes_idempotentes' in inspector.get_table_names():
+        indexes = [idx['name'] for idx in inspector.get_indexes('requisicoes_idempotentes')]
+        if 'ix_requisicoes_idempotentes_usuario_id' not in indexes:
+            op.create_index('ix_requisicoes_idempotentes_usuario_id', 'requisicoes_idempotentes', ['usuario_id'], unique=False)
+        if 'ix_requisicoes_idempotentes_expira_em' not in indexes:
+            op.create_index('ix_requisicoes_idempotentes_expira_em', 'requisicoes_idempotentes', ['expira_em'], unique=False)
+        return
+
+    if is_postgres:
+        op.execute("CREATE TYPE idempotencia_status AS ENUM ('em_andamento', 'concluida')")
+        status_enum = sa.Enum('em_andamento', 'concluida', name='idempotencia_status', create_type=False)
+    else:
+        status_enum = sa.String(20)
+
+    op.create_table(
+        'requisicoes_idempotentes',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('usuario_id', sa.Integer(), nullable=False),
+        sa.Column('chave', sa.String(length=255), nullable=False),
+        sa.Column('impressao', sa.String(length=64), nullable=False),
+        sa.Column('status', status_enum, nullable=False, server_default='em_andamento'),
+        sa.Column('status_http', sa.Integer(), nullable=True),
+        sa.Column('cabecalhos', sa.JSON(), nullable=True),
+        sa.Column('corpo', sa.LargeBinary(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('expira_em', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['usuario_id'], ['usuarios.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        # A mesma chave de um usuário identifica uma única requisição
+        sa.UniqueConstraint('usuario_id', 'chave', name='uq_requisicoes_idempotentes_usuario_chave')
+    )
+
+    if not is_postgres:
+        op.create_check_constraint(
+            'ck_requisicoes_idempotentes_status',
+            'requisicoes_idempotentes',
+            "status IN ('em_andamento', 'concluida')"
+        )
+
+    op.create_index('ix_requisicoes_idempotentes_usuario_id', 'requisicoes_idempotentes', ['usuario_id'], unique=False)
+    # Limpeza das chaves vencidas
+    op.create_index('ix_requisicoes_idempotentes_expira_em', 'requisicoes_idempotentes', ['expira_em'], unique=False)
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    is_postgres = bind.dialect.name == 'postgresql'
+
+    op.drop_index('ix_requisicoes_idempotentes_expira_em', table_name='requisicoes_idempotentes')
+    op.drop_index('ix_requisicoes_idempotentes_usuario_id', table_name='requisicoes_idempotentes')
+    op.drop_table('requisicoes_idempotentes')
+
+    if is_postgres:
+        op.execute("DROP TYPE IF EXISTS idempotencia_status")
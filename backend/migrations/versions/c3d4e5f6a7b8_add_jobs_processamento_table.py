@@ -0,0 +1,77 @@
+"""Add jobs_processamento table
+
+Revision ID: c3d4e5f6a7b8
+Revises: b2c3d4e5f6a7
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'c3d4e5f6a7b8'
+down_revision = 'b2c3d4e5f6a7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Verificar tipo de banco de dados
+    bind = op.get_bind()
+    is_postgres = bind.dialect.name == 'postgresql'
+    
+    # Verificar se a tabela já existe (pode ter sido criada por db.create_all())
+    inspector = sa.inspect(bind)
+    if 'jobs_processamento' in inspector.get_table_names():
+        indexes = [idx['name'] for idx in inspector.get_indexes('jobs_processamento')]
+        if 'ix_jobs_processamento_usuario_id' not in indexes:
+            op.create_index('ix_jobs_processamento_usuario_id', 'jobs_processamento', ['usuario_id'], unique=False)
+        if 'ix_jobs_processamento_status_created_at' not in indexes:
+            op.create_index('ix_jobs_processamento_status_created_at', 'jobs_processamento', ['status', 'created_at'], unique=False)
+        return
+    
+    if is_postgres:
+        op.execute("CREATE TYPE job_status AS ENUM ('queued', 'running', 'done', 'error')")
+        job_status_enum = sa.Enum('queued', 'running', 'done', 'error', name='job_status', create_type=False)
+    else:
+        job_status_enum = sa.String(20)
+    
+    op.create_table(
+        'jobs_processamento',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('usuario_id', sa.Integer(), nullable=False),
+        sa.Column('tipo', sa.String(length=50), nullable=False),
+        sa.Column('status', job_status_enum, nullable=False, server_default='queued'),
+        sa.Column('parametros', sa.JSON(), nullable=True),
+        sa.Column('resultado', sa.JSON(), nullable=True),
+        sa.Column('projeto_id', sa.Integer(), nullable=True),
+        sa.Column('erro', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['usuario_id'], ['usuarios.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    
+    if not is_postgres:
+        op.create_check_constraint(
+            'ck_jobs_processamento_status',
+            'jobs_processamento',
+            "status IN ('queued', 'running', 'done', 'error')"
+        )
+    
+    op.create_index('ix_jobs_processamento_usuario_id', 'jobs_processamento', ['usuario_id'], unique=False)
+    # Consulta dos workers: jobs 'queued' mais antigos primeiro
+    op.create_index('ix_jobs_processamento_status_created_at', 'jobs_processamento', ['status', 'created_at'], unique=False)
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    is_postgres = bind.dialect.name == 'postgresql'
+    
+    op.drop_index('ix_jobs_processamento_status_created_at', table_name='jobs_processamento')
+    op.drop_index('ix_jobs_processamento_usuario_id', table_name='jobs_processamento')
+    op.drop_table('jobs_processamento')
+    
+    if is_postgres:
+        op.execute("DROP TYPE IF EXISTS job_status")
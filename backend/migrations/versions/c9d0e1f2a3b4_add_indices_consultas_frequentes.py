@@ -0,0 +1,85 @@
+"""Add composite indexes for the frequent queries
+
+Revision ID: c9d0e1f2a3b4
+Revises: b8c9d0e1f2a3
+Create Date: 2026-10-17 23:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'c9d0e1f2a3b4'
+down_revision = 'b8c9d0e1f2a3'
+branch_labels = None
+depends_on = None
+
+# (nome, tabela, colunas): os mesmos declarados nos modelos (src/models/user.py);
+# o uso de cada um é conferido por scripts/verificar_planos_consulta.py
+INDICES = (
+    ('ix_lancamentos_financeiros_cenario_origem_data', 'lancamentos_financeiros',
+     ['cenario_id', 'origem', 'data_competencia']),
+    ('ix_arquivos_upload_projeto_id_uploaded_at', 'arquivos_upload', ['projeto_id', 'uploaded_at']),
+    ('ix_logs_sistema_usuario_id_timestamp', 'logs_sistema', ['usuario_id', 'timestamp']),
+    ('ix_logs_sistema_usuario_id_acao_timestamp', 'logs_sistema', ['usuario_id', 'acao', 'timestamp']),
+    ('ix_logs_sistema_timestamp_acao', 'logs_sistema', ['timestamp', 'acao']),
+    ('ix_historico_cenarios_cenario_id_created_at', 'historico_cenarios', ['cenario_id', 'created_at']),
+    ('ix_projetos_usuario_id_created_at', 'projetos', ['usuario_id', 'created_at']),
+    ('ix_cenarios_projeto_id', 'cenarios', ['projeto_id']),
+)
+
+
+def _indices_existentes(bind) -> dict:
+    """Nome do índice -> válido; no PostgreSQL, um CREATE INDEX CONCURRENTLY interrompido deixa o índice inválido"""
+    if bind.dialect.name == 'postgresql':
+        linhas = bind.execute(sa.text(
+            "SELECT c.relname, i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname = ANY(:nomes)"
+        ), {'nomes': [nome for nome, _, _ in INDICES]})
+        return {nome: valido for nome, valido in linhas}
+
+    inspector = sa.inspect(bind)
+    tabelas = set(inspector.get_table_names())
+    existentes = {}
+    for tabela in {tabela for _, tabela, _ in INDICES} & tabelas:
+        existentes.update((indice['name'], True) for indice in inspector.get_indexes(tabela))
+    return existentes
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    is_postgres = bind.dialect.name == 'postgresql'
+
+    # Verificar quais índices já existem (podem ter sido criados por db.create_all())
+    existentes = _indices_existentes(bind)
+    pendentes = [indice for indice in INDICES if not existentes.get(indice[0])]
+    if not pendentes:
+        return
+
+    if is_postgres:
+        # CONCURRENTLY não bloqueia escritas nas tabelas (lançamentos, logs) durante a criação,
+        # mas não roda dentro de transação: cada índice é criado em autocommit
+        with op.get_context().autocommit_block():
+            for nome, tabela, colunas in pendentes:
+                if nome in existentes:
+                    op.drop_index(nome, table_name=tabela, postgresql_concurrently=True)
+                op.create_index(nome, tabela, colunas, unique=False, postgresql_concurrently=True)
+    else:
+        for nome, tabela, colunas in pendentes:
+            op.create_index(nome, tabela, colunas, unique=False)
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    is_postgres = bind.dialect.name == 'postgresql'
+    existentes = _indices_existentes(bind)
+
+    if is_postgres:
+        with op.get_context().autocommit_block():
+            for nome, tabela, _ in reversed(INDICES):
+                if nome in existentes:
+                    op.drop_index(nome, table_name=tabela, postgresql_concurrently=True)
+    else:
+        for nome, tabela, _ in reversed(INDICES):
+            if nome in existentes:
+                op.drop_index(nome, table_name=tabela)
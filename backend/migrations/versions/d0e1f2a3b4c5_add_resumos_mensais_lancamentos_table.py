@@ -0,0 +1,84 @@
+"""Add resumos_mensais_lancamentos table
+
+Revision ID: d0e1f2a3b4c5
+Revises: c9d0e1f2a3b4
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'd0e1f2a3b4c5'
+down_revision = 'c9d0e1f2a3b4'
+branch_labels = None
+depends_on = None
+
+
+def _popular(is_postgres: bool) -> None:
+    """Calcula o resumo a partir dos lançamentos existentes (as leituras passam a depender dele)"""
+    if is_postgres:
+        mes = "CAST(date_trunc('month', data_competencia) AS DATE)"
+    else:
+        mes = "date(data_competencia, 'start of month')"
+    op.execute(
+        "INSERT INTO resumos_mensais_lancamentos (cenario_id, mes, categoria_id, tipo, origem, total, quantidade) "
+        f"SELECT cenario_id, {mes}, categoria_id, tipo, origem, SUM(valor), COUNT(id) "
+        "FROM lancamentos_financeiros "
+        f"GROUP BY cenario_id, {mes}, categoria_id, tipo, origem"
+    )
+
+
+def upgrade() -> None:
+    # Verificar tipo de banco de dados
+    bind = op.get_bind()
+    is_postgres = bind.dialect.name == 'postgresql'
+
+    # Verificar se a tabela já existe (pode ter sido criada por db.create_all())
+    inspector = sa.inspect(bind)
+    if 'resumos_mensais_lancamentos' in inspector.get_table_names():
+        # Criada vazia pelo create_all: preencher se ainda não houver resumo
+        vazia = bind.execute(sa.text('SELECT COUNT(*) FROM resumos_mensais_lancamentos')).scalar() == 0
+        if vazia:
+            _popular(is_postgres)
+        return
+
+    if is_postgres:
+        # Tipos já criados com a tabela lancamentos_financeiros
+        tipo_enum = sa.Enum('ENTRADA', 'SAIDA', name='tipo_lancamento', create_type=False)
+        origem_enum = sa.Enum('PROJETADO', 'REALIZADO', name='origem_lancamento', create_type=False)
+        restricoes = []
+    else:
+        tipo_enum = sa.String(10)
+        origem_enum = sa.String(10)
+        # Declaradas no CREATE TABLE: o SQLite não aceita ALTER TABLE ... ADD CONSTRAINT
+        restricoes = [
+            sa.CheckConstraint("tipo IN ('ENTRADA', 'SAIDA')", name='ck_resumos_mensais_lancamentos_tipo'),
+            sa.CheckConstraint("origem IN ('PROJETADO', 'REALIZADO')", name='ck_resumos_mensais_lancamentos_origem'),
+        ]
+
+    op.create_table(
+        'resumos_mensais_lancamentos',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('cenario_id', sa.Integer(), nullable=False),
+        sa.Column('mes', sa.Date(), nullable=False),
+        sa.Column('categoria_id', sa.Integer(), nullable=False),
+        sa.Column('tipo', tipo_enum, nullable=False),
+        sa.Column('origem', origem_enum, nullable=False),
+        sa.Column('total', sa.Numeric(precision=18, scale=2), nullable=False),
+        sa.Column('quantidade', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['cenario_id'], ['cenarios.id'], ),
+        sa.ForeignKeyConstraint(['categoria_id'], ['categorias_financeiras.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        *restricoes
+    )
+    # Uma linha por chave (alvo do ON CONFLICT); o prefixo cenario_id, mes atende às leituras do cenário
+    op.create_index('ix_resumos_mensais_lancamentos_chave', 'resumos_mensais_lancamentos',
+                    ['cenario_id', 'mes', 'categoria_id', 'tipo', 'origem'], unique=True)
+
+    _popular(is_postgres)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_resumos_mensais_lancamentos_chave', table_name='resumos_mensais_lancamentos')
+    op.drop_table('resumos_mensais_lancamentos')
@@ -0,0 +1,39 @@
+"""Add extracoes_planilha table
+
+Revision ID: d4e5f6a7b8c9
+Revises: c3d4e5f6a7b8
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'd4e5f6a7b8c9'
+down_revision = 'c3d4e5f6a7b8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Verificar se a tabela já existe (pode ter sido criada por db.create_all())
+    inspector = sa.inspect(op.get_bind())
+    if 'extracoes_planilha' in inspector.get_table_names():
+        return
+    
+    op.create_table(
+        'extracoes_planilha',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('hash_arquivo', sa.String(length=64), nullable=False),
+        sa.Column('versao', sa.Integer(), nullable=False),
+        sa.Column('dados', sa.JSON(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    # Índice único: chave do cache e alvo do ON CONFLICT na gravação
+    op.create_index('ix_extracoes_planilha_hash_arquivo', 'extracoes_planilha', ['hash_arquivo'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_extracoes_planilha_hash_arquivo', table_name='extracoes_planilha')
+    op.drop_table('extracoes_planilha')
@@ -0,0 +1,93 @@
+"""Add ON DELETE CASCADE / SET NULL to the foreign keys
+
+Revision ID: e1f2a3b4c5d6
+Revises: d0e1f2a3b4c5
+Create Date: 2026-10-18 01:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'e1f2a3b4c5d6'
+down_revision = 'd0e1f2a3b4c5'
+branch_labels = None
+depends_on = None
+
+# (tabela, coluna, tabela referida, ON DELETE): as mesmas declaradas nos modelos (src/models/user.py).
+# A aplicação exclui em conjunto (src/services/exclusao_dados.py); as regras garantem a limpeza
+# também em exclusões feitas direto no banco
+CHAVES = (
+    ('projetos', 'usuario_id', 'usuarios', 'CASCADE'),
+    ('cenarios', 'projeto_id', 'projetos', 'CASCADE'),
+    ('lancamentos_financeiros', 'cenario_id', 'cenarios', 'CASCADE'),
+    ('resumos_mensais_lancamentos', 'cenario_id', 'cenarios', 'CASCADE'),
+    ('arquivos_upload', 'projeto_id', 'projetos', 'CASCADE'),
+    ('configuracoes_cenarios', 'usuario_id', 'usuarios', 'CASCADE'),
+    ('logs_sistema', 'usuario_id', 'usuarios', 'SET NULL'),
+    ('historico_cenarios', 'cenario_id', 'cenarios', 'CASCADE'),
+    ('historico_cenarios', 'usuario_id', 'usuarios', 'CASCADE'),
+    ('relatorios', 'usuario_id', 'usuarios', 'CASCADE'),
+    ('relatorios', 'scenario_id', 'cenarios', 'SET NULL'),
+    ('jobs_processamento', 'usuario_id', 'usuarios', 'CASCADE'),
+    ('sessoes_upload', 'usuario_id', 'usuarios', 'CASCADE'),
+    ('importacoes_extrato', 'projeto_id', 'projetos', 'CASCADE'),
+    ('importacoes_extrato', 'usuario_id', 'usuarios', 'CASCADE'),
+    ('requisicoes_idempotentes', 'usuario_id', 'usuarios', 'CASCADE'),
+)
+
+
+def _chave_existente(inspector, tabela: str, coluna: str, referida: str):
+    for chave in inspector.get_foreign_keys(tabela):
+        if chave['constrained_columns'] == [coluna] and chave['referred_table'] == referida:
+            return chave
+    return None
+
+
+def _substituir(bind, ondelete_por_chave) -> None:
+    """
+    Recria as chaves com a regra ON DELETE indicada (None: sem regra). A nova chave é criada NOT VALID
+    e validada à parte (sem bloquear escritas durante a verificação das linhas) antes de remover a
+    antiga, de modo que a tabela nunca fica sem a chave
+    """
+    inspector = sa.inspect(bind)
+    tabelas = set(inspector.get_table_names())
+    pendentes = []
+    for tabela, coluna, referida, ondelete in ondelete_por_chave:
+        if tabela not in tabelas or referida not in tabelas:
+            continue
+        existente = _chave_existente(inspector, tabela, coluna, referida)
+        atual = ((existente or {}).get('options') or {}).get('ondelete')
+        if existente is not None and (atual or '').upper() == (ondelete or ''):
+            continue
+        pendentes.append((tabela, coluna, referida, ondelete, existente and existente['name']))
+    if not pendentes:
+        return
+
+    with op.get_context().autocommit_block():
+        for tabela, coluna, referida, ondelete, nome_antigo in pendentes:
+            nome = f'fk_{tabela}_{coluna}' if nome_antigo != f'fk_{tabela}_{coluna}' else f'{tabela}_{coluna}_fkey'
+            regra = f' ON DELETE {ondelete}' if ondelete else ''
+            op.execute(
+                f'ALTER TABLE {tabela} ADD CONSTRAINT {nome} FOREIGN KEY ({coluna}) '
+                f'REFERENCES {referida} (id){regra} NOT VALID'
+            )
+            op.execute(f'ALTER TABLE {tabela} VALIDATE CONSTRAINT {nome}')
+            if nome_antigo:
+                op.execute(f'ALTER TABLE {tabela} DROP CONSTRAINT {nome_antigo}')
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        # SQLite não altera chaves estrangeiras (nem as verifica sem PRAGMA foreign_keys);
+        # a exclusão em conjunto da aplicação remove as linhas dependentes
+        return
+    _substituir(bind, CHAVES)
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+    _substituir(bind, [(tabela, coluna, referida, None) for tabela, coluna, referida, _ in CHAVES])
@@ -0,0 +1,39 @@
+"""Add cenario_base_id and percentual_variacao to cenarios
+
+Revision ID: e5f6a7b8c9d0
+Revises: d4e5f6a7b8c9
+Create Date: 2026-10-17 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'e5f6a7b8c9d0'
+down_revision = 'd4e5f6a7b8c9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Verificar se as colunas já existem (podem ter sido criadas por db.create_all())
+    inspector = sa.inspect(op.get_bind())
+    colunas = {coluna['name'] for coluna in inspector.get_columns('cenarios')}
+    if 'cenario_base_id' in colunas:
+        return
+
+    # batch_alter_table recria a tabela no SQLite (ALTER TABLE sem suporte a FK); no PostgreSQL é um ALTER comum
+    with op.batch_alter_table('cenarios') as batch_op:
+        batch_op.add_column(sa.Column('cenario_base_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('percentual_variacao', sa.Numeric(precision=7, scale=2), nullable=True))
+        batch_op.create_foreign_key('fk_cenarios_cenario_base_id', 'cenarios', ['cenario_base_id'], ['id'])
+        batch_op.create_index('ix_cenarios_cenario_base_id', ['cenario_base_id'])
+    # Cenários existentes mantêm seus lançamentos copiados (cenario_base_id NULL)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('cenarios') as batch_op:
+        batch_op.drop_index('ix_cenarios_cenario_base_id')
+        batch_op.drop_constraint('fk_cenarios_cenario_base_id', type_='foreignkey')
+        batch_op.drop_column('percentual_variacao')
+        batch_op.drop_column('cenario_base_id')
@@ -0,0 +1,80 @@
+"""Add sessoes_upload table
+
+Revision ID: f6a7b8c9d0e1
+Revises: e5f6a7b8c9d0
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'f6a7b8c9d0e1'
+down_revision = 'e5f6a7b8c9d0'
+branch_labels = None
+depends_on = None
+
+STATUS_SESSAO = ('aberta', 'finalizando', 'finalizada', 'cancelada', 'expirada')
+
+
+def upgrade() -> None:
+    # Verificar tipo de banco de dados
+    bind = op.get_bind()
+    is_postgres = bind.dialect.name == 'postgresql'
+
+    # Verificar se a tabela já existe (pode ter sido criada por db.create_all())
+    inspector = sa.inspect(bind)
+    if 'sessoes_upload' in inspector.get_table_names():
+        indexes = [idx['name'] for idx in inspector.get_indexes('sessoes_upload')]
+        if 'ix_sessoes_upload_usuario_id' not in indexes:
+            op.create_index('ix_sessoes_upload_usuario_id', 'sessoes_upload', ['usuario_id'], unique=False)
+        if 'ix_sessoes_upload_status_expira_em' not in indexes:
+            op.create_index('ix_sessoes_upload_status_expira_em', 'sessoes_upload', ['status', 'expira_em'], unique=False)
+        return
+
+    if is_postgres:
+        op.execute("CREATE TYPE sessao_upload_status AS ENUM ('aberta', 'finalizando', 'finalizada', 'cancelada', 'expirada')")
+        status_enum = sa.Enum(*STATUS_SESSAO, name='sessao_upload_status', create_type=False)
+    else:
+        status_enum = sa.String(20)
+
+    op.create_table(
+        'sessoes_upload',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('usuario_id', sa.Integer(), nullable=False),
+        sa.Column('nome_arquivo', sa.String(length=255), nullable=False),
+        sa.Column('tamanho', sa.BigInteger(), nullable=False),
+        sa.Column('tamanho_parte', sa.Integer(), nullable=False),
+        sa.Column('total_partes', sa.Integer(), nullable=False),
+        sa.Column('sha256', sa.String(length=64), nullable=True),
+        sa.Column('projeto_id', sa.Integer(), nullable=True),
+        sa.Column('status', status_enum, nullable=False, server_default='aberta'),
+        sa.Column('job_id', sa.String(length=36), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('expira_em', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['usuario_id'], ['usuarios.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+    if not is_postgres:
+        op.create_check_constraint(
+            'ck_sessoes_upload_status',
+            'sessoes_upload',
+            "status IN ('aberta', 'finalizando', 'finalizada', 'cancelada', 'expirada')"
+        )
+
+    op.create_index('ix_sessoes_upload_usuario_id', 'sessoes_upload', ['usuario_id'], unique=False)
+    # Limpeza das sessões abertas vencidas
+    op.create_index('ix_sessoes_upload_status_expira_em', 'sessoes_upload', ['status', 'expira_em'], unique=False)
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    is_postgres = bind.dialect.name == 'postgresql'
+
+    op.drop_index('ix_sessoes_upload_status_expira_em', table_name='sessoes_upload')
+    op.drop_index('ix_sessoes_upload_usuario_id', table_name='sessoes_upload')
+    op.drop_table('sessoes_upload')
+
+    if is_postgres:
+        op.execute("DROP TYPE IF EXISTS sessao_upload_status")
@@ -0,0 +1,81 @@
+"""Fill resumos_mensais_lancamentos for derived scenarios
+
+Revision ID: f7a8b9c0d1e2
+Revises: e1f2a3b4c5d6
+Create Date: 2026-10-18 02:00:00.000000
+
+"""
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal, ROUND_HALF_UP
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'f7a8b9c0d1e2'
+down_revision = 'e1f2a3b4c5d6'
+branch_labels = None
+depends_on = None
+
+CENTAVOS = Decimal('0.01')
+
+# Cenários derivados e as linhas do cenário base, agrupadas por valor: o ajuste é arredondado por
+# lançamento, como na listagem (src/services/resumo_mensal.py, ajustar_valor)
+LINHAS_DERIVADOS = sa.text(
+    "SELECT d.id, d.percentual_variacao, l.categoria_id, l.tipo, l.origem, l.data_competencia, l.valor, "
+    "COUNT(l.id) "
+    "FROM cenarios d JOIN lancamentos_financeiros l ON l.cenario_id = d.cenario_base_id "
+    "WHERE d.cenario_base_id IS NOT NULL "
+    "AND NOT EXISTS (SELECT 1 FROM resumos_mensais_lancamentos r WHERE r.cenario_id = d.id) "
+    "GROUP BY d.id, d.percentual_variacao, l.categoria_id, l.tipo, l.origem, l.data_competencia, l.valor"
+)
+
+
+def _mes(data_competencia) -> date:
+    # SQLite devolve as datas como texto
+    if isinstance(data_competencia, str):
+        data_competencia = date.fromisoformat(data_competencia[:10])
+    return data_competencia.replace(day=1)
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    tabelas = set(sa.inspect(bind).get_table_names())
+    if 'resumos_mensais_lancamentos' not in tabelas:
+        return
+
+    # Até aqui os derivados liam o resumo do cenário base; passam a ter resumo próprio
+    acumulado = defaultdict(lambda: [Decimal(0), 0])
+    for cenario_id, percentual, categoria_id, tipo, origem, data_competencia, valor, quantidade in bind.execute(LINHAS_DERIVADOS):
+        # Ao centavo, como o valor é listado (o SQLite pode guardar o float da extração)
+        valor = Decimal(str(valor if valor is not None else 0)).quantize(CENTAVOS, rounding=ROUND_HALF_UP)
+        if tipo == 'ENTRADA' and origem == 'PROJETADO':
+            fator = Decimal(1) + Decimal(str(percentual or 0)) / Decimal(100)
+            valor = (valor * fator).quantize(CENTAVOS, rounding=ROUND_HALF_UP)
+        item = acumulado[(cenario_id, _mes(data_competencia), categoria_id, tipo, origem)]
+        item[0] += valor * quantidade
+        item[1] += quantidade
+
+    if acumulado:
+        tabela = sa.table(
+            'resumos_mensais_lancamentos',
+            sa.column('cenario_id', sa.Integer), sa.column('mes', sa.Date), sa.column('categoria_id', sa.Integer),
+            sa.column('tipo', sa.String), sa.column('origem', sa.String), sa.column('total', sa.Numeric(18, 2)),
+            sa.column('quantidade', sa.Integer)
+        )
+        op.bulk_insert(tabela, [
+            {'cenario_id': cenario_id, 'mes': mes, 'categoria_id': categoria_id, 'tipo': tipo, 'origem': origem,
+             'total': total, 'quantidade': quantidade}
+            for (cenario_id, mes, categoria_id, tipo, origem), (total, quantidade) in acumulado.items()
+        ])
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if 'resumos_mensais_lancamentos' not in set(sa.inspect(bind).get_table_names()):
+        return
+    op.execute(
+        "DELETE FROM resumos_mensais_lancamentos WHERE cenario_id IN "
+        "(SELECT id FROM cenarios WHERE cenario_base_id IS NOT NULL)"
+    )
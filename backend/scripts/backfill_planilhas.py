@@ -0,0 +1,485 @@
+#!/usr/bin/env python3
+"""
+Importação em massa (backfill) de um diretório de planilhas Habitus Forecast.
+
+Para migrações e implantação de clientes: percorre o diretório (recursivamente),
+atribui cada planilha a um usuário pelo arquivo de mapeamento e cria os projetos
+como o upload pela API (POST /api/upload-planilha): mesma extração do
+ProcessadorPlanilhaHabitusForecast, mesmo gerar_projeto (lançamentos gravados em
+lote, com COPY no PostgreSQL), arquivo copiado para src/uploads, extração
+gravada no cache e registro em ArquivoUpload e LogSistema.
+
+A leitura das planilhas roda em um pool de processos (--workers, padrão: todas
+as CPUs), sem acesso ao banco. A gravação é feita no processo principal, uma
+transação por planilha, enquanto o pool lê as próximas. Planilhas idênticas são
+lidas uma única vez e as que já estão no cache de extrações não são lidas.
+
+Cada planilha concluída é registrada no checkpoint (JSON Lines). Se o backfill
+for interrompido, basta executar o mesmo comando: planilhas já importadas são
+puladas. Uma planilha gravada no banco mas ausente do checkpoint (queda entre
+o commit e o registro) é reconhecida pelo conteúdo (SHA256), nome e usuário e
+não gera um projeto duplicado.
+
+Arquivo de mapeamento (CSV com cabeçalho padrao,usuario; ',' ou ';'):
+    padrao,usuario
+    cliente_a/,ana@cliente-a.com.br
+    2024/*_filial_*.xlsx,7
+    *,backfill@habitus.com
+
+O padrão é comparado ao caminho relativo ao diretório (com '/'): terminado em
+'/' é um prefixo de diretório, senão um padrão glob (*, ?, [..]; o * também
+casa '/', ou seja, entra em subdiretórios). Vale a primeira linha que casar. O
+usuário é o e-mail ou o id. Planilhas sem usuário são listadas e não são
+importadas.
+
+Uso:
+    python scripts/backfill_planilhas.py /dados/planilhas --mapeamento usuarios.csv
+    python scripts/backfill_planilhas.py /dados/planilhas --mapeamento usuarios.csv --workers 8 --checkpoint backfill.jsonl
+    python scripts/backfill_planilhas.py /dados/planilhas --usuario-padrao ana@cliente-a.com.br --simular
+"""
+import argparse
+import contextlib
+import csv
+import fnmatch
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Dict, List, Optional, Tuple
+
+# Adicionar o diretório raiz ao path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+load_dotenv(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.env'))
+
+from src.services.metricas_processamento import MedidorProcessamento
+from src.services.planilha_processor import ProcessadorPlanilhaHabitusForecast
+
+CHECKPOINT_PADRAO = 'backfill_planilhas.checkpoint.jsonl'
+EXTENSOES_PLANILHA = ('.xlsx', '.xls')
+# Status do checkpoint que encerram a planilha; erros são repetidos só com --repetir-erros
+STATUS_CONCLUIDOS = ('importada', 'existente')
+TAMANHO_BLOCO = 1024 * 1024
+
+
+def _extrair_em_processo(caminho: str) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """Executado nos processos do pool: apenas lê a planilha, sem acesso ao banco"""
+    medidor = MedidorProcessamento()
+    # O backfill já paraleliza por planilha: as abas de cada uma são lidas no próprio processo
+    with contextlib.redirect_stdout(io.StringIO()):
+        extracao = ProcessadorPlanilhaHabitusForecast().extrair_arquivo(caminho, medidor, leitura_paralela=False)
+    return extracao, medidor.etapas
+
+
+def listar_planilhas(diretorio: str) -> List[Dict[str, Any]]:
+    """Planilhas do diretório (recursivo), em ordem, sem arquivos ocultos e de bloqueio do Office (~$)"""
+    planilhas = []
+    for raiz, pastas, arquivos in os.walk(diretorio):
+        pastas[:] = sorted(pasta for pasta in pastas if not pasta.startswith('.'))
+        for nome in sorted(arquivos):
+            if nome.startswith(('.', '~$')) or not nome.lower().endswith(EXTENSOES_PLANILHA):
+                continue
+            caminho = os.path.join(raiz, nome)
+            info = os.stat(caminho)
+            planilhas.append({
+                'relativo': os.path.relpath(caminho, diretorio).replace(os.sep, '/'),
+                'caminho': caminho,
+                'nome': nome,
+                'tamanho': info.st_size,
+                'mtime_ns': info.st_mtime_ns,
+            })
+    return planilhas
+
+
+def carregar_mapeamento(caminho: str) -> List[Tuple[str, str]]:
+    """Linhas (padrão, usuário) do CSV de mapeamento, na ordem do arquivo"""
+    with open(caminho, encoding='utf-8-sig', newline='') as f:
+        amostra = f.readline()
+        f.seek(0)
+        delimitador = ';' if amostra.count(';') > amostra.count(',') else ','
+        leitor = csv.DictReader((linha for linha in f if not linha.lstrip().startswith('#')), delimiter=delimitador)
+        campos = [campo.strip().lower() for campo in (leitor.fieldnames or [])]
+        if 'padrao' not in campos or 'usuario' not in campos:
+            raise ValueError("o mapeamento precisa das colunas 'padrao' e 'usuario'")
+        leitor.fieldnames = campos
+        regras = []
+        for numero, linha in enumerate(leitor, start=2):
+            padrao, usuario = (linha.get('padrao') or '').strip(), (linha.get('usuario') or '').strip()
+            if not padrao or not usuario:
+                raise ValueError(f'linha {numero}: padrão e usuário são obrigatórios')
+            regras.append((padrao, usuario))
+    return regras
+
+
+def padrao_casa(padrao: str, relativo: str) -> bool:
+    if padrao.endswith('/'):
+        return relativo.startswith(padrao)
+    return fnmatch.fnmatchcase(relativo, padrao)
+
+
+def resolver_usuarios(identificadores, db, User) -> Dict[str, int]:
+    """E-mail ou id -> id do usuário; levanta ValueError com os que não existem"""
+    ids, desconhecidos = {}, []
+    for identificador in dict.fromkeys(identificadores):
+        if identificador.isdigit():
+            usuario = db.session.get(User, int(identificador))
+        else:
+            usuario = User.query.filter_by(email=identificador.lower()).first()
+        if usuario is None:
+            desconhecidos.append(identificador)
+        else:
+            ids[identificador] = usuario.id
+    if desconhecidos:
+        raise ValueError(f"usuários não encontrados: {', '.join(desconhecidos)}")
+    return ids
+
+
+def hash_e_assinatura(caminho: str) -> Tuple[str, bytes]:
+    """SHA256 do arquivo e os primeiros bytes (assinatura Excel)"""
+    sha256 = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        cabecalho = f.read(8)
+        sha256.update(cabecalho)
+        for bloco in iter(lambda: f.read(TAMANHO_BLOCO), b''):
+            sha256.update(bloco)
+    return sha256.hexdigest(), cabecalho
+
+
+class Checkpoint:
+    """Progresso do backfill em JSON Lines: uma linha por planilha concluída (a última linha vale)"""
+
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+        self.registros: Dict[str, Dict[str, Any]] = {}
+        self._arquivo = None
+
+    def carregar(self):
+        if not os.path.exists(self.caminho):
+            return
+        with open(self.caminho, encoding='utf-8') as f:
+            for linha in f:
+                try:
+                    registro = json.loads(linha)
+                except ValueError:
+                    # Última linha incompleta (queda durante a escrita)
+                    continue
+                self.registros[registro['arquivo']] = registro
+
+    def pendente(self, planilha: Dict[str, Any], repetir_erros: bool) -> bool:
+        registro = self.registros.get(planilha['relativo'])
+        if registro is None or registro['tamanho'] != planilha['tamanho'] or registro['mtime_ns'] != planilha['mtime_ns']:
+            return True
+        return registro['status'] not in STATUS_CONCLUIDOS and repetir_erros
+
+    def registrar(self, planilha: Dict[str, Any], status: str, **dados):
+        if self._arquivo is None:
+            self._arquivo = open(self.caminho, 'a', encoding='utf-8')
+        registro = {
+            'arquivo': planilha['relativo'], 'tamanho': planilha['tamanho'], 'mtime_ns': planilha['mtime_ns'],
+            'status': status, **dados
+        }
+        self._arquivo.write(json.dumps(registro, ensure_ascii=False) + '\n')
+        self._arquivo.flush()
+        os.fsync(self._arquivo.fileno())
+        self.registros[planilha['relativo']] = registro
+
+    def fechar(self):
+        if self._arquivo is not None:
+            self._arquivo.close()
+
+
+class Estatisticas:
+    """Contadores e vazão do backfill, com uma linha de progresso a cada `intervalo` segundos"""
+
+    def __init__(self, total: int, intervalo: float):
+        self.total = total
+        self.intervalo = intervalo
+        self.inicio = time.perf_counter()
+        self.ultimo_progresso = self.inicio
+        self.status: Dict[str, int] = {}
+        self.bytes = 0
+        self.lancamentos = 0
+        self.extracao_ms = 0.0
+        self.gravacao_ms = 0.0
+
+    @property
+    def concluidas(self) -> int:
+        return sum(self.status.values())
+
+    def contar(self, planilha: Dict[str, Any], status: str, lancamentos: int = 0):
+        self.status[status] = self.status.get(status, 0) + 1
+        self.bytes += planilha['tamanho']
+        self.lancamentos += lancamentos
+        agora = time.perf_counter()
+        if agora - self.ultimo_progresso >= self.intervalo:
+            self.ultimo_progresso = agora
+            print(f"   {self.concluidas}/{self.total} planilhas | {self._vazao(agora)}", flush=True)
+
+    def _vazao(self, agora: float) -> str:
+        decorrido = max(agora - self.inicio, 1e-9)
+        texto = (f"{self.concluidas / decorrido:.1f} planilhas/s, {self.bytes / 1024 / 1024 / decorrido:.1f} MB/s, "
+                 f"{self.lancamentos / decorrido:.0f} lançamentos/s")
+        if 0 < self.concluidas < self.total:
+            restante = (self.total - self.concluidas) * decorrido / self.concluidas
+            texto += f", restante ~{restante:.0f}s"
+        return texto
+
+    def imprimir_resumo(self, workers: int):
+        agora = time.perf_counter()
+        decorrido = agora - self.inicio
+        print(f"✓ Backfill concluído em {decorrido:.1f}s: {self.concluidas} planilhas")
+        if not self.concluidas:
+            return
+        print(f"   {', '.join(f'{status}: {quantidade}' for status, quantidade in sorted(self.status.items()))}")
+        print(f"   {self._vazao(agora)}")
+        if self.extracao_ms:
+            paralelismo = self.extracao_ms / 1000 / decorrido if decorrido else 0
+            print(f"   leitura: {self.extracao_ms / 1000:.1f}s somados em {workers} processo(s) "
+                  f"(paralelismo efetivo {paralelismo:.1f}x); gravação: {self.gravacao_ms / 1000:.1f}s")
+
+
+class Backfill:
+    """Lê as planilhas no pool de processos e grava os projetos no processo principal"""
+
+    def __init__(self, checkpoint: Checkpoint, estatisticas: Estatisticas, usuarios: List[int], workers: int,
+                 simular: bool):
+        from src.models.user import db, ArquivoUpload, LogSistema, Projeto
+        from src.services.armazenamento_upload import ASSINATURAS_EXCEL, caminho_definitivo
+        from src.services.cache_extracoes import cache_extracoes
+
+        self.db, self.LogSistema = db, LogSistema
+        self.assinaturas_excel = ASSINATURAS_EXCEL
+        self.caminho_definitivo = caminho_definitivo
+        self.cache_extracoes = cache_extracoes
+        self.checkpoint = checkpoint
+        self.estatisticas = estatisticas
+        self.workers = workers
+        self.simular = simular
+        self.processador = ProcessadorPlanilhaHabitusForecast()
+        # Planilhas já no banco (queda antes do checkpoint): (hash, nome, usuário)
+        self.existentes: Dict[Tuple[str, str, int], int] = {
+            (hash_arquivo, nome, usuario_id): projeto_id
+            for hash_arquivo, nome, usuario_id, projeto_id in db.session.query(
+                ArquivoUpload.hash_arquivo, ArquivoUpload.nome_original, Projeto.usuario_id, Projeto.id
+            ).join(Projeto, ArquivoUpload.projeto_id == Projeto.id).filter(Projeto.usuario_id.in_(usuarios))
+        }
+
+    def executar(self, planilhas: List[Dict[str, Any]]):
+        """Processa as planilhas ({..., 'usuario_id'}), com até 2 leituras por processo em andamento"""
+        em_leitura: Dict[str, List[Dict[str, Any]]] = {}
+        limite = self.workers * 2
+
+        if self.workers == 1:
+            for planilha in planilhas:
+                hash_arquivo = self._preparar(planilha)
+                if hash_arquivo is not None:
+                    try:
+                        resultado, erro = _extrair_em_processo(planilha['caminho']), None
+                    except Exception as e:
+                        resultado, erro = None, e
+                    self._concluir_leitura(hash_arquivo, [planilha], resultado, erro)
+            return
+
+        # 'spawn': os processos filhos não herdam a conexão com o banco do processo principal
+        contexto = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=contexto) as pool:
+            futuros = {}
+            for planilha in planilhas:
+                hash_arquivo = self._preparar(planilha)
+                if hash_arquivo is None:
+                    continue
+                if hash_arquivo in em_leitura:
+                    # Mesmo conteúdo de uma planilha em leitura: aproveita a mesma extração
+                    em_leitura[hash_arquivo].append(planilha)
+                    continue
+                em_leitura[hash_arquivo] = [planilha]
+                futuros[pool.submit(_extrair_em_processo, planilha['caminho'])] = hash_arquivo
+                while len(futuros) >= limite:
+                    self._receber(futuros, em_leitura)
+            while futuros:
+                self._receber(futuros, em_leitura)
+
+    def _receber(self, futuros, em_leitura):
+        """Espera ao menos uma leitura terminar e grava as planilhas correspondentes"""
+        prontos, _ = wait(futuros, return_when=FIRST_COMPLETED)
+        for futuro in prontos:
+            hash_arquivo = futuros.pop(futuro)
+            try:
+                resultado, erro = futuro.result(), None
+            except Exception as e:
+                resultado, erro = None, e
+            self._concluir_leitura(hash_arquivo, em_leitura.pop(hash_arquivo), resultado, erro)
+
+    def _preparar(self, planilha: Dict[str, Any]) -> Optional[str]:
+        """Hash e validação da planilha; retorna o hash se ela precisa ser lida pelo pool"""
+        hash_arquivo, cabecalho = hash_e_assinatura(planilha['caminho'])
+        planilha['hash'] = hash_arquivo
+        if not cabecalho.startswith(self.assinaturas_excel):
+            self._falhar(planilha, ValueError('O arquivo não é uma planilha Excel válida'))
+            return None
+
+        projeto_id = self.existentes.get((hash_arquivo, planilha['nome'], planilha['usuario_id']))
+        if projeto_id is not None and not self.simular:
+            self.checkpoint.registrar(planilha, 'existente', hash=hash_arquivo, usuario_id=planilha['usuario_id'],
+                                      projeto_id=projeto_id)
+            self.estatisticas.contar(planilha, 'existente')
+            return None
+
+        extracao = self.cache_extracoes.obter(hash_arquivo)
+        if extracao is not None:
+            self._gravar(planilha, extracao, True)
+            return None
+        return hash_arquivo
+
+    def _concluir_leitura(self, hash_arquivo: str, planilhas: List[Dict[str, Any]], resultado, erro):
+        if erro is not None:
+            for planilha in planilhas:
+                self._falhar(planilha, erro)
+            return
+        extracao, etapas = resultado
+        self.estatisticas.extracao_ms += sum(etapa['tempo_ms'] for etapa in etapas if 'nivel' not in etapa)
+        if not self.simular:
+            try:
+                self.cache_extracoes.salvar(hash_arquivo, extracao)
+            except Exception as e:
+                print(f"   aviso: extração de {planilhas[0]['relativo']} não gravada no cache: {str(e)}")
+        for planilha in planilhas:
+            self._gravar(planilha, extracao, False, etapas)
+
+    def _gravar(self, planilha: Dict[str, Any], extracao: Dict[str, Any], extracao_em_cache: bool,
+                etapas: Optional[List[Dict[str, Any]]] = None):
+        if self.simular:
+            self.estatisticas.contar(planilha, 'lida')
+            return
+
+        inicio = time.perf_counter()
+        destino = self.caminho_definitivo(planilha['nome'])
+        try:
+            shutil.copyfile(planilha['caminho'], destino)
+            with contextlib.redirect_stdout(io.StringIO()):
+                resultado = self.processador.gerar_projeto(
+                    extracao, planilha['usuario_id'], destino, planilha['hash'], extracao_em_cache,
+                    nome_original=planilha['nome'], medidor=MedidorProcessamento(etapas)
+                )
+            self._registrar_log(planilha['usuario_id'], 'PLANILHA_UPLOADED', {
+                'filename': planilha['nome'],
+                'arquivo': planilha['relativo'],
+                'projeto_id': resultado['projeto_id'],
+                'status': resultado['status'],
+                'lancamentos_criados': resultado['lancamentos_criados']
+            })
+        except Exception as e:
+            if os.path.exists(destino):
+                os.remove(destino)
+            self._falhar(planilha, e)
+            return
+        finally:
+            self.estatisticas.gravacao_ms += (time.perf_counter() - inicio) * 1000
+
+        self.existentes[(planilha['hash'], planilha['nome'], planilha['usuario_id'])] = resultado['projeto_id']
+        self.checkpoint.registrar(
+            planilha, 'importada', hash=planilha['hash'], usuario_id=planilha['usuario_id'],
+            projeto_id=resultado['projeto_id'], lancamentos_criados=resultado['lancamentos_criados']
+        )
+        self.estatisticas.contar(planilha, 'importada', resultado['lancamentos_criados'])
+
+    def _falhar(self, planilha: Dict[str, Any], erro: Exception):
+        self.db.session.rollback()
+        print(f"❌ {planilha['relativo']}: {str(erro)}")
+        if not self.simular:
+            self.checkpoint.registrar(planilha, 'erro', hash=planilha.get('hash'), usuario_id=planilha['usuario_id'],
+                                      erro=str(erro))
+            self._registrar_log(planilha['usuario_id'], 'PLANILHA_UPLOAD_ERROR', {
+                'filename': planilha['nome'], 'arquivo': planilha['relativo'], 'erro': str(erro)
+            })
+        self.estatisticas.contar(planilha, 'erro')
+
+    def _registrar_log(self, usuario_id: int, acao: str, detalhes: Dict[str, Any]):
+        try:
+            self.db.session.add(self.LogSistema(usuario_id=usuario_id, acao=acao, detalhes=dict(detalhes, tipo='BACKFILL')))
+            self.db.session.commit()
+        except Exception:
+            self.db.session.rollback()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Importa em massa um diretório de planilhas Habitus Forecast')
+    parser.add_argument('diretorio', help='Diretório com as planilhas (.xlsx/.xls), percorrido recursivamente')
+    parser.add_argument('--mapeamento', help='CSV padrao,usuario que atribui as planilhas aos usuários')
+    parser.add_argument('--usuario-padrao', help='Usuário (e-mail ou id) das planilhas sem linha no mapeamento')
+    parser.add_argument('--checkpoint', default=CHECKPOINT_PADRAO, help=f'Arquivo de progresso (padrão: {CHECKPOINT_PADRAO})')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Processos de leitura (padrão: CPUs)')
+    parser.add_argument('--repetir-erros', action='store_true', help='Tentar de novo as planilhas com erro no checkpoint')
+    parser.add_argument('--intervalo', type=float, default=10, help='Segundos entre as linhas de progresso')
+    parser.add_argument('--simular', action='store_true', help='Apenas ler as planilhas, sem gravar nem usar o checkpoint')
+    args = parser.parse_args()
+
+    if not args.mapeamento and not args.usuario_padrao:
+        parser.error('informe --mapeamento e/ou --usuario-padrao')
+    if not os.path.isdir(args.diretorio):
+        print(f"❌ Diretório não encontrado: {args.diretorio}")
+        sys.exit(1)
+
+    try:
+        regras = carregar_mapeamento(args.mapeamento) if args.mapeamento else []
+    except (OSError, ValueError) as e:
+        print(f"❌ Mapeamento inválido: {str(e)}")
+        sys.exit(1)
+
+    # Importado aqui: os processos do pool (spawn) importam este módulo e não devem criar a aplicação
+    from src.main import app
+    from src.models.user import db, User
+
+    with app.app_context():
+        try:
+            ids = resolver_usuarios([usuario for _, usuario in regras] + ([args.usuario_padrao] if args.usuario_padrao else []), db, User)
+        except ValueError as e:
+            print(f"❌ {str(e)}")
+            sys.exit(1)
+
+        checkpoint = Checkpoint(args.checkpoint)
+        if not args.simular:
+            checkpoint.carregar()
+
+        planilhas, sem_usuario, ja_concluidas = [], [], 0
+        for planilha in listar_planilhas(args.diretorio):
+            usuario = next((usuario for padrao, usuario in regras if padrao_casa(padrao, planilha['relativo'])),
+                           args.usuario_padrao)
+            if usuario is None:
+                sem_usuario.append(planilha['relativo'])
+            elif args.simular or checkpoint.pendente(planilha, args.repetir_erros):
+                planilhas.append(dict(planilha, usuario_id=ids[usuario]))
+            else:
+                ja_concluidas += 1
+
+        print(f"✓ {len(planilhas)} planilha(s) a processar com {args.workers} processo(s) "
+              f"({ja_concluidas} já no checkpoint, {len(sem_usuario)} sem usuário)")
+        for relativo in sem_usuario[:20]:
+            print(f"   sem usuário: {relativo}")
+        if len(sem_usuario) > 20:
+            print(f"   ... e mais {len(sem_usuario) - 20}")
+
+        estatisticas = Estatisticas(len(planilhas), args.intervalo)
+        workers = max(1, args.workers)
+        try:
+            Backfill(checkpoint, estatisticas, list(ids.values()), workers, args.simular).executar(planilhas)
+        except KeyboardInterrupt:
+            print(f"❌ Interrompido: {estatisticas.concluidas} planilha(s) concluídas; execute de novo para continuar")
+            sys.exit(130)
+        finally:
+            checkpoint.fechar()
+            db.session.remove()
+        estatisticas.imprimir_resumo(workers)
+
+    if estatisticas.status.get('erro'):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
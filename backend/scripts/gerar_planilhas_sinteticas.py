@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Gerador de planilhas Habitus Foreca$t sintéticas para testes de carga e benchmark.
+
+Gera planilhas nos três layouts aceitos pelo processador (antigo, novo com
+RECEITAS e novo sem RECEITAS), com as mesmas abas, rótulos e posições que o
+processador lê (ver src/services/layout_planilhas.py), valores mensais
+plausíveis e um tamanho configurável: linhas por aba e colunas extras além dos
+12 meses (simulando abas com totais, observações e cálculos auxiliares).
+
+Uso:
+    python scripts/gerar_planilhas_sinteticas.py --layout novo_receitas --linhas 5000 --saida /tmp/planilha.xlsx
+"""
+import argparse
+import os
+import random
+import sys
+
+# Adicionar o diretório raiz ao path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openpyxl import Workbook
+
+from src.services.layout_planilhas import LAYOUTS_PLANILHA
+from src.services.planilha_processor import ProcessadorPlanilhaHabitusForecast
+
+LAYOUTS = tuple(layout['nome'] for layout in LAYOUTS_PLANILHA)
+MESES = 12
+# Linhas fixas lidas pelo processador: a aba precisa ter pelo menos estas linhas
+LINHAS_MINIMAS = 220
+
+
+def _valor_mensal(rng: random.Random, base: float) -> float:
+    # Frações de centavo, como nos resultados de fórmulas das planilhas reais (ex.: 120263.04999999999)
+    return round(base * rng.uniform(0.8, 1.25), 4)
+
+
+def _preencher_linha(aba, linha: int, coluna_inicial: int, base: float, rng: random.Random, colunas: int = MESES):
+    for coluna in range(coluna_inicial, coluna_inicial + colunas):
+        aba.cell(linha, coluna, _valor_mensal(rng, base))
+
+
+def _preencher_aba_categorias(aba, linhas: int, colunas_extras: int, rng: random.Random):
+    """
+    Aba com rótulos de categoria na coluna A (a partir da linha 4) e 12 meses nas colunas C-N.
+
+    Todas as categorias conhecidas aparecem uma vez no início; as demais linhas têm
+    rótulos de detalhamento que o processador ignora, como nas planilhas reais.
+    """
+    aba.cell(1, 1, 'HABITUS FORECA$T')
+    aba.cell(3, 1, 'CATEGORIA')
+    for mes in range(MESES):
+        aba.cell(3, 3 + mes, f'MÊS {mes + 1}')
+
+    rotulos = list(ProcessadorPlanilhaHabitusForecast().categorias_mapeamento.keys())
+    for linha in range(4, linhas + 1):
+        indice = linha - 4
+        rotulo = rotulos[indice] if indice < len(rotulos) else f'  DETALHAMENTO {indice - len(rotulos) + 1}'
+        aba.cell(linha, 1, rotulo)
+        _preencher_linha(aba, linha, 3, rng.choice((1500, 8000, 25000, 120000)), rng)
+        for coluna in range(3 + MESES, 3 + MESES + colunas_extras):
+            aba.cell(linha, coluna, _valor_mensal(rng, 500))
+
+
+def _preencher_aba_valores(aba, linhas: int, colunas_extras: int, rng: random.Random):
+    """Aba de apoio (DESPESAS, INVESTIMENTOS...): valores nas colunas E-P, de onde são lidas as linhas fixas"""
+    for linha in range(1, linhas + 1):
+        aba.cell(linha, 1, f'CONTA {linha}')
+        _preencher_linha(aba, linha, 5, rng.choice((800, 5000, 30000)), rng, MESES + colunas_extras)
+
+
+def _aba_indicadores(livro, rng: random.Random):
+    aba = livro.create_sheet('Indicadores Forecast')
+    aba['B19'], aba['H19'] = 'Geração FDC Livre', _valor_mensal(rng, 150000)
+    aba['B31'], aba['H31'] = 'Ponto de Equilíbrio', _valor_mensal(rng, 90000)
+    aba['B35'], aba['H35'] = '% Custo Fixo', round(rng.uniform(0.05, 0.35), 4)
+
+
+def gerar_layout_antigo(livro, linhas: int, colunas_extras: int, rng: random.Random):
+    painel = livro.active
+    painel.title = 'Painel Controle'
+    parametros = (
+        ('Nome do Cliente', 'Cliente Sintético Ltda'),
+        ('Data-base', '2025-09-30'),
+        ('Saldo Inicial', _valor_mensal(rng, 50000)),
+        ('Cenário', 'Realista'),
+    )
+    for linha, (rotulo, valor) in enumerate(parametros, start=3):
+        painel.cell(linha, 2, rotulo)
+        painel.cell(linha, 5, valor)
+
+    habitus = livro.create_sheet('HABITUS_FORECA$T')
+    _preencher_aba_categorias(habitus, linhas, colunas_extras, rng)
+    # Linha 56: base do gráfico (linha verde)
+    habitus.cell(56, 1, 'SALDO PROJETADO')
+
+    vendas = livro.create_sheet('VENDAS')
+    _preencher_aba_valores(vendas, min(linhas, 60), colunas_extras, rng)
+
+    fdc_real = livro.create_sheet('FDC-REAL')
+    _preencher_aba_valores(fdc_real, max(linhas, 63), colunas_extras, rng)
+    # Linha 63, colunas C-N: FDC realizado
+    _preencher_linha(fdc_real, 63, 3, 40000, rng)
+
+    _aba_indicadores(livro, rng)
+
+
+def gerar_layout_novo(livro, linhas: int, colunas_extras: int, rng: random.Random, com_receitas: bool):
+    realizado = livro.active
+    realizado.title = 'REALIZADO'
+    _preencher_aba_categorias(realizado, linhas, colunas_extras, rng)
+    realizado['B2'] = 'Cliente Sintético Ltda'
+    # Linha 61, colunas F-Q: FDC realizado
+    _preencher_linha(realizado, 61, 6, 40000, rng)
+
+    if com_receitas:
+        receitas = livro.create_sheet('RECEITAS')
+        _preencher_aba_categorias(receitas, linhas, colunas_extras, rng)
+        # Linha 6, colunas E-P: base da linha verde
+        _preencher_linha(receitas, 6, 5, 180000, rng)
+
+    for nome in ('DESPESAS', 'INVESTIMENTOS', 'FINANCIAMENTOS'):
+        _preencher_aba_valores(livro.create_sheet(nome), linhas, colunas_extras, rng)
+
+    _aba_indicadores(livro, rng)
+
+
+def gerar_planilha(caminho: str, layout: str = 'novo_receitas', linhas: int = 250,
+                   colunas_extras: int = 0, semente: int = 42) -> str:
+    """
+    Gera uma planilha sintética no layout informado ('antigo', 'novo_receitas' ou 'novo').
+
+    `linhas` é o número de linhas das abas principais (mínimo de 220, para conter as
+    linhas fixas lidas pelo processador). Retorna o caminho do arquivo gerado.
+    """
+    if layout not in LAYOUTS:
+        raise ValueError(f'Layout desconhecido: {layout}. Opções: {", ".join(LAYOUTS)}')
+
+    rng = random.Random(semente)
+    linhas = max(linhas, LINHAS_MINIMAS)
+    livro = Workbook()
+    if layout == 'antigo':
+        gerar_layout_antigo(livro, linhas, colunas_extras, rng)
+    else:
+        gerar_layout_novo(livro, linhas, colunas_extras, rng, com_receitas=(layout == 'novo_receitas'))
+    livro.save(caminho)
+    return caminho
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Gera planilhas Habitus Foreca$t sintéticas')
+    parser.add_argument('--layout', choices=LAYOUTS, default='novo_receitas')
+    parser.add_argument('--linhas', type=int, default=250, help='Linhas por aba (mínimo 220)')
+    parser.add_argument('--colunas-extras', type=int, default=0, help='Colunas preenchidas além dos 12 meses')
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--saida', required=True, help='Caminho do .xlsx gerado')
+    args = parser.parse_args()
+
+    caminho = gerar_planilha(args.saida, args.layout, args.linhas, args.colunas_extras, args.semente)
+    print(f"✓ Planilha gerada: {caminho} ({os.path.getsize(caminho) / 1024:.0f} KB)")
+
+
+if __name__ == '__main__':
+    main()
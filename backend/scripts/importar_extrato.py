@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Importa um extrato bancário (CSV ou OFX) como lançamentos REALIZADOS de um projeto.
+
+Mesma importação do endpoint POST /api/upload-extrato (ver
+src/services/importacao_extrato.py), útil para cargas iniciais com vários
+extratos. Com --simular, o extrato é apenas lido e categorizado, para conferir
+as regras antes de gravar.
+
+Uso:
+    python scripts/importar_extrato.py extrato_2025.csv --projeto-id 12 --regras regras_cliente.json
+    python scripts/importar_extrato.py extratos/*.ofx --projeto-id 12 --sem-agregacao
+    python scripts/importar_extrato.py extrato_2025.csv --regras regras_cliente.json --simular
+"""
+import argparse
+import json
+import os
+import sys
+
+# Adicionar o diretório raiz ao path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+load_dotenv(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.env'))
+
+from src.main import app
+from src.models.user import db, Projeto
+from src.services.importacao_extrato import (
+    ErroImportacaoExtrato, carregar_configuracao, importar_extrato, resumir_extrato
+)
+
+
+def _imprimir_resumo(resumo: dict):
+    periodo = resumo['periodo']
+    print(f"   período: {periodo['inicio']} a {periodo['fim']}")
+    print(f"   transações: {resumo['transacoes_importadas']} "
+          f"(entradas {resumo['total_entradas']:.2f}, saídas {resumo['total_saidas']:.2f})")
+    for nome, totais in resumo['por_categoria'].items():
+        print(f"   - {nome}: {totais['transacoes']} transações, "
+              f"entradas {totais['entradas']:.2f}, saídas {totais['saidas']:.2f}")
+    if resumo['linhas_ignoradas']:
+        print(f"   linhas ignoradas: {resumo['linhas_ignoradas']} {resumo['motivos_ignoradas']}")
+    if resumo['descricoes_sem_regra']:
+        print(f"   sem regra ({resumo['nao_categorizadas']} transações), mais frequentes:")
+        for item in resumo['descricoes_sem_regra'][:10]:
+            print(f"     {item['transacoes']:>6}  {item['descricao']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Importa extratos bancários (CSV/OFX) como lançamentos REALIZADOS')
+    parser.add_argument('arquivos', nargs='+', help='Extratos .csv/.txt/.ofx/.qfx')
+    parser.add_argument('--projeto-id', type=int, help='Projeto que recebe os lançamentos (obrigatório sem --simular)')
+    parser.add_argument('--usuario-id', type=int, help='Usuário da importação (padrão: dono do projeto)')
+    parser.add_argument('--regras', help='Arquivo JSON com as regras de categoria (padrão: EXTRATO_REGRAS_CATEGORIAS)')
+    parser.add_argument('--formato', choices=('csv', 'ofx'), help='Formato (padrão: pela extensão do arquivo)')
+    agregacao = parser.add_mutually_exclusive_group()
+    agregacao.add_argument('--agregar-mensal', dest='agregar_mensal', action='store_true', default=None,
+                           help='Somar as transações por categoria e mês')
+    agregacao.add_argument('--sem-agregacao', dest='agregar_mensal', action='store_false',
+                           help='Um lançamento por transação, na data do extrato')
+    parser.add_argument('--simular', action='store_true', help='Apenas ler e categorizar, sem gravar')
+    args = parser.parse_args()
+
+    if not args.simular and args.projeto_id is None:
+        parser.error('--projeto-id é obrigatório (ou use --simular)')
+
+    try:
+        if args.regras:
+            with open(args.regras, encoding='utf-8') as f:
+                configuracao = carregar_configuracao(json.load(f))
+        else:
+            configuracao = carregar_configuracao()
+    except (OSError, ValueError) as e:
+        print(f"❌ Regras inválidas: {str(e)}")
+        sys.exit(1)
+
+    falhas = 0
+    with app.app_context():
+        usuario_id = args.usuario_id
+        if not args.simular:
+            projeto = db.session.get(Projeto, args.projeto_id)
+            if projeto is None:
+                print(f"❌ Projeto {args.projeto_id} não encontrado")
+                sys.exit(1)
+            usuario_id = usuario_id or projeto.usuario_id
+
+        for caminho in args.arquivos:
+            nome = os.path.basename(caminho)
+            try:
+                if args.simular:
+                    resumo = resumir_extrato(caminho, args.formato, configuracao)
+                    print(f"✓ {nome}: simulação")
+                else:
+                    resultado = importar_extrato(
+                        caminho, args.projeto_id, usuario_id, nome_arquivo=nome, formato=args.formato,
+                        configuracao=configuracao, agregar_mensal=args.agregar_mensal
+                    )
+                    resumo = resultado['relatorio']
+                    print(f"✓ {nome}: {resultado['lancamentos_criados']} lançamentos criados "
+                          f"(importação {resultado['importacao_id']})")
+                _imprimir_resumo(resumo)
+            except ErroImportacaoExtrato as e:
+                falhas += 1
+                print(f"❌ {nome}: {str(e)}")
+            except Exception as e:
+                falhas += 1
+                db.session.rollback()
+                print(f"❌ {nome}: erro inesperado: {str(e)}")
+
+    if falhas:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
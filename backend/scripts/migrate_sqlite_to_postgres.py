@@ -20,6 +20,7 @@ from src.models.user import (
     LancamentoFinanceiro, ArquivoUpload, ConfiguracaoCenarios,
     LogSistema, HistoricoCenario, db
 )
+from src.services.resumo_mensal import preencher_resumo_vazio
 
 def migrate_sqlite_to_postgres():
     """Migra dados do SQLite para PostgreSQL"""
@@ -119,6 +120,16 @@ def migrate_sqlite_to_postgres():
         
         sqlite_conn.close()
         
+        # O resumo mensal é derivado dos lançamentos: calcular no destino em vez de copiar
+        try:
+            cenarios = preencher_resumo_vazio()
+            db.session.commit()
+            print(f"✓ resumos_mensais_lancamentos: resumo calculado para {cenarios} cenários")
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Erro ao calcular o resumo mensal: {e}")
+            print("   Execute: python scripts/recalcular_resumo_mensal.py")
+        
         print(f"\n✅ Migração concluída! Total: {total_migrated} registros migrados")
         print("\n⚠ Importante:")
         print("   1. Verifique os dados migrados no PostgreSQL")
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Paridade e benchmark dos leitores de planilha (calamine x openpyxl).
+
+Para cada planilha (as informadas na linha de comando, por exemplo planilhas
+reais de clientes, e as sintéticas geradas nos três layouts, incluindo uma com
+casos especiais: fórmulas com valor em cache, células mescladas, erros, datas,
+horas e booleanos), verifica que:
+- todas as células de todas as abas têm o mesmo valor e tipo nos dois leitores;
+- a extração do ProcessadorPlanilhaHabitusForecast é idêntica com openpyxl,
+  calamine e o modo 'auto' (ver src/services/leitores_planilha.py).
+
+Também mede, por leitor, a abertura da planilha mais a extração completa
+(mínimo e mediana em ms). Termina com código 1 se houver divergência.
+
+Uso:
+    python scripts/paridade_leitores_planilha.py
+    python scripts/paridade_leitores_planilha.py planilhas_clientes/*.xlsx --linhas 250 --repeticoes 5
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import zipfile
+from datetime import date, datetime, time as hora
+
+# Adicionar o diretório raiz ao path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openpyxl import Workbook
+
+from src.services.leitores_planilha import LeitorCalamine, LeitorOpenpyxl, calamine_disponivel
+from src.services.planilha_carregada import PlanilhaCarregada
+from src.services.planilha_processor import ProcessadorPlanilhaHabitusForecast
+from scripts.gerar_planilhas_sinteticas import LAYOUTS, gerar_planilha
+
+LEITORES_COMPARADOS = ('openpyxl', 'calamine', 'auto')
+MAX_DIVERGENCIAS_EXIBIDAS = 10
+
+# Fórmulas com valor em cache (o openpyxl grava fórmulas sem o valor calculado)
+VALORES_EM_CACHE = {
+    '<c r="I1"><f>B1+C1</f><v /></c>': '<c r="I1"><f>B1+C1</f><v>2.5</v></c>',
+    '<c r="J1"><f>B1*0</f><v /></c>': '<c r="J1"><f>B1*0</f><v>0</v></c>',
+    '<c r="K1"><f>A1&amp;"x"</f><v /></c>': '<c r="K1" t="str"><f>A1&amp;"x"</f><v>textox</v></c>',
+    '<c r="L1"><f>1/0</f><v /></c>': '<c r="L1" t="e"><f>1/0</f><v>#DIV/0!</v></c>',
+    '<c r="M1"><f>1=1</f><v /></c>': '<c r="M1" t="b"><f>1=1</f><v>1</v></c>',
+}
+
+
+def gerar_planilha_casos_especiais(caminho: str) -> str:
+    """Planilha com os tipos de célula em que os leitores poderiam divergir"""
+    livro = Workbook()
+    aba = livro.active
+    aba.title = 'REALIZADO'
+    valores = ['texto', 1, 1.5, True, datetime(2024, 1, 31), date(2024, 2, 1), hora(10, 30), '#DIV/0!']
+    for coluna, valor in enumerate(valores, start=1):
+        aba.cell(1, coluna, valor)
+    for referencia, formula in (('I1', '=B1+C1'), ('J1', '=B1*0'), ('K1', '=A1&"x"'), ('L1', '=1/0'), ('M1', '=1=1')):
+        aba[referencia] = formula
+    aba['N1'] = '  espaços '
+    aba['O1'] = 1e20
+    aba['P1'] = -0.0
+    aba['Q1'] = datetime(2024, 3, 5, 14, 15, 16)
+    aba['R1'] = '#N/A'
+    aba['B3'] = 'mesclada'
+    aba.merge_cells('B3:D4')
+    aba['A6'] = 5
+    aba['C8'] = 'fim'
+    deslocada = livro.create_sheet('DESLOCADA')
+    deslocada['C5'] = 1
+    deslocada['E7'] = 'a'
+    livro.create_sheet('VAZIA')
+
+    temporario = caminho + '.tmp'
+    livro.save(temporario)
+    with zipfile.ZipFile(temporario) as origem, zipfile.ZipFile(caminho, 'w', zipfile.ZIP_DEFLATED) as destino:
+        for info in origem.infolist():
+            dados = origem.read(info.filename)
+            if info.filename == 'xl/worksheets/sheet1.xml':
+                xml = dados.decode('utf-8')
+                for sem_cache, com_cache in VALORES_EM_CACHE.items():
+                    xml = xml.replace(sem_cache, com_cache)
+                dados = xml.encode('utf-8')
+            destino.writestr(info, dados)
+    os.remove(temporario)
+    return caminho
+
+
+def _celulas(leitor, nome: str) -> list:
+    """Todas as células da aba convertidas, sem as vazias ao fim de cada linha e sem linhas vazias ao fim"""
+    linhas, converter = leitor.linhas(nome)
+    resultado = []
+    for celulas in linhas:
+        linha = [converter(celula) for celula in celulas]
+        while linha and linha[-1] == '':
+            linha.pop()
+        resultado.append(linha)
+    while resultado and not resultado[-1]:
+        resultado.pop()
+    return resultado
+
+
+def _coluna(indice: int) -> str:
+    letras = ''
+    indice += 1
+    while indice:
+        indice, resto = divmod(indice - 1, 26)
+        letras = chr(ord('A') + resto) + letras
+    return letras
+
+
+def comparar_celulas(caminho: str) -> list:
+    """Divergências célula a célula entre openpyxl e calamine (valor e tipo)"""
+    with open(caminho, 'rb') as f:
+        conteudo = f.read()
+    openpyxl, calamine = LeitorOpenpyxl(conteudo), LeitorCalamine(conteudo)
+    divergencias = []
+    try:
+        if openpyxl.sheetnames != calamine.sheetnames:
+            return [f'abas: openpyxl={openpyxl.sheetnames} calamine={calamine.sheetnames}']
+        for nome in openpyxl.sheetnames:
+            esperadas, obtidas = _celulas(openpyxl, nome), _celulas(calamine, nome)
+            for linha in range(max(len(esperadas), len(obtidas))):
+                a = esperadas[linha] if linha < len(esperadas) else []
+                b = obtidas[linha] if linha < len(obtidas) else []
+                for coluna in range(max(len(a), len(b))):
+                    va = a[coluna] if coluna < len(a) else ''
+                    vb = b[coluna] if coluna < len(b) else ''
+                    if type(va) is not type(vb) or va != vb:
+                        divergencias.append(f'{nome}!{_coluna(coluna)}{linha + 1}: openpyxl={va!r} calamine={vb!r}')
+    finally:
+        openpyxl.fechar()
+        calamine.fechar()
+    return divergencias
+
+
+def _extrair(caminho: str, leitor: str) -> str:
+    """Extração completa serializada (ou o erro), para comparação entre leitores"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        try:
+            with PlanilhaCarregada(caminho, leitor=leitor) as planilha:
+                resultado = ProcessadorPlanilhaHabitusForecast().extrair_dados_planilha(planilha)
+        except Exception as e:
+            return f'erro: {e}'
+    return json.dumps(resultado, default=str, sort_keys=True)
+
+
+def _medir(caminho: str, leitor: str, repeticoes: int) -> dict:
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        _extrair(caminho, leitor)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return {'min_ms': round(min(tempos), 2), 'mediana_ms': round(statistics.median(tempos), 2)}
+
+
+def verificar(caminho: str, repeticoes: int) -> dict:
+    divergencias = comparar_celulas(caminho)
+    extracoes = {leitor: _extrair(caminho, leitor) for leitor in LEITORES_COMPARADOS}
+    for leitor in LEITORES_COMPARADOS[1:]:
+        if extracoes[leitor] != extracoes['openpyxl']:
+            divergencias.append(f'extração com {leitor} difere da extração com openpyxl')
+    return {
+        'paridade': not divergencias,
+        'divergencias': divergencias,
+        'tempos': {leitor: _medir(caminho, leitor, repeticoes) for leitor in LEITORES_COMPARADOS},
+    }
+
+
+def _lista(tipo):
+    return lambda valor: [tipo(item) for item in valor.split(',') if item.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Paridade e benchmark dos leitores de planilha (calamine x openpyxl)')
+    parser.add_argument('arquivos', nargs='*', help='Planilhas .xlsx adicionais (ex.: planilhas reais de clientes)')
+    parser.add_argument('--linhas', type=_lista(int), default=[250, 2000], help='Tamanhos das planilhas sintéticas')
+    parser.add_argument('--colunas-extras', type=int, default=20, help='Colunas preenchidas além dos 12 meses')
+    parser.add_argument('--sem-sinteticas', action='store_true', help='Verificar apenas os arquivos informados')
+    parser.add_argument('--repeticoes', type=int, default=3)
+    parser.add_argument('--saida', help='Grava os resultados em JSON')
+    args = parser.parse_args()
+
+    if not calamine_disponivel():
+        print("❌ python-calamine não está instalado (pip install python-calamine)")
+        sys.exit(1)
+
+    with tempfile.TemporaryDirectory(prefix='paridade_leitores_') as diretorio:
+        planilhas = {os.path.basename(caminho): caminho for caminho in args.arquivos}
+        if not args.sem_sinteticas:
+            planilhas['casos_especiais'] = gerar_planilha_casos_especiais(os.path.join(diretorio, 'casos_especiais.xlsx'))
+            for layout in LAYOUTS:
+                for linhas in args.linhas:
+                    nome = f'{layout}_{linhas}'
+                    planilhas[nome] = gerar_planilha(
+                        os.path.join(diretorio, f'{nome}.xlsx'), layout, linhas, args.colunas_extras
+                    )
+
+        resultados = {}
+        for nome, caminho in planilhas.items():
+            resultado = resultados[nome] = verificar(caminho, args.repeticoes)
+            tempos = ', '.join(f"{leitor} {tempo['mediana_ms']:.0f}ms" for leitor, tempo in resultado['tempos'].items())
+            if resultado['paridade']:
+                print(f"✓ {nome}: paridade OK ({tempos})")
+            else:
+                print(f"❌ {nome}: {len(resultado['divergencias'])} divergências ({tempos})")
+                for divergencia in resultado['divergencias'][:MAX_DIVERGENCIAS_EXIBIDAS]:
+                    print(f"   {divergencia}")
+
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            json.dump(resultados, f, indent=2, ensure_ascii=False)
+        print(f"✓ Resultados gravados em {args.saida}")
+
+    if not all(resultado['paridade'] for resultado in resultados.values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Reconstrói ou confere o resumo mensal dos lançamentos (tabela resumos_mensais_lancamentos).
+
+O resumo é mantido pela aplicação a cada alteração dos lançamentos (ver
+src/services/resumo_mensal.py). Este script serve para recalculá-lo depois de
+alterações feitas diretamente no banco (SQL manual, restauração de backup) e,
+com --verificar, para conferir se ele bate com os lançamentos sem gravar nada.
+
+Uso:
+    python scripts/recalcular_resumo_mensal.py                   # todos os cenários
+    python scripts/recalcular_resumo_mensal.py --projeto-id 12
+    python scripts/recalcular_resumo_mensal.py --cenario-id 40 --verificar
+"""
+import argparse
+import os
+import sys
+
+# Adicionar o diretório raiz ao path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+load_dotenv(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.env'))
+
+from src.main import app
+from src.models.user import db, Cenario, Projeto
+from src.services.resumo_mensal import cenarios_com_resumo, divergencias_resumo, recalcular_resumo
+
+MAX_DIVERGENCIAS_EXIBIDAS = 10
+
+
+def _cenarios(args) -> list:
+    if args.cenario_id is not None:
+        if db.session.get(Cenario, args.cenario_id) is None:
+            print(f"❌ Cenário {args.cenario_id} não encontrado")
+            sys.exit(1)
+        return [args.cenario_id]
+    if args.projeto_id is not None:
+        if db.session.get(Projeto, args.projeto_id) is None:
+            print(f"❌ Projeto {args.projeto_id} não encontrado")
+            sys.exit(1)
+        return [c.id for c in Cenario.query.filter_by(projeto_id=args.projeto_id).order_by(Cenario.id)]
+    return cenarios_com_resumo()
+
+
+def _verificar(cenario_ids: list) -> int:
+    falhas = 0
+    for cenario_id in cenario_ids:
+        divergencias = divergencias_resumo(cenario_id)
+        if not divergencias:
+            print(f"✓ Cenário {cenario_id}: resumo confere com os lançamentos")
+            continue
+        falhas += 1
+        print(f"❌ Cenário {cenario_id}: {len(divergencias)} divergências (gravado x lançamentos)")
+        for (_, mes, categoria_id, tipo, origem), gravado, calculado in divergencias[:MAX_DIVERGENCIAS_EXIBIDAS]:
+            print(f"   {mes:%Y-%m} categoria {categoria_id} {tipo}/{origem}: {gravado} x {calculado}")
+    return falhas
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Reconstrói ou confere o resumo mensal dos lançamentos')
+    escopo = parser.add_mutually_exclusive_group()
+    escopo.add_argument('--projeto-id', type=int, help='Apenas os cenários do projeto')
+    escopo.add_argument('--cenario-id', type=int, help='Apenas o cenário')
+    parser.add_argument('--verificar', action='store_true',
+                        help='Apenas conferir o resumo com os lançamentos, sem gravar (código 1 se divergir)')
+    args = parser.parse_args()
+
+    with app.app_context():
+        cenario_ids = _cenarios(args)
+        if not cenario_ids:
+            print("ℹ Nenhum cenário com lançamentos")
+            return
+
+        if args.verificar:
+            if _verificar(cenario_ids):
+                sys.exit(1)
+            return
+
+        for cenario_id in cenario_ids:
+            try:
+                linhas = recalcular_resumo(cenario_id)
+                db.session.commit()
+                print(f"✓ Cenário {cenario_id}: {linhas} linhas de resumo")
+            except Exception as e:
+                db.session.rollback()
+                print(f"❌ Cenário {cenario_id}: {str(e)}")
+                sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Verificação do número de consultas SQL das listagens.
+
+Sobe o blueprint de projetos sobre um SQLite temporário, popula volumes
+crescentes de projetos, cenários, uploads e snapshots e chama cada listagem pelo
+cliente de teste do Flask (como admin e como usuário comum), contando os
+comandos enviados ao banco. A contagem precisa ser a mesma em todos os volumes
+(nenhuma consulta por item listado) e não passar do limite do endpoint, que
+inclui as duas consultas da autenticação (blacklist e usuário do token). As
+respostas também são conferidas: quantidade de itens, upload mais recente de
+cada projeto e autor de cada snapshot.
+
+Uso:
+    python scripts/verificar_contagem_consultas.py
+    python scripts/verificar_contagem_consultas.py --projetos 2,40 --mostrar-consultas
+
+O script termina com código 1 se alguma listagem variar com o volume, passar do
+limite ou responder diferente do esperado.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+from datetime import date, datetime, timedelta
+
+# Adicionar o diretório raiz ao path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import event
+
+from src.auth import create_access_token
+from src.models.user import db, User, Projeto, Cenario, ArquivoUpload, HistoricoCenario
+from src.routes.projetos import projetos_bp
+
+NOMES_CENARIOS = ('Realista', 'Pessimista', 'Otimista', 'Agressivo')
+EMAIL_ADMIN = 'contagem_admin@habitus.local'
+EMAILS_USUARIOS = ('contagem_1@habitus.local', 'contagem_2@habitus.local')
+
+
+class Listagem:
+    """Endpoint de listagem, o máximo de consultas por requisição e a conferência da resposta"""
+
+    def __init__(self, endpoint: str, url, maximo: int, conferir):
+        self.endpoint = endpoint
+        self.url = url  # dados -> URL
+        self.maximo = maximo
+        self.conferir = conferir  # (resposta JSON, dados, email) -> lista de problemas
+
+
+def _projetos_visiveis(dados: dict, email: str) -> list:
+    return [projeto for projeto in dados['projetos'] if email == EMAIL_ADMIN or projeto['email'] == email]
+
+
+def _conferir_projetos(resposta: dict, dados: dict, email: str) -> list:
+    esperado = {projeto['id']: projeto['upload_recente'] for projeto in _projetos_visiveis(dados, email)}
+    obtido = {projeto['id']: projeto['nome_arquivo'] for projeto in resposta['projetos']}
+    return [] if obtido == esperado else [f'{len(obtido)} projetos/uploads recentes diferentes dos {len(esperado)} esperados']
+
+
+def _conferir_cenarios(resposta: dict, dados: dict, email: str) -> list:
+    esperado = {
+        cenario_id: (projeto['nome_cliente'], projeto['upload_recente'])
+        for projeto in _projetos_visiveis(dados, email) for cenario_id in projeto['cenarios']
+    }
+    obtido = {
+        cenario['id']: (cenario['projeto_nome'], cenario['arquivo_nome'])
+        for cenario in resposta['cenarios']
+    }
+    return [] if obtido == esperado else [f'{len(obtido)} cenários/projetos/uploads diferentes dos {len(esperado)} esperados']
+
+
+def _conferir_historico(resposta: dict, dados: dict, email: str) -> list:
+    obtido = {item['id']: item.get('usuario_email') for item in resposta['historico']}
+    return [] if obtido == dados['snapshots'] else [f"{len(obtido)} snapshots/autores diferentes dos {len(dados['snapshots'])} esperados"]
+
+
+LISTAGENS = (
+    Listagem('GET /projetos', lambda dados: '/api/projetos', 3, _conferir_projetos),
+    Listagem('GET /cenarios', lambda dados: '/api/cenarios', 3, _conferir_cenarios),
+    # Cenário e projeto (permissão) e o histórico com os autores
+    Listagem('GET /cenarios/<id>/historico', lambda dados: f"/api/cenarios/{dados['cenario_historico']}/historico",
+             5, _conferir_historico),
+)
+
+
+def criar_app(url_banco: str) -> Flask:
+    app = Flask('verificar_contagem_consultas')
+    app.config['SQLALCHEMY_DATABASE_URI'] = url_banco
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    app.register_blueprint(projetos_bp, url_prefix='/api')
+    return app
+
+
+def popular(projetos_por_usuario: int) -> dict:
+    """Cria os usuários e o volume (com commit) e devolve o que cada listagem deve retornar"""
+    agora = datetime.utcnow()
+    usuarios = {}
+    for email, role in [(EMAIL_ADMIN, 'admin')] + [(email, 'usuario') for email in EMAILS_USUARIOS]:
+        usuario = User(nome=email.split('@')[0], email=email, senha_hash='-', role=role, status='active')
+        db.session.add(usuario)
+        db.session.flush()
+        usuarios[email] = usuario.id
+
+    projetos = []
+    for indice in range(projetos_por_usuario * len(EMAILS_USUARIOS)):
+        email = EMAILS_USUARIOS[indice % len(EMAILS_USUARIOS)]
+        projeto = Projeto(usuario_id=usuarios[email], nome_cliente=f'Cliente {indice}',
+                          data_base_estudo=date(2025, 1, 1), saldo_inicial_caixa=0)
+        db.session.add(projeto)
+        db.session.flush()
+        cenarios = []
+        for nome in NOMES_CENARIOS:
+            cenario = Cenario(projeto_id=projeto.id, nome=nome, created_at=agora - timedelta(minutes=indice))
+            db.session.add(cenario)
+            db.session.flush()
+            cenarios.append(cenario.id)
+        # 0 a 3 uploads por projeto; o mais recente é o de maior versão
+        upload_recente = None
+        for versao in range(indice % 4):
+            upload_recente = f'planilha_{indice}_{versao}.xlsx'
+            db.session.add(ArquivoUpload(
+                projeto_id=projeto.id, nome_original=upload_recente, caminho_storage='-', hash_arquivo='-',
+                uploaded_at=agora - timedelta(days=3 - versao)
+            ))
+        projetos.append({'id': projeto.id, 'email': email, 'nome_cliente': projeto.nome_cliente,
+                         'cenarios': cenarios, 'upload_recente': upload_recente})
+
+    cenario_historico = projetos[0]['cenarios'][0]
+    snapshots = {}
+    autores = (EMAIL_ADMIN,) + EMAILS_USUARIOS
+    for indice in range(projetos_por_usuario):
+        autor = autores[indice % len(autores)]
+        historico = HistoricoCenario(cenario_id=cenario_historico, usuario_id=usuarios[autor],
+                                     snapshot_data={}, created_at=agora - timedelta(hours=indice))
+        db.session.add(historico)
+        db.session.flush()
+        snapshots[historico.id] = autor
+    db.session.commit()
+
+    return {'projetos': projetos, 'cenario_historico': cenario_historico, 'snapshots': snapshots}
+
+
+def medir(projetos_por_usuario: int, diretorio: str, mostrar_consultas: bool) -> dict:
+    """(listagem, email) -> (consultas, problemas) em um banco novo com o volume pedido"""
+    app = criar_app('sqlite:///' + os.path.join(diretorio, f'contagem_{projetos_por_usuario}.db'))
+    consultas = []
+    resultado = {}
+    with app.app_context():
+        db.create_all()
+        dados = popular(projetos_por_usuario)
+        event.listen(db.engine, 'before_cursor_execute',
+                     lambda conexao, cursor, instrucao, *args: consultas.append(instrucao))
+        db.session.remove()
+
+    cliente = app.test_client()
+    for email in (EMAIL_ADMIN, EMAILS_USUARIOS[0]):
+        cabecalhos = {'Authorization': 'Bearer ' + create_access_token(data={'sub': email})}
+        for listagem in LISTAGENS:
+            consultas.clear()
+            resposta = cliente.get(listagem.url(dados), headers=cabecalhos)
+            if resposta.status_code != 200:
+                problemas = [f'HTTP {resposta.status_code}: {resposta.get_json()}']
+            else:
+                problemas = listagem.conferir(resposta.get_json(), dados, email)
+            resultado[(listagem.endpoint, email)] = (len(consultas), problemas)
+            if mostrar_consultas:
+                print(f"   {listagem.endpoint} ({email}, {projetos_por_usuario} projetos/usuário): {len(consultas)}")
+                for instrucao in consultas:
+                    print('      ' + ' '.join(instrucao.split())[:200])
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Verifica se as listagens fazem um número fixo de consultas SQL')
+    parser.add_argument('--projetos', default='2,25',
+                        help='Projetos por usuário em cada volume, separados por vírgula (padrão: 2,25)')
+    parser.add_argument('--mostrar-consultas', action='store_true', help='Imprime as consultas de cada requisição')
+    args = parser.parse_args()
+    volumes = sorted({int(valor) for valor in args.projetos.split(',') if valor.strip()})
+    if len(volumes) < 2:
+        parser.error('Informe pelo menos dois volumes em --projetos')
+
+    diretorio = tempfile.mkdtemp(prefix='contagem_consultas_')
+    try:
+        medicoes = {volume: medir(volume, diretorio, args.mostrar_consultas) for volume in volumes}
+    finally:
+        shutil.rmtree(diretorio, ignore_errors=True)
+
+    falhas = 0
+    for listagem in LISTAGENS:
+        for email in (EMAIL_ADMIN, EMAILS_USUARIOS[0]):
+            perfil = 'admin' if email == EMAIL_ADMIN else 'usuário'
+            contagens = {volume: medicoes[volume][(listagem.endpoint, email)][0] for volume in volumes}
+            problemas = [
+                f'{volume} projetos/usuário: {problema}'
+                for volume in volumes for problema in medicoes[volume][(listagem.endpoint, email)][1]
+            ]
+            if len(set(contagens.values())) > 1:
+                problemas.append('consultas variam com o volume: ' + ', '.join(
+                    f'{volume} projetos/usuário = {total}' for volume, total in contagens.items()))
+            if max(contagens.values()) > listagem.maximo:
+                problemas.append(f'{max(contagens.values())} consultas (máximo {listagem.maximo})')
+
+            if problemas:
+                falhas += 1
+                print(f"❌ {listagem.endpoint} ({perfil}): {'; '.join(problemas)}")
+            else:
+                print(f"✓ {listagem.endpoint} ({perfil}): {contagens[volumes[0]]} consultas em todos os volumes")
+
+    if falhas:
+        print(f"❌ {falhas} listagem(ns) com número de consultas ou resposta fora do esperado")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -73,6 +73,10 @@ except ImportError:
 
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 
+# Uploads de planilhas são gravados direto no armazenamento definitivo (hash calculado durante a escrita)
+from src.services.armazenamento_upload import RequestUploadDireto
+app.request_class = RequestUploadDireto
+
 # Validar variáveis de ambiente obrigatórias em produção
 missing_vars, invalid_vars = validate_environment_variables()
 if missing_vars or invalid_vars:
@@ -147,7 +151,8 @@ if is_production:
 
 CORS(app, 
      origins=cors_origins_list,
-     expose_headers=['X-Report-Pages', 'X-Report-Sheets', 'X-Report-Template', 'X-Report-Period'])
+     expose_headers=['X-Report-Pages', 'X-Report-Sheets', 'X-Report-Template', 'X-Report-Period',
+                     'Idempotent-Replayed', 'Retry-After'])
 
 # Configurar Sentry para monitoramento de erros (opcional)
 sentry_dsn = os.getenv('SENTRY_DSN')
@@ -213,15 +218,17 @@ app.register_blueprint(settings_bp)
 # Usar DATABASE_URL se disponível (para CI/produção), senão usar SQLite local
 database_url = os.getenv('DATABASE_URL')
 
-# Se DATABASE_URL apontar para PostgreSQL, verificar se pode ser usada
-if database_url and database_url.startswith('postgresql://'):
+# Se DATABASE_URL apontar para PostgreSQL, verificar se pode ser usada (apenas em desenvolvimento:
+# em produção a URL é obrigatória e uma falha de conexão não deve trocar o banco por SQLite)
+if database_url and database_url.startswith('postgresql://') and not is_production:
     try:
         import psycopg2
         # Tentar testar a conexão (detecta problemas de encoding/conexão)
         try:
             from sqlalchemy import create_engine, text
-            # Criar engine temporário para testar
-            test_engine = create_engine(database_url, connect_args={'connect_timeout': 2})
+            from sqlalchemy.pool import NullPool
+            # Criar engine temporário para testar (sem pool: a conexão é fechada ao sair do bloco)
+            test_engine = create_engine(database_url, poolclass=NullPool, connect_args={'connect_timeout': 2})
             # Tentar conectar brevemente
             with test_engine.connect() as conn:
                 conn.execute(text("SELECT 1"))
@@ -261,7 +268,17 @@ else:
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 
+# Pool de conexões conforme o perfil de implantação (DB_PERFIL_POOL, ver src/utils/pool_conexoes.py)
+from src.utils.pool_conexoes import configurar_pool, registrar_eventos
+configuracao_pool = configurar_pool(app)
+
 db.init_app(app)
+with app.app_context():
+    registrar_eventos(db.engine, configuracao_pool)
+
+# Fila local de processamento assíncrono de uploads (workers iniciados sob demanda em cada processo)
+from src.services.fila_processamento import fila_processamento
+fila_processamento.init_app(app)
 
 # Criar tabelas e dados iniciais apenas se não estiver em modo de teste/CI
 # No CI, isso será feito pelo step de migrations/testes
@@ -304,9 +321,19 @@ if not os.getenv('SKIP_DB_INIT'):
             if not categoria_existente:
                 categoria = CategoriaFinanceira(nome=nome, tipo_fluxo=tipo_fluxo)
                 db.session.add(categoria)
-        
+
         db.session.commit()
 
+        # Calcular o resumo mensal em bancos que já tinham lançamentos antes dele
+        from sqlalchemy.exc import IntegrityError
+        from src.services.resumo_mensal import preencher_resumo_vazio
+        try:
+            preencher_resumo_vazio()
+            db.session.commit()
+        except IntegrityError:
+            # Outro processo (worker) preencheu ao mesmo tempo
+            db.session.rollback()
+
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
 def serve(path):
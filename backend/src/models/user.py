@@ -56,7 +56,7 @@ class Projeto(db.Model):
     __tablename__ = 'projetos'
     
     id = db.Column(db.Integer, primary_key=True)
-    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id', ondelete='CASCADE'), nullable=False)
     nome_cliente = db.Column(db.String(255), nullable=False)
     data_base_estudo = db.Column(db.Date, nullable=False)
     saldo_inicial_caixa = db.Column(db.Numeric(15, 2), nullable=False)
@@ -66,9 +66,15 @@ class Projeto(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    __table_args__ = (
+        # Projetos do usuário e o mais recente (dashboard)
+        db.Index('ix_projetos_usuario_id_created_at', 'usuario_id', 'created_at'),
+    )
+    
     # Relacionamentos
     cenarios = db.relationship('Cenario', backref='projeto', lazy=True, cascade='all, delete-orphan')
     arquivos_upload = db.relationship('ArquivoUpload', backref='projeto', lazy=True, cascade='all, delete-orphan')
+    importacoes_extrato = db.relationship('ImportacaoExtrato', backref='projeto', lazy=True, cascade='all, delete-orphan')
 
     def to_dict(self):
         return {
@@ -92,14 +98,20 @@ class Cenario(db.Model):
     __tablename__ = 'cenarios'
     
     id = db.Column(db.Integer, primary_key=True)
-    projeto_id = db.Column(db.Integer, db.ForeignKey('projetos.id'), nullable=False)
+    projeto_id = db.Column(db.Integer, db.ForeignKey('projetos.id', ondelete='CASCADE'), nullable=False, index=True)
     nome = db.Column(db.String(100), nullable=False)
     descricao = db.Column(db.Text)
     is_active = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Cenário derivado: lançamentos lidos do cenário base com ENTRADAS projetadas ajustadas pelo percentual
+    # (ver services/cenarios_virtuais.py); NULL para cenários com lançamentos próprios
+    cenario_base_id = db.Column(db.Integer, db.ForeignKey('cenarios.id'), nullable=True, index=True)
+    percentual_variacao = db.Column(db.Numeric(7, 2), nullable=True)
     
     # Relacionamentos
     lancamentos = db.relationship('LancamentoFinanceiro', backref='cenario', lazy=True, cascade='all, delete-orphan')
+    resumos_mensais = db.relationship('ResumoMensalLancamento', lazy=True, cascade='all, delete-orphan')
+    cenario_base = db.relationship('Cenario', remote_side=[id], backref='cenarios_derivados')
 
     def to_dict(self):
         return {
@@ -108,6 +120,8 @@ class Cenario(db.Model):
             'nome': self.nome,
             'descricao': self.descricao,
             'is_active': self.is_active,
+            'cenario_base_id': self.cenario_base_id,
+            'percentual_variacao': float(self.percentual_variacao) if self.percentual_variacao is not None else None,
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
@@ -143,13 +157,18 @@ class LancamentoFinanceiro(db.Model):
     __tablename__ = 'lancamentos_financeiros'
     
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    cenario_id = db.Column(db.Integer, db.ForeignKey('cenarios.id'), nullable=False)
+    cenario_id = db.Column(db.Integer, db.ForeignKey('cenarios.id', ondelete='CASCADE'), nullable=False)
     categoria_id = db.Column(db.Integer, db.ForeignKey('categorias_financeiras.id'), nullable=False)
     data_competencia = db.Column(db.Date, nullable=False)
     valor = db.Column(db.Numeric(15, 2), nullable=False)
     tipo = db.Column(db.Enum('ENTRADA', 'SAIDA', name='tipo_lancamento'), nullable=False)
     origem = db.Column(db.Enum('PROJETADO', 'REALIZADO', name='origem_lancamento'), default='PROJETADO', nullable=False)
 
+    __table_args__ = (
+        # Lançamentos do cenário, por origem e em ordem de competência (prefixo cenario_id para os demais filtros)
+        db.Index('ix_lancamentos_financeiros_cenario_origem_data', 'cenario_id', 'origem', 'data_competencia'),
+    )
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -165,11 +184,34 @@ class LancamentoFinanceiro(db.Model):
         return f'<LancamentoFinanceiro {self.valor}>'
 
 
+class ResumoMensalLancamento(db.Model):
+    """Soma e quantidade dos lançamentos do cenário por mês, categoria, tipo e origem (ver services/resumo_mensal.py)"""
+    __tablename__ = 'resumos_mensais_lancamentos'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    cenario_id = db.Column(db.Integer, db.ForeignKey('cenarios.id', ondelete='CASCADE'), nullable=False)
+    mes = db.Column(db.Date, nullable=False)  # Primeiro dia do mês de competência
+    categoria_id = db.Column(db.Integer, db.ForeignKey('categorias_financeiras.id'), nullable=False)
+    tipo = db.Column(db.Enum('ENTRADA', 'SAIDA', name='tipo_lancamento'), nullable=False)
+    origem = db.Column(db.Enum('PROJETADO', 'REALIZADO', name='origem_lancamento'), nullable=False)
+    total = db.Column(db.Numeric(18, 2), nullable=False, default=0)
+    quantidade = db.Column(db.Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        # Uma linha por chave (alvo do ON CONFLICT); o prefixo cenario_id, mes atende às leituras do cenário
+        db.Index('ix_resumos_mensais_lancamentos_chave', 'cenario_id', 'mes', 'categoria_id', 'tipo', 'origem',
+                 unique=True),
+    )
+    
+    def __repr__(self):
+        return f'<ResumoMensalLancamento {self.cenario_id} {self.mes}>'
+
+
 class ArquivoUpload(db.Model):
     __tablename__ = 'arquivos_upload'
     
     id = db.Column(db.Integer, primary_key=True)
-    projeto_id = db.Column(db.Integer, db.ForeignKey('projetos.id'), nullable=False)
+    projeto_id = db.Column(db.Integer, db.ForeignKey('projetos.id', ondelete='CASCADE'), nullable=False)
     nome_original = db.Column(db.String(255), nullable=False)
     caminho_storage = db.Column(db.String(512), nullable=False)
     hash_arquivo = db.Column(db.String(255), nullable=False)
@@ -177,6 +219,11 @@ class ArquivoUpload(db.Model):
     relatorio_processamento = db.Column(db.JSON)
     uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # Upload mais recente do projeto e histórico de uploads
+        db.Index('ix_arquivos_upload_projeto_id_uploaded_at', 'projeto_id', 'uploaded_at'),
+    )
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -195,7 +242,7 @@ class ConfiguracaoCenarios(db.Model):
     __tablename__ = 'configuracoes_cenarios'
     
     id = db.Column(db.Integer, primary_key=True)
-    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id', ondelete='CASCADE'), nullable=False)
     pessimista = db.Column(db.Numeric(5, 2), nullable=False, default=0)
     realista = db.Column(db.Numeric(5, 2), nullable=False, default=0)
     otimista = db.Column(db.Numeric(5, 2), nullable=False, default=0)
@@ -223,11 +270,20 @@ class LogSistema(db.Model):
     __tablename__ = 'logs_sistema'
     
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=True)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id', ondelete='SET NULL'), nullable=True)
     acao = db.Column(db.String(255), nullable=False)
     detalhes = db.Column(db.JSON)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     
+    __table_args__ = (
+        # Atividade do usuário (dashboard, último acesso)
+        db.Index('ix_logs_sistema_usuario_id_timestamp', 'usuario_id', 'timestamp'),
+        # Histórico de uma ação do usuário (ex.: CENARIOS_CONFIGURADOS)
+        db.Index('ix_logs_sistema_usuario_id_acao_timestamp', 'usuario_id', 'acao', 'timestamp'),
+        # Listagem do admin e atividade por período, agrupada por ação
+        db.Index('ix_logs_sistema_timestamp_acao', 'timestamp', 'acao'),
+    )
+    
     # Relacionamento será definido via foreign key apenas
 
     def to_dict(self):
@@ -247,12 +303,16 @@ class HistoricoCenario(db.Model):
     __tablename__ = 'historico_cenarios'
     
     id = db.Column(db.Integer, primary_key=True)
-    cenario_id = db.Column(db.Integer, db.ForeignKey('cenarios.id'), nullable=False)
-    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False)
+    cenario_id = db.Column(db.Integer, db.ForeignKey('cenarios.id', ondelete='CASCADE'), nullable=False)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id', ondelete='CASCADE'), nullable=False)
     descricao = db.Column(db.String(255), nullable=True)  # Descrição opcional do snapshot
     snapshot_data = db.Column(db.JSON, nullable=False)  # Dados serializados do cenário e lançamentos
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    __table_args__ = (
+        db.Index('ix_historico_cenarios_cenario_id_created_at', 'cenario_id', 'created_at'),
+    )
+    
     # Relacionamentos
     cenario = db.relationship('Cenario', backref='historico_versoes')
     usuario = db.relationship('User', backref='snapshots_criados')
@@ -275,12 +335,12 @@ class Relatorio(db.Model):
     __tablename__ = 'relatorios'
     
     id = db.Column(db.Integer, primary_key=True)
-    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id', ondelete='CASCADE'), nullable=False)
     title = db.Column(db.String(255), nullable=False)
     type = db.Column(db.Enum('pdf', 'excel', name='report_type'), nullable=False)
     template = db.Column(db.Enum('executive', 'detailed', 'comparison', name='report_template'), nullable=False)
     scenario = db.Column(db.String(255), nullable=True)  # Nome do(s) cenário(s)
-    scenario_id = db.Column(db.Integer, db.ForeignKey('cenarios.id'), nullable=True)  # ID único (null para comparativos)
+    scenario_id = db.Column(db.Integer, db.ForeignKey('cenarios.id', ondelete='SET NULL'), nullable=True)  # ID único (null para comparativos)
     scenario_ids = db.Column(db.JSON, nullable=True)  # Array de IDs para comparativos
     size = db.Column(db.String(50), nullable=True)  # Tamanho em MB como string
     pages = db.Column(db.Integer, nullable=True)  # Número de páginas (null para Excel)
@@ -349,3 +409,166 @@ class TokenBlacklist(db.Model):
     
     def __repr__(self):
         return f'<TokenBlacklist {self.id}>'
+
+
+class JobProcessamento(db.Model):
+    """Job de processamento assíncrono (fila local persistida no banco, sem broker externo)"""
+    __tablename__ = 'jobs_processamento'
+    
+    id = db.Column(db.String(36), primary_key=True)  # UUID, exposto ao cliente como job_id
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id', ondelete='CASCADE'), nullable=False, index=True)
+    tipo = db.Column(db.String(50), nullable=False, default='upload_planilha')
+    status = db.Column(db.Enum('queued', 'running', 'done', 'error', name='job_status'), default='queued', nullable=False)
+    parametros = db.Column(db.JSON)  # Argumentos do job (ex.: caminho do arquivo armazenado)
+    resultado = db.Column(db.JSON)  # Resultado do processamento quando status = 'done'
+    projeto_id = db.Column(db.Integer, nullable=True)  # Projeto gerado (sem FK: o projeto pode ser excluído depois)
+    erro = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    
+    __table_args__ = (
+        db.Index('ix_jobs_processamento_status_created_at', 'status', 'created_at'),
+    )
+    
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'tipo': self.tipo,
+            'status': self.status,
+            'projeto_id': self.projeto_id,
+            'resultado': self.resultado,
+            'erro': self.erro,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+    
+    def __repr__(self):
+        return f'<JobProcessamento {self.id} - {self.status}>'
+
+
+class ExtracaoPlanilha(db.Model):
+    """Resultado da extração de uma planilha, indexado pelo SHA256 do conteúdo (cache de reprocessamento)"""
+    __tablename__ = 'extracoes_planilha'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    hash_arquivo = db.Column(db.String(64), nullable=False, unique=True, index=True)
+    versao = db.Column(db.Integer, nullable=False)  # Versão do formato/extrator; versões antigas são ignoradas
+    dados = db.Column(db.JSON, nullable=False)  # Representação compacta (ver services/cache_extracoes.py)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<ExtracaoPlanilha {self.hash_arquivo[:12]} v{self.versao}>'
+
+
+class SessaoUpload(db.Model):
+    """Sessão de upload em partes (retomável) de uma planilha grande; as partes ficam em disco até a finalização"""
+    __tablename__ = 'sessoes_upload'
+    
+    id = db.Column(db.String(36), primary_key=True)  # UUID, exposto ao cliente como sessao_id
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id', ondelete='CASCADE'), nullable=False, index=True)
+    nome_arquivo = db.Column(db.String(255), nullable=False)
+    tamanho = db.Column(db.BigInteger, nullable=False)  # Tamanho total do arquivo em bytes
+    tamanho_parte = db.Column(db.Integer, nullable=False)  # Todas as partes têm este tamanho, exceto a última
+    total_partes = db.Column(db.Integer, nullable=False)
+    sha256 = db.Column(db.String(64), nullable=True)  # SHA256 esperado do arquivo completo (opcional)
+    projeto_id = db.Column(db.Integer, nullable=True)  # Projeto de destino da reimportação (opcional)
+    status = db.Column(
+        db.Enum('aberta', 'finalizando', 'finalizada', 'cancelada', 'expirada', name='sessao_upload_status'),
+        default='aberta', nullable=False
+    )
+    job_id = db.Column(db.String(36), nullable=True)  # Job de processamento criado na finalização
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expira_em = db.Column(db.DateTime, nullable=False)
+    
+    __table_args__ = (
+        db.Index('ix_sessoes_upload_status_expira_em', 'status', 'expira_em'),
+    )
+    
+    def to_dict(self, partes_recebidas=None):
+        dados = {
+            'sessao_id': self.id,
+            'nome_arquivo': self.nome_arquivo,
+            'tamanho': self.tamanho,
+            'tamanho_parte': self.tamanho_parte,
+            'total_partes': self.total_partes,
+            'projeto_id': self.projeto_id,
+            'status': self.status,
+            'job_id': self.job_id,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'expira_em': self.expira_em.isoformat() if self.expira_em else None
+        }
+        if partes_recebidas is not None:
+            recebidas = set(partes_recebidas)
+            dados['partes_recebidas'] = sorted(recebidas)
+            dados['partes_pendentes'] = [numero for numero in range(1, self.total_partes + 1) if numero not in recebidas]
+        return dados
+    
+    def __repr__(self):
+        return f'<SessaoUpload {self.id} - {self.status}>'
+
+
+class ImportacaoExtrato(db.Model):
+    """Importação de um extrato bancário (CSV/OFX) como lançamentos REALIZADOS no cenário base do projeto"""
+    __tablename__ = 'importacoes_extrato'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    projeto_id = db.Column(db.Integer, db.ForeignKey('projetos.id', ondelete='CASCADE'), nullable=False)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id', ondelete='CASCADE'), nullable=False)
+    cenario_id = db.Column(db.Integer, nullable=False)  # Cenário que recebeu os lançamentos
+    nome_arquivo = db.Column(db.String(255), nullable=False)
+    formato = db.Column(db.String(10), nullable=False)  # 'csv' ou 'ofx'
+    hash_arquivo = db.Column(db.String(64), nullable=False)  # SHA256: o mesmo extrato não é importado duas vezes
+    agregacao_mensal = db.Column(db.Boolean, nullable=False, default=True)
+    transacoes_lidas = db.Column(db.Integer, nullable=False, default=0)
+    lancamentos_criados = db.Column(db.Integer, nullable=False, default=0)
+    relatorio = db.Column(db.JSON)  # Período, totais por categoria, linhas ignoradas e descrições sem regra
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.UniqueConstraint('projeto_id', 'hash_arquivo', name='uq_importacoes_extrato_projeto_hash'),
+    )
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'projeto_id': self.projeto_id,
+            'cenario_id': self.cenario_id,
+            'nome_arquivo': self.nome_arquivo,
+            'formato': self.formato,
+            'agregacao_mensal': self.agregacao_mensal,
+            'transacoes_lidas': self.transacoes_lidas,
+            'lancamentos_criados': self.lancamentos_criados,
+            'relatorio': self.relatorio,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+    
+    def __repr__(self):
+        return f'<ImportacaoExtrato {self.nome_arquivo}>'
+
+
+class RequisicaoIdempotente(db.Model):
+    """Resultado de uma requisição com Idempotency-Key, devolvido às retentativas com a mesma chave até expirar"""
+    __tablename__ = 'requisicoes_idempotentes'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id', ondelete='CASCADE'), nullable=False, index=True)
+    chave = db.Column(db.String(255), nullable=False)  # Valor do cabeçalho Idempotency-Key
+    impressao = db.Column(db.String(64), nullable=False)  # SHA256 de endpoint, parâmetros e corpo da requisição
+    status = db.Column(
+        db.Enum('em_andamento', 'concluida', name='idempotencia_status'),
+        default='em_andamento', nullable=False
+    )
+    status_http = db.Column(db.Integer, nullable=True)
+    cabecalhos = db.Column(db.JSON, nullable=True)  # Cabeçalhos da resposta (Content-Type, Content-Disposition...)
+    corpo = db.Column(db.LargeBinary, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expira_em = db.Column(db.DateTime, nullable=False, index=True)
+    
+    __table_args__ = (
+        db.UniqueConstraint('usuario_id', 'chave', name='uq_requisicoes_idempotentes_usuario_chave'),
+    )
+    
+    def __repr__(self):
+        return f'<RequisicaoIdempotente {self.chave} - {self.status}>'
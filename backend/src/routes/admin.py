@@ -1,8 +1,12 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, request, jsonify
 from datetime import datetime, timedelta
 from sqlalchemy import func, desc
 from src.models.user import db, User, Projeto, LogSistema, ArquivoUpload
 from src.auth import admin_required
+from src.services.exclusao_dados import (
+    LIMITE_SINCRONO_USUARIO, contar_lancamentos_usuario, enfileirar_exclusao_usuario, excluir_usuario
+)
+from src.utils.pool_conexoes import resolver_configuracao, resumo_pool
 
 admin_bp = Blueprint('admin', __name__)
 
@@ -165,6 +169,8 @@ def deletar_usuario(current_user, usuario_id):
         
         usuario = User.query.get_or_404(usuario_id)
         email = usuario.email
+        lancamentos = contar_lancamentos_usuario(usuario.id)
+        em_segundo_plano = lancamentos > LIMITE_SINCRONO_USUARIO
         
         # Log antes de deletar
         log = LogSistema(
@@ -172,13 +178,31 @@ def deletar_usuario(current_user, usuario_id):
             acao='ADMIN_USER_DELETED',
             detalhes={
                 'usuario_deletado_id': usuario.id,
-                'email': email
+                'email': email,
+                'lancamentos': lancamentos,
+                'em_segundo_plano': em_segundo_plano
             }
         )
         db.session.add(log)
         
-        db.session.delete(usuario)
+        if em_segundo_plano:
+            # Muitos lançamentos: a exclusão vai para a fila (um projeto por transação)
+            # e o login fica bloqueado até ela terminar
+            usuario.status = 'rejected'
+            db.session.commit()
+            job = enfileirar_exclusao_usuario(current_user.id, usuario.id)
+            status_url = f"/api/upload-planilha/jobs/{job.id}"
+            return jsonify({
+                'message': 'Exclusão do usuário enfileirada',
+                'job_id': job.id,
+                'status': job.status,
+                'status_url': status_url
+            }), 202, {'Location': status_url}
+        
+        # Projetos, lançamentos, relatórios etc. em alguns DELETEs em conjunto (sem carregar as linhas)
+        exclusao = excluir_usuario(usuario.id)
         db.session.commit()
+        exclusao.remover_arquivos()
         
         return jsonify({'message': 'Usuário deletado com sucesso'})
         
@@ -306,6 +330,17 @@ def obter_estatisticas_admin(current_user):
     except Exception as e:
         return jsonify({'message': f'Erro interno: {str(e)}'}), 500
 
+@admin_bp.route('/admin/metricas/banco', methods=['GET'])
+@admin_required
+def obter_metricas_banco(current_user):
+    """Configuração e métricas do pool de conexões do processo que atendeu a requisição"""
+    try:
+        configuracao = current_app.extensions.get('pool_conexoes') or resolver_configuracao()
+        return jsonify(resumo_pool(db.engine, configuracao))
+
+    except Exception as e:
+        return jsonify({'message': f'Erro interno: {str(e)}'}), 500
+
 @admin_bp.route('/admin/projetos', methods=['GET'])
 @admin_required
 def listar_todos_projetos(current_user):
@@ -47,9 +47,16 @@ try:
         
         @admin_ns.doc(security='Bearer Auth')
         @admin_ns.response(204, 'Usuário deletado')
+        @admin_ns.response(202, 'Exclusão enfileirada (usuário com muitos lançamentos); acompanhar pelo status_url')
         @admin_ns.response(403, 'Acesso negado - requer admin')
         def delete(self, usuario_id):
-            """Deletar usuário (Admin)"""
+            """
+            Deletar usuário (Admin)
+            
+            Exclui o usuário com projetos, cenários, lançamentos, relatórios e uploads em alguns
+            comandos. Acima de EXCLUSAO_USUARIO_LIMITE_SINCRONO lançamentos, a exclusão roda em
+            segundo plano: a resposta é 202 com o job_id e o login do usuário fica bloqueado.
+            """
             pass
     
     @admin_ns.route('/admin/logs')
@@ -74,6 +81,21 @@ try:
             """Estatísticas administrativas (Admin)"""
             pass
     
+    @admin_ns.route('/admin/metricas/banco')
+    @admin_ns.doc('admin_metricas_banco')
+    class AdminMetricasBanco(Resource):
+        @admin_ns.doc(security='Bearer Auth')
+        @admin_ns.response(403, 'Acesso negado - requer admin')
+        def get(self):
+            """
+            Métricas do pool de conexões (Admin)
+            
+            Perfil e parâmetros do pool, conexões em uso, saturação, tempo de espera
+            no checkout (média, máxima e por faixa), timeouts e conexões invalidadas.
+            Os valores são do processo (worker) que atendeu a requisição.
+            """
+            pass
+    
     @admin_ns.route('/admin/projetos')
     @admin_ns.doc('admin_projetos')
     class AdminProjetos(Resource):
@@ -5,13 +5,12 @@ from src.models.user import (
     db,
     Projeto,
     Cenario,
-    LancamentoFinanceiro,
-    CategoriaFinanceira,
     User,
     LogSistema,
     ConfiguracaoCenarios,
 )
 from src.auth import token_required, admin_required
+from src.services.cenarios_virtuais import resumo_do_cenario
 
 dashboard_bp = Blueprint('dashboard', __name__)
 
@@ -156,43 +155,14 @@ def obter_fluxo_caixa_projeto(current_user, projeto_id):
         if not cenario:
             return jsonify({'message': 'Nenhum cenário ativo encontrado'}), 404
 
-        # Buscar lançamentos projetados (Habitus Foreca$t)
-        lancamentos_projetados = db.session.query(
-            LancamentoFinanceiro.data_competencia,
-            CategoriaFinanceira.nome,
-            LancamentoFinanceiro.tipo,
-            func.sum(LancamentoFinanceiro.valor).label('total')
-        ).join(
-            CategoriaFinanceira
-        ).filter(
-            LancamentoFinanceiro.cenario_id == cenario.id,
-            LancamentoFinanceiro.origem == 'PROJETADO'
-        ).group_by(
-            LancamentoFinanceiro.data_competencia,
-            CategoriaFinanceira.nome,
-            LancamentoFinanceiro.tipo
-        ).order_by(
-            LancamentoFinanceiro.data_competencia
-        ).all()
+        # Totais mensais do cenário por categoria e tipo (resumo mensal)
+        resumo = resumo_do_cenario(cenario)
 
-        # Buscar lançamentos realizados (FDC-REAL)
-        lancamentos_realizados = db.session.query(
-            LancamentoFinanceiro.data_competencia,
-            CategoriaFinanceira.nome,
-            LancamentoFinanceiro.tipo,
-            func.sum(LancamentoFinanceiro.valor).label('total')
-        ).join(
-            CategoriaFinanceira
-        ).filter(
-            LancamentoFinanceiro.cenario_id == cenario.id,
-            LancamentoFinanceiro.origem == 'REALIZADO'
-        ).group_by(
-            LancamentoFinanceiro.data_competencia,
-            CategoriaFinanceira.nome,
-            LancamentoFinanceiro.tipo
-        ).order_by(
-            LancamentoFinanceiro.data_competencia
-        ).all()
+        # Lançamentos projetados (Habitus Foreca$t)
+        lancamentos_projetados = [l for l in resumo if l.origem == 'PROJETADO']
+
+        # Lançamentos realizados (FDC-REAL)
+        lancamentos_realizados = [l for l in resumo if l.origem == 'REALIZADO']
 
         # Organizar dados para o gráfico - criar 12 meses baseados na data-base
         dados_grafico = {}
@@ -217,19 +187,19 @@ def obter_fluxo_caixa_projeto(current_user, projeto_id):
             mes = lancamento.data_competencia.strftime('%Y-%m')
             if mes in dados_grafico:
                 # Usar apenas a categoria HABITUS_FORECA$T-GRAFICO / PROFECIA-GRAFICO para a linha verde
-                if (lancamento.nome == 'HABITUS_FORECA$T-GRAFICO' or lancamento.nome == 'PROFECIA-GRAFICO') and lancamento.tipo == 'ENTRADA':
-                    valor_base = float(lancamento.total or 0)
+                if (lancamento.categoria_nome == 'HABITUS_FORECA$T-GRAFICO' or lancamento.categoria_nome == 'PROFECIA-GRAFICO') and lancamento.tipo == 'ENTRADA':
+                    valor_base = float(lancamento.valor or 0)
                     # Aplica cenário somente sobre o fluxo (sem saldo inicial)
-                    valor_ajustado = valor_base * multiplier
-                    valor_com_saldo = valor_ajustado + saldo_inicial
+                    valor_com_percentual = valor_base * multiplier
+                    valor_com_saldo = valor_com_percentual + saldo_inicial
                     dados_grafico[mes]['receita'] = valor_com_saldo
-                    print(f"Mês {mes}: base={valor_base} perc={perc} -> ajustado={valor_ajustado} + saldo({saldo_inicial}) = {valor_com_saldo}")
+                    print(f"Mês {mes}: base={valor_base} perc={perc} -> ajustado={valor_com_percentual} + saldo({saldo_inicial}) = {valor_com_saldo}")
 
         # Processar dados realizados (FDC-REAL)
         for lancamento in lancamentos_realizados:
             mes = lancamento.data_competencia.strftime('%Y-%m')
-            if mes in dados_grafico and lancamento.nome == 'FDC-REAL' and lancamento.tipo == 'ENTRADA':
-                dados_grafico[mes]['fdc_real'] = float(lancamento.total or 0)
+            if mes in dados_grafico and lancamento.categoria_nome == 'FDC-REAL' and lancamento.tipo == 'ENTRADA':
+                dados_grafico[mes]['fdc_real'] = float(lancamento.valor or 0)
 
         # Calcular saldo acumulado (usando receita projetada)
         saldo_acumulado = float(projeto.saldo_inicial_caixa or 0)
@@ -266,30 +236,22 @@ def obter_dados_por_categoria(current_user, projeto_id):
         if not cenario:
             return jsonify({'message': 'Nenhum cenário ativo encontrado'}), 404
         
-        # Buscar totais por categoria
-        totais_categoria = db.session.query(
-            CategoriaFinanceira.nome,
-            LancamentoFinanceiro.tipo,
-            func.sum(LancamentoFinanceiro.valor).label('total')
-        ).join(
-            CategoriaFinanceira
-        ).filter(
-            LancamentoFinanceiro.cenario_id == cenario.id
-        ).group_by(
-            CategoriaFinanceira.nome,
-            LancamentoFinanceiro.tipo
-        ).all()
+        # Somar os totais mensais (resumo mensal) por categoria e tipo
+        totais_categoria = {}
+        for linha in resumo_do_cenario(cenario):
+            chave = (linha.categoria_nome, linha.tipo)
+            totais_categoria[chave] = totais_categoria.get(chave, 0) + float(linha.valor)
         
         entradas = []
         saidas = []
         
-        for categoria in totais_categoria:
+        for (categoria_nome, tipo), total in sorted(totais_categoria.items()):
             dados_categoria = {
-                'categoria': categoria.nome,
-                'valor': float(categoria.total)
+                'categoria': categoria_nome,
+                'valor': total
             }
             
-            if categoria.tipo == 'ENTRADA':
+            if tipo == 'ENTRADA':
                 entradas.append(dados_categoria)
             else:
                 saidas.append(dados_categoria)
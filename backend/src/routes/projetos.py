@@ -1,33 +1,60 @@
 from flask import Blueprint, request, jsonify, send_file
 from datetime import datetime, timedelta
-from sqlalchemy import func, extract
+from sqlalchemy import func, extract, select
 from src.models.user import db, Projeto, Cenario, LogSistema, ArquivoUpload, LancamentoFinanceiro, CategoriaFinanceira, HistoricoCenario, User, Relatorio
 from src.auth import token_required, admin_required
+from src.services.exclusao_dados import excluir_cenarios, excluir_projetos
+from src.services.idempotencia import idempotente
+from src.services.registro_categorias import registro_categorias
+from src.services.cenarios_virtuais import (
+    aplicar_cenario, buscar_lancamento, cenario_fonte_id, consultar_lancamentos, contar_lancamentos, e_virtual,
+    lancamento_editavel, lancamentos_do_cenario, materializar_cenario, materializar_derivados, preparar_alteracao,
+    resumo_do_cenario
+)
+from src.services.resumo_mensal import recalcular_resumo
 from io import BytesIO
 import os
 
 projetos_bp = Blueprint('projetos', __name__)
 
+
+def _uploads_recentes(usuario_id=None):
+    """
+    Subconsulta (projeto_id, nome_original, uploaded_at) com o upload mais recente de cada projeto
+    (apenas os projetos do usuário, se informado), para as listagens juntarem sem uma consulta por projeto
+    """
+    ordem = func.row_number().over(
+        partition_by=ArquivoUpload.projeto_id,
+        order_by=(ArquivoUpload.uploaded_at.desc(), ArquivoUpload.id.desc())
+    ).label('ordem')
+    uploads = select(ArquivoUpload.projeto_id, ArquivoUpload.nome_original, ArquivoUpload.uploaded_at, ordem)
+    if usuario_id is not None:
+        uploads = uploads.where(
+            ArquivoUpload.projeto_id.in_(select(Projeto.id).where(Projeto.usuario_id == usuario_id))
+        )
+    uploads = uploads.subquery()
+    return select(uploads.c.projeto_id, uploads.c.nome_original, uploads.c.uploaded_at)\
+        .where(uploads.c.ordem == 1).subquery('upload_recente')
+
+
 @projetos_bp.route('/projetos', methods=['GET'])
 @token_required
 def listar_projetos(current_user):
     """Lista projetos do usuário atual ou todos (se admin)"""
     try:
-        if current_user.role == 'admin':
-            projetos = Projeto.query.all()
-        else:
-            projetos = Projeto.query.filter_by(usuario_id=current_user.id).all()
+        usuario_id = None if current_user.role == 'admin' else current_user.id
+        
+        # Projetos e o nome do arquivo do upload mais recente (se houver) em uma única consulta
+        upload_recente = _uploads_recentes(usuario_id)
+        consulta = db.session.query(Projeto, upload_recente.c.nome_original)\
+            .outerjoin(upload_recente, upload_recente.c.projeto_id == Projeto.id)
+        if usuario_id is not None:
+            consulta = consulta.filter(Projeto.usuario_id == usuario_id)
         
         projetos_data = []
-        for projeto in projetos:
+        for projeto, nome_arquivo in consulta.order_by(Projeto.id):
             d = projeto.to_dict()
-            # Anexar nome_arquivo do upload mais recente (se houver)
-            try:
-                upload_recente = ArquivoUpload.query.filter_by(projeto_id=projeto.id)\
-                    .order_by(ArquivoUpload.uploaded_at.desc()).first()
-                d['nome_arquivo'] = upload_recente.nome_original if upload_recente else None
-            except Exception:
-                d['nome_arquivo'] = None
+            d['nome_arquivo'] = nome_arquivo
             projetos_data.append(d)
 
         return jsonify({
@@ -180,8 +207,10 @@ def deletar_projeto(current_user, projeto_id):
         )
         db.session.add(log)
         
-        db.session.delete(projeto)
+        # Cenários, lançamentos, uploads e o projeto em alguns DELETEs em conjunto (sem carregar as linhas)
+        exclusao = excluir_projetos([projeto.id])
         db.session.commit()
+        exclusao.remover_arquivos()
         
         return jsonify({'message': 'Projeto deletado com sucesso'})
         
@@ -194,34 +223,23 @@ def deletar_projeto(current_user, projeto_id):
 def listar_cenarios(current_user):
     """Lista todos os cenários do usuário atual ou todos (se admin)"""
     try:
-        # Buscar projetos do usuário
-        if current_user.role == 'admin':
-            projetos = Projeto.query.all()
-        else:
-            projetos = Projeto.query.filter_by(usuario_id=current_user.id).all()
-        
-        projeto_ids = [p.id for p in projetos]
-        
-        if not projeto_ids:
-            return jsonify({'cenarios': []}), 200
+        usuario_id = None if current_user.role == 'admin' else current_user.id
         
-        # Buscar todos os cenários dos projetos do usuário
-        cenarios = Cenario.query.filter(Cenario.projeto_id.in_(projeto_ids)).order_by(Cenario.created_at.desc()).all()
+        # Cenários com o nome do projeto e o upload mais recente do projeto em uma única consulta
+        upload_recente = _uploads_recentes(usuario_id)
+        consulta = db.session.query(
+            Cenario, Projeto.nome_cliente, upload_recente.c.nome_original, upload_recente.c.uploaded_at
+        ).join(Projeto, Projeto.id == Cenario.projeto_id)\
+            .outerjoin(upload_recente, upload_recente.c.projeto_id == Cenario.projeto_id)
+        if usuario_id is not None:
+            consulta = consulta.filter(Projeto.usuario_id == usuario_id)
         
-        # Buscar informações do projeto e arquivo para cada cenário
         cenarios_data = []
-        for cenario in cenarios:
-            projeto = Projeto.query.get(cenario.projeto_id)
-            upload_recente = ArquivoUpload.query.filter_by(projeto_id=cenario.projeto_id)\
-                .order_by(ArquivoUpload.uploaded_at.desc()).first()
-            
+        for cenario, projeto_nome, arquivo_nome, arquivo_data in consulta.order_by(Cenario.created_at.desc(), Cenario.id):
             cenario_dict = cenario.to_dict()
-            cenario_dict['projeto_nome'] = projeto.nome_cliente if projeto else 'Projeto Desconhecido'
-            cenario_dict['arquivo_nome'] = upload_recente.nome_original if upload_recente else None
-            cenario_dict['arquivo_data'] = upload_recente.uploaded_at.isoformat() if upload_recente and upload_recente.uploaded_at else None
-            
-            # Calcular estatísticas básicas (receita total, etc)
-            # Isso pode ser otimizado depois, mas por enquanto vamos retornar dados básicos
+            cenario_dict['projeto_nome'] = projeto_nome
+            cenario_dict['arquivo_nome'] = arquivo_nome
+            cenario_dict['arquivo_data'] = arquivo_data.isoformat() if arquivo_data else None
             cenarios_data.append(cenario_dict)
         
         return jsonify({'cenarios': cenarios_data}), 200
@@ -273,14 +291,14 @@ def comparar_cenarios(current_user):
             cenario = item['cenario']
             projeto = item['projeto']
             
-            # Buscar lançamentos
-            lancamentos = LancamentoFinanceiro.query.filter_by(cenario_id=cenario.id).all()
+            # Totais mensais do cenário (resumo mensal)
+            lancamentos = resumo_do_cenario(cenario)
             
             # Calcular estatísticas
             total_entradas = sum(float(l.valor) for l in lancamentos if l.tipo == 'ENTRADA')
             total_saidas = sum(float(l.valor) for l in lancamentos if l.tipo == 'SAIDA')
             saldo_liquido = total_entradas - total_saidas
-            total_lancamentos = len(lancamentos)
+            total_lancamentos = contar_lancamentos(lancamentos)
             
             # Buscar arquivo relacionado
             upload_recente = ArquivoUpload.query.filter_by(projeto_id=projeto.id)\
@@ -500,7 +518,9 @@ def deletar_cenario(current_user, cenario_id):
         )
         db.session.add(log)
         
-        db.session.delete(cenario)
+        # Cenários derivados deste passam a ter lançamentos próprios antes da exclusão
+        materializar_derivados(cenario)
+        excluir_cenarios([cenario.id])
         db.session.commit()
         
         return jsonify({'message': f'Cenário {nome_cenario} deletado com sucesso'}), 200
@@ -524,8 +544,8 @@ def analisar_cenario(current_user, cenario_id):
         if current_user.role != 'admin' and projeto.usuario_id != current_user.id:
             return jsonify({'message': 'Acesso negado'}), 403
         
-        # Buscar lançamentos do cenário
-        lancamentos = LancamentoFinanceiro.query.filter_by(cenario_id=cenario_id).all()
+        # Totais mensais do cenário (resumo mensal)
+        lancamentos = resumo_do_cenario(cenario)
         
         # Estatísticas básicas
         total_entradas = sum(float(l.valor) for l in lancamentos if l.tipo == 'ENTRADA')
@@ -533,42 +553,34 @@ def analisar_cenario(current_user, cenario_id):
         saldo_liquido = total_entradas - total_saidas
         
         # Contagem de lançamentos
-        total_lancamentos = len(lancamentos)
-        lancamentos_entrada = len([l for l in lancamentos if l.tipo == 'ENTRADA'])
-        lancamentos_saida = len([l for l in lancamentos if l.tipo == 'SAIDA'])
-        lancamentos_projetados = len([l for l in lancamentos if l.origem == 'PROJETADO'])
-        lancamentos_realizados = len([l for l in lancamentos if l.origem == 'REALIZADO'])
+        total_lancamentos = contar_lancamentos(lancamentos)
+        lancamentos_entrada = contar_lancamentos([l for l in lancamentos if l.tipo == 'ENTRADA'])
+        lancamentos_saida = contar_lancamentos([l for l in lancamentos if l.tipo == 'SAIDA'])
+        lancamentos_projetados = contar_lancamentos([l for l in lancamentos if l.origem == 'PROJETADO'])
+        lancamentos_realizados = contar_lancamentos([l for l in lancamentos if l.origem == 'REALIZADO'])
         
         # Buscar arquivo relacionado
         upload_recente = ArquivoUpload.query.filter_by(projeto_id=projeto.id)\
             .order_by(ArquivoUpload.uploaded_at.desc()).first()
         
         # Estatísticas por categoria
-        lancamentos_por_categoria = db.session.query(
-            CategoriaFinanceira.nome,
-            func.sum(LancamentoFinanceiro.valor).label('total'),
-            func.count(LancamentoFinanceiro.id).label('quantidade')
-        ).join(
-            LancamentoFinanceiro, CategoriaFinanceira.id == LancamentoFinanceiro.categoria_id
+        lancamentos_por_categoria = {}
+        for l in lancamentos:
+            categoria = lancamentos_por_categoria.setdefault(l.categoria_nome, {'nome': l.categoria_nome, 'total': 0, 'quantidade': 0})
+            categoria['total'] += float(l.valor)
+            categoria['quantidade'] += l.quantidade
+        
+        categorias_data = [lancamentos_por_categoria[nome] for nome in sorted(lancamentos_por_categoria)]
+        
+        # Período de análise (primeira e última data; o resumo guarda apenas o mês)
+        periodo_inicio, periodo_fim = db.session.query(
+            func.min(LancamentoFinanceiro.data_competencia),
+            func.max(LancamentoFinanceiro.data_competencia)
         ).filter(
-            LancamentoFinanceiro.cenario_id == cenario_id
-        ).group_by(
-            CategoriaFinanceira.nome
-        ).all()
-        
-        categorias_data = [
-            {
-                'nome': row.nome,
-                'total': float(row.total) if row.total else 0,
-                'quantidade': row.quantidade
-            }
-            for row in lancamentos_por_categoria
-        ]
-        
-        # Período de análise (primeira e última data)
-        datas = [l.data_competencia for l in lancamentos if l.data_competencia]
-        periodo_inicio = min(datas).isoformat() if datas else None
-        periodo_fim = max(datas).isoformat() if datas else None
+            LancamentoFinanceiro.cenario_id == cenario_fonte_id(cenario)
+        ).one()
+        periodo_inicio = periodo_inicio.isoformat() if periodo_inicio else None
+        periodo_fim = periodo_fim.isoformat() if periodo_fim else None
         
         analise = {
             'cenario': cenario.to_dict(),
@@ -652,6 +664,10 @@ def criar_lancamento(current_user, cenario_id):
         except (ValueError, TypeError):
             return jsonify({'message': 'Valor inválido'}), 400
         
+        # Cenário derivado ganha lançamentos próprios antes de receber o novo lançamento;
+        # os derivados de um cenário base ficam com os valores atuais
+        preparar_alteracao(cenario)
+        
         # Criar lançamento
         lancamento = LancamentoFinanceiro(
             cenario_id=cenario_id,
@@ -663,6 +679,7 @@ def criar_lancamento(current_user, cenario_id):
         )
         
         db.session.add(lancamento)
+        recalcular_resumo(cenario_id, [data_competencia])
         db.session.commit()
         
         # Log
@@ -694,10 +711,7 @@ def atualizar_lancamento(current_user, cenario_id, lancamento_id):
     """Atualiza um lançamento financeiro"""
     try:
         cenario = Cenario.query.get_or_404(cenario_id)
-        lancamento = LancamentoFinanceiro.query.filter_by(
-            id=lancamento_id,
-            cenario_id=cenario_id
-        ).first_or_404()
+        lancamento = buscar_lancamento(cenario, lancamento_id)
         
         projeto = Projeto.query.get(cenario.projeto_id)
         
@@ -712,6 +726,11 @@ def atualizar_lancamento(current_user, cenario_id, lancamento_id):
         if not cenario.is_active:
             return jsonify({'message': 'Não é possível editar lançamentos em cenários congelados. Descongele o cenário primeiro.'}), 400
         
+        # Em cenário derivado, a edição é feita na cópia própria do lançamento; em cenário base,
+        # os derivados são materializados antes
+        lancamento = lancamento_editavel(cenario, lancamento)
+        data_anterior = lancamento.data_competencia
+        
         data = request.get_json()
         
         # Atualizar campos fornecidos
@@ -742,6 +761,7 @@ def atualizar_lancamento(current_user, cenario_id, lancamento_id):
         if data.get('origem') and data.get('origem') in ['PROJETADO', 'REALIZADO']:
             lancamento.origem = data.get('origem')
         
+        recalcular_resumo(lancamento.cenario_id, [data_anterior, lancamento.data_competencia])
         db.session.commit()
         
         # Log
@@ -772,10 +792,7 @@ def deletar_lancamento(current_user, cenario_id, lancamento_id):
     """Deleta um lançamento financeiro"""
     try:
         cenario = Cenario.query.get_or_404(cenario_id)
-        lancamento = LancamentoFinanceiro.query.filter_by(
-            id=lancamento_id,
-            cenario_id=cenario_id
-        ).first_or_404()
+        lancamento = buscar_lancamento(cenario, lancamento_id)
         
         projeto = Projeto.query.get(cenario.projeto_id)
         
@@ -790,6 +807,10 @@ def deletar_lancamento(current_user, cenario_id, lancamento_id):
         if not cenario.is_active:
             return jsonify({'message': 'Não é possível deletar lançamentos em cenários congelados. Descongele o cenário primeiro.'}), 400
         
+        # Em cenário derivado, a exclusão é feita na cópia própria do lançamento; em cenário base,
+        # os derivados são materializados antes
+        lancamento = lancamento_editavel(cenario, lancamento)
+        
         # Log antes de deletar
         log = LogSistema(
             usuario_id=current_user.id,
@@ -804,6 +825,7 @@ def deletar_lancamento(current_user, cenario_id, lancamento_id):
         db.session.add(log)
         
         db.session.delete(lancamento)
+        recalcular_resumo(lancamento.cenario_id, [lancamento.data_competencia])
         db.session.commit()
         
         return jsonify({'message': 'Lançamento deletado com sucesso'}), 200
@@ -834,14 +856,16 @@ def listar_lancamentos_cenario(current_user, cenario_id):
         ).join(
             CategoriaFinanceira, LancamentoFinanceiro.categoria_id == CategoriaFinanceira.id
         ).filter(
-            LancamentoFinanceiro.cenario_id == cenario_id
+            LancamentoFinanceiro.cenario_id == cenario_fonte_id(cenario)
         ).order_by(
             LancamentoFinanceiro.data_competencia.desc(),
             LancamentoFinanceiro.id.desc()
         ).all()
         
+        lancamentos_cenario = aplicar_cenario(cenario, [lancamento for lancamento, _ in lancamentos])
+        
         lancamentos_data = []
-        for lancamento, categoria_nome in lancamentos:
+        for lancamento, (_, categoria_nome) in zip(lancamentos_cenario, lancamentos):
             lancamento_dict = lancamento.to_dict()
             lancamento_dict['categoria_nome'] = categoria_nome
             lancamentos_data.append(lancamento_dict)
@@ -859,8 +883,7 @@ def listar_lancamentos_cenario(current_user, cenario_id):
 def listar_categorias(current_user):
     """Lista todas as categorias financeiras disponíveis"""
     try:
-        categorias = CategoriaFinanceira.query.order_by(CategoriaFinanceira.nome).all()
-        categorias_data = [cat.to_dict() for cat in categorias]
+        categorias_data = registro_categorias.listar()
         return jsonify({'categorias': categorias_data}), 200
     except Exception as e:
         return jsonify({'message': f'Erro interno: {str(e)}'}), 500
@@ -883,8 +906,8 @@ def obter_graficos_cenario(current_user, cenario_id):
         # Obter parâmetro de período (mensal, trimestral, anual)
         periodo = request.args.get('periodo', 'mensal')  # default: mensal
         
-        # Buscar lançamentos do cenário
-        lancamentos = LancamentoFinanceiro.query.filter_by(cenario_id=cenario_id).all()
+        # Totais mensais do cenário (resumo mensal)
+        lancamentos = resumo_do_cenario(cenario)
         
         if not lancamentos:
             return jsonify({
@@ -941,26 +964,14 @@ def obter_graficos_cenario(current_user, cenario_id):
         ]
         
         # Distribuição por categoria
-        distribuicao_categorias = db.session.query(
-            CategoriaFinanceira.nome,
-            func.sum(LancamentoFinanceiro.valor).label('total'),
-            LancamentoFinanceiro.tipo
-        ).join(
-            LancamentoFinanceiro, CategoriaFinanceira.id == LancamentoFinanceiro.categoria_id
-        ).filter(
-            LancamentoFinanceiro.cenario_id == cenario_id
-        ).group_by(
-            CategoriaFinanceira.nome,
-            LancamentoFinanceiro.tipo
-        ).all()
-        
         categorias_dict = {}
-        for categoria_nome, total, tipo in distribuicao_categorias:
+        for lancamento in lancamentos:
+            categoria_nome = lancamento.categoria_nome
             if categoria_nome not in categorias_dict:
                 categorias_dict[categoria_nome] = {'entradas': 0, 'saidas': 0}
             
-            valor_total = float(total) if total else 0
-            if tipo == 'ENTRADA':
+            valor_total = float(lancamento.valor)
+            if lancamento.tipo == 'ENTRADA':
                 categorias_dict[categoria_nome]['entradas'] += valor_total
             else:
                 categorias_dict[categoria_nome]['saidas'] += valor_total
@@ -1046,6 +1057,22 @@ def obter_graficos_cenario(current_user, cenario_id):
 # FUNÇÕES AUXILIARES PARA GERAÇÃO DE RELATÓRIOS
 # ============================================================================
 
+def _inicio_periodo(periodo):
+    """Primeiro dia do mês, trimestre ou ano atual para o filtro de período ('todos': None)"""
+    hoje = datetime.now().date()
+    if periodo == 'mensal':
+        # Último mês
+        return hoje.replace(day=1)
+    if periodo == 'trimestral':
+        # Último trimestre
+        trimestre_atual = (hoje.month - 1) // 3
+        return hoje.replace(month=trimestre_atual * 3 + 1, day=1)
+    if periodo == 'anual':
+        # Último ano
+        return hoje.replace(month=1, day=1)
+    return None
+
+
 def _agrupar_por_periodo(lancamentos, periodo):
     """Agrupa lançamentos por período"""
     dados_agrupados = {}
@@ -1088,12 +1115,11 @@ def _agrupar_por_periodo(lancamentos, periodo):
 
 
 def _obter_top_categorias(lancamentos, top_n=5):
-    """Retorna as top N categorias por valor total"""
+    """Retorna as top N categorias por valor total (lançamentos do resumo mensal)"""
     categorias_dict = {}
     
     for lancamento in lancamentos:
-        categoria = CategoriaFinanceira.query.get(lancamento.categoria_id)
-        categoria_nome = categoria.nome if categoria else 'N/A'
+        categoria_nome = lancamento.categoria_nome or 'N/A'
         
         if categoria_nome not in categorias_dict:
             categorias_dict[categoria_nome] = {
@@ -1205,7 +1231,7 @@ def _gerar_pdf_detailed(cenario, projeto, lancamentos, periodo, upload_recente,
     total_entradas = sum(float(l.valor) for l in lancamentos if l.tipo == 'ENTRADA')
     total_saidas = sum(float(l.valor) for l in lancamentos if l.tipo == 'SAIDA')
     saldo_liquido = total_entradas - total_saidas
-    total_lancamentos = len(lancamentos)
+    total_lancamentos = contar_lancamentos(lancamentos)
     
     # Título
     title_style = ParagraphStyle(
@@ -1384,7 +1410,7 @@ def _gerar_pdf_comparison(cenarios_data, periodo, styles, colors):
             f"R$ {total_entradas:,.2f}",
             f"R$ {total_saidas:,.2f}",
             f"R$ {saldo_liquido:,.2f}",
-            str(len(lancamentos))
+            str(contar_lancamentos(lancamentos))
         ])
     
     comp_table = Table(comp_data, colWidths=[2*inch, 2.5*inch, 1.5*inch, 1.5*inch, 1.5*inch, 1.2*inch])
@@ -1468,45 +1494,13 @@ def gerar_relatorio_pdf(current_user, cenario_id):
         periodo = request.args.get('periodo', 'todos')  # todos, mensal, trimestral, anual
         template = request.args.get('template', 'detailed')  # executive, detailed, comparison
         
-        # Buscar lançamentos do cenário
-        lancamentos_query = LancamentoFinanceiro.query.filter_by(cenario_id=cenario_id)
-        
-        # Aplicar filtro de período se não for 'todos'
-        if periodo != 'todos':
-            hoje = datetime.now().date()
-            if periodo == 'mensal':
-                # Último mês
-                primeiro_dia_mes = hoje.replace(day=1)
-                lancamentos_query = lancamentos_query.filter(
-                    LancamentoFinanceiro.data_competencia >= primeiro_dia_mes
-                )
-            elif periodo == 'trimestral':
-                # Último trimestre
-                trimestre_atual = (hoje.month - 1) // 3
-                primeiro_mes_trimestre = trimestre_atual * 3 + 1
-                primeiro_dia_trimestre = hoje.replace(month=primeiro_mes_trimestre, day=1)
-                lancamentos_query = lancamentos_query.filter(
-                    LancamentoFinanceiro.data_competencia >= primeiro_dia_trimestre
-                )
-            elif periodo == 'anual':
-                # Último ano
-                primeiro_dia_ano = hoje.replace(month=1, day=1)
-                lancamentos_query = lancamentos_query.filter(
-                    LancamentoFinanceiro.data_competencia >= primeiro_dia_ano
-                )
-        
-        lancamentos = lancamentos_query.all()
+        # Totais mensais do cenário (resumo mensal), com filtro de período se não for 'todos'
+        lancamentos = resumo_do_cenario(cenario, _inicio_periodo(periodo))
         
         # Verificar se há lançamentos
         if not lancamentos:
             return jsonify({'message': 'Não há lançamentos para gerar o relatório. Por favor, adicione lançamentos ao cenário primeiro.'}), 400
         
-        # Calcular estatísticas
-        total_entradas = sum(float(l.valor) for l in lancamentos if l.tipo == 'ENTRADA')
-        total_saidas = sum(float(l.valor) for l in lancamentos if l.tipo == 'SAIDA')
-        saldo_liquido = total_entradas - total_saidas
-        total_lancamentos = len(lancamentos)
-        
         # Buscar arquivo relacionado
         upload_recente = ArquivoUpload.query.filter_by(projeto_id=projeto.id)\
             .order_by(ArquivoUpload.uploaded_at.desc()).first()
@@ -1582,6 +1576,7 @@ def gerar_relatorio_pdf(current_user, cenario_id):
 
 @projetos_bp.route('/cenarios/relatorio-comparativo/pdf', methods=['POST'])
 @token_required
+@idempotente
 def gerar_relatorio_comparativo_pdf(current_user):
     """Gera relatório PDF comparativo de múltiplos cenários"""
     try:
@@ -1618,30 +1613,8 @@ def gerar_relatorio_comparativo_pdf(current_user):
             if current_user.role != 'admin' and projeto.usuario_id != current_user.id:
                 return jsonify({'message': f'Acesso negado ao cenário {cenario_id}'}), 403
             
-            # Aplicar filtro de período
-            lancamentos_query = LancamentoFinanceiro.query.filter_by(cenario_id=cenario.id)
-            
-            if periodo != 'todos':
-                hoje = datetime.now().date()
-                if periodo == 'mensal':
-                    primeiro_dia_mes = hoje.replace(day=1)
-                    lancamentos_query = lancamentos_query.filter(
-                        LancamentoFinanceiro.data_competencia >= primeiro_dia_mes
-                    )
-                elif periodo == 'trimestral':
-                    trimestre_atual = (hoje.month - 1) // 3
-                    primeiro_mes_trimestre = trimestre_atual * 3 + 1
-                    primeiro_dia_trimestre = hoje.replace(month=primeiro_mes_trimestre, day=1)
-                    lancamentos_query = lancamentos_query.filter(
-                        LancamentoFinanceiro.data_competencia >= primeiro_dia_trimestre
-                    )
-                elif periodo == 'anual':
-                    primeiro_dia_ano = hoje.replace(month=1, day=1)
-                    lancamentos_query = lancamentos_query.filter(
-                        LancamentoFinanceiro.data_competencia >= primeiro_dia_ano
-                    )
-            
-            lancamentos = lancamentos_query.all()
+            # Totais mensais do cenário (resumo mensal) com filtro de período
+            lancamentos = resumo_do_cenario(cenario, _inicio_periodo(periodo))
             
             cenarios_data.append({
                 'cenario': cenario,
@@ -1706,6 +1679,7 @@ def gerar_relatorio_comparativo_pdf(current_user):
 
 @projetos_bp.route('/cenarios/relatorio-comparativo/excel', methods=['POST'])
 @token_required
+@idempotente
 def gerar_relatorio_comparativo_excel(current_user):
     """Gera relatório Excel comparativo de múltiplos cenários"""
     try:
@@ -1739,30 +1713,8 @@ def gerar_relatorio_comparativo_excel(current_user):
             if current_user.role != 'admin' and projeto.usuario_id != current_user.id:
                 return jsonify({'message': f'Acesso negado ao cenário {cenario_id}'}), 403
             
-            # Aplicar filtro de período
-            lancamentos_query = LancamentoFinanceiro.query.filter_by(cenario_id=cenario.id)
-            
-            if periodo != 'todos':
-                hoje = datetime.now().date()
-                if periodo == 'mensal':
-                    primeiro_dia_mes = hoje.replace(day=1)
-                    lancamentos_query = lancamentos_query.filter(
-                        LancamentoFinanceiro.data_competencia >= primeiro_dia_mes
-                    )
-                elif periodo == 'trimestral':
-                    trimestre_atual = (hoje.month - 1) // 3
-                    primeiro_mes_trimestre = trimestre_atual * 3 + 1
-                    primeiro_dia_trimestre = hoje.replace(month=primeiro_mes_trimestre, day=1)
-                    lancamentos_query = lancamentos_query.filter(
-                        LancamentoFinanceiro.data_competencia >= primeiro_dia_trimestre
-                    )
-                elif periodo == 'anual':
-                    primeiro_dia_ano = hoje.replace(month=1, day=1)
-                    lancamentos_query = lancamentos_query.filter(
-                        LancamentoFinanceiro.data_competencia >= primeiro_dia_ano
-                    )
-            
-            lancamentos = lancamentos_query.all()
+            # Totais mensais do cenário (resumo mensal) com filtro de período
+            lancamentos = resumo_do_cenario(cenario, _inicio_periodo(periodo))
             
             cenarios_data.append({
                 'cenario': cenario,
@@ -1827,7 +1779,7 @@ def gerar_relatorio_comparativo_excel(current_user):
             ws[f'C{row}'] = f"R$ {total_entradas:,.2f}"
             ws[f'D{row}'] = f"R$ {total_saidas:,.2f}"
             ws[f'E{row}'] = f"R$ {saldo_liquido:,.2f}"
-            ws[f'F{row}'] = len(lancamentos)
+            ws[f'F{row}'] = contar_lancamentos(lancamentos)
             
             for col in range(1, 7):
                 cell = ws.cell(row=row, column=col)
@@ -1898,31 +1850,17 @@ def gerar_relatorio_excel(current_user, cenario_id):
         periodo = request.args.get('periodo', 'todos')
         template = request.args.get('template', 'detailed')  # executive, detailed, comparison
         
-        # Buscar lançamentos do cenário com filtro de período
-        lancamentos_query = LancamentoFinanceiro.query.filter_by(cenario_id=cenario_id)
+        # Buscar lançamentos do cenário com filtro de período (a planilha lista cada lançamento)
+        lancamentos_query = consultar_lancamentos(cenario)
         
         # Aplicar filtro de período se não for 'todos'
-        if periodo != 'todos':
-            hoje = datetime.now().date()
-            if periodo == 'mensal':
-                primeiro_dia_mes = hoje.replace(day=1)
-                lancamentos_query = lancamentos_query.filter(
-                    LancamentoFinanceiro.data_competencia >= primeiro_dia_mes
-                )
-            elif periodo == 'trimestral':
-                trimestre_atual = (hoje.month - 1) // 3
-                primeiro_mes_trimestre = trimestre_atual * 3 + 1
-                primeiro_dia_trimestre = hoje.replace(month=primeiro_mes_trimestre, day=1)
-                lancamentos_query = lancamentos_query.filter(
-                    LancamentoFinanceiro.data_competencia >= primeiro_dia_trimestre
-                )
-            elif periodo == 'anual':
-                primeiro_dia_ano = hoje.replace(month=1, day=1)
-                lancamentos_query = lancamentos_query.filter(
-                    LancamentoFinanceiro.data_competencia >= primeiro_dia_ano
-                )
+        inicio_periodo = _inicio_periodo(periodo)
+        if inicio_periodo is not None:
+            lancamentos_query = lancamentos_query.filter(
+                LancamentoFinanceiro.data_competencia >= inicio_periodo
+            )
         
-        lancamentos = lancamentos_query.order_by(LancamentoFinanceiro.data_competencia).all()
+        lancamentos = aplicar_cenario(cenario, lancamentos_query.order_by(LancamentoFinanceiro.data_competencia).all())
         
         # Verificar se há lançamentos
         if not lancamentos:
@@ -2102,7 +2040,7 @@ def criar_snapshot_cenario(current_user, cenario_id):
         descricao = data.get('descricao', '') if data else ''
         
         # Buscar todos os lançamentos do cenário
-        lancamentos = LancamentoFinanceiro.query.filter_by(cenario_id=cenario_id).all()
+        lancamentos = lancamentos_do_cenario(cenario)
         
         # Criar snapshot com dados serializados
         snapshot_data = {
@@ -2175,18 +2113,18 @@ def listar_historico_cenario(current_user, cenario_id):
         if current_user.role != 'admin' and projeto.usuario_id != current_user.id:
             return jsonify({'message': 'Acesso negado'}), 403
         
-        # Buscar histórico
-        historicos = HistoricoCenario.query.filter_by(cenario_id=cenario_id)\
+        # Buscar histórico com nome e email do autor de cada snapshot (uma única consulta)
+        historicos = db.session.query(HistoricoCenario, User.nome, User.email)\
+            .outerjoin(User, User.id == HistoricoCenario.usuario_id)\
+            .filter(HistoricoCenario.cenario_id == cenario_id)\
             .order_by(HistoricoCenario.created_at.desc()).all()
         
         historicos_data = []
-        for historico in historicos:
+        for historico, usuario_nome, usuario_email in historicos:
             h_dict = historico.to_dict()
-            # Adicionar informações do usuário
-            usuario = db.session.get(User, historico.usuario_id)
-            if usuario:
-                h_dict['usuario_nome'] = usuario.nome
-                h_dict['usuario_email'] = usuario.email
+            if usuario_nome is not None:
+                h_dict['usuario_nome'] = usuario_nome
+                h_dict['usuario_email'] = usuario_email
             historicos_data.append(h_dict)
         
         return jsonify({
@@ -2225,7 +2163,7 @@ def restaurar_versao_cenario(current_user, cenario_id, historico_id):
         snapshot_data = historico.snapshot_data
         
         # Criar snapshot do estado atual antes de restaurar
-        lancamentos_atuais = LancamentoFinanceiro.query.filter_by(cenario_id=cenario_id).all()
+        lancamentos_atuais = lancamentos_do_cenario(cenario)
         snapshot_atual = {
             'cenario': {
                 'nome': cenario.nome,
@@ -2253,9 +2191,14 @@ def restaurar_versao_cenario(current_user, cenario_id, historico_id):
         )
         db.session.add(backup)
         
-        # Deletar lançamentos atuais
-        for lancamento in lancamentos_atuais:
-            db.session.delete(lancamento)
+        # Deletar lançamentos atuais (cenário derivado apenas deixa de usar os lançamentos do cenário base;
+        # os derivados de um cenário base ficam com os valores atuais)
+        if e_virtual(cenario):
+            materializar_cenario(cenario, copiar_lancamentos=False)
+        else:
+            materializar_derivados(cenario)
+            for lancamento in lancamentos_atuais:
+                db.session.delete(lancamento)
         
         # Restaurar lançamentos do snapshot
         lancamentos_restaurados = 0
@@ -2283,6 +2226,8 @@ def restaurar_versao_cenario(current_user, cenario_id, historico_id):
                 print(f"Erro ao restaurar lançamento: {e}")
                 continue
         
+        recalcular_resumo(cenario_id)
+        
         # Restaurar dados do cenário (se houver mudanças)
         if snapshot_data.get('cenario'):
             cenario.nome = snapshot_data['cenario'].get('nome', cenario.nome)
@@ -2337,6 +2282,7 @@ def listar_relatorios(current_user):
 
 @projetos_bp.route('/relatorios', methods=['POST'])
 @token_required
+@idempotente
 def criar_relatorio(current_user):
     """Cria um novo registro de relatório"""
     try:
@@ -1,10 +1,25 @@
 from flask import Blueprint, request, jsonify, send_file, current_app
 import os
-import tempfile
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
-from src.models.user import db, LogSistema, Projeto, ArquivoUpload
+from src.models.user import db, LogSistema, Projeto, ArquivoUpload, JobProcessamento, SessaoUpload
 from src.auth import token_required
 from src.services.planilha_processor import ProcessadorPlanilhaHabitusForecast
+from src.services.planilha_carregada import PlanilhaCarregada
+from src.services.fila_processamento import fila_processamento
+from src.services.idempotencia import idempotente
+from src.services.armazenamento_upload import armazenar_upload
+from src.services.exclusao_dados import excluir_upload
+from src.services.validacao_rapida import PlanilhaIlegivel, validar_cabecalho
+from src.services.sessoes_upload import (
+    ErroSessaoUpload, criar_sessao, gravar_parte, finalizar_sessao, cancelar_sessao, partes_recebidas
+)
+from src.services.processamento_lote import (
+    ProcessadorLote, ErroLote, descompactar_zip, MAX_ARQUIVOS_LOTE, MAX_TAMANHO_LOTE
+)
+from src.services.importacao_extrato import (
+    ErroImportacaoExtrato, FORMATOS_EXTENSAO, MAX_TAMANHO_EXTRATO, carregar_configuracao, importar_extrato
+)
 from src.utils.logger import debug_log, error_log, exception_log
 
 upload_bp = Blueprint('upload', __name__)
@@ -80,10 +95,41 @@ def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def is_async_request():
+    """Verifica se o cliente pediu processamento assíncrono (?async=1 ou campo de formulário 'async')"""
+    valor = request.args.get('async') or request.form.get('async') or ''
+    return valor.strip().lower() in ('1', 'true', 'sim', 'yes')
+
+def projeto_destino_reimportacao(current_user):
+    """
+    Projeto informado em ?projeto_id= (ou campo de formulário/JSON) para reimportar a planilha nele.
+    Retorna (projeto_id, None), (None, None) se não informado, ou (None, (resposta, status)) se inválido.
+    """
+    dados_json = request.get_json(silent=True) if request.is_json else None
+    valor = str(
+        request.args.get('projeto_id') or request.form.get('projeto_id') or (dados_json or {}).get('projeto_id') or ''
+    ).strip()
+    if not valor:
+        return None, None
+    if not valor.isdigit():
+        return None, (jsonify({'message': 'projeto_id inválido'}), 400)
+    projeto = db.session.get(Projeto, int(valor))
+    if projeto is None:
+        return None, (jsonify({'message': 'Projeto não encontrado'}), 404)
+    if current_user.role != 'admin' and projeto.usuario_id != current_user.id:
+        return None, (jsonify({'message': 'Acesso negado'}), 403)
+    return projeto.id, None
+
 @upload_bp.route('/upload-planilha', methods=['POST'])
 @token_required
+@idempotente
 def upload_planilha(current_user):
-    """Endpoint para upload e processamento de planilhas Excel"""
+    """
+    Endpoint para upload e processamento de planilhas Excel.
+
+    Com ?projeto_id=<id>, a planilha é reimportada no projeto existente: apenas os lançamentos
+    alterados são gravados (ver services/reimportacao.py) e nenhum projeto novo é criado.
+    """
     
     try:
         # Verificar se arquivo foi enviado
@@ -98,30 +144,80 @@ def upload_planilha(current_user):
         if not allowed_file(file.filename):
             return jsonify({'message': 'Apenas arquivos Excel (.xlsx, .xls) são aceitos'}), 400
         
-        # Validar tamanho do arquivo ANTES de salvar
-        is_valid_size, size_error = validate_file_size(file)
-        if not is_valid_size:
-            return jsonify({'message': size_error}), 400
-        
-        # Salvar arquivo temporariamente com nome único
         filename = secure_filename(file.filename)
-        import uuid
-        unique_id = str(uuid.uuid4())
-        temp_path = os.path.join(tempfile.gettempdir(), f"habitus_{unique_id}.xlsx")
         
-        file.save(temp_path)
+        # O arquivo já foi gravado no armazenamento definitivo durante a leitura do corpo da requisição,
+        # com hash SHA256, tamanho e assinatura calculados na mesma passada
+        arquivo_armazenado = armazenar_upload(file)
+        permanent_path = arquivo_armazenado.caminho
+        
+        if arquivo_armazenado.tamanho > MAX_FILE_SIZE:
+            arquivo_armazenado.descartar()
+            return jsonify({'message': f'Arquivo muito grande. Máximo: {MAX_FILE_SIZE / 1024 / 1024}MB'}), 400
+        
+        if not arquivo_armazenado.assinatura_excel:
+            arquivo_armazenado.descartar()
+            return jsonify({'message': 'O arquivo parece estar corrompido ou em formato inválido. Verifique se é um arquivo Excel válido.'}), 400
+        
+        projeto_id, erro_projeto = projeto_destino_reimportacao(current_user)
+        if erro_projeto is not None:
+            arquivo_armazenado.descartar()
+            return erro_projeto
         
-        # Criar diretório de armazenamento permanente
-        upload_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'uploads')
-        os.makedirs(upload_dir, exist_ok=True)
+        arquivo_armazenado.manter()
+        arquivo_armazenado.close()
         
-        # Caminho permanente para o arquivo
-        permanent_path = os.path.join(upload_dir, f"{unique_id}_{filename}")
+        if is_async_request():
+            # Modo assíncrono: devolver o job imediatamente
+            parametros_job = {
+                'caminho_arquivo': permanent_path,
+                'filename': filename,
+                'hash_arquivo': arquivo_armazenado.hash_arquivo
+            }
+            if projeto_id is not None:
+                parametros_job['projeto_id'] = projeto_id
+            job = fila_processamento.enfileirar(current_user.id, 'upload_planilha', parametros_job)
+            status_url = f"/api/upload-planilha/jobs/{job.id}"
+            return jsonify({
+                'message': 'Planilha recebida e enfileirada para processamento',
+                'job_id': job.id,
+                'status': job.status,
+                'status_url': status_url
+            }), 202, {'Location': status_url}
         
+        processado = False
         try:
-            # Processar planilha
             processador = ProcessadorPlanilhaHabitusForecast()
-            resultado = processador.processar_planilha_completa(temp_path, current_user.id, permanent_path)
+            if projeto_id is not None:
+                # Reimportação no projeto existente
+                resultado = processador.reimportar_no_projeto(
+                    permanent_path, projeto_id, current_user.id, hash_arquivo=arquivo_armazenado.hash_arquivo
+                )
+                processado = True
+                db.session.add(LogSistema(
+                    usuario_id=current_user.id,
+                    acao='PLANILHA_REIMPORTADA',
+                    detalhes={
+                        'filename': filename,
+                        'projeto_id': projeto_id,
+                        'arquivo_upload_id': resultado['arquivo_upload_id'],
+                        'alteracoes': resultado['alteracoes']
+                    }
+                ))
+                db.session.commit()
+                return jsonify({
+                    'message': 'Planilha reimportada no projeto',
+                    'projeto_id': projeto_id,
+                    'alteracoes': resultado['alteracoes'],
+                    'cenarios_nao_atualizados': resultado['cenarios_nao_atualizados'],
+                    'parametros': resultado['parametros']
+                }), 200
+            
+            # Processar planilha
+            resultado = processador.processar_planilha_completa(
+                permanent_path, current_user.id, hash_arquivo=arquivo_armazenado.hash_arquivo
+            )
+            processado = True
             
             # Log do upload
             log = LogSistema(
@@ -223,9 +319,9 @@ def upload_planilha(current_user):
             return jsonify({'message': 'Erro ao processar planilha. Verifique se o arquivo está no formato correto e tente novamente.'}), 400
         
         finally:
-            # Limpar arquivo temporário
-            if os.path.exists(temp_path):
-                os.unlink(temp_path)
+            # Remover do armazenamento arquivos que não geraram projeto
+            if not processado and os.path.exists(permanent_path):
+                os.unlink(permanent_path)
     
     except Exception as e:
         # Log de erro interno (não expor ao usuário)
@@ -246,10 +342,331 @@ def upload_planilha(current_user):
         
         return jsonify({'message': 'Erro interno do servidor. Tente novamente mais tarde.'}), 500
 
+@upload_bp.route('/upload-planilha/lote', methods=['POST'])
+@token_required
+def upload_planilhas_lote(current_user):
+    """Endpoint para importar várias planilhas de uma vez (um ZIP no campo 'file' ou vários arquivos no campo 'files')"""
+    
+    arquivos = []
+    try:
+        # O lote pode ultrapassar o limite de um upload individual
+        request.max_content_length = MAX_TAMANHO_LOTE
+        
+        zip_enviado = request.files.get('file')
+        if zip_enviado and zip_enviado.filename:
+            if not zip_enviado.filename.lower().endswith('.zip'):
+                return jsonify({'message': 'Envie um arquivo .zip no campo "file" ou as planilhas no campo "files"'}), 400
+            arquivos = descompactar_zip(zip_enviado.stream)
+        else:
+            for file in request.files.getlist('files'):
+                if not file.filename:
+                    continue
+                if not allowed_file(file.filename):
+                    return jsonify({'message': f'Apenas arquivos Excel (.xlsx, .xls) são aceitos: {file.filename}'}), 400
+                arquivos.append({'nome': secure_filename(file.filename), 'armazenado': armazenar_upload(file)})
+        
+        if not arquivos:
+            return jsonify({'message': 'Nenhuma planilha encontrada no lote'}), 400
+        
+        if len(arquivos) > MAX_ARQUIVOS_LOTE:
+            for arquivo in arquivos:
+                arquivo['armazenado'].descartar()
+            return jsonify({'message': f'Máximo de {MAX_ARQUIVOS_LOTE} planilhas por lote'}), 400
+        
+        resultados = ProcessadorLote().processar(arquivos, current_user.id)
+        sucessos = sum(1 for resultado in resultados if resultado['status'] == 'sucesso')
+        
+        return jsonify({
+            'message': f'{sucessos} de {len(resultados)} planilhas processadas com sucesso',
+            'total_arquivos': len(resultados),
+            'processados': sucessos,
+            'com_erro': len(resultados) - sucessos,
+            'resultados': resultados
+        }), 200 if sucessos else 400
+    
+    except ErroLote as e:
+        return jsonify({'message': str(e)}), 400
+    
+    except Exception as e:
+        exception_log(f"Erro interno no endpoint de upload em lote: {str(e)}")
+        for arquivo in arquivos:
+            if 'resultado' not in arquivo:
+                arquivo['armazenado'].descartar()
+        return jsonify({'message': 'Erro interno do servidor. Tente novamente mais tarde.'}), 500
+
+@upload_bp.route('/upload-planilha/jobs/<job_id>', methods=['GET'])
+@token_required
+def obter_status_job_upload(current_user, job_id):
+    """Endpoint para consultar o status de um upload assíncrono (queued/running/done/error)"""
+    try:
+        job = db.session.get(JobProcessamento, job_id)
+        if not job:
+            return jsonify({'message': 'Job não encontrado'}), 404
+        
+        if job.usuario_id != current_user.id and current_user.role != 'admin':
+            return jsonify({'message': 'Acesso negado'}), 403
+        
+        return jsonify(job.to_dict()), 200
+    
+    except Exception as e:
+        exception_log(f"Erro ao consultar job de upload: {str(e)}")
+        return jsonify({'message': 'Erro ao consultar status do upload'}), 500
+
+def obter_sessao_upload(current_user, sessao_id):
+    """Sessão de upload do usuário; retorna (sessao, None) ou (None, (resposta, status))"""
+    sessao = db.session.get(SessaoUpload, sessao_id)
+    if not sessao:
+        return None, (jsonify({'message': 'Sessão de upload não encontrada'}), 404)
+    if sessao.usuario_id != current_user.id and current_user.role != 'admin':
+        return None, (jsonify({'message': 'Acesso negado'}), 403)
+    return sessao, None
+
+def resposta_erro_sessao(erro):
+    return jsonify({'message': str(erro), **erro.detalhes}), erro.status_http
+
+@upload_bp.route('/upload-planilha/sessoes', methods=['POST'])
+@token_required
+def criar_sessao_upload(current_user):
+    """
+    Endpoint para abrir uma sessão de upload em partes (planilhas grandes, conexões lentas).
+
+    Corpo JSON: nome_arquivo, tamanho (bytes) e, opcionais, tamanho_parte, sha256 do arquivo
+    completo e projeto_id (reimportação). A resposta traz o número de partes a enviar.
+    """
+    try:
+        dados = request.get_json(silent=True) or {}
+        nome_arquivo = secure_filename(str(dados.get('nome_arquivo') or ''))
+        if not nome_arquivo or not allowed_file(nome_arquivo):
+            return jsonify({'message': 'Apenas arquivos Excel (.xlsx, .xls) são aceitos'}), 400
+        try:
+            tamanho = int(dados.get('tamanho'))
+            tamanho_parte = int(dados['tamanho_parte']) if dados.get('tamanho_parte') else None
+        except (TypeError, ValueError):
+            return jsonify({'message': 'tamanho e tamanho_parte devem ser inteiros (bytes)'}), 400
+        
+        projeto_id, erro_projeto = projeto_destino_reimportacao(current_user)
+        if erro_projeto is not None:
+            return erro_projeto
+        
+        sessao = criar_sessao(
+            current_user.id, nome_arquivo, tamanho, tamanho_parte=tamanho_parte,
+            sha256=dados.get('sha256') or None, projeto_id=projeto_id
+        )
+        url_sessao = f"/api/upload-planilha/sessoes/{sessao.id}"
+        return jsonify(sessao.to_dict(partes_recebidas=[])), 201, {'Location': url_sessao}
+    
+    except ErroSessaoUpload as e:
+        return resposta_erro_sessao(e)
+    
+    except Exception as e:
+        db.session.rollback()
+        exception_log(f"Erro ao criar sessão de upload: {str(e)}")
+        return jsonify({'message': 'Erro interno do servidor. Tente novamente mais tarde.'}), 500
+
+@upload_bp.route('/upload-planilha/sessoes/<sessao_id>', methods=['GET'])
+@token_required
+def obter_sessao_upload_status(current_user, sessao_id):
+    """Endpoint para consultar uma sessão de upload (partes recebidas/pendentes, para retomar o envio)"""
+    try:
+        sessao, erro = obter_sessao_upload(current_user, sessao_id)
+        if erro is not None:
+            return erro
+        return jsonify(sessao.to_dict(partes_recebidas(sessao))), 200
+    
+    except Exception as e:
+        exception_log(f"Erro ao consultar sessão de upload: {str(e)}")
+        return jsonify({'message': 'Erro ao consultar sessão de upload'}), 500
+
+@upload_bp.route('/upload-planilha/sessoes/<sessao_id>/partes/<int:numero>', methods=['PUT'])
+@token_required
+def enviar_parte_upload(current_user, sessao_id, numero):
+    """
+    Endpoint para enviar uma parte (corpo binário da requisição, numeração a partir de 1).
+
+    O SHA256 da parte vai no cabeçalho X-Parte-SHA256; reenviar uma parte a substitui.
+    """
+    try:
+        sessao, erro = obter_sessao_upload(current_user, sessao_id)
+        if erro is not None:
+            return erro
+        
+        # Cada requisição transporta no máximo uma parte
+        request.max_content_length = sessao.tamanho_parte
+        gravar_parte(
+            sessao, numero, request.stream, request.content_length, request.headers.get('X-Parte-SHA256')
+        )
+        recebidas = partes_recebidas(sessao)
+        return jsonify({
+            'sessao_id': sessao.id,
+            'parte': numero,
+            'partes_recebidas': len(recebidas),
+            'total_partes': sessao.total_partes
+        }), 200
+    
+    except ErroSessaoUpload as e:
+        return resposta_erro_sessao(e)
+    
+    except RequestEntityTooLarge:
+        return jsonify({'message': f'A parte excede o tamanho_parte da sessão ({sessao.tamanho_parte} bytes)'}), 413
+    
+    except Exception as e:
+        exception_log(f"Erro ao gravar parte do upload: {str(e)}")
+        return jsonify({'message': 'Erro ao gravar parte do upload. Reenvie a parte.'}), 500
+
+@upload_bp.route('/upload-planilha/sessoes/<sessao_id>/finalizar', methods=['POST'])
+@token_required
+def finalizar_sessao_upload(current_user, sessao_id):
+    """Endpoint para montar o arquivo a partir das partes e enfileirar o processamento (resposta 202 com job_id)"""
+    try:
+        sessao, erro = obter_sessao_upload(current_user, sessao_id)
+        if erro is not None:
+            return erro
+        
+        job_id = finalizar_sessao(sessao)
+        status_url = f"/api/upload-planilha/jobs/{job_id}"
+        return jsonify({
+            'message': 'Planilha recebida e enfileirada para processamento',
+            'sessao_id': sessao.id,
+            'job_id': job_id,
+            'status': db.session.get(JobProcessamento, job_id).status,
+            'status_url': status_url
+        }), 202, {'Location': status_url}
+    
+    except ErroSessaoUpload as e:
+        return resposta_erro_sessao(e)
+    
+    except Exception as e:
+        exception_log(f"Erro ao finalizar sessão de upload: {str(e)}")
+        return jsonify({'message': 'Erro interno do servidor. Tente novamente mais tarde.'}), 500
+
+@upload_bp.route('/upload-planilha/sessoes/<sessao_id>', methods=['DELETE'])
+@token_required
+def cancelar_sessao_upload(current_user, sessao_id):
+    """Endpoint para cancelar uma sessão de upload e descartar as partes recebidas"""
+    try:
+        sessao, erro = obter_sessao_upload(current_user, sessao_id)
+        if erro is not None:
+            return erro
+        
+        cancelar_sessao(sessao)
+        return jsonify({'message': 'Sessão de upload cancelada'}), 200
+    
+    except ErroSessaoUpload as e:
+        return resposta_erro_sessao(e)
+    
+    except Exception as e:
+        db.session.rollback()
+        exception_log(f"Erro ao cancelar sessão de upload: {str(e)}")
+        return jsonify({'message': 'Erro ao cancelar sessão de upload'}), 500
+
+def valor_booleano_opcional(nome):
+    """Valor booleano de ?nome= ou do campo de formulário; None se não informado"""
+    valor = (request.args.get(nome) or request.form.get(nome) or '').strip().lower()
+    if not valor:
+        return None
+    return valor in ('1', 'true', 'sim', 'yes')
+
+@upload_bp.route('/upload-extrato', methods=['POST'])
+@token_required
+def upload_extrato(current_user):
+    """
+    Endpoint para importar um extrato bancário (CSV ou OFX no campo 'file') como lançamentos REALIZADOS.
+
+    Obrigatório: projeto_id. Opcionais: 'regras' (JSON com as regras de categoria, ver
+    services/importacao_extrato.py), agregar_mensal e async=1 (resposta 202 com job_id).
+    """
+    arquivo_armazenado = None
+    enfileirado = False
+    try:
+        # Extratos de vários anos podem ultrapassar o limite de uma planilha
+        request.max_content_length = MAX_TAMANHO_EXTRATO
+        
+        file = request.files.get('file')
+        if not file or not file.filename:
+            return jsonify({'message': 'Nenhum arquivo foi enviado'}), 400
+        
+        extensao = os.path.splitext(file.filename)[1].lower()
+        if extensao not in FORMATOS_EXTENSAO:
+            return jsonify({'message': 'Apenas extratos .csv, .txt, .ofx ou .qfx são aceitos'}), 400
+        
+        projeto_id, erro_projeto = projeto_destino_reimportacao(current_user)
+        if erro_projeto is not None:
+            return erro_projeto
+        if projeto_id is None:
+            return jsonify({'message': 'Informe o projeto_id do projeto que receberá o extrato'}), 400
+        
+        configuracao = carregar_configuracao(request.form.get('regras'))
+        agregar_mensal = valor_booleano_opcional('agregar_mensal')
+        filename = secure_filename(file.filename)
+        arquivo_armazenado = armazenar_upload(file)
+        arquivo_armazenado.manter()
+        arquivo_armazenado.close()
+        
+        if is_async_request():
+            job = fila_processamento.enfileirar(current_user.id, 'importar_extrato', {
+                'caminho_arquivo': arquivo_armazenado.caminho,
+                'filename': filename,
+                'hash_arquivo': arquivo_armazenado.hash_arquivo,
+                'projeto_id': projeto_id,
+                'formato': FORMATOS_EXTENSAO[extensao],
+                'configuracao': configuracao.to_dict(),
+                'agregar_mensal': agregar_mensal
+            })
+            enfileirado = True
+            status_url = f"/api/upload-planilha/jobs/{job.id}"
+            return jsonify({
+                'message': 'Extrato recebido e enfileirado para importação',
+                'job_id': job.id,
+                'status': job.status,
+                'status_url': status_url
+            }), 202, {'Location': status_url}
+        
+        resultado = importar_extrato(
+            arquivo_armazenado.caminho, projeto_id, current_user.id,
+            nome_arquivo=filename,
+            formato=FORMATOS_EXTENSAO[extensao],
+            configuracao=configuracao,
+            agregar_mensal=agregar_mensal,
+            hash_arquivo=arquivo_armazenado.hash_arquivo
+        )
+        db.session.add(LogSistema(
+            usuario_id=current_user.id,
+            acao='EXTRATO_IMPORTADO',
+            detalhes={
+                'filename': filename,
+                'projeto_id': projeto_id,
+                'importacao_id': resultado['importacao_id'],
+                'lancamentos_criados': resultado['lancamentos_criados']
+            }
+        ))
+        db.session.commit()
+        return jsonify(dict(resultado, message='Extrato importado com sucesso')), 201
+    
+    except ErroImportacaoExtrato as e:
+        return jsonify({'message': str(e), **e.detalhes}), e.status_http
+    
+    except RequestEntityTooLarge:
+        return jsonify({'message': f'Extrato muito grande. Máximo: {MAX_TAMANHO_EXTRATO // (1024 * 1024)}MB'}), 413
+    
+    except Exception as e:
+        db.session.rollback()
+        exception_log(f"Erro interno no endpoint de importação de extrato: {str(e)}")
+        return jsonify({'message': 'Erro ao importar extrato. Verifique o formato do arquivo e tente novamente.'}), 500
+    
+    finally:
+        # O extrato só é necessário durante a importação (o hash fica em importacoes_extrato)
+        if arquivo_armazenado is not None and not enfileirado:
+            arquivo_armazenado.descartar()
+
 @upload_bp.route('/validar-planilha', methods=['POST'])
 @token_required
 def validar_planilha(current_user):
-    """Endpoint para apenas validar uma planilha sem processar"""
+    """
+    Endpoint para apenas validar uma planilha sem processar.
+
+    Lê só os nomes das abas direto do corpo do upload em memória (sem arquivo temporário).
+    Com ?preview=1, também extrai os parâmetros gerais para pré-visualização (lê a planilha).
+    """
     
     try:
         if 'file' not in request.files:
@@ -263,42 +680,33 @@ def validar_planilha(current_user):
         if not allowed_file(file.filename):
             return jsonify({'message': 'Apenas arquivos Excel (.xlsx, .xls) são aceitos'}), 400
         
-        # Validar tamanho do arquivo ANTES de salvar
+        # Validar tamanho do arquivo
         is_valid_size, size_error = validate_file_size(file)
         if not is_valid_size:
             return jsonify({'message': size_error}), 400
         
-        # Salvar arquivo temporariamente com nome único
         filename = secure_filename(file.filename)
-        import uuid
-        unique_id = str(uuid.uuid4())
-        temp_path = os.path.join(tempfile.gettempdir(), f"habitus_{unique_id}.xlsx")
-        
-        file.save(temp_path)
-        
         try:
-            # Apenas validar
-            processador = ProcessadorPlanilhaHabitusForecast()
-            validacao = processador.validar_planilha(temp_path)
-            
-            if validacao['valido']:
-                # Tentar extrair parâmetros para preview
-                try:
-                    parametros = processador.extrair_parametros_gerais(temp_path)
-                    validacao['preview_parametros'] = parametros
-                except Exception as e:
-                    debug_log(f"Erro ao extrair parâmetros: {str(e)}")
-                    pass
-            
+            validacao = validar_cabecalho(file.stream)
+        except PlanilhaIlegivel as e:
             return jsonify({
-                'validacao': validacao,
+                'validacao': {'valido': False, 'erro': f'Erro ao ler planilha: {str(e)}'},
                 'filename': filename
             })
-            
-        finally:
-            # Limpar arquivo temporário
-            if os.path.exists(temp_path):
-                os.unlink(temp_path)
+        
+        if validacao['valido'] and request.args.get('preview', '').lower() in ('1', 'true'):
+            # Pré-visualização dos parâmetros gerais (abre a planilha a partir do conteúdo em memória)
+            try:
+                file.stream.seek(0)
+                with PlanilhaCarregada(filename, conteudo=file.stream.read()) as planilha:
+                    validacao['preview_parametros'] = ProcessadorPlanilhaHabitusForecast().extrair_parametros_gerais(planilha)
+            except Exception as e:
+                debug_log(f"Erro ao extrair parâmetros: {str(e)}")
+        
+        return jsonify({
+            'validacao': validacao,
+            'filename': filename
+        })
     
     except Exception as e:
         exception_log(f"Erro no endpoint de validação: {str(e)}")
@@ -393,8 +801,6 @@ def download_upload_file(current_user, upload_id):
 def delete_upload_file(current_user, upload_id):
     """Endpoint para deletar upload e arquivo"""
     try:
-        from src.models.user import LancamentoFinanceiro, Cenario
-        
         upload_record = ArquivoUpload.query.get(upload_id)
         if not upload_record:
             return jsonify({'message': 'Upload não encontrado'}), 404
@@ -404,40 +810,15 @@ def delete_upload_file(current_user, upload_id):
         if not projeto or projeto.usuario_id != current_user.id:
             return jsonify({'message': 'Acesso negado'}), 403
         
-        # Deletar apenas os lançamentos financeiros relacionados ao arquivo específico
-        # Buscar cenários que foram criados por este arquivo específico
-        cenarios_do_arquivo = Cenario.query.filter_by(projeto_id=projeto.id).all()
-        lancamentos_deletados = 0
-        cenarios_deletados = 0
-        
-        for cenario in cenarios_do_arquivo:
-            # Verificar se este cenário foi criado por este arquivo específico
-            # (assumindo que cada upload cria um cenário com nome único baseado no arquivo)
-            lancamentos = LancamentoFinanceiro.query.filter_by(cenario_id=cenario.id).all()
-            for lancamento in lancamentos:
-                db.session.delete(lancamento)
-                lancamentos_deletados += 1
-            
-            # Deletar o cenário
-            db.session.delete(cenario)
-            cenarios_deletados += 1
-        
-        # Verificar se ainda há outros arquivos no projeto
-        outros_arquivos = ArquivoUpload.query.filter_by(projeto_id=projeto.id).filter(ArquivoUpload.id != upload_id).all()
-        
-        # Se não há outros arquivos, deletar o projeto também
-        if not outros_arquivos:
-            db.session.delete(projeto)
-        
-        # Deletar arquivo físico se existir
-        if os.path.exists(upload_record.caminho_storage):
-            os.remove(upload_record.caminho_storage)
-        
-        # Deletar registro do banco
-        db.session.delete(upload_record)
+        # Cenários e lançamentos do projeto (e o projeto, se não há outros arquivos) são
+        # excluídos com alguns DELETEs em conjunto, sem carregar as linhas
+        exclusao = excluir_upload(upload_record)
         db.session.commit()
         
-        debug_log(f"Upload {upload_id} deletado com sucesso - {lancamentos_deletados} lançamentos e {cenarios_deletados} cenários removidos")
+        # Deletar arquivo físico se existir (reprocessamentos compartilham o mesmo arquivo armazenado)
+        exclusao.remover_arquivos()
+        
+        debug_log(f"Upload {upload_id} deletado com sucesso - {exclusao.contagem.get('lancamentos', 0)} lançamentos e {exclusao.contagem.get('cenarios', 0)} cenários removidos")
         
         return jsonify({'message': 'Upload deletado com sucesso'}), 200
         
@@ -447,6 +828,50 @@ def delete_upload_file(current_user, upload_id):
         return jsonify({'message': 'Erro ao deletar upload'}), 500
 
 
+@upload_bp.route('/uploads/<int:upload_id>/reprocessar', methods=['POST'])
+@token_required
+def reprocessar_upload(current_user, upload_id):
+    """Endpoint para gerar um novo projeto a partir de um upload anterior (configurações de cenários atuais)"""
+    try:
+        upload_record = ArquivoUpload.query.get(upload_id)
+        if not upload_record:
+            return jsonify({'message': 'Upload não encontrado'}), 404
+        
+        projeto = Projeto.query.get(upload_record.projeto_id)
+        if not projeto or projeto.usuario_id != current_user.id:
+            return jsonify({'message': 'Acesso negado'}), 403
+        
+        processador = ProcessadorPlanilhaHabitusForecast()
+        resultado = processador.reprocessar_arquivo(upload_record, current_user.id)
+        
+        log = LogSistema(
+            usuario_id=current_user.id,
+            acao='PLANILHA_REPROCESSADA',
+            detalhes={
+                'upload_id': upload_id,
+                'projeto_id': resultado.get('projeto_id'),
+                'lancamentos_criados': resultado.get('lancamentos_criados', 0),
+                'extracao_em_cache': resultado.get('extracao_em_cache')
+            }
+        )
+        db.session.add(log)
+        db.session.commit()
+        
+        return jsonify({
+            'message': 'Planilha reprocessada com sucesso',
+            'projeto_id': resultado['projeto_id'],
+            'lancamentos_criados': resultado['lancamentos_criados'],
+            'extracao_em_cache': resultado['extracao_em_cache']
+        }), 201
+    
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 409
+    
+    except Exception as e:
+        exception_log(f"Erro ao reprocessar upload: {str(e)}")
+        return jsonify({'message': 'Erro ao reprocessar planilha'}), 500
+
+
 @upload_bp.route('/uploads/<int:upload_id>/rename', methods=['PUT'])
 @token_required
 def rename_upload_file(current_user, upload_id):
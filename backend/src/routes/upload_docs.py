@@ -6,12 +6,21 @@ try:
     from flask_restx import reqparse
     from src.api_docs import upload_ns
     from src.schemas.upload_schema import (
-        upload_response_schema, validacao_schema, upload_history_item_schema
+        upload_response_schema, validacao_schema, upload_history_item_schema, sessao_upload_schema,
+        importacao_extrato_schema
     )
     
     # Parser para upload de arquivo
     upload_parser = reqparse.RequestParser()
     upload_parser.add_argument('file', location='files', type='file', required=True, help='Arquivo Excel (.xlsx ou .xls)')
+    upload_parser.add_argument('async', location='args', type=str, required=False, help='Processar em segundo plano (1/true) e retornar job_id')
+    upload_parser.add_argument('projeto_id', location='args', type=int, required=False, help='Reimportar a planilha neste projeto (grava apenas as diferenças)')
+    upload_parser.add_argument('Idempotency-Key', location='headers', type=str, required=False, help='Chave da operação: retentativas com a mesma chave recebem a resposta da primeira (ver services/idempotencia.py)')
+    
+    # Parser da validação rápida
+    validacao_parser = reqparse.RequestParser()
+    validacao_parser.add_argument('file', location='files', type='file', required=True, help='Arquivo Excel (.xlsx ou .xls)')
+    validacao_parser.add_argument('preview', location='args', type=str, required=False, help='Incluir preview dos parâmetros gerais (1/true); lê a planilha')
     
     @upload_ns.route('/upload-planilha')
     @upload_ns.doc('upload_planilha')
@@ -19,8 +28,14 @@ try:
         @upload_ns.doc(security='Bearer Auth')
         @upload_ns.expect(upload_parser)
         @upload_ns.marshal_with(upload_response_schema, code=201)
+        @upload_ns.response(200, 'Planilha reimportada no projeto (?projeto_id)')
+        @upload_ns.response(202, 'Planilha enfileirada (modo assíncrono)')
         @upload_ns.response(400, 'Arquivo inválido')
         @upload_ns.response(401, 'Não autenticado')
+        @upload_ns.response(403, 'Projeto de outro usuário')
+        @upload_ns.response(404, 'Projeto não encontrado')
+        @upload_ns.response(409, 'Requisição com a mesma Idempotency-Key ainda em processamento')
+        @upload_ns.response(422, 'Idempotency-Key já usada em outra requisição')
         def post(self):
             """
             Upload e processamento de planilha Excel
@@ -32,6 +47,182 @@ try:
             
             Formatos aceitos: .xlsx, .xls
             Tamanho máximo: 16MB
+            
+            Com ?async=1 a planilha é apenas armazenada e enfileirada: a resposta
+            202 traz job_id e status_url para acompanhar o processamento.
+            
+            Com ?projeto_id=<id> (versão atualizada da mesma planilha), nenhum projeto é
+            criado: os lançamentos do cenário base (Realista) são comparados por
+            (categoria, data de competência, origem) e só as inserções, atualizações e
+            exclusões necessárias são gravadas. Cenários derivados acompanham o base;
+            ids do projeto/cenários e snapshots são preservados. A resposta traz o
+            resumo das alterações, também registrado no histórico de uploads.
+            
+            Com o cabeçalho Idempotency-Key, uma retentativa com a mesma chave (proxy,
+            rede) recebe a resposta da primeira requisição, com Idempotent-Replayed: true,
+            em vez de criar outro projeto; se a primeira ainda estiver em processamento,
+            a retentativa aguarda o resultado dela.
+            """
+            pass
+    
+    @upload_ns.route('/upload-planilha/jobs/<string:job_id>')
+    @upload_ns.doc('status_job_upload')
+    class StatusJobUpload(Resource):
+        @upload_ns.doc(security='Bearer Auth')
+        @upload_ns.response(403, 'Acesso negado')
+        @upload_ns.response(404, 'Job não encontrado')
+        def get(self, job_id):
+            """
+            Status de um upload assíncrono
+            
+            Retorna status (queued, running, done, error); quando concluído inclui
+            projeto_id e o resumo do processamento.
+            """
+            pass
+    
+    # Parsers das sessões de upload em partes
+    sessao_parser = reqparse.RequestParser()
+    sessao_parser.add_argument('nome_arquivo', location='json', type=str, required=True, help='Nome do arquivo (.xlsx ou .xls)')
+    sessao_parser.add_argument('tamanho', location='json', type=int, required=True, help='Tamanho total do arquivo em bytes')
+    sessao_parser.add_argument('tamanho_parte', location='json', type=int, required=False, help='Tamanho das partes (padrão e máximo: UPLOAD_SESSAO_TAMANHO_PARTE)')
+    sessao_parser.add_argument('sha256', location='json', type=str, required=False, help='SHA256 do arquivo completo, conferido na finalização')
+    sessao_parser.add_argument('projeto_id', location='json', type=int, required=False, help='Reimportar a planilha neste projeto')
+    
+    parte_parser = reqparse.RequestParser()
+    parte_parser.add_argument('X-Parte-SHA256', location='headers', type=str, required=True, help='SHA256 (hexadecimal) do conteúdo da parte')
+    
+    @upload_ns.route('/upload-planilha/sessoes')
+    @upload_ns.doc('criar_sessao_upload')
+    class SessoesUpload(Resource):
+        @upload_ns.doc(security='Bearer Auth')
+        @upload_ns.expect(sessao_parser)
+        @upload_ns.marshal_with(sessao_upload_schema, code=201)
+        @upload_ns.response(400, 'Parâmetros inválidos')
+        @upload_ns.response(404, 'Projeto não encontrado')
+        @upload_ns.response(413, 'Arquivo maior que UPLOAD_SESSAO_MAX_BYTES')
+        def post(self):
+            """
+            Abrir sessão de upload em partes
+            
+            Para planilhas grandes ou conexões lentas: o arquivo é enviado em partes
+            numeradas (PUT .../partes/<n>), cada uma em uma requisição, e a sessão é
+            finalizada com POST .../finalizar. Um envio interrompido é retomado
+            consultando a sessão (partes_pendentes) e reenviando só as partes que faltam.
+            
+            Limite: UPLOAD_SESSAO_MAX_BYTES por arquivo; a sessão expira após
+            UPLOAD_SESSAO_VALIDADE_HORAS.
+            """
+            pass
+    
+    @upload_ns.route('/upload-planilha/sessoes/<string:sessao_id>')
+    @upload_ns.doc('sessao_upload')
+    class SessaoUploadResource(Resource):
+        @upload_ns.doc(security='Bearer Auth')
+        @upload_ns.marshal_with(sessao_upload_schema)
+        @upload_ns.response(403, 'Acesso negado')
+        @upload_ns.response(404, 'Sessão não encontrada')
+        def get(self, sessao_id):
+            """Consultar sessão de upload (partes recebidas e pendentes)"""
+            pass
+        
+        @upload_ns.doc(security='Bearer Auth')
+        @upload_ns.response(200, 'Sessão cancelada e partes descartadas')
+        @upload_ns.response(409, 'Sessão já finalizada')
+        def delete(self, sessao_id):
+            """Cancelar sessão de upload"""
+            pass
+    
+    @upload_ns.route('/upload-planilha/sessoes/<string:sessao_id>/partes/<int:numero>')
+    @upload_ns.doc('enviar_parte_upload')
+    class ParteSessaoUpload(Resource):
+        @upload_ns.doc(security='Bearer Auth')
+        @upload_ns.expect(parte_parser)
+        @upload_ns.response(200, 'Parte gravada')
+        @upload_ns.response(400, 'Número da parte ou Content-Length inválido')
+        @upload_ns.response(409, 'Sessão não está aberta')
+        @upload_ns.response(410, 'Sessão expirada')
+        @upload_ns.response(413, 'Parte maior que tamanho_parte')
+        @upload_ns.response(422, 'SHA256 da parte não confere')
+        def put(self, sessao_id, numero):
+            """
+            Enviar uma parte
+            
+            Corpo binário (application/octet-stream) com exatamente tamanho_parte bytes
+            (a última parte leva o restante). Reenviar uma parte a substitui.
+            """
+            pass
+    
+    @upload_ns.route('/upload-planilha/sessoes/<string:sessao_id>/finalizar')
+    @upload_ns.doc('finalizar_sessao_upload')
+    class FinalizarSessaoUpload(Resource):
+        @upload_ns.doc(security='Bearer Auth')
+        @upload_ns.response(202, 'Planilha enfileirada (job_id e status_url)')
+        @upload_ns.response(409, 'Partes pendentes ou sessão não aberta')
+        @upload_ns.response(422, 'Arquivo montado inválido (tamanho, SHA256 ou formato)')
+        def post(self, sessao_id):
+            """
+            Finalizar sessão de upload
+            
+            Monta o arquivo a partir das partes e enfileira o processamento, como no
+            upload com ?async=1 (ou a reimportação, se a sessão tem projeto_id).
+            Finalizar de novo devolve o mesmo job.
+            """
+            pass
+    
+    # Parser para upload em lote
+    lote_parser = reqparse.RequestParser()
+    lote_parser.add_argument('file', location='files', type='file', required=False, help='Arquivo .zip com as planilhas')
+    lote_parser.add_argument('files', location='files', type='file', required=False, action='append', help='Planilhas Excel (.xlsx ou .xls)')
+    
+    @upload_ns.route('/upload-planilha/lote')
+    @upload_ns.doc('upload_planilhas_lote')
+    class UploadPlanilhasLote(Resource):
+        @upload_ns.doc(security='Bearer Auth')
+        @upload_ns.expect(lote_parser)
+        @upload_ns.response(200, 'Manifesto com o resultado de cada planilha')
+        @upload_ns.response(400, 'Lote inválido ou nenhuma planilha processada')
+        @upload_ns.response(401, 'Não autenticado')
+        def post(self):
+            """
+            Upload de várias planilhas de uma vez
+            
+            Aceita um ZIP no campo "file" ou várias planilhas no campo "files".
+            As planilhas são lidas em paralelo e cada uma gera seu próprio projeto
+            (uma transação por planilha). A resposta lista o resultado de cada arquivo.
+            
+            Limites: UPLOAD_LOTE_MAX_ARQUIVOS planilhas e UPLOAD_LOTE_MAX_BYTES por lote
+            """
+            pass
+    
+    # Parser da importação de extratos bancários
+    extrato_parser = reqparse.RequestParser()
+    extrato_parser.add_argument('file', location='files', type='file', required=True, help='Extrato .csv/.txt ou .ofx/.qfx')
+    extrato_parser.add_argument('projeto_id', location='form', type=int, required=True, help='Projeto que recebe os lançamentos')
+    extrato_parser.add_argument('regras', location='form', type=str, required=False, help='JSON com as regras de categoria (padrão: EXTRATO_REGRAS_CATEGORIAS)')
+    extrato_parser.add_argument('agregar_mensal', location='form', type=str, required=False, help='Somar por categoria e mês (padrão: EXTRATO_AGREGAR_MENSAL)')
+    extrato_parser.add_argument('async', location='args', type=str, required=False, help='Importar em segundo plano (1/true) e retornar job_id')
+    
+    @upload_ns.route('/upload-extrato')
+    @upload_ns.doc('upload_extrato')
+    class UploadExtrato(Resource):
+        @upload_ns.doc(security='Bearer Auth')
+        @upload_ns.expect(extrato_parser)
+        @upload_ns.marshal_with(importacao_extrato_schema, code=201)
+        @upload_ns.response(202, 'Extrato enfileirado (job_id e status_url)')
+        @upload_ns.response(400, 'Arquivo, cabeçalho do CSV ou regras inválidos')
+        @upload_ns.response(409, 'Extrato já importado no projeto')
+        @upload_ns.response(413, 'Extrato maior que EXTRATO_MAX_BYTES')
+        def post(self):
+            """
+            Importar extrato bancário (CSV/OFX) como lançamentos REALIZADOS
+            
+            O extrato é lido em streaming e gravado em lotes no cenário base do projeto.
+            A categoria de cada transação vem das regras de descrição, por exemplo
+            [{"padrao": "PIX RECEBIDO", "categoria": "FATURAMENTO"},
+             {"padrao": "re:^TAR(IFA)?\\b", "categoria": "CUSTOS DE TRANSAÇÕES"}];
+            transações sem regra vão para a categoria padrão (NÃO CATEGORIZADO).
+            Com agregar_mensal, as transações são somadas por categoria e mês.
+            O mesmo arquivo não é importado duas vezes no projeto.
             """
             pass
     
@@ -39,14 +230,16 @@ try:
     @upload_ns.doc('validar_planilha')
     class ValidarPlanilha(Resource):
         @upload_ns.doc(security='Bearer Auth')
-        @upload_ns.expect(upload_parser)
+        @upload_ns.expect(validacao_parser)
         @upload_ns.marshal_with(validacao_schema)
         def post(self):
             """
             Validar planilha sem processar
             
-            Valida estrutura e formato da planilha sem criar dados no banco.
-            Útil para preview antes do upload definitivo.
+            Validação rápida: lê apenas os nomes das abas (xl/workbook.xml no .xlsx,
+            registros BOUNDSHEET no .xls) do upload em memória e detecta o layout,
+            sem arquivo temporário nem criação de dados no banco.
+            Com ?preview=1, também retorna os parâmetros gerais da planilha.
             """
             pass
     
@@ -86,6 +279,22 @@ try:
     rename_parser = reqparse.RequestParser()
     rename_parser.add_argument('nome', type=str, required=True, help='Novo nome do arquivo')
     
+    @upload_ns.route('/uploads/<int:upload_id>/reprocessar')
+    @upload_ns.doc('reprocess_upload')
+    class ReprocessUpload(Resource):
+        @upload_ns.doc(security='Bearer Auth')
+        @upload_ns.response(201, 'Novo projeto criado')
+        @upload_ns.response(404, 'Upload não encontrado')
+        @upload_ns.response(409, 'Dados extraídos e arquivo original indisponíveis')
+        def post(self, upload_id):
+            """
+            Reprocessar upload anterior
+            
+            Cria um novo projeto a partir dos dados já extraídos da planilha (cache
+            por hash do conteúdo), aplicando as configurações de cenários atuais.
+            """
+            pass
+    
     @upload_ns.route('/uploads/<int:upload_id>/rename')
     @upload_ns.doc('rename_upload')
     class RenameUpload(Resource):
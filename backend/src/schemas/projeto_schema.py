@@ -40,6 +40,8 @@ cenario_schema = Model('Cenario', {
     'nome': fields.String(required=True, description='Nome do cenário'),
     'descricao': fields.String(description='Descrição do cenário'),
     'is_active': fields.Boolean(description='Cenário ativo'),
+    'cenario_base_id': fields.Integer(description='Cenário base (Realista) de um cenário derivado; null se o cenário tem lançamentos próprios'),
+    'percentual_variacao': fields.Float(description='Variação (%) aplicada às ENTRADAS projetadas do cenário base'),
     'created_at': fields.DateTime(description='Data de criação'),
 })
 
@@ -17,7 +17,39 @@ validacao_schema = Model('ValidacaoPlanilha', {
     'valido': fields.Boolean(required=True, description='Se a planilha é válida'),
     'erros': fields.List(fields.String, description='Lista de erros encontrados'),
     'avisos': fields.List(fields.String, description='Lista de avisos'),
-    'preview_parametros': fields.Raw(description='Preview dos parâmetros extraídos'),
+    'layout': fields.String(enum=['antigo', 'novo'], description='Layout detectado pelos nomes das abas'),
+    'formato': fields.String(enum=['xlsx', 'xls'], description='Formato do arquivo (pela assinatura)'),
+    'abas_encontradas': fields.List(fields.String, description='Nomes das abas'),
+    'preview_parametros': fields.Raw(description='Preview dos parâmetros extraídos (apenas com ?preview=1)'),
+})
+
+# Schema de sessão de upload em partes
+sessao_upload_schema = Model('SessaoUpload', {
+    'sessao_id': fields.String(required=True, description='ID da sessão'),
+    'nome_arquivo': fields.String(description='Nome do arquivo'),
+    'tamanho': fields.Integer(description='Tamanho total do arquivo (bytes)'),
+    'tamanho_parte': fields.Integer(description='Tamanho de cada parte (bytes), exceto a última'),
+    'total_partes': fields.Integer(description='Número de partes (numeradas a partir de 1)'),
+    'projeto_id': fields.Integer(description='Projeto de destino da reimportação'),
+    'status': fields.String(enum=['aberta', 'finalizando', 'finalizada', 'cancelada', 'expirada'], description='Status da sessão'),
+    'job_id': fields.String(description='Job de processamento (após a finalização)'),
+    'partes_recebidas': fields.List(fields.Integer, description='Partes já recebidas e conferidas'),
+    'partes_pendentes': fields.List(fields.Integer, description='Partes que faltam enviar'),
+    'created_at': fields.DateTime(description='Data de criação'),
+    'expira_em': fields.DateTime(description='Prazo para finalizar a sessão'),
+})
+
+importacao_extrato_schema = Model('ImportacaoExtrato', {
+    'importacao_id': fields.Integer(required=True, description='ID da importação'),
+    'projeto_id': fields.Integer(description='Projeto que recebeu os lançamentos'),
+    'cenario_id': fields.Integer(description='Cenário base que recebeu os lançamentos'),
+    'nome_arquivo': fields.String(description='Nome do extrato'),
+    'formato': fields.String(enum=['csv', 'ofx'], description='Formato do extrato'),
+    'agregacao_mensal': fields.Boolean(description='Transações somadas por categoria e mês'),
+    'transacoes_lidas': fields.Integer(description='Transações válidas do extrato'),
+    'lancamentos_criados': fields.Integer(description='Lançamentos REALIZADOS gravados'),
+    'relatorio': fields.Raw(description='Período, totais por categoria, linhas ignoradas e descrições sem regra'),
+    'created_at': fields.DateTime(description='Data da importação'),
 })
 
 # Schema de histórico de uploads
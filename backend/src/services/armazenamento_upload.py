@@ -0,0 +1,142 @@
+"""
+Gravação de uploads de planilhas direto no armazenamento definitivo.
+
+O corpo multipart é gravado uma única vez, já em src/uploads, enquanto o
+SHA256, o tamanho e a assinatura (primeiros bytes) são calculados sobre os
+mesmos blocos. Assim não há arquivo temporário, nem cópia entre sistemas de
+arquivos (shutil.move), nem releitura do arquivo para calcular o hash.
+"""
+import hashlib
+import os
+import uuid
+from io import BytesIO
+from typing import List, Optional
+
+from flask import Request
+from werkzeug.utils import secure_filename
+
+UPLOAD_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'uploads')
+
+# Assinaturas conhecidas de arquivos Excel
+ASSINATURAS_EXCEL = (
+    b'\x50\x4B\x03\x04',  # ZIP (XLSX é um ZIP)
+    b'\xD0\xCF\x11\xE0',  # OLE2 (XLS antigo)
+)
+TAMANHO_CABECALHO = 8
+
+EXTENSOES_EXCEL = ('.xlsx', '.xls')
+EXTENSOES_EXTRATO = ('.csv', '.txt', '.ofx', '.qfx')
+# Endpoints cujos arquivos (com as extensões indicadas) são gravados diretamente no armazenamento definitivo
+ENDPOINTS_GRAVACAO_DIRETA = {
+    'upload.upload_planilha': EXTENSOES_EXCEL,
+    'upload.upload_planilhas_lote': EXTENSOES_EXCEL,
+    'upload.upload_extrato': EXTENSOES_EXTRATO,
+}
+# Endpoints que só leem o cabeçalho do arquivo: o corpo fica em memória (limitado por MAX_CONTENT_LENGTH),
+# sem o arquivo temporário que o Werkzeug cria para arquivos grandes
+ENDPOINTS_EM_MEMORIA = {'upload.validar_planilha'}
+
+
+def caminho_definitivo(filename: Optional[str]) -> str:
+    """Caminho único em src/uploads para o arquivo enviado ('<uuid>_<nome seguro>')"""
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    nome_seguro = secure_filename(filename or '') or 'planilha.xlsx'
+    return os.path.join(UPLOAD_DIR, f"{uuid.uuid4()}_{nome_seguro}")
+
+
+class ArquivoEmArmazenamento:
+    """
+    Destino de escrita de um arquivo do upload, já no caminho definitivo.
+
+    Calcula SHA256, tamanho e cabeçalho durante a escrita. Também é legível e
+    posicionável, como exige o parser multipart do Werkzeug. Arquivos não
+    confirmados com manter() são removidos ao fim da requisição.
+    """
+
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+        self._arquivo = open(caminho, 'w+b')
+        self._sha256 = hashlib.sha256()
+        self.tamanho = 0
+        self.cabecalho = b''
+        self.mantido = False
+
+    def write(self, dados: bytes) -> int:
+        if len(self.cabecalho) < TAMANHO_CABECALHO:
+            self.cabecalho += bytes(dados[:TAMANHO_CABECALHO - len(self.cabecalho)])
+        self._sha256.update(dados)
+        self.tamanho += len(dados)
+        return self._arquivo.write(dados)
+
+    @property
+    def hash_arquivo(self) -> str:
+        return self._sha256.hexdigest()
+
+    @property
+    def assinatura_excel(self) -> bool:
+        return any(self.cabecalho.startswith(assinatura) for assinatura in ASSINATURAS_EXCEL)
+
+    def manter(self):
+        """Confirma o arquivo no armazenamento (não será removido ao fim da requisição)"""
+        if not self._arquivo.closed:
+            self._arquivo.flush()
+        self.mantido = True
+
+    def descartar(self):
+        self.close()
+        if os.path.exists(self.caminho):
+            os.remove(self.caminho)
+
+    def close(self):
+        if not self._arquivo.closed:
+            self._arquivo.close()
+
+    def __getattr__(self, nome):
+        # read, readline, seek, tell, flush... vão direto para o arquivo em disco
+        return getattr(self._arquivo, nome)
+
+
+class RequestUploadDireto(Request):
+    """Request que grava os arquivos dos endpoints de upload direto no armazenamento definitivo"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if self.endpoint in ENDPOINTS_EM_MEMORIA:
+            return BytesIO()
+        # Demais arquivos (ex.: ZIP do lote) seguem o fluxo padrão do Werkzeug (memória/arquivo temporário)
+        extensoes = ENDPOINTS_GRAVACAO_DIRETA.get(self.endpoint)
+        if not extensoes or not (filename or '').lower().endswith(extensoes):
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+
+        destino = ArquivoEmArmazenamento(caminho_definitivo(filename))
+        self.arquivos_armazenados.append(destino)
+        return destino
+
+    @property
+    def arquivos_armazenados(self) -> List[ArquivoEmArmazenamento]:
+        if '_arquivos_armazenados' not in self.__dict__:
+            self.__dict__['_arquivos_armazenados'] = []
+        return self.__dict__['_arquivos_armazenados']
+
+    def close(self):
+        super().close()
+        for destino in self.arquivos_armazenados:
+            if not destino.mantido:
+                destino.descartar()
+
+
+def armazenar_upload(file) -> ArquivoEmArmazenamento:
+    """
+    Retorna o arquivo do upload já no armazenamento definitivo.
+
+    Se o request não usou RequestUploadDireto (ex.: outro endpoint), copia o
+    conteúdo uma única vez para o destino, calculando hash e cabeçalho no caminho.
+    """
+    if isinstance(file.stream, ArquivoEmArmazenamento):
+        return file.stream
+
+    destino = ArquivoEmArmazenamento(caminho_definitivo(file.filename))
+    file.stream.seek(0)
+    for bloco in iter(lambda: file.stream.read(1024 * 1024), b''):
+        destino.write(bloco)
+    destino.seek(0)
+    return destino
@@ -0,0 +1,155 @@
+"""
+Cache persistente das extrações de planilhas, indexado pelo SHA256 do conteúdo.
+
+A extração (validação, parâmetros gerais, indicadores, séries mensais da
+Habitus Foreca$t e FDC-REAL) é gravada em uma representação JSON compacta.
+Uploads idênticos reutilizam essa representação sem abrir o Excel, e projetos
+podem ser gerados novamente a partir dela (ex.: após mudar os percentuais dos
+cenários) sem o .xlsx original.
+"""
+import math
+from datetime import date, datetime
+from itertools import groupby
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import delete, select
+
+from src.models.user import db, ExtracaoPlanilha
+
+# Incrementar sempre que a lógica de extração ou o formato abaixo mudarem:
+# entradas gravadas com outra versão são ignoradas e a planilha é lida de novo
+VERSAO_EXTRACAO = 1
+
+
+def _valor_json(valor: Any) -> Any:
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    if isinstance(valor, float) and not math.isfinite(valor):
+        return None
+    return valor
+
+
+def _data(valor: str) -> date:
+    return date.fromisoformat(valor)
+
+
+def _chave_serie(dado: Dict[str, Any]):
+    return (dado['categoria_nome'], dado['tipo_fluxo'], dado['tipo'], dado['origem'])
+
+
+def serializar_extracao(extracao: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Converte a extração em JSON compacto.
+
+    Os lançamentos são agrupados em séries consecutivas de mesma categoria/tipo/origem,
+    guardando apenas pares [data, valor] (a ordem original é preservada).
+    """
+    series = []
+    for (categoria_nome, tipo_fluxo, tipo, origem), dados in groupby(extracao['dados_habitus_forecast'], key=_chave_serie):
+        series.append([
+            categoria_nome, tipo_fluxo, tipo, origem,
+            [[dado['data_competencia'].isoformat(), dado['valor']] for dado in dados]
+        ])
+
+    return {
+        'validacao': extracao['validacao'],
+        'parametros': {chave: _valor_json(valor) for chave, valor in extracao['parametros'].items()},
+        'indicadores': {chave: _valor_json(valor) for chave, valor in extracao['indicadores'].items()},
+        'series': series,
+        'fdc_real': [
+            [dado['data_competencia'].isoformat(), dado['valor'], dado['tipo']]
+            for dado in extracao['dados_fdc_real']
+        ]
+    }
+
+
+def desserializar_extracao(dados: Dict[str, Any]) -> Dict[str, Any]:
+    """Reconstrói a extração no mesmo formato produzido pelo processador"""
+    parametros = dict(dados['parametros'])
+    if isinstance(parametros.get('data_base'), str):
+        parametros['data_base'] = _data(parametros['data_base'])
+
+    dados_habitus_forecast: List[Dict[str, Any]] = []
+    for categoria_nome, tipo_fluxo, tipo, origem, valores in dados['series']:
+        for data_competencia, valor in valores:
+            dados_habitus_forecast.append({
+                'categoria_nome': categoria_nome,
+                'tipo_fluxo': tipo_fluxo,
+                'tipo': tipo,
+                'data_competencia': _data(data_competencia),
+                'valor': valor,
+                'origem': origem
+            })
+
+    dados_fdc_real = []
+    for data_competencia, valor, tipo in dados['fdc_real']:
+        data_fdc = _data(data_competencia)
+        dados_fdc_real.append({
+            'data_competencia': data_fdc,
+            'valor': valor,
+            'tipo': tipo,
+            'origem': 'REALIZADO',
+            'categoria': 'FDC-REAL',
+            'descricao': f'Dados FDC-REAL - {data_fdc.strftime("%B %Y")}'
+        })
+
+    return {
+        'validacao': dados['validacao'],
+        'parametros': parametros,
+        'indicadores': {chave: (0.0 if valor is None else valor) for chave, valor in dados['indicadores'].items()},
+        'dados_habitus_forecast': dados_habitus_forecast,
+        'dados_fdc_real': dados_fdc_real
+    }
+
+
+class CacheExtracoes:
+    """Leitura e gravação das extrações na tabela extracoes_planilha"""
+
+    def obter(self, hash_arquivo: str) -> Optional[Dict[str, Any]]:
+        """Extração em cache para o hash informado, ou None se ausente/de versão anterior"""
+        tabela = ExtracaoPlanilha.__table__
+        with db.engine.connect() as conexao:
+            linha = conexao.execute(
+                select(tabela.c.versao, tabela.c.dados).where(tabela.c.hash_arquivo == hash_arquivo)
+            ).first()
+        if linha is None or linha.versao != VERSAO_EXTRACAO:
+            return None
+        return desserializar_extracao(linha.dados)
+
+    def salvar(self, hash_arquivo: str, extracao: Dict[str, Any]):
+        """
+        Grava a extração em uma transação curta e própria (independente da transação do upload).
+        Uploads simultâneos do mesmo arquivo gravam o mesmo conteúdo; prevalece a última gravação.
+        """
+        registro = {
+            'hash_arquivo': hash_arquivo,
+            'versao': VERSAO_EXTRACAO,
+            'dados': serializar_extracao(extracao),
+            'created_at': datetime.utcnow()
+        }
+        tabela = ExtracaoPlanilha.__table__
+        with db.engine.begin() as conexao:
+            dialeto = conexao.dialect.name
+            if dialeto == 'postgresql':
+                from sqlalchemy.dialects.postgresql import insert as dialect_insert
+            elif dialeto == 'sqlite':
+                from sqlalchemy.dialects.sqlite import insert as dialect_insert
+            else:
+                dialect_insert = None
+
+            if dialect_insert is not None:
+                comando = dialect_insert(tabela).values(**registro)
+                conexao.execute(comando.on_conflict_do_update(
+                    index_elements=['hash_arquivo'],
+                    set_={
+                        'versao': comando.excluded.versao,
+                        'dados': comando.excluded.dados,
+                        'created_at': comando.excluded.created_at
+                    }
+                ))
+            else:
+                conexao.execute(delete(tabela).where(tabela.c.hash_arquivo == hash_arquivo))
+                conexao.execute(tabela.insert().values(**registro))
+
+
+cache_extracoes = CacheExtracoes()
@@ -0,0 +1,192 @@
+"""
+Cenários derivados (Pessimista/Otimista/Agressivo) sem cópia de lançamentos.
+
+Um cenário derivado guarda apenas o cenário base (Realista) e o percentual de
+variação. Seus lançamentos são os do cenário base, com as ENTRADAS projetadas
+multiplicadas por `1 + percentual/100` (SAÍDAS e lançamentos REALIZADOS, como
+o FDC-REAL, permanecem iguais). Os valores são calculados na leitura. O
+cenário só ganha linhas próprias (materialização) quando seus lançamentos são
+editados, ou antes que os lançamentos do cenário base sejam editados, excluídos
+ou restaurados de um snapshot: uma alteração manual vale só para o cenário em
+que foi feita. A reimportação da planilha e os extratos bancários atualizam o
+cenário base e, com ele, os derivados ativos; os congelados são materializados
+antes e não mudam.
+
+Os totais mensais (resumo_do_cenario) vêm do resumo mensal do próprio cenário:
+o de um derivado é somado a partir dos lançamentos do base já ajustados, um a
+um, e acompanha o base (ver services/resumo_mensal.py), de modo que os totais
+batem com a soma dos lançamentos listados.
+"""
+from datetime import date
+from decimal import Decimal
+from typing import Dict, List, Optional, Sequence
+
+from sqlalchemy import insert
+
+from src.models.user import db, Cenario, LancamentoFinanceiro
+from src.services.resumo_mensal import ajustar_valor, consultar_resumo, fator_variacao, recalcular_resumo
+
+
+def e_virtual(cenario: Cenario) -> bool:
+    return cenario.cenario_base_id is not None
+
+
+def cenario_fonte_id(cenario: Cenario) -> int:
+    """Id do cenário cujas linhas de lançamento são lidas"""
+    return cenario.cenario_base_id if e_virtual(cenario) else cenario.id
+
+
+def multiplicador(cenario: Cenario) -> Decimal:
+    return fator_variacao(cenario.percentual_variacao)
+
+
+class LancamentoVirtual:
+    """Lançamento de um cenário derivado (somente leitura, mesmos atributos de LancamentoFinanceiro)"""
+
+    __slots__ = ('id', 'cenario_id', 'categoria_id', 'data_competencia', 'valor', 'tipo', 'origem')
+
+    def __init__(self, base: LancamentoFinanceiro, cenario_id: int, fator: Decimal):
+        # O id é o do lançamento base: é por ele que a edição localiza a linha ao materializar o cenário
+        self.id = base.id
+        self.cenario_id = cenario_id
+        self.categoria_id = base.categoria_id
+        self.data_competencia = base.data_competencia
+        self.tipo = base.tipo
+        self.origem = base.origem
+        self.valor = ajustar_valor(base.valor, base.tipo, base.origem, fator)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'cenario_id': self.cenario_id,
+            'categoria_id': self.categoria_id,
+            'data_competencia': self.data_competencia.isoformat() if self.data_competencia else None,
+            'valor': float(self.valor) if self.valor else 0,
+            'tipo': self.tipo,
+            'origem': self.origem
+        }
+
+
+class LinhaResumo:
+    """
+    Total mensal do cenário por categoria, tipo e origem. Tem os atributos usados nas
+    agregações de lançamentos (data_competencia é o primeiro dia do mês e valor é a
+    soma), além de quantidade e categoria_nome.
+    """
+
+    __slots__ = ('cenario_id', 'categoria_id', 'categoria_nome', 'data_competencia', 'tipo', 'origem',
+                 'valor', 'quantidade')
+
+    def __init__(self, linha, cenario_id: int):
+        self.cenario_id = cenario_id
+        self.categoria_id = linha.categoria_id
+        self.categoria_nome = linha.nome
+        self.data_competencia = linha.mes
+        self.tipo = linha.tipo
+        self.origem = linha.origem
+        self.quantidade = linha.quantidade
+        self.valor = Decimal(str(linha.total)) if linha.total is not None else Decimal(0)
+
+
+def resumo_do_cenario(cenario: Cenario, desde: Optional[date] = None) -> List[LinhaResumo]:
+    """Totais mensais do cenário (derivados também têm resumo próprio), a partir de `desde`"""
+    return [LinhaResumo(linha, cenario.id) for linha in consultar_resumo(cenario.id, desde)]
+
+
+def contar_lancamentos(linhas: Sequence[LinhaResumo]) -> int:
+    return sum(linha.quantidade for linha in linhas)
+
+
+def consultar_lancamentos(cenario: Cenario):
+    """Query das linhas que compõem o cenário (as do cenário base, se for derivado); use com aplicar_cenario"""
+    return LancamentoFinanceiro.query.filter_by(cenario_id=cenario_fonte_id(cenario))
+
+
+def aplicar_cenario(cenario: Cenario, lancamentos: Sequence[LancamentoFinanceiro]) -> List:
+    """Converte as linhas lidas via consultar_lancamentos nos lançamentos do cenário"""
+    if not e_virtual(cenario):
+        return list(lancamentos)
+    fator = multiplicador(cenario)
+    return [LancamentoVirtual(lancamento, cenario.id, fator) for lancamento in lancamentos]
+
+
+def lancamentos_do_cenario(cenario: Cenario) -> List:
+    return aplicar_cenario(cenario, consultar_lancamentos(cenario).all())
+
+
+def materializar_cenario(cenario: Cenario, copiar_lancamentos: bool = True) -> Dict[int, int]:
+    """
+    Grava linhas próprias para um cenário derivado e o desvincula do cenário base.
+
+    Retorna o mapa id do lançamento base -> id da nova linha. Com copiar_lancamentos=False
+    o cenário apenas fica vazio e independente (ex.: antes de restaurar um snapshot).
+    """
+    if not e_virtual(cenario):
+        return {}
+
+    mapa_ids = {}
+    if copiar_lancamentos:
+        base = consultar_lancamentos(cenario).order_by(LancamentoFinanceiro.id).all()
+        lancamentos = aplicar_cenario(cenario, base)
+        if lancamentos:
+            novos_ids = db.session.execute(
+                insert(LancamentoFinanceiro).returning(LancamentoFinanceiro.id, sort_by_parameter_order=True),
+                [{
+                    'cenario_id': cenario.id,
+                    'categoria_id': lancamento.categoria_id,
+                    'data_competencia': lancamento.data_competencia,
+                    'valor': lancamento.valor,
+                    'tipo': lancamento.tipo,
+                    'origem': lancamento.origem
+                } for lancamento in lancamentos]
+            ).scalars().all()
+            mapa_ids = {lancamento.id: novo_id for lancamento, novo_id in zip(lancamentos, novos_ids)}
+
+    cenario.cenario_base_id = None
+    cenario.percentual_variacao = None
+    db.session.flush()
+    # O resumo do derivado já somava esses valores; recalculá-lo das linhas próprias o corrige se estiver defasado
+    recalcular_resumo(cenario.id)
+    return mapa_ids
+
+
+def materializar_derivados(cenario: Cenario, apenas_congelados: bool = False):
+    """
+    Materializa os cenários derivados de `cenario` com os valores atuais, antes que as linhas dele
+    mudem ou sejam excluídas. Com apenas_congelados=True os derivados ativos continuam acompanhando
+    o cenário base (reimportação da planilha e extratos)
+    """
+    consulta = Cenario.query.filter_by(cenario_base_id=cenario.id)
+    if apenas_congelados:
+        consulta = consulta.filter_by(is_active=False)
+    for derivado in consulta.order_by(Cenario.id).all():
+        materializar_cenario(derivado)
+
+
+def preparar_alteracao(cenario: Cenario):
+    """
+    Antes de alterar os lançamentos do cenário: um derivado ganha linhas próprias e os derivados de
+    um cenário base são materializados, para que a alteração não chegue a outros cenários
+    """
+    if e_virtual(cenario):
+        materializar_cenario(cenario)
+    else:
+        materializar_derivados(cenario)
+
+
+def buscar_lancamento(cenario: Cenario, lancamento_id: int):
+    """Lançamento do cenário pelo id (em cenários derivados, o id do lançamento base), ou 404"""
+    lancamento = consultar_lancamentos(cenario).filter_by(id=lancamento_id).first_or_404()
+    return aplicar_cenario(cenario, [lancamento])[0]
+
+
+def lancamento_editavel(cenario: Cenario, lancamento) -> LancamentoFinanceiro:
+    """
+    Garante uma linha própria para editar: materializa o cenário derivado e retorna a cópia do
+    lançamento; em um cenário base, materializa antes os derivados dele
+    """
+    if not e_virtual(cenario):
+        materializar_derivados(cenario)
+        return lancamento
+    mapa_ids = materializar_cenario(cenario)
+    return db.session.get(LancamentoFinanceiro, mapa_ids[lancamento.id])
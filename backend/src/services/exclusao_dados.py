@@ -0,0 +1,181 @@
+"""
+Exclusão de cenários, projetos, uploads e usuários com DELETEs em conjunto.
+
+Em vez de carregar cada cenário e cada lançamento e excluí-los um a um pelo
+cascade do ORM (milhares de comandos para um projeto com anos de dados), cada
+tabela dependente é limpa por um único DELETE ... WHERE <fk> IN (subconsulta),
+dos filhos para os pais: alguns comandos por exclusão, independente do volume.
+No PostgreSQL as chaves estrangeiras também têm ON DELETE CASCADE / SET NULL
+(migração e1f2a3b4c5d6), que mantêm o banco consistente mesmo em exclusões
+feitas fora daqui; no SQLite, que não verifica as chaves, é a ordem dos DELETEs
+que garante isso.
+
+As funções não fazem commit. Os arquivos em disco (planilhas armazenadas e
+partes de sessões de upload) só são removidos depois do commit, com
+Exclusao.remover_arquivos().
+
+Usuários com mais de EXCLUSAO_USUARIO_LIMITE_SINCRONO lançamentos são excluídos
+em segundo plano pela fila de processamento (job 'exclusao_usuario'), um
+projeto por transação, para que a requisição retorne logo e nenhuma transação
+fique longa demais.
+"""
+import os
+from typing import Any, Dict, List
+
+from sqlalchemy import delete, func, select, update
+
+from src.models.user import (
+    db, User, Projeto, Cenario, LancamentoFinanceiro, ResumoMensalLancamento, ArquivoUpload,
+    ConfiguracaoCenarios, LogSistema, HistoricoCenario, Relatorio, JobProcessamento, SessaoUpload,
+    ImportacaoExtrato, RequisicaoIdempotente
+)
+from src.services.fila_processamento import fila_processamento
+from src.services.sessoes_upload import remover_partes_sessoes
+from src.utils.logger import debug_log
+
+LIMITE_SINCRONO_USUARIO = int(os.getenv('EXCLUSAO_USUARIO_LIMITE_SINCRONO', '200000'))
+
+# Tabelas com usuario_id (além de projetos) cujas linhas são excluídas junto com o usuário
+TABELAS_DO_USUARIO = (
+    ('snapshots', HistoricoCenario),
+    ('relatorios', Relatorio),
+    ('importacoes_extrato', ImportacaoExtrato),
+    ('configuracoes_cenarios', ConfiguracaoCenarios),
+    ('jobs', JobProcessamento),
+    ('sessoes_upload', SessaoUpload),
+    ('requisicoes_idempotentes', RequisicaoIdempotente),
+)
+
+
+class Exclusao:
+    """Linhas excluídas por tabela e arquivos a remover do disco depois do commit"""
+
+    def __init__(self):
+        self.contagem: Dict[str, int] = {}
+        self.caminhos_upload: List[str] = []
+        self.sessoes_upload: List[str] = []
+
+    def somar(self, chave: str, linhas: int):
+        self.contagem[chave] = self.contagem.get(chave, 0) + linhas
+
+    def remover_arquivos(self):
+        """Remove as planilhas que nenhum upload restante usa (reprocessamentos compartilham o arquivo) e as partes"""
+        caminhos = set(self.caminhos_upload)
+        if caminhos:
+            compartilhados = set(db.session.execute(
+                select(ArquivoUpload.caminho_storage).where(ArquivoUpload.caminho_storage.in_(caminhos))
+            ).scalars())
+            for caminho in caminhos - compartilhados:
+                if os.path.exists(caminho):
+                    os.remove(caminho)
+        remover_partes_sessoes(self.sessoes_upload)
+
+
+def _executar(instrucao) -> int:
+    return db.session.execute(instrucao.execution_options(synchronize_session=False)).rowcount
+
+
+def excluir_cenarios(cenario_ids, exclusao: Exclusao = None) -> Exclusao:
+    """
+    Exclui os cenários (lista de ids ou select(Cenario.id)) e seus lançamentos, resumo e snapshots;
+    relatórios do cenário ficam sem vínculo. Cenários derivados de fora do conjunto devem ser
+    materializados antes (cenarios_virtuais.materializar_derivados).
+    """
+    exclusao = exclusao or Exclusao()
+    exclusao.somar('relatorios_desvinculados', _executar(
+        update(Relatorio).where(Relatorio.scenario_id.in_(cenario_ids)).values(scenario_id=None)
+    ))
+    exclusao.somar('snapshots', _executar(
+        delete(HistoricoCenario).where(HistoricoCenario.cenario_id.in_(cenario_ids))
+    ))
+    exclusao.somar('resumos_mensais', _executar(
+        delete(ResumoMensalLancamento).where(ResumoMensalLancamento.cenario_id.in_(cenario_ids))
+    ))
+    exclusao.somar('lancamentos', _executar(
+        delete(LancamentoFinanceiro).where(LancamentoFinanceiro.cenario_id.in_(cenario_ids))
+    ))
+    exclusao.somar('cenarios', _executar(delete(Cenario).where(Cenario.id.in_(cenario_ids))))
+    return exclusao
+
+
+def excluir_projetos(projeto_ids, exclusao: Exclusao = None) -> Exclusao:
+    """Exclui os projetos (lista de ids ou select(Projeto.id)) com cenários, uploads e importações de extrato"""
+    exclusao = exclusao or Exclusao()
+    exclusao.caminhos_upload.extend(db.session.execute(
+        select(ArquivoUpload.caminho_storage).where(ArquivoUpload.projeto_id.in_(projeto_ids)).distinct()
+    ).scalars())
+    excluir_cenarios(select(Cenario.id).where(Cenario.projeto_id.in_(projeto_ids)), exclusao)
+    exclusao.somar('importacoes_extrato', _executar(
+        delete(ImportacaoExtrato).where(ImportacaoExtrato.projeto_id.in_(projeto_ids))
+    ))
+    exclusao.somar('uploads', _executar(delete(ArquivoUpload).where(ArquivoUpload.projeto_id.in_(projeto_ids))))
+    exclusao.somar('projetos', _executar(delete(Projeto).where(Projeto.id.in_(projeto_ids))))
+    return exclusao
+
+
+def excluir_upload(upload: ArquivoUpload) -> Exclusao:
+    """
+    Exclui o upload e os cenários do projeto; o projeto inteiro, se ele não tiver outros uploads.
+    A planilha armazenada é removida em Exclusao.remover_arquivos(), se nenhum outro upload a usar
+    """
+    outro_upload = db.session.execute(
+        select(ArquivoUpload.id)
+        .where(ArquivoUpload.projeto_id == upload.projeto_id, ArquivoUpload.id != upload.id)
+        .limit(1)
+    ).first()
+    if outro_upload is None:
+        return excluir_projetos([upload.projeto_id])
+
+    exclusao = excluir_cenarios(select(Cenario.id).where(Cenario.projeto_id == upload.projeto_id))
+    exclusao.caminhos_upload.append(upload.caminho_storage)
+    exclusao.somar('uploads', _executar(delete(ArquivoUpload).where(ArquivoUpload.id == upload.id)))
+    return exclusao
+
+
+def excluir_usuario(usuario_id: int, exclusao: Exclusao = None) -> Exclusao:
+    """Exclui o usuário com projetos, relatórios, snapshots, jobs e sessões; os logs dele ficam sem vínculo"""
+    exclusao = exclusao or Exclusao()
+    excluir_projetos(select(Projeto.id).where(Projeto.usuario_id == usuario_id), exclusao)
+    exclusao.sessoes_upload.extend(db.session.execute(
+        select(SessaoUpload.id).where(SessaoUpload.usuario_id == usuario_id)
+    ).scalars())
+    for chave, modelo in TABELAS_DO_USUARIO:
+        exclusao.somar(chave, _executar(delete(modelo).where(modelo.usuario_id == usuario_id)))
+    exclusao.somar('logs_desvinculados', _executar(
+        update(LogSistema).where(LogSistema.usuario_id == usuario_id).values(usuario_id=None)
+    ))
+    exclusao.somar('usuarios', _executar(delete(User).where(User.id == usuario_id)))
+    return exclusao
+
+
+def contar_lancamentos_usuario(usuario_id: int) -> int:
+    return db.session.execute(
+        select(func.count(LancamentoFinanceiro.id))
+        .join(Cenario, Cenario.id == LancamentoFinanceiro.cenario_id)
+        .join(Projeto, Projeto.id == Cenario.projeto_id)
+        .where(Projeto.usuario_id == usuario_id)
+    ).scalar()
+
+
+def processar_job_exclusao_usuario(job: JobProcessamento) -> Dict[str, Any]:
+    """Exclui o usuário `parametros['usuario_id']` um projeto por transação (o job pertence ao admin)"""
+    usuario_id = job.parametros['usuario_id']
+    exclusao = Exclusao()
+    projeto_ids = db.session.execute(
+        select(Projeto.id).where(Projeto.usuario_id == usuario_id).order_by(Projeto.id)
+    ).scalars().all()
+    for projeto_id in projeto_ids:
+        excluir_projetos([projeto_id], exclusao)
+        db.session.commit()
+    excluir_usuario(usuario_id, exclusao)
+    db.session.commit()
+    exclusao.remover_arquivos()
+    debug_log(f"Usuário {usuario_id} excluído em segundo plano: {exclusao.contagem}")
+    return {'usuario_id': usuario_id, 'excluidos': exclusao.contagem}
+
+
+def enfileirar_exclusao_usuario(admin_id: int, usuario_id: int) -> JobProcessamento:
+    return fila_processamento.enfileirar(admin_id, 'exclusao_usuario', {'usuario_id': usuario_id})
+
+
+fila_processamento.registrar_handler('exclusao_usuario', processar_job_exclusao_usuario)
@@ -0,0 +1,235 @@
+"""
+Fila local de processamento assíncrono, persistida no banco de dados.
+
+Cada processo da aplicação mantém um pool limitado de threads que reservam
+jobs 'queued' com um UPDATE condicional (status = 'queued' -> 'running'), o que
+torna a reserva segura entre processos e servidores sem broker externo. Jobs
+enfileirados no próprio processo acordam as threads imediatamente; os demais
+são encontrados por polling.
+"""
+import os
+import threading
+import uuid
+from datetime import datetime, date, timedelta
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy import select, update
+
+from src.models.user import db, JobProcessamento, LogSistema
+from src.services.planilha_processor import ProcessadorPlanilhaHabitusForecast
+from src.utils.logger import debug_log, exception_log
+
+MENSAGEM_ERRO_GENERICA = 'Erro ao processar planilha. Verifique se o arquivo está no formato correto e tente novamente.'
+
+
+class FilaProcessamento:
+    """Pool limitado de workers locais que consome a tabela jobs_processamento"""
+
+    def __init__(self):
+        self.max_workers = int(os.getenv('UPLOAD_ASYNC_WORKERS', '2'))
+        self.intervalo_polling = float(os.getenv('UPLOAD_ASYNC_POLL_INTERVAL', '5'))
+        # Jobs 'running' há mais tempo que isso são considerados interrompidos (worker reiniciado)
+        self.tempo_limite = int(os.getenv('UPLOAD_ASYNC_JOB_TIMEOUT', '1800'))
+        self._handlers: Dict[str, Callable[[JobProcessamento], Dict[str, Any]]] = {}
+        self._app = None
+        self._lock = threading.Lock()
+        self._evento = threading.Event()
+        self._pid: Optional[int] = None
+
+    def init_app(self, app):
+        """Associa a fila à aplicação; as threads só são criadas no processo que atende requisições"""
+        self._app = app
+
+        @app.before_request
+        def _garantir_workers_fila():
+            self.iniciar_workers()
+
+    def registrar_handler(self, tipo: str, handler: Callable[[JobProcessamento], Dict[str, Any]]):
+        self._handlers[tipo] = handler
+
+    def iniciar_workers(self):
+        """Cria as threads uma vez por processo (após o fork dos workers do gunicorn)"""
+        pid = os.getpid()
+        if self._pid == pid or self._app is None or self.max_workers <= 0:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            self._pid = pid
+            self._evento = threading.Event()
+            for i in range(self.max_workers):
+                threading.Thread(
+                    target=self._executar,
+                    name=f'fila-processamento-{i}',
+                    daemon=True
+                ).start()
+
+    def enfileirar(self, usuario_id: int, tipo: str, parametros: Dict[str, Any]) -> JobProcessamento:
+        """Persiste um job 'queued' e acorda os workers do processo atual"""
+        job = JobProcessamento(
+            id=str(uuid.uuid4()),
+            usuario_id=usuario_id,
+            tipo=tipo,
+            status='queued',
+            parametros=parametros
+        )
+        db.session.add(job)
+        db.session.commit()
+        self.iniciar_workers()
+        self._evento.set()
+        return job
+
+    def _executar(self):
+        while True:
+            self._evento.wait(self.intervalo_polling)
+            self._evento.clear()
+            with self._app.app_context():
+                try:
+                    while True:
+                        job_id = self._reservar_proximo()
+                        if job_id is None:
+                            break
+                        self._processar(job_id)
+                except Exception as e:
+                    exception_log(f"Erro no worker da fila de processamento: {str(e)}")
+                finally:
+                    db.session.remove()
+
+    def _expirar_jobs_interrompidos(self):
+        tabela = JobProcessamento.__table__
+        limite = datetime.utcnow() - timedelta(seconds=self.tempo_limite)
+        db.session.execute(
+            update(tabela)
+            .where(tabela.c.status == 'running', tabela.c.started_at < limite)
+            .values(status='error', erro='Processamento interrompido. Envie a planilha novamente.',
+                    finished_at=datetime.utcnow())
+        )
+        db.session.commit()
+
+    def _reservar_proximo(self) -> Optional[str]:
+        """Reserva o job mais antigo ainda na fila; o UPDATE condicional evita reserva dupla"""
+        self._expirar_jobs_interrompidos()
+        tabela = JobProcessamento.__table__
+        candidatos = db.session.execute(
+            select(tabela.c.id)
+            .where(tabela.c.status == 'queued')
+            .order_by(tabela.c.created_at)
+            .limit(self.max_workers)
+        ).scalars().all()
+        for job_id in candidatos:
+            reservado = db.session.execute(
+                update(tabela)
+                .where(tabela.c.id == job_id, tabela.c.status == 'queued')
+                .values(status='running', started_at=datetime.utcnow())
+            )
+            db.session.commit()
+            if reservado.rowcount == 1:
+                return job_id
+        db.session.commit()
+        return None
+
+    def _processar(self, job_id: str):
+        job = db.session.get(JobProcessamento, job_id)
+        handler = self._handlers.get(job.tipo)
+        try:
+            if handler is None:
+                raise ValueError(f'Tipo de job desconhecido: {job.tipo}')
+            resultado = handler(job)
+            job = db.session.get(JobProcessamento, job_id)
+            job.status = 'done'
+            job.resultado = resultado
+            job.projeto_id = resultado.get('projeto_id')
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+            debug_log(f"Job {job_id} concluído")
+        except Exception as e:
+            db.session.rollback()
+            exception_log(f"Erro ao processar job {job_id}: {str(e)}")
+            job = db.session.get(JobProcessamento, job_id)
+            job.status = 'error'
+            job.erro = MENSAGEM_ERRO_GENERICA
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+
+
+def _serializar_parametros(parametros: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        chave: valor.isoformat() if isinstance(valor, (date, datetime)) else valor
+        for chave, valor in (parametros or {}).items()
+    }
+
+
+def processar_job_upload_planilha(job: JobProcessamento) -> Dict[str, Any]:
+    """Processa uma planilha já armazenada em definitivo (mesmos logs do upload síncrono)"""
+    caminho_arquivo = job.parametros['caminho_arquivo']
+    filename = job.parametros.get('filename')
+    projeto_id = job.parametros.get('projeto_id')
+    usuario_id = job.usuario_id
+    try:
+        processador = ProcessadorPlanilhaHabitusForecast()
+        if projeto_id is not None:
+            # Reimportação no projeto existente (apenas as diferenças são gravadas)
+            resultado = processador.reimportar_no_projeto(
+                caminho_arquivo, projeto_id, usuario_id, hash_arquivo=job.parametros.get('hash_arquivo')
+            )
+        else:
+            resultado = processador.processar_planilha_completa(
+                caminho_arquivo, usuario_id, hash_arquivo=job.parametros.get('hash_arquivo')
+            )
+    except Exception as e:
+        db.session.rollback()
+        db.session.add(LogSistema(
+            usuario_id=usuario_id,
+            acao='PLANILHA_UPLOAD_ERROR',
+            detalhes={'filename': filename, 'erro': str(e), 'tipo': 'ASSINCRONO', 'job_id': job.id}
+        ))
+        db.session.commit()
+        if os.path.exists(caminho_arquivo):
+            os.remove(caminho_arquivo)
+        raise
+
+    if projeto_id is not None:
+        db.session.add(LogSistema(
+            usuario_id=usuario_id,
+            acao='PLANILHA_REIMPORTADA',
+            detalhes={
+                'filename': filename,
+                'projeto_id': projeto_id,
+                'arquivo_upload_id': resultado['arquivo_upload_id'],
+                'alteracoes': resultado['alteracoes'],
+                'job_id': job.id
+            }
+        ))
+        db.session.commit()
+        return {
+            'projeto_id': projeto_id,
+            'alteracoes': resultado['alteracoes'],
+            'cenarios_nao_atualizados': resultado['cenarios_nao_atualizados'],
+            'hash_arquivo': resultado.get('hash_arquivo'),
+            'parametros': _serializar_parametros(resultado.get('parametros'))
+        }
+
+    db.session.add(LogSistema(
+        usuario_id=usuario_id,
+        acao='PLANILHA_UPLOADED',
+        detalhes={
+            'filename': filename,
+            'projeto_id': resultado.get('projeto_id'),
+            'status': resultado.get('status'),
+            'lancamentos_criados': resultado.get('lancamentos_criados', 0),
+            'job_id': job.id
+        }
+    ))
+    db.session.commit()
+
+    return {
+        'projeto_id': resultado['projeto_id'],
+        'lancamentos_criados': resultado.get('lancamentos_criados', 0),
+        'cenarios_criados': resultado.get('cenarios_criados', 0),
+        'hash_arquivo': resultado.get('hash_arquivo'),
+        'parametros': _serializar_parametros(resultado.get('parametros'))
+    }
+
+
+fila_processamento = FilaProcessamento()
+fila_processamento.registrar_handler('upload_planilha', processar_job_upload_planilha)
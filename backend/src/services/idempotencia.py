@@ -0,0 +1,211 @@
+"""
+Requisições idempotentes (cabeçalho Idempotency-Key).
+
+Quando um upload ou relatório demora, o frontend ou o proxy (nginx) repetem a
+requisição, e a mesma planilha vira dois projetos ou o mesmo PDF é gerado duas
+vezes. Com o decorator `idempotente`, o cliente envia uma chave por operação
+(a mesma em todas as retentativas):
+
+- a primeira requisição reserva a chave e executa normalmente; uma resposta 2xx
+  é gravada por IDEMPOTENCIA_TTL_HORAS;
+- uma retentativa com a chave concluída recebe a resposta gravada, sem executar
+  o endpoint de novo, com o cabeçalho `Idempotent-Replayed: true`;
+- uma retentativa enquanto a primeira ainda executa aguarda o resultado dela por
+  até IDEMPOTENCIA_ESPERA_SEGUNDOS; depois disso recebe 409 com Retry-After;
+- a mesma chave com outra requisição (outro endpoint, query string, corpo JSON ou,
+  em uploads, outros campos ou arquivos, comparados pelo SHA256) recebe 422.
+
+Erros (exceções e respostas fora de 2xx) e respostas maiores que
+IDEMPOTENCIA_MAX_CORPO_BYTES não são gravados: a chave é liberada e a próxima
+tentativa executa de novo. A reserva é uma linha em requisicoes_idempotentes
+com unicidade por (usuario_id, chave), portanto vale entre workers e processos.
+Requisições sem o cabeçalho não mudam de comportamento.
+"""
+import hashlib
+import os
+import time
+from datetime import datetime, timedelta
+from functools import wraps
+from typing import Optional, Tuple
+
+from flask import Response, jsonify, make_response, request
+from sqlalchemy import delete, update
+from sqlalchemy.exc import IntegrityError
+
+from src.models.user import db, RequisicaoIdempotente
+from src.services.armazenamento_upload import ArquivoEmArmazenamento
+from src.utils.logger import debug_log, error_log, info_log
+
+CABECALHO_CHAVE = 'Idempotency-Key'
+CABECALHO_REPETICAO = 'Idempotent-Replayed'
+TAMANHO_MAXIMO_CHAVE = 255
+VALIDADE_RESULTADO = timedelta(hours=int(os.getenv('IDEMPOTENCIA_TTL_HORAS', '24')))
+ESPERA_MAXIMA = float(os.getenv('IDEMPOTENCIA_ESPERA_SEGUNDOS', '30'))
+MAX_TAMANHO_CORPO = int(os.getenv('IDEMPOTENCIA_MAX_CORPO_BYTES', str(10 * 1024 * 1024)))
+# Uma reserva sem conclusão (worker encerrado no meio) é descartada depois disso
+VALIDADE_RESERVA = timedelta(minutes=int(os.getenv('IDEMPOTENCIA_RESERVA_MINUTOS', '15')))
+INTERVALO_CONSULTA = 0.25
+# Maior corpo lido para a impressão da requisição (JSON); formulários entram pelos campos e arquivos
+MAX_CORPO_IMPRESSAO = 1024 * 1024
+TIPOS_FORMULARIO = ('multipart/form-data', 'application/x-www-form-urlencoded')
+# Cabeçalhos recalculados na resposta repetida
+CABECALHOS_NAO_GRAVADOS = {'content-length', 'set-cookie', 'date'}
+
+
+def _hash_arquivo(arquivo) -> str:
+    if isinstance(arquivo.stream, ArquivoEmArmazenamento):
+        # Calculado enquanto o parser gravava o arquivo no armazenamento (o mesmo hash_arquivo do upload)
+        return arquivo.stream.hash_arquivo
+    sha256 = hashlib.sha256()
+    arquivo.stream.seek(0)
+    for bloco in iter(lambda: arquivo.stream.read(1024 * 1024), b''):
+        sha256.update(bloco)
+    arquivo.stream.seek(0)
+    return sha256.hexdigest()
+
+
+def impressao_requisicao() -> str:
+    """SHA256 do endpoint, da query string e do corpo da requisição.
+
+    De um formulário (upload multipart) entram os campos e, de cada arquivo, o nome e
+    o SHA256 do conteúdo, não o corpo bruto: o separador das partes muda a cada envio
+    do mesmo arquivo. O parser do formulário é o mesmo que o endpoint usaria e grava
+    os arquivos no armazenamento, então o conteúdo não é lido de novo.
+    """
+    h = hashlib.sha256()
+    h.update(f'{request.method} {request.endpoint}?{request.query_string.decode("latin-1")}\n'.encode('utf-8'))
+    h.update(f'{request.mimetype}\n'.encode('utf-8'))
+    if request.mimetype in TIPOS_FORMULARIO:
+        for nome, valor in sorted(request.form.items(multi=True)):
+            h.update(f'campo {nome}={valor}\n'.encode('utf-8'))
+        arquivos = sorted(
+            (nome, arquivo.filename or '', _hash_arquivo(arquivo)) for nome, arquivo in request.files.items(multi=True)
+        )
+        for nome, nome_arquivo, hash_arquivo in arquivos:
+            h.update(f'arquivo {nome}={nome_arquivo} {hash_arquivo}\n'.encode('utf-8'))
+    elif (request.content_length or 0) <= MAX_CORPO_IMPRESSAO:
+        h.update(request.get_data(cache=True))
+    return h.hexdigest()
+
+
+def _resposta_gravada(registro: RequisicaoIdempotente) -> Response:
+    resposta = Response(registro.corpo or b'', status=registro.status_http, headers=registro.cabecalhos or {})
+    resposta.headers[CABECALHO_REPETICAO] = 'true'
+    return resposta
+
+
+def _reservar(usuario_id: int, chave: str, impressao: str) -> Tuple[Optional[int], Optional[Response]]:
+    """Reserva a chave para esta requisição.
+
+    Retorna (id da reserva, None) quando esta requisição deve executar o endpoint,
+    ou (None, resposta) quando a resposta já existe ou não pode ser dada agora.
+    """
+    inicio = time.monotonic()
+    while True:
+        agora = datetime.utcnow()
+        db.session.execute(delete(RequisicaoIdempotente).where(RequisicaoIdempotente.expira_em < agora))
+        registro = RequisicaoIdempotente(
+            usuario_id=usuario_id, chave=chave, impressao=impressao,
+            status='em_andamento', expira_em=agora + VALIDADE_RESERVA
+        )
+        db.session.add(registro)
+        try:
+            db.session.commit()
+            return registro.id, None
+        except IntegrityError:
+            db.session.rollback()
+
+        # A chave já existe: resposta gravada ou requisição ainda em andamento
+        while True:
+            existente = RequisicaoIdempotente.query.filter_by(usuario_id=usuario_id, chave=chave).first()
+            if existente is None or existente.expira_em < datetime.utcnow():
+                # Liberada (erro na requisição original) ou vencida: tentar reservar de novo
+                db.session.rollback()
+                break
+            if existente.impressao != impressao:
+                return None, (jsonify({
+                    'message': f'{CABECALHO_CHAVE} já usada em outra requisição. Gere uma nova chave para cada operação.'
+                }), 422)
+            if existente.status == 'concluida':
+                info_log(f"Requisição repetida ({CABECALHO_CHAVE} {chave}): devolvendo a resposta gravada")
+                return None, _resposta_gravada(existente)
+
+            decorrido = time.monotonic() - inicio
+            if decorrido >= ESPERA_MAXIMA:
+                resposta = jsonify({
+                    'message': 'Uma requisição com a mesma Idempotency-Key ainda está em processamento. Tente novamente.'
+                })
+                resposta.status_code = 409
+                resposta.headers['Retry-After'] = str(max(1, int(ESPERA_MAXIMA)))
+                return None, resposta
+            # Encerrar a transação para enxergar a conclusão gravada pelo outro worker
+            db.session.rollback()
+            time.sleep(min(INTERVALO_CONSULTA, ESPERA_MAXIMA - decorrido))
+
+
+def _liberar(registro_id: int):
+    try:
+        db.session.rollback()
+        db.session.execute(delete(RequisicaoIdempotente).where(RequisicaoIdempotente.id == registro_id))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        error_log(f"Erro ao liberar {CABECALHO_CHAVE} {registro_id}: {str(e)}")
+
+
+def _concluir(registro_id: int, resposta: Response):
+    """Grava a resposta 2xx para as retentativas; as demais liberam a chave"""
+    if not 200 <= resposta.status_code < 300:
+        _liberar(registro_id)
+        return
+    if resposta.is_streamed:
+        # send_file: lido para a memória (relatórios) se couber no limite
+        if resposta.content_length is None or resposta.content_length > MAX_TAMANHO_CORPO:
+            debug_log(f"Resposta sem tamanho conhecido ou acima de {MAX_TAMANHO_CORPO} bytes; {CABECALHO_CHAVE} liberada")
+            _liberar(registro_id)
+            return
+        resposta.direct_passthrough = False
+    corpo = resposta.get_data()
+    if len(corpo) > MAX_TAMANHO_CORPO:
+        _liberar(registro_id)
+        return
+
+    cabecalhos = {nome: valor for nome, valor in resposta.headers.items() if nome.lower() not in CABECALHOS_NAO_GRAVADOS}
+    try:
+        db.session.execute(
+            update(RequisicaoIdempotente)
+            .where(RequisicaoIdempotente.id == registro_id)
+            .values(
+                status='concluida', status_http=resposta.status_code, cabecalhos=cabecalhos, corpo=corpo,
+                expira_em=datetime.utcnow() + VALIDADE_RESULTADO
+            )
+        )
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        error_log(f"Erro ao gravar a resposta da {CABECALHO_CHAVE} {registro_id}: {str(e)}")
+        _liberar(registro_id)
+
+
+def idempotente(f):
+    """Decorator (abaixo de @token_required) que aplica o cabeçalho Idempotency-Key à rota"""
+    @wraps(f)
+    def decorated(current_user, *args, **kwargs):
+        chave = (request.headers.get(CABECALHO_CHAVE) or '').strip()
+        if not chave:
+            return f(current_user=current_user, *args, **kwargs)
+        if len(chave) > TAMANHO_MAXIMO_CHAVE:
+            return jsonify({'message': f'{CABECALHO_CHAVE} deve ter no máximo {TAMANHO_MAXIMO_CHAVE} caracteres'}), 400
+
+        registro_id, resposta = _reservar(current_user.id, chave, impressao_requisicao())
+        if resposta is not None:
+            return resposta
+
+        try:
+            resposta = make_response(f(current_user=current_user, *args, **kwargs))
+        except Exception:
+            _liberar(registro_id)
+            raise
+        _concluir(registro_id, resposta)
+        return resposta
+    return decorated
@@ -0,0 +1,722 @@
+"""
+Importação em streaming de extratos bancários (CSV/OFX) como lançamentos REALIZADOS.
+
+O extrato é lido em blocos, sem carregar o arquivo inteiro: o CSV pelo leitor
+csv da biblioteca padrão e o OFX (SGML 1.x ou XML 2.x) por um tokenizador de
+tags incremental. A categoria de cada transação vem das regras de descrição (a
+primeira regra que casar; sem regra, a categoria padrão) e o tipo vem do sinal
+do valor (positivo = ENTRADA, negativo = SAIDA, gravado em módulo).
+
+Os lançamentos vão para o cenário base do projeto (os cenários derivados os
+leem de lá, sem ajuste, como o FDC-REAL; os congelados são materializados antes
+e não mudam) e são gravados em lotes de
+EXTRATO_TAMANHO_LOTE linhas com inserir_lancamentos (COPY no PostgreSQL), em
+uma única transação: o extrato entra inteiro ou não entra. Com a agregação
+mensal (EXTRATO_AGREGAR_MENSAL, padrão), as transações são somadas por
+categoria, tipo e mês, com competência no último dia do mês (como o FDC-REAL da
+planilha), e a memória fica limitada a categorias x meses.
+
+Regras (campo 'regras' do endpoint, --regras do script ou o arquivo JSON em
+EXTRATO_REGRAS_CATEGORIAS): uma lista de {"padrao", "categoria", "tipo_fluxo"}
+ou um objeto {"regras": [...], "categoria_padrao": ..., "colunas": {...}}. Os
+padrões são comparados com a descrição sem acentos e em maiúsculas: substring
+por padrão, expressão regular com o prefixo 're:'. 'colunas' informa os
+cabeçalhos do CSV (data, descricao, valor, credito, debito, natureza) quando os
+nomes usuais não são reconhecidos.
+
+A categoria FDC-REAL é reservada à planilha. A reimportação da planilha só
+compara os REALIZADOS dessa categoria, então não remove os lançamentos
+importados de extratos.
+"""
+import csv
+import hashlib
+import html
+import json
+import os
+import re
+import unicodedata
+from calendar import monthrange
+from collections import Counter, defaultdict
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from sqlalchemy.exc import IntegrityError
+
+from src.models.user import db, ImportacaoExtrato, LogSistema, JobProcessamento
+from src.services.cenarios_virtuais import materializar_derivados
+from src.services.fila_processamento import fila_processamento
+from src.services.indice_rotulos import compilar_padroes
+from src.services.metricas_processamento import MedidorProcessamento
+from src.services.persistencia_lancamentos import LinhaLancamento, inserir_lancamentos
+from src.services.registro_categorias import registro_categorias
+from src.services.reimportacao import cenario_base_do_projeto
+from src.utils.logger import debug_log
+
+# Extensão do arquivo -> formato do extrato
+FORMATOS_EXTENSAO = {'.csv': 'csv', '.txt': 'csv', '.ofx': 'ofx', '.qfx': 'ofx'}
+MAX_TAMANHO_EXTRATO = int(os.getenv('EXTRATO_MAX_BYTES', str(100 * 1024 * 1024)))
+TAMANHO_LOTE = int(os.getenv('EXTRATO_TAMANHO_LOTE', '5000'))
+AGREGAR_MENSAL = os.getenv('EXTRATO_AGREGAR_MENSAL', 'true').lower() == 'true'
+ARQUIVO_REGRAS = os.getenv('EXTRATO_REGRAS_CATEGORIAS', '')
+CATEGORIA_PADRAO = 'NÃO CATEGORIZADO'
+CATEGORIA_RESERVADA = 'FDC-REAL'
+TIPOS_FLUXO = ('OPERACIONAL', 'INVESTIMENTO', 'FINANCIAMENTO')
+PREFIXO_REGEX = 're:'
+
+TAMANHO_AMOSTRA = 64 * 1024
+TAMANHO_BLOCO_TEXTO = 64 * 1024
+MAX_LINHAS_CABECALHO = 30
+DELIMITADORES_CSV = (';', ',', '\t', '|')
+# Linhas de saldo dos extratos (SALDO ANTERIOR, SALDO DO DIA...) não são transações
+PREFIXO_SALDO = 'SALDO'
+TAMANHO_CACHE_DESCRICOES = 10000
+MAX_DESCRICOES_RASTREADAS = 1000
+MAX_ITENS_RELATORIO = 20
+
+# Cabeçalhos usuais dos CSVs de bancos (normalizados: sem acentos, maiúsculas, sem pontuação)
+ALIASES_COLUNAS = {
+    'data': ('DATA', 'DATA LANCAMENTO', 'DATA DO LANCAMENTO', 'DATA MOVIMENTO', 'DATA MOVIMENTACAO',
+             'DT LANCAMENTO', 'DT MOVIMENTO', 'DATE'),
+    'descricao': ('DESCRICAO', 'HISTORICO', 'LANCAMENTO', 'DESCRICAO DO LANCAMENTO', 'DETALHAMENTO',
+                  'MEMO', 'TITULO', 'DESCRIPTION'),
+    'valor': ('VALOR', 'VALOR LANCAMENTO', 'VALOR DO LANCAMENTO', 'AMOUNT'),
+    'credito': ('CREDITO', 'CREDITOS', 'ENTRADA', 'ENTRADAS'),
+    'debito': ('DEBITO', 'DEBITOS', 'SAIDA', 'SAIDAS'),
+    'natureza': ('D/C', 'C/D', 'NATUREZA', 'DEBITO/CREDITO', 'CREDITO/DEBITO'),
+}
+PADRAO_DATA_DMA = re.compile(r'^(\d{1,2})[/.-](\d{1,2})[/.-](\d{2}|\d{4})\b')
+PADRAO_DATA_AMD = re.compile(r'^(\d{4})-?(\d{2})-?(\d{2})')
+PADRAO_TAG_OFX = re.compile(r'<(/?)([A-Za-z0-9.]+)[^>]*>([^<]*)')
+
+
+class ErroImportacaoExtrato(ValueError):
+    """Extrato ou configuração inválidos; `status_http` é o código a devolver ao cliente"""
+
+    def __init__(self, mensagem: str, status_http: int = 400, **detalhes):
+        super().__init__(mensagem)
+        self.status_http = status_http
+        self.detalhes = detalhes
+
+
+class TransacaoExtrato(NamedTuple):
+    """Transação lida do extrato; `data`/`valor` são None quando não puderam ser convertidos"""
+    linha: int
+    data: Optional[date]
+    descricao: str
+    valor: Optional[Decimal]
+
+
+class RegraCategoria(NamedTuple):
+    padrao: str
+    categoria: str
+    tipo_fluxo: str
+
+
+def normalizar_texto(texto: str) -> str:
+    """Sem acentos, em maiúsculas e com espaços simples (comparação de descrições e cabeçalhos)"""
+    if texto.isascii():
+        return ' '.join(texto.upper().split())
+    decomposto = unicodedata.normalize('NFKD', texto)
+    sem_acentos = ''.join(caractere for caractere in decomposto if not unicodedata.combining(caractere))
+    return ' '.join(sem_acentos.upper().split())
+
+
+def _normalizar_cabecalho(texto: str) -> str:
+    texto = normalizar_texto(texto).replace('R$', '')
+    return ' '.join(re.sub(r'[^A-Z0-9/]+', ' ', texto).split())
+
+
+# ---------------------------------------------------------------------------
+# Configuração (regras de categoria e colunas do CSV)
+# ---------------------------------------------------------------------------
+
+class ConfiguracaoImportacao:
+    """Regras de descrição -> categoria, categoria padrão e cabeçalhos do CSV"""
+
+    def __init__(self, regras: Sequence[RegraCategoria] = (), categoria_padrao: str = CATEGORIA_PADRAO,
+                 colunas: Optional[Dict[str, str]] = None):
+        self.regras = list(regras)
+        self.categoria_padrao = categoria_padrao
+        self.colunas = dict(colunas or {})
+
+    def categorias(self) -> List[Tuple[str, str]]:
+        """Categorias (nome, tipo_fluxo) que a importação pode usar, sem repetição"""
+        categorias = {regra.categoria: regra.tipo_fluxo for regra in reversed(self.regras)}
+        categorias.setdefault(self.categoria_padrao, 'OPERACIONAL')
+        return list(categorias.items())
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'regras': [regra._asdict() for regra in self.regras],
+            'categoria_padrao': self.categoria_padrao,
+            'colunas': self.colunas
+        }
+
+
+def _validar_categoria(nome: Any, contexto: str) -> str:
+    nome = str(nome or '').strip()
+    if not nome:
+        raise ErroImportacaoExtrato(f'{contexto}: categoria não informada')
+    if len(nome) > 255:
+        raise ErroImportacaoExtrato(f'{contexto}: nome de categoria com mais de 255 caracteres')
+    if nome.upper() == CATEGORIA_RESERVADA:
+        raise ErroImportacaoExtrato(f'{contexto}: a categoria {CATEGORIA_RESERVADA} é reservada à planilha')
+    return nome
+
+
+def carregar_configuracao(dados: Any = None) -> ConfiguracaoImportacao:
+    """
+    Configuração a partir de JSON (texto, lista de regras ou objeto) ou, se não informada,
+    do arquivo em EXTRATO_REGRAS_CATEGORIAS. Erros de formato geram ErroImportacaoExtrato (400).
+    """
+    if dados is None or (isinstance(dados, str) and not dados.strip()):
+        if not ARQUIVO_REGRAS:
+            return ConfiguracaoImportacao()
+        with open(ARQUIVO_REGRAS, encoding='utf-8') as f:
+            dados = json.load(f)
+    elif isinstance(dados, (str, bytes)):
+        try:
+            dados = json.loads(dados)
+        except ValueError as e:
+            raise ErroImportacaoExtrato(f'Regras de categoria não são um JSON válido: {str(e)}')
+
+    if isinstance(dados, list):
+        dados = {'regras': dados}
+    if not isinstance(dados, dict):
+        raise ErroImportacaoExtrato('Regras de categoria: informe uma lista de regras ou um objeto com "regras"')
+
+    regras = []
+    for posicao, regra in enumerate(dados.get('regras') or [], start=1):
+        contexto = f'Regra {posicao}'
+        if not isinstance(regra, dict):
+            raise ErroImportacaoExtrato(f'{contexto}: informe um objeto com "padrao" e "categoria"')
+        padrao = str(regra.get('padrao') or '').strip()
+        if not padrao or padrao == PREFIXO_REGEX:
+            raise ErroImportacaoExtrato(f'{contexto}: padrão não informado')
+        if padrao.startswith(PREFIXO_REGEX):
+            try:
+                re.compile(padrao[len(PREFIXO_REGEX):])
+            except re.error as e:
+                raise ErroImportacaoExtrato(f'{contexto}: expressão regular inválida: {str(e)}')
+        tipo_fluxo = str(regra.get('tipo_fluxo') or 'OPERACIONAL').strip().upper()
+        if tipo_fluxo not in TIPOS_FLUXO:
+            raise ErroImportacaoExtrato(f'{contexto}: tipo_fluxo deve ser {", ".join(TIPOS_FLUXO)}')
+        regras.append(RegraCategoria(padrao, _validar_categoria(regra.get('categoria'), contexto), tipo_fluxo))
+
+    categoria_padrao = _validar_categoria(dados.get('categoria_padrao') or CATEGORIA_PADRAO, 'categoria_padrao')
+    colunas = dados.get('colunas') or {}
+    if not isinstance(colunas, dict) or any(campo not in ALIASES_COLUNAS for campo in colunas):
+        raise ErroImportacaoExtrato(f'colunas: informe um objeto com as chaves {", ".join(ALIASES_COLUNAS)}')
+    return ConfiguracaoImportacao(regras, categoria_padrao, {campo: str(nome) for campo, nome in colunas.items()})
+
+
+class MapeadorCategorias:
+    """
+    Descrição -> categoria pela primeira regra que casar.
+
+    Os padrões de substring são testados de uma vez pelo automato de indice_rotulos;
+    as expressões regulares, só as anteriores à melhor substring encontrada. O
+    resultado fica em cache, pois as descrições se repetem muito nos extratos.
+    """
+
+    def __init__(self, configuracao: ConfiguracaoImportacao):
+        self.regras = configuracao.regras
+        self.categoria_padrao = configuracao.categoria_padrao
+        substrings = [
+            (posicao, normalizar_texto(regra.padrao)) for posicao, regra in enumerate(self.regras)
+            if not regra.padrao.startswith(PREFIXO_REGEX)
+        ]
+        self._automato = compilar_padroes(tuple(padrao for _, padrao in substrings))
+        self._posicoes_substring = [posicao for posicao, _ in substrings]
+        self._expressoes = [
+            (posicao, re.compile(regra.padrao[len(PREFIXO_REGEX):], re.IGNORECASE))
+            for posicao, regra in enumerate(self.regras) if regra.padrao.startswith(PREFIXO_REGEX)
+        ]
+        self.categoria = lru_cache(maxsize=TAMANHO_CACHE_DESCRICOES)(self._categoria)
+
+    def _categoria(self, descricao: str) -> Tuple[str, bool]:
+        """(nome da categoria, se alguma regra casou)"""
+        texto = normalizar_texto(descricao)
+        melhor = min(
+            (self._posicoes_substring[indice] for indice in self._automato.encontrar(texto)),
+            default=len(self.regras)
+        )
+        for posicao, expressao in self._expressoes:
+            if posicao >= melhor:
+                break
+            if expressao.search(texto):
+                melhor = posicao
+                break
+        if melhor < len(self.regras):
+            return self.regras[melhor].categoria, True
+        return self.categoria_padrao, False
+
+
+# ---------------------------------------------------------------------------
+# Leitura dos extratos
+# ---------------------------------------------------------------------------
+
+def converter_valor(texto: Any) -> Optional[Decimal]:
+    """Valor monetário em formato brasileiro ou americano ('1.234,56', '-1,234.56', '(10,00)', '10,00 D')"""
+    texto = str(texto or '').upper().replace('R$', '').replace('\xa0', '').replace(' ', '')
+    if not texto:
+        return None
+    negativo = False
+    if texto[-1] in 'DC':
+        negativo = texto[-1] == 'D'
+        texto = texto[:-1]
+    if texto.startswith('(') and texto.endswith(')'):
+        negativo, texto = True, texto[1:-1]
+    if texto.endswith('-'):
+        negativo, texto = True, texto[:-1]
+    if texto[:1] in '+-':
+        negativo, texto = negativo or texto[0] == '-', texto[1:]
+
+    if ',' in texto and '.' in texto:
+        # O último separador é o decimal
+        if texto.rfind(',') > texto.rfind('.'):
+            texto = texto.replace('.', '').replace(',', '.')
+        else:
+            texto = texto.replace(',', '')
+    elif ',' in texto:
+        texto = texto.replace(',', '') if texto.count(',') > 1 else texto.replace(',', '.')
+    elif texto.count('.') > 1:
+        texto = texto.replace('.', '')
+
+    try:
+        valor = Decimal(texto)
+    except InvalidOperation:
+        return None
+    if not valor.is_finite():
+        return None
+    return -valor if negativo else valor
+
+
+@lru_cache(maxsize=4096)
+def converter_data(texto: str) -> Optional[date]:
+    """Data em dd/mm/aaaa (ou dd/mm/aa, com '-' ou '.'), aaaa-mm-dd ou aaaammdd (OFX, com hora opcional)"""
+    texto = texto.strip()
+    encontrado = PADRAO_DATA_DMA.match(texto)
+    if encontrado:
+        dia, mes, ano = (int(parte) for parte in encontrado.groups())
+        if ano < 100:
+            ano += 2000
+    else:
+        encontrado = PADRAO_DATA_AMD.match(texto)
+        if not encontrado:
+            return None
+        ano, mes, dia = (int(parte) for parte in encontrado.groups())
+    try:
+        return date(ano, mes, dia)
+    except ValueError:
+        return None
+
+
+def detectar_formato(caminho: str, nome_arquivo: Optional[str] = None) -> str:
+    """'csv' ou 'ofx', pela extensão ou, se desconhecida, pelo início do arquivo"""
+    extensao = os.path.splitext(nome_arquivo or caminho)[1].lower()
+    if extensao in FORMATOS_EXTENSAO:
+        return FORMATOS_EXTENSAO[extensao]
+    with open(caminho, 'rb') as f:
+        inicio = f.read(1024).upper()
+    return 'ofx' if b'OFXHEADER' in inicio or b'<OFX>' in inicio else 'csv'
+
+
+def detectar_codificacao(amostra: bytes) -> str:
+    """UTF-8 (com ou sem BOM) se a amostra for válida; senão cp1252, comum nas exportações de bancos"""
+    if amostra.startswith(b'\xef\xbb\xbf'):
+        return 'utf-8-sig'
+    try:
+        amostra.decode('utf-8')
+    except UnicodeDecodeError as e:
+        # Caractere multibyte cortado no fim da amostra
+        if e.start < len(amostra) - 3:
+            return 'cp1252'
+    return 'utf-8'
+
+
+def _ler_amostra(caminho: str) -> Tuple[str, str]:
+    """(codificação, texto do início do arquivo, sem a última linha se ela estiver incompleta)"""
+    with open(caminho, 'rb') as f:
+        amostra = f.read(TAMANHO_AMOSTRA)
+        completa = not f.read(1)
+    codificacao = detectar_codificacao(amostra)
+    texto = amostra.decode(codificacao, errors='ignore')
+    if not completa and '\n' in texto:
+        texto = texto[:texto.rfind('\n') + 1]
+    return codificacao, texto
+
+
+def _mapear_colunas(celulas: Sequence[str], colunas: Dict[str, str]) -> Optional[Dict[str, int]]:
+    """Índice de cada campo na linha de cabeçalho, ou None se a linha não for o cabeçalho"""
+    cabecalhos = [_normalizar_cabecalho(celula) for celula in celulas]
+    indices = {}
+    for campo, aliases in ALIASES_COLUNAS.items():
+        procurados = (_normalizar_cabecalho(colunas[campo]),) if campo in colunas else aliases
+        for procurado in procurados:
+            if procurado in cabecalhos:
+                indices[campo] = cabecalhos.index(procurado)
+                break
+    if 'data' in indices and ('valor' in indices or 'credito' in indices or 'debito' in indices):
+        return indices
+    return None
+
+
+def detectar_cabecalho_csv(texto: str, colunas: Optional[Dict[str, str]] = None) -> Tuple[str, int, Dict[str, int]]:
+    """
+    (delimitador, número da linha do cabeçalho, índices das colunas) a partir do início do CSV.
+
+    Extratos costumam ter linhas de identificação (agência, conta, período) antes do
+    cabeçalho: vale a primeira linha, entre as MAX_LINHAS_CABECALHO iniciais, que tem as
+    colunas de data e valor (ou crédito/débito).
+    """
+    for delimitador in DELIMITADORES_CSV:
+        leitor = csv.reader(texto.splitlines(), delimiter=delimitador)
+        for numero, celulas in enumerate(leitor):
+            if numero >= MAX_LINHAS_CABECALHO:
+                break
+            indices = _mapear_colunas(celulas, colunas or {})
+            if indices is not None:
+                return delimitador, numero, indices
+    raise ErroImportacaoExtrato(
+        'Cabeçalho do CSV não reconhecido: são necessárias as colunas de data e de valor '
+        '(ou crédito/débito). Informe os nomes em "colunas" nas regras de importação.'
+    )
+
+
+def _valor_csv(celulas: Sequence[str], indices: Dict[str, int]) -> Optional[Decimal]:
+    def celula(campo):
+        indice = indices.get(campo)
+        return celulas[indice] if indice is not None and indice < len(celulas) else ''
+
+    if 'valor' in indices:
+        valor = converter_valor(celula('valor'))
+        if valor is not None and 'natureza' in indices and celula('natureza').strip()[:1].upper() in ('D', 'S'):
+            valor = -abs(valor)
+        return valor
+
+    credito, debito = converter_valor(celula('credito')), converter_valor(celula('debito'))
+    if credito is None and debito is None:
+        return None
+    return abs(credito or 0) - abs(debito or 0)
+
+
+def transacoes_csv(caminho: str, colunas: Optional[Dict[str, str]] = None) -> Iterator[TransacaoExtrato]:
+    """Transações do CSV, lidas linha a linha (delimitador, cabeçalho e codificação detectados)"""
+    codificacao, amostra = _ler_amostra(caminho)
+    delimitador, linha_cabecalho, indices = detectar_cabecalho_csv(amostra, colunas)
+    indice_data, indice_descricao = indices['data'], indices.get('descricao')
+
+    with open(caminho, encoding=codificacao, errors='replace', newline='') as f:
+        leitor = csv.reader(f, delimiter=delimitador)
+        for numero, celulas in enumerate(leitor):
+            if numero <= linha_cabecalho or not any(celula.strip() for celula in celulas):
+                continue
+            data = converter_data(celulas[indice_data]) if indice_data < len(celulas) else None
+            descricao = ''
+            if indice_descricao is not None and indice_descricao < len(celulas):
+                descricao = ' '.join(celulas[indice_descricao].split())
+            yield TransacaoExtrato(leitor.line_num, data, descricao, _valor_csv(celulas, indices))
+
+
+def _tags_ofx(arquivo) -> Iterator[Tuple[bool, str, str]]:
+    """(fechamento, tag, texto) de cada tag do OFX, lido em blocos de texto"""
+    pendente = ''
+    while True:
+        bloco = arquivo.read(TAMANHO_BLOCO_TEXTO)
+        texto = pendente + bloco
+        if bloco:
+            # O texto de uma tag só está completo quando a próxima tag começa
+            corte = texto.rfind('<')
+            if corte < 0:
+                pendente = texto
+                continue
+            texto, pendente = texto[:corte], texto[corte:]
+        for encontrado in PADRAO_TAG_OFX.finditer(texto):
+            valor = encontrado.group(3).strip()
+            yield encontrado.group(1) == '/', encontrado.group(2).upper(), html.unescape(valor) if '&' in valor else valor
+        if not bloco:
+            return
+
+
+def transacoes_ofx(caminho: str) -> Iterator[TransacaoExtrato]:
+    """Transações (<STMTTRN>) do OFX; a data vem de DTPOSTED e a descrição de NAME/MEMO"""
+    codificacao, _ = _ler_amostra(caminho)
+    with open(caminho, encoding=codificacao, errors='replace') as f:
+        atual: Optional[Dict[str, str]] = None
+        numero = 0
+        for fechamento, tag, texto in _tags_ofx(f):
+            if tag == 'STMTTRN':
+                if fechamento and atual is not None:
+                    numero += 1
+                    partes = [parte for parte in (atual.get('NAME'), atual.get('MEMO')) if parte]
+                    if len(partes) == 2 and partes[0] == partes[1]:
+                        partes.pop()
+                    yield TransacaoExtrato(
+                        numero, converter_data(atual.get('DTPOSTED', '')),
+                        ' - '.join(partes), converter_valor(atual.get('TRNAMT'))
+                    )
+                atual = None if fechamento else {}
+            elif atual is not None and not fechamento and texto:
+                atual[tag] = texto
+
+
+def transacoes_extrato(caminho: str, formato: str,
+                       configuracao: Optional[ConfiguracaoImportacao] = None) -> Iterator[TransacaoExtrato]:
+    if formato == 'ofx':
+        return transacoes_ofx(caminho)
+    if formato == 'csv':
+        return transacoes_csv(caminho, (configuracao or ConfiguracaoImportacao()).colunas)
+    raise ErroImportacaoExtrato(f'Formato de extrato desconhecido: {formato} (use csv ou ofx)')
+
+
+# ---------------------------------------------------------------------------
+# Importação
+# ---------------------------------------------------------------------------
+
+def _ultimo_dia_do_mes(data: date) -> date:
+    return date(data.year, data.month, monthrange(data.year, data.month)[1])
+
+
+def _motivo_ignorada(transacao: TransacaoExtrato) -> Optional[str]:
+    if transacao.descricao[:len(PREFIXO_SALDO)].upper() == PREFIXO_SALDO:
+        return 'linha de saldo'
+    if transacao.data is None:
+        return 'data inválida'
+    if transacao.valor is None:
+        return 'valor inválido'
+    if transacao.valor == 0:
+        return 'valor zero'
+    return None
+
+
+def calcular_hash(caminho: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(1024 * 1024), b''):
+            sha256.update(bloco)
+    return sha256.hexdigest()
+
+
+class ResumoImportacao:
+    """Totais do extrato com memória limitada (categorias, motivos e até MAX_DESCRICOES_RASTREADAS descrições)"""
+
+    def __init__(self):
+        self.transacoes = 0
+        self.inicio: Optional[date] = None
+        self.fim: Optional[date] = None
+        self.por_categoria: Dict[str, Dict[str, Any]] = defaultdict(
+            lambda: {'transacoes': 0, 'entradas': Decimal(0), 'saidas': Decimal(0)}
+        )
+        self.ignoradas = Counter()
+        self.exemplos_ignoradas: List[Dict[str, Any]] = []
+        self.nao_categorizadas = 0
+        self.descricoes_sem_regra = Counter()
+
+    def ignorar(self, transacao: TransacaoExtrato, motivo: str):
+        self.ignoradas[motivo] += 1
+        if len(self.exemplos_ignoradas) < MAX_ITENS_RELATORIO:
+            self.exemplos_ignoradas.append({'linha': transacao.linha, 'motivo': motivo})
+
+    def registrar(self, transacao: TransacaoExtrato, categoria: str, mapeada: bool):
+        self.transacoes += 1
+        if self.inicio is None or transacao.data < self.inicio:
+            self.inicio = transacao.data
+        if self.fim is None or transacao.data > self.fim:
+            self.fim = transacao.data
+        totais = self.por_categoria[categoria]
+        totais['transacoes'] += 1
+        totais['entradas' if transacao.valor > 0 else 'saidas'] += abs(transacao.valor)
+        if not mapeada:
+            self.nao_categorizadas += 1
+            descricao = transacao.descricao or '(sem descrição)'
+            if descricao in self.descricoes_sem_regra or len(self.descricoes_sem_regra) < MAX_DESCRICOES_RASTREADAS:
+                self.descricoes_sem_regra[descricao] += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'periodo': {
+                'inicio': self.inicio.isoformat() if self.inicio else None,
+                'fim': self.fim.isoformat() if self.fim else None
+            },
+            'transacoes_importadas': self.transacoes,
+            'total_entradas': float(sum(totais['entradas'] for totais in self.por_categoria.values())),
+            'total_saidas': float(sum(totais['saidas'] for totais in self.por_categoria.values())),
+            'por_categoria': {
+                nome: {'transacoes': totais['transacoes'], 'entradas': float(totais['entradas']),
+                       'saidas': float(totais['saidas'])}
+                for nome, totais in sorted(self.por_categoria.items())
+            },
+            'linhas_ignoradas': sum(self.ignoradas.values()),
+            'motivos_ignoradas': dict(self.ignoradas),
+            'exemplos_ignoradas': self.exemplos_ignoradas,
+            'nao_categorizadas': self.nao_categorizadas,
+            'descricoes_sem_regra': [
+                {'descricao': descricao, 'transacoes': quantidade}
+                for descricao, quantidade in self.descricoes_sem_regra.most_common(MAX_ITENS_RELATORIO)
+            ]
+        }
+
+
+def resumir_extrato(caminho: str, formato: Optional[str] = None,
+                    configuracao: Optional[ConfiguracaoImportacao] = None) -> Dict[str, Any]:
+    """Lê e categoriza o extrato sem gravar nada (conferência das regras antes da importação)"""
+    configuracao = configuracao or carregar_configuracao()
+    mapeador = MapeadorCategorias(configuracao)
+    resumo = ResumoImportacao()
+    for transacao in transacoes_extrato(caminho, formato or detectar_formato(caminho), configuracao):
+        motivo = _motivo_ignorada(transacao)
+        if motivo is not None:
+            resumo.ignorar(transacao, motivo)
+        else:
+            resumo.registrar(transacao, *mapeador.categoria(transacao.descricao))
+    return resumo.to_dict()
+
+
+def importar_extrato(caminho: str, projeto_id: int, usuario_id: int, nome_arquivo: Optional[str] = None,
+                     formato: Optional[str] = None, configuracao: Optional[ConfiguracaoImportacao] = None,
+                     agregar_mensal: Optional[bool] = None, hash_arquivo: Optional[str] = None,
+                     medidor: Optional[MedidorProcessamento] = None) -> Dict[str, Any]:
+    """
+    Importa o extrato no cenário base do projeto e registra a ImportacaoExtrato (commit ao final).
+
+    Erros de conteúdo ou de estado geram ErroImportacaoExtrato: 400 para o arquivo ou as regras,
+    409 para um extrato já importado no projeto ou um projeto sem cenário.
+    """
+    if medidor is None:
+        medidor = MedidorProcessamento()
+    configuracao = configuracao or carregar_configuracao()
+    agregar_mensal = AGREGAR_MENSAL if agregar_mensal is None else agregar_mensal
+    nome_arquivo = nome_arquivo or os.path.basename(caminho)
+    formato = formato or detectar_formato(caminho, nome_arquivo)
+    hash_arquivo = hash_arquivo or calcular_hash(caminho)
+
+    existente = ImportacaoExtrato.query.filter_by(projeto_id=projeto_id, hash_arquivo=hash_arquivo).first()
+    if existente is not None:
+        raise ErroImportacaoExtrato(
+            'Este extrato já foi importado no projeto', 409, importacao_id=existente.id
+        )
+    cenario = cenario_base_do_projeto(projeto_id)
+    if cenario is None:
+        raise ErroImportacaoExtrato('O projeto não possui cenário para receber o extrato', 409)
+
+    with medidor.etapa('sincronizar_categorias') as registro:
+        ids_categorias = registro_categorias.garantir(configuracao.categorias())
+        registro['linhas'] = len(ids_categorias)
+
+    mapeador = MapeadorCategorias(configuracao)
+    resumo = ResumoImportacao()
+    agregados: Dict[Tuple[int, date, str], Decimal] = defaultdict(Decimal)
+    lote: List[LinhaLancamento] = []
+    lancamentos_criados = 0
+    try:
+        # Cenários derivados congelados ficam com os valores atuais; os ativos passam a ler o extrato
+        materializar_derivados(cenario, apenas_congelados=True)
+        with medidor.etapa('importar_transacoes', formato=formato, agregacao_mensal=agregar_mensal) as registro:
+            for transacao in transacoes_extrato(caminho, formato, configuracao):
+                motivo = _motivo_ignorada(transacao)
+                if motivo is not None:
+                    resumo.ignorar(transacao, motivo)
+                    continue
+                categoria, mapeada = mapeador.categoria(transacao.descricao)
+                resumo.registrar(transacao, categoria, mapeada)
+                tipo = 'ENTRADA' if transacao.valor > 0 else 'SAIDA'
+                if agregar_mensal:
+                    agregados[(ids_categorias[categoria], _ultimo_dia_do_mes(transacao.data), tipo)] += abs(transacao.valor)
+                    continue
+                lote.append((cenario.id, ids_categorias[categoria], transacao.data, abs(transacao.valor), tipo, 'REALIZADO'))
+                if len(lote) >= TAMANHO_LOTE:
+                    lancamentos_criados += inserir_lancamentos(lote)
+                    lote = []
+            registro['linhas'] = resumo.transacoes
+
+        with medidor.etapa('gravar_lancamentos') as registro:
+            linhas = lote + [
+                (cenario.id, categoria_id, competencia, valor, tipo, 'REALIZADO')
+                for (categoria_id, competencia, tipo), valor in sorted(agregados.items())
+            ]
+            for inicio in range(0, len(linhas), TAMANHO_LOTE):
+                lancamentos_criados += inserir_lancamentos(linhas[inicio:inicio + TAMANHO_LOTE])
+            registro['linhas'] = lancamentos_criados
+
+        if resumo.transacoes == 0:
+            raise ErroImportacaoExtrato(
+                'Nenhuma transação válida encontrada no extrato', 400, motivos_ignoradas=dict(resumo.ignoradas)
+            )
+
+        relatorio = dict(resumo.to_dict(), cenario=cenario.nome, metricas=medidor.resumo())
+        importacao = ImportacaoExtrato(
+            projeto_id=projeto_id,
+            usuario_id=usuario_id,
+            cenario_id=cenario.id,
+            nome_arquivo=nome_arquivo[:255],
+            formato=formato,
+            hash_arquivo=hash_arquivo,
+            agregacao_mensal=agregar_mensal,
+            transacoes_lidas=resumo.transacoes,
+            lancamentos_criados=lancamentos_criados,
+            relatorio=relatorio
+        )
+        db.session.add(importacao)
+        db.session.commit()
+    except IntegrityError:
+        # Importação concorrente do mesmo extrato (constraint projeto_id + hash_arquivo)
+        db.session.rollback()
+        raise ErroImportacaoExtrato('Este extrato já foi importado no projeto', 409)
+    except Exception:
+        db.session.rollback()
+        raise
+
+    medidor.registrar_log(
+        'Importação de extrato concluída',
+        projeto_id=projeto_id, importacao_extrato_id=importacao.id, formato=formato,
+        transacoes=resumo.transacoes, lancamentos_criados=lancamentos_criados
+    )
+    debug_log(f"Extrato {nome_arquivo} importado no projeto {projeto_id}: {resumo.transacoes} transações, "
+              f"{lancamentos_criados} lançamentos")
+    return dict(importacao.to_dict(), importacao_id=importacao.id)
+
+
+def processar_job_importacao_extrato(job: JobProcessamento) -> Dict[str, Any]:
+    """Importa um extrato já armazenado; o arquivo é removido ao final, com sucesso ou erro"""
+    parametros = job.parametros
+    caminho_arquivo = parametros['caminho_arquivo']
+    try:
+        resultado = importar_extrato(
+            caminho_arquivo, parametros['projeto_id'], job.usuario_id,
+            nome_arquivo=parametros.get('filename'),
+            formato=parametros.get('formato'),
+            configuracao=carregar_configuracao(parametros.get('configuracao')),
+            agregar_mensal=parametros.get('agregar_mensal'),
+            hash_arquivo=parametros.get('hash_arquivo')
+        )
+    except Exception as e:
+        db.session.add(LogSistema(
+            usuario_id=job.usuario_id,
+            acao='EXTRATO_IMPORTACAO_ERROR',
+            detalhes={'filename': parametros.get('filename'), 'erro': str(e), 'tipo': 'ASSINCRONO', 'job_id': job.id}
+        ))
+        db.session.commit()
+        raise
+    finally:
+        if os.path.exists(caminho_arquivo):
+            os.remove(caminho_arquivo)
+
+    db.session.add(LogSistema(
+        usuario_id=job.usuario_id,
+        acao='EXTRATO_IMPORTADO',
+        detalhes={
+            'filename': parametros.get('filename'),
+            'projeto_id': resultado['projeto_id'],
+            'importacao_id': resultado['importacao_id'],
+            'lancamentos_criados': resultado['lancamentos_criados'],
+            'job_id': job.id
+        }
+    ))
+    db.session.commit()
+    return resultado
+
+
+fila_processamento.registrar_handler('importar_extrato', processar_job_importacao_extrato)
@@ -0,0 +1,130 @@
+from bisect import bisect_left
+from collections import deque
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import pandas as pd
+
+
+class AutomatoPadroes:
+    """
+    Automato Aho-Corasick para testar vários padrões de substring de uma só vez.
+
+    Cada texto é percorrido uma única vez, independentemente do número de
+    padrões, e o resultado é o conjunto de índices dos padrões contidos nele
+    (mesma semântica de `padrao in texto`).
+    """
+
+    def __init__(self, padroes: Iterable[str]):
+        self.padroes: Tuple[str, ...] = tuple(padroes)
+        self._transicoes: List[Dict[str, int]] = [{}]
+        self._falha: List[int] = [0]
+        self._saida: List[List[int]] = [[]]
+
+        for indice, padrao in enumerate(self.padroes):
+            estado = 0
+            for caractere in padrao:
+                proximo = self._transicoes[estado].get(caractere)
+                if proximo is None:
+                    proximo = len(self._transicoes)
+                    self._transicoes.append({})
+                    self._falha.append(0)
+                    self._saida.append([])
+                    self._transicoes[estado][caractere] = proximo
+                estado = proximo
+            self._saida[estado].append(indice)
+
+        # Links de falha calculados em largura (estados de profundidade 1 falham para a raiz)
+        fila = deque(self._transicoes[0].values())
+        while fila:
+            estado = fila.popleft()
+            for caractere, proximo in self._transicoes[estado].items():
+                fila.append(proximo)
+                falha = self._falha[estado]
+                while falha and caractere not in self._transicoes[falha]:
+                    falha = self._falha[falha]
+                self._falha[proximo] = self._transicoes[falha].get(caractere, 0)
+                self._saida[proximo] = self._saida[proximo] + self._saida[self._falha[proximo]]
+
+    def encontrar(self, texto: str) -> Set[int]:
+        """Retorna os índices de todos os padrões contidos em `texto`"""
+        transicoes, falha, saida = self._transicoes, self._falha, self._saida
+        encontrados = set(saida[0])
+        estado = 0
+        for caractere in texto:
+            while estado and caractere not in transicoes[estado]:
+                estado = falha[estado]
+            estado = transicoes[estado].get(caractere, 0)
+            if saida[estado]:
+                encontrados.update(saida[estado])
+        return encontrados
+
+
+@lru_cache(maxsize=32)
+def compilar_padroes(padroes: Tuple[str, ...]) -> AutomatoPadroes:
+    """Compila (e mantém em cache) o automato de um conjunto fixo de padrões"""
+    return AutomatoPadroes(padroes)
+
+
+def rotulo_maiusculo(rotulo: str) -> str:
+    """Normalização usada na busca de FATURAMENTO: sem espaços nas pontas e em maiúsculas"""
+    return rotulo.strip().upper()
+
+
+class IndiceRotulos:
+    """
+    Índice dos rótulos de uma coluna de uma aba, construído uma vez por aba.
+
+    Mapeia o texto de cada célula não vazia (str(valor), como nas buscas
+    originais com iterrows) para as posições de linha, e resolve regras de
+    substring de vários padrões com um único automato por conjunto de padrões.
+    """
+
+    def __init__(self, df: pd.DataFrame, coluna: int = 0):
+        if df.shape[1] > coluna:
+            valores = df.iloc[:, coluna].tolist()
+        else:
+            valores = []
+        self.rotulos: List[Optional[str]] = [str(v) if pd.notna(v) else None for v in valores]
+        self.posicoes: Dict[str, List[int]] = {}
+        for posicao, rotulo in enumerate(self.rotulos):
+            if rotulo is not None:
+                self.posicoes.setdefault(rotulo, []).append(posicao)
+        self._ocorrencias: Dict[Tuple, Dict[str, List[int]]] = {}
+
+    def __len__(self):
+        return len(self.rotulos)
+
+    def posicao_exata(self, rotulo: str, a_partir_de: int = 0) -> Optional[int]:
+        """Primeira linha (>= a_partir_de) cujo rótulo é exatamente `rotulo`"""
+        posicoes = self.posicoes.get(rotulo)
+        if not posicoes:
+            return None
+        i = bisect_left(posicoes, a_partir_de)
+        return posicoes[i] if i < len(posicoes) else None
+
+    def ocorrencias(self, padroes: Tuple[str, ...],
+                    normalizar: Optional[Callable[[str], str]] = None) -> Dict[str, List[int]]:
+        """Para cada padrão, as linhas (em ordem) cujo rótulo o contém como substring"""
+        chave = (padroes, normalizar)
+        if chave not in self._ocorrencias:
+            automato = compilar_padroes(padroes)
+            resultado: Dict[str, List[int]] = {padrao: [] for padrao in padroes}
+            # Rótulos repetidos são avaliados uma única vez
+            for rotulo, posicoes in self.posicoes.items():
+                texto = normalizar(rotulo) if normalizar else rotulo
+                for indice in automato.encontrar(texto):
+                    resultado[padroes[indice]].extend(posicoes)
+            for posicoes in resultado.values():
+                posicoes.sort()
+            self._ocorrencias[chave] = resultado
+        return self._ocorrencias[chave]
+
+    def primeira_ocorrencia(self, padroes: Tuple[str, ...], a_partir_de: int = 0,
+                            normalizar: Optional[Callable[[str], str]] = None) -> Dict[str, Optional[int]]:
+        """Para cada padrão, a primeira linha (>= a_partir_de) cujo rótulo o contém"""
+        primeiras = {}
+        for padrao, posicoes in self.ocorrencias(padroes, normalizar).items():
+            i = bisect_left(posicoes, a_partir_de)
+            primeiras[padrao] = posicoes[i] if i < len(posicoes) else None
+        return primeiras
@@ -0,0 +1,111 @@
+"""
+Layouts de planilha Habitus Foreca$t aceitos e as células lidas de cada aba.
+
+Cada layout declara as abas obrigatórias (usadas na validação) e, por aba,
+os intervalos no formato do Excel ('A:A' = coluna inteira, 'C63:N63' = trecho
+de uma linha) que o processador consulta. A especificação é compilada em um
+plano de leitura: a PlanilhaCarregada lê cada aba em streaming só até a última
+linha necessária e guarda apenas as células dos intervalos. Abas fora do plano
+(ou planilhas sem layout reconhecido) são lidas por inteiro.
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from openpyxl.utils.cell import range_boundaries
+
+# Geração FDC Livre (H19), Ponto de Equilíbrio (H31) e % Custo Fixo (H35)
+INTERVALOS_INDICADORES = ('H19', 'H31', 'H35')
+
+LAYOUTS_PLANILHA = (
+    {
+        'nome': 'antigo',
+        'abas_obrigatorias': ('Painel Controle', 'HABITUS_FORECA$T', 'VENDAS'),
+        'intervalos': {
+            # Rótulos dos parâmetros gerais (coluna B) e respectivos valores (coluna E)
+            'Painel Controle': ('B:B', 'E:E'),
+            # Rótulos das categorias (coluna A) e 12 meses (C-N), inclusive a linha 56 do gráfico
+            'HABITUS_FORECA$T': ('A:A', 'C:N'),
+            'PROFECIA': ('A:A', 'C:N'),
+            'FDC-REAL': ('C63:N63',),
+            'indicadores forecast': INTERVALOS_INDICADORES,
+        },
+    },
+    {
+        'nome': 'novo_receitas',
+        'abas_obrigatorias': ('REALIZADO', 'RECEITAS', 'DESPESAS', 'INVESTIMENTOS', 'FINANCIAMENTOS'),
+        'intervalos': {
+            # Nome do cliente (B2) e FDC-REAL (linha 61, F-Q)
+            'REALIZADO': ('B2', 'F61:Q61'),
+            # Categorias (A + C-N) e base da linha verde (linha 6, E-P)
+            'RECEITAS': ('A:A', 'C:N', 'E6:P6'),
+            'DESPESAS': ('E217:P217',),
+            'INVESTIMENTOS': ('E61:P61', 'E63:P63'),
+            'FINANCIAMENTOS': ('E78:P78', 'E80:P80'),
+            'indicadores forecast': INTERVALOS_INDICADORES,
+        },
+    },
+    {
+        'nome': 'novo',
+        'abas_obrigatorias': ('REALIZADO', 'DESPESAS', 'INVESTIMENTOS', 'FINANCIAMENTOS'),
+        'intervalos': {
+            # Categorias e FATURAMENTO (A + C-N), nome do cliente (B2) e FDC-REAL (linha 61, F-Q)
+            'REALIZADO': ('A:A', 'C:N', 'B2', 'F61:Q61'),
+            'indicadores forecast': INTERVALOS_INDICADORES,
+        },
+    },
+)
+
+
+def normalizar_nome_aba(nome: str) -> str:
+    return str(nome).strip().lower()
+
+
+def detectar_layout(abas: Iterable[str]) -> Optional[Dict]:
+    """Primeiro layout (na ordem de LAYOUTS_PLANILHA) cujas abas obrigatórias estão todas presentes"""
+    abas = set(abas)
+    for layout in LAYOUTS_PLANILHA:
+        if all(aba in abas for aba in layout['abas_obrigatorias']):
+            return layout
+    return None
+
+
+class LeituraAba:
+    """Intervalos de uma aba, em coordenadas 1-based (linhas None = sem limite)"""
+
+    def __init__(self, intervalos: Iterable[str]):
+        self.limites: List[Tuple[int, Optional[int], int, Optional[int]]] = []
+        for intervalo in intervalos:
+            coluna_inicial, linha_inicial, coluna_final, linha_final = range_boundaries(intervalo)
+            self.limites.append((coluna_inicial, linha_inicial, coluna_final, linha_final))
+        self.ultima_coluna = max(limite[2] for limite in self.limites)
+        # Última linha a ler; None se algum intervalo ocupa a coluna inteira
+        linhas_finais = [limite[3] for limite in self.limites]
+        self.ultima_linha = None if None in linhas_finais else max(linhas_finais)
+
+    def colunas(self, linha: int) -> List[Tuple[int, int]]:
+        """Trechos de colunas (inicial, final) necessários na linha informada"""
+        return [
+            (coluna_inicial, coluna_final)
+            for coluna_inicial, linha_inicial, coluna_final, linha_final in self.limites
+            if (linha_inicial is None or linha_inicial <= linha) and (linha_final is None or linha <= linha_final)
+        ]
+
+
+class PlanoLeitura:
+    """Plano de leitura compilado do layout detectado para as abas da planilha"""
+
+    def __init__(self, layout: Dict):
+        self.layout = layout['nome']
+        self._abas: Dict[str, LeituraAba] = {
+            normalizar_nome_aba(aba): LeituraAba(intervalos)
+            for aba, intervalos in layout['intervalos'].items()
+        }
+
+    def leitura(self, aba: str) -> Optional[LeituraAba]:
+        """Intervalos da aba, ou None se ela deve ser lida por inteiro"""
+        return self._abas.get(normalizar_nome_aba(aba))
+
+
+def compilar_plano(abas: Iterable[str]) -> Optional[PlanoLeitura]:
+    """Plano de leitura para uma planilha com as abas informadas (None se o layout não for reconhecido)"""
+    layout = detectar_layout(abas)
+    return PlanoLeitura(layout) if layout is not None else None
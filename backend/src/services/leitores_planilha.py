@@ -0,0 +1,163 @@
+"""
+Leitores de planilhas Excel usados pela PlanilhaCarregada.
+
+- openpyxl: modo somente leitura, em streaming (sempre disponível).
+- calamine (pacote opcional python-calamine, em Rust): bem mais rápido no parse
+  do XML; usado quando instalado.
+
+UPLOAD_LEITOR_PLANILHA escolhe o leitor: 'auto' (padrão: calamine se instalado),
+'calamine' ou 'openpyxl'. Se o calamine não estiver instalado ou não conseguir
+abrir o arquivo, a planilha é lida com o openpyxl.
+
+O calamine carrega a aba inteira, enquanto o openpyxl para na última linha do
+plano de leitura. Por isso, no modo 'auto', as abas cujo XML passa de
+UPLOAD_CALAMINE_MAX_ABA_BYTES e que têm limite de linhas são lidas em streaming
+pelo openpyxl. Exemplo: abas de 30MB com as linhas usadas no início levam cerca
+de 700ms no calamine e 30ms no openpyxl.
+
+Os dois leitores entregam os mesmos valores por célula, na mesma posição (a
+partir de A1): valores em cache das fórmulas, só a primeira célula de uma área
+mesclada preenchida, números inteiros sem casas decimais, datas como datetime,
+vazio e erros (#DIV/0!, #N/A...) como ''. A paridade é verificada por
+scripts/paridade_leitores_planilha.py.
+"""
+import os
+import zipfile
+from datetime import date, datetime, time
+from io import BytesIO
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from openpyxl import load_workbook
+from openpyxl.cell.cell import TYPE_ERROR, TYPE_NUMERIC
+
+from src.services.validacao_rapida import ASSINATURA_ZIP, partes_abas_xlsx
+from src.utils.logger import warning_log
+
+try:
+    from python_calamine import CalamineWorkbook
+except ImportError:
+    CalamineWorkbook = None
+
+LEITORES = ('auto', 'calamine', 'openpyxl')
+LEITOR_PLANILHA = os.getenv('UPLOAD_LEITOR_PLANILHA', 'auto').strip().lower()
+# Modo 'auto': abas maiores que isso (XML descompactado) com limite de linhas vão para o streaming do openpyxl
+MAX_ABA_CALAMINE = int(os.getenv('UPLOAD_CALAMINE_MAX_ABA_BYTES', str(2 * 1024 * 1024)))
+
+# Linhas da aba (células ou valores, conforme o leitor) e a função que converte cada uma
+LinhasAba = Tuple[Iterable[Sequence[Any]], Callable[[Any], Any]]
+
+
+def _converter_celula(celula):
+    """Célula do openpyxl: vazio/erro -> '', inteiros sem casas (como o leitor openpyxl do pandas)"""
+    if celula.value is None or celula.data_type == TYPE_ERROR:
+        return ''
+    if celula.data_type == TYPE_NUMERIC:
+        valor = int(celula.value)
+        if valor == celula.value:
+            return valor
+        return float(celula.value)
+    return celula.value
+
+
+def _converter_valor(valor):
+    """Valor do calamine com as mesmas regras do openpyxl (ele devolve '' para vazio e erros)"""
+    if isinstance(valor, float):
+        inteiro = int(valor)
+        if inteiro == valor:
+            return inteiro
+        return valor
+    if isinstance(valor, date) and not isinstance(valor, datetime):
+        # Datas sem hora: o openpyxl devolve datetime à meia-noite
+        return datetime.combine(valor, time())
+    return valor
+
+
+class LeitorOpenpyxl:
+    """Leitura em streaming com o openpyxl (read_only, valores em cache das fórmulas)"""
+
+    nome = 'openpyxl'
+
+    def __init__(self, conteudo: bytes):
+        self._livro = load_workbook(BytesIO(conteudo), read_only=True, data_only=True, keep_links=False)
+
+    @property
+    def sheetnames(self) -> List[str]:
+        return self._livro.sheetnames
+
+    def linhas(self, nome: str, max_linha: Optional[int] = None, max_coluna: Optional[int] = None) -> LinhasAba:
+        """Linhas da aba a partir de A1, em streaming (células do openpyxl)"""
+        planilha = self._livro[nome]
+        # A dimensão gravada no arquivo pode estar errada (mesmo tratamento do pandas)
+        planilha.reset_dimensions()
+        return planilha.iter_rows(max_row=max_linha, max_col=max_coluna), _converter_celula
+
+    def fechar(self):
+        self._livro.close()
+
+
+class LeitorCalamine:
+    """Leitura com o python-calamine (cada aba é carregada inteira na primeira leitura)"""
+
+    nome = 'calamine'
+
+    def __init__(self, conteudo: bytes, max_aba: Optional[int] = None):
+        # `max_aba`: abas maiores (bytes de XML) com limite de linhas são lidas pelo openpyxl
+        self._livro = CalamineWorkbook.from_filelike(BytesIO(conteudo))
+        self._conteudo = conteudo
+        self._max_aba = max_aba
+        self._tamanhos_abas: Optional[Dict[str, int]] = None
+        self._streaming: Optional[LeitorOpenpyxl] = None
+
+    @property
+    def sheetnames(self) -> List[str]:
+        return self._livro.sheet_names
+
+    def _tamanho_aba(self, nome: str) -> int:
+        if self._tamanhos_abas is None:
+            self._tamanhos_abas = {}
+            if self._conteudo.startswith(ASSINATURA_ZIP):
+                try:
+                    with zipfile.ZipFile(BytesIO(self._conteudo)) as zf:
+                        self._tamanhos_abas = {aba: info.file_size for aba, info in partes_abas_xlsx(zf).items()}
+                except Exception:
+                    pass
+        return self._tamanhos_abas.get(nome, 0)
+
+    def linhas(self, nome: str, max_linha: Optional[int] = None, max_coluna: Optional[int] = None) -> LinhasAba:
+        """Linhas da aba a partir de A1 (valores Python)"""
+        if self._max_aba is not None and max_linha is not None and self._tamanho_aba(nome) > self._max_aba:
+            if self._streaming is None:
+                self._streaming = LeitorOpenpyxl(self._conteudo)
+            return self._streaming.linhas(nome, max_linha, max_coluna)
+
+        # skip_empty_area=False: linhas e colunas vazias iniciais são mantidas (posições a partir de A1)
+        linhas = self._livro.get_sheet_by_name(nome).to_python(skip_empty_area=False, nrows=max_linha)
+        if max_coluna is not None:
+            linhas = (linha[:max_coluna] for linha in linhas)
+        return linhas, _converter_valor
+
+    def fechar(self):
+        self._livro.close()
+        if self._streaming is not None:
+            self._streaming.fechar()
+
+
+def calamine_disponivel() -> bool:
+    return CalamineWorkbook is not None
+
+
+def abrir_leitor(conteudo: bytes, leitor: Optional[str] = None):
+    """Abre o conteúdo com o leitor configurado (UPLOAD_LEITOR_PLANILHA), recorrendo ao openpyxl"""
+    leitor = (leitor or LEITOR_PLANILHA).lower()
+    if leitor not in LEITORES:
+        raise ValueError(f'Leitor de planilha desconhecido: {leitor} (use {", ".join(LEITORES)})')
+
+    if leitor != 'openpyxl':
+        if calamine_disponivel():
+            try:
+                return LeitorCalamine(conteudo, max_aba=MAX_ABA_CALAMINE if leitor == 'auto' else None)
+            except Exception as e:
+                warning_log(f"calamine não abriu a planilha; usando openpyxl: {str(e)}")
+        elif leitor == 'calamine':
+            warning_log("UPLOAD_LEITOR_PLANILHA=calamine, mas python-calamine não está instalado; usando openpyxl")
+    return LeitorOpenpyxl(conteudo)
@@ -0,0 +1,121 @@
+"""
+Instrumentação das etapas do processamento de planilhas.
+
+Cada etapa registra tempo de parede, tempo de CPU da thread, pico de memória
+alocada (tracemalloc, relativo ao início da etapa) e, quando informado, o
+número de linhas. O resumo é gravado em ArquivoUpload.relatorio_processamento
+e enviado ao log estruturado, para identificar quais planilhas de clientes
+são lentas e em qual etapa.
+
+A medição de memória é opcional (UPLOAD_METRICAS_MEMORIA=true): o tracemalloc
+deixa a leitura das abas várias vezes mais lenta. Ele também é global no
+processo: com vários processamentos simultâneos no mesmo processo (ex.:
+workers da fila), os picos de memória são aproximados.
+"""
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from src.utils.logger import info_log
+
+MEDIR_MEMORIA = os.getenv('UPLOAD_METRICAS_MEMORIA', 'false').lower() == 'true'
+
+_lock_tracemalloc = threading.Lock()
+_usuarios_tracemalloc = 0
+
+
+def _iniciar_tracemalloc() -> bool:
+    """Inicia o tracemalloc se ainda não estiver ativo; retorna True se este medidor deve pará-lo depois"""
+    global _usuarios_tracemalloc
+    with _lock_tracemalloc:
+        if _usuarios_tracemalloc == 0 and tracemalloc.is_tracing():
+            # Ativado por terceiros (ex.: profiling manual): apenas usar
+            return False
+        if _usuarios_tracemalloc == 0:
+            tracemalloc.start()
+        _usuarios_tracemalloc += 1
+        return True
+
+
+def _parar_tracemalloc():
+    global _usuarios_tracemalloc
+    with _lock_tracemalloc:
+        _usuarios_tracemalloc -= 1
+        if _usuarios_tracemalloc == 0:
+            tracemalloc.stop()
+
+
+class MedidorProcessamento:
+    """Coleta as métricas das etapas de um processamento (etapas podem ser aninhadas)"""
+
+    def __init__(self, etapas: Optional[List[Dict[str, Any]]] = None, medir_memoria: bool = None):
+        # `etapas` permite continuar a medição iniciada em outro processo (ex.: extração no pool do lote)
+        self.etapas: List[Dict[str, Any]] = list(etapas or [])
+        self.medir_memoria = MEDIR_MEMORIA if medir_memoria is None else medir_memoria
+        self._pilha: List[Dict[str, Any]] = []
+
+    @contextmanager
+    def etapa(self, nome: str, **detalhes):
+        """
+        Mede o bloco como uma etapa. O dicionário retornado pode receber informações
+        ao longo da etapa (ex.: registro['linhas'] = 120).
+        """
+        registro: Dict[str, Any] = {'etapa': nome, **detalhes}
+        if self._pilha:
+            registro['nivel'] = len(self._pilha)
+        self.etapas.append(registro)
+
+        para_tracemalloc = False
+        memoria_inicial = 0
+        if self.medir_memoria:
+            para_tracemalloc = _iniciar_tracemalloc()
+            if self._pilha:
+                # Preservar o pico já atingido pela etapa externa antes de zerar o pico global
+                externa = self._pilha[-1]
+                externa['_pico'] = max(externa['_pico'], tracemalloc.get_traced_memory()[1])
+            memoria_inicial = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        controle = {'_pico': 0}
+        self._pilha.append(controle)
+
+        inicio = time.perf_counter()
+        inicio_cpu = time.thread_time()
+        try:
+            yield registro
+        finally:
+            registro['tempo_ms'] = round((time.perf_counter() - inicio) * 1000, 2)
+            registro['cpu_ms'] = round((time.thread_time() - inicio_cpu) * 1000, 2)
+            self._pilha.pop()
+            if self.medir_memoria:
+                pico = max(controle['_pico'], tracemalloc.get_traced_memory()[1])
+                registro['memoria_pico_kb'] = round(max(pico - memoria_inicial, 0) / 1024, 1)
+                if self._pilha:
+                    self._pilha[-1]['_pico'] = max(self._pilha[-1]['_pico'], pico)
+                if para_tracemalloc:
+                    _parar_tracemalloc()
+
+    def incorporar(self, etapas: List[Dict[str, Any]]):
+        """Adiciona etapas medidas em outro processo como subetapas da etapa em andamento"""
+        for etapa in etapas:
+            nivel = etapa.get('nivel', 0) + len(self._pilha)
+            self.etapas.append(dict(etapa, nivel=nivel) if nivel else dict(etapa))
+
+    def resumo(self) -> Dict[str, Any]:
+        """Totais das etapas de primeiro nível e a lista de todas as etapas, pronto para JSON"""
+        principais = [etapa for etapa in self.etapas if 'nivel' not in etapa and 'tempo_ms' in etapa]
+        resumo: Dict[str, Any] = {
+            'tempo_total_ms': round(sum(etapa['tempo_ms'] for etapa in principais), 2),
+            'cpu_total_ms': round(sum(etapa['cpu_ms'] for etapa in principais), 2),
+            'etapas': self.etapas,
+        }
+        picos = [etapa['memoria_pico_kb'] for etapa in principais if 'memoria_pico_kb' in etapa]
+        if picos:
+            resumo['memoria_pico_kb'] = max(picos)
+        return resumo
+
+    def registrar_log(self, mensagem: str, **contexto):
+        """Envia o resumo ao log estruturado (campo 'metricas' do JSONFormatter)"""
+        info_log(mensagem, extra={'metricas': dict(self.resumo(), **contexto)})
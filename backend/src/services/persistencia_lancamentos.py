@@ -0,0 +1,85 @@
+"""
+Persistência em lote de cenários e lançamentos gerados na importação de planilhas.
+
+Os lançamentos são montados como tuplas simples (sem objetos ORM) e gravados
+com um único comando por cenário: COPY FROM STDIN no PostgreSQL e INSERT
+multi-linha (executemany) nos demais bancos. O resumo mensal dos cenários
+(services/resumo_mensal.py) é atualizado na mesma transação.
+"""
+import csv
+from io import StringIO
+from typing import Dict, List, Sequence, Tuple
+
+from sqlalchemy import insert
+
+from src.models.user import db, Cenario, LancamentoFinanceiro
+from src.services.resumo_mensal import centavos, somar_lancamentos
+
+# Ordem das colunas das tuplas de lançamento
+COLUNAS_LANCAMENTO = ('cenario_id', 'categoria_id', 'data_competencia', 'valor', 'tipo', 'origem')
+
+LinhaLancamento = Tuple[int, int, object, float, str, str]
+
+
+def _dialeto() -> str:
+    return db.session.connection().dialect.name
+
+
+def inserir_cenarios(cenarios: List[Dict]) -> List[int]:
+    """Insere os cenários em um único INSERT multi-linha e retorna os ids (RETURNING) na ordem recebida"""
+    if not cenarios:
+        return []
+    resultado = db.session.execute(
+        insert(Cenario).returning(Cenario.id, sort_by_parameter_order=True),
+        cenarios
+    )
+    return [linha.id for linha in resultado]
+
+
+def _copiar_postgres(linhas: Sequence[LinhaLancamento]) -> bool:
+    """Grava as linhas via COPY FROM STDIN na conexão da transação atual; False se o driver não suportar"""
+    db.session.flush()
+    conexao = db.session.connection().connection
+    cursor = conexao.cursor()
+    try:
+        if not hasattr(cursor, 'copy_expert'):
+            return False
+        buffer = StringIO()
+        escritor = csv.writer(buffer)
+        for cenario_id, categoria_id, data_competencia, valor, tipo, origem in linhas:
+            escritor.writerow((cenario_id, categoria_id, data_competencia.isoformat(), repr(float(valor)), tipo, origem))
+        buffer.seek(0)
+        cursor.copy_expert(
+            f"COPY {LancamentoFinanceiro.__tablename__} ({', '.join(COLUNAS_LANCAMENTO)}) "
+            "FROM STDIN WITH (FORMAT csv)",
+            buffer
+        )
+        return True
+    finally:
+        cursor.close()
+
+
+def inserir_lancamentos(linhas: Sequence[LinhaLancamento], atualizar_resumo: bool = True) -> int:
+    """
+    Grava as tuplas de lançamento (ver COLUNAS_LANCAMENTO) com um único comando e retorna a quantidade.
+
+    Com atualizar_resumo=False o chamador recalcula o resumo mensal (ex.: reimportação, que também
+    altera e exclui lançamentos).
+    """
+    if not linhas:
+        return 0
+    # Valores ao centavo, como o Numeric(15, 2) do PostgreSQL grava: o SQLite guardaria o float da
+    # extração e a soma do resumo mensal deixaria de bater com os valores listados
+    linhas = [
+        (cenario_id, categoria_id, data_competencia, centavos(valor), tipo, origem)
+        for cenario_id, categoria_id, data_competencia, valor, tipo, origem in linhas
+    ]
+    if atualizar_resumo:
+        somar_lancamentos(linhas)
+    if _dialeto() == 'postgresql' and _copiar_postgres(linhas):
+        return len(linhas)
+    db.session.execute(
+        insert(LancamentoFinanceiro.__table__),
+        [dict(zip(COLUNAS_LANCAMENTO, linha)) for linha in linhas]
+    )
+    return len(linhas)
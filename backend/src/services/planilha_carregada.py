@@ -0,0 +1,201 @@
+import hashlib
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+from pandas.io.parsers import TextParser
+
+from src.services.indice_rotulos import IndiceRotulos
+from src.services.layout_planilhas import LeituraAba, compilar_plano
+from src.services.leitores_planilha import abrir_leitor
+from src.services.metricas_processamento import MedidorProcessamento
+from src.utils.logger import warning_log
+
+# Leitura das abas do plano em paralelo (opt-in): número de processos; 0 ou 1 desativa
+PROCESSOS_LEITURA_ABAS = int(os.getenv('UPLOAD_LEITURA_ABAS_PROCESSOS', '0'))
+
+_pool_leitura_abas: Optional[ProcessPoolExecutor] = None
+_lock_pool_leitura_abas = threading.Lock()
+
+
+def _obter_pool_leitura_abas() -> ProcessPoolExecutor:
+    """Pool de processos reaproveitado entre uploads (o custo de iniciar os processos é pago uma vez)"""
+    global _pool_leitura_abas
+    with _lock_pool_leitura_abas:
+        if _pool_leitura_abas is None:
+            # 'spawn': os workers do gunicorn mantêm threads (fila assíncrona, pool do banco); fork não é seguro
+            _pool_leitura_abas = ProcessPoolExecutor(
+                max_workers=PROCESSOS_LEITURA_ABAS, mp_context=multiprocessing.get_context('spawn')
+            )
+        return _pool_leitura_abas
+
+
+def _descartar_pool_leitura_abas():
+    global _pool_leitura_abas
+    with _lock_pool_leitura_abas:
+        if _pool_leitura_abas is not None:
+            _pool_leitura_abas.shutdown(wait=False, cancel_futures=True)
+            _pool_leitura_abas = None
+
+
+def _ler_aba_em_processo(caminho_arquivo: str, nome: str, medir: bool) -> Tuple[pd.DataFrame, List[Dict[str, Any]]]:
+    """Executado nos processos do pool: abre a planilha e lê uma aba segundo o plano"""
+    medidor = MedidorProcessamento() if medir else None
+    with PlanilhaCarregada(caminho_arquivo, medidor=medidor) as planilha:
+        return planilha.ler_aba(nome), (medidor.etapas if medidor is not None else [])
+
+
+class PlanilhaCarregada:
+    """
+    Planilha Excel aberta uma única vez por upload.
+
+    O conteúdo do arquivo é lido para memória uma vez, o ZIP/XML é aberto
+    uma vez (calamine ou openpyxl, ver leitores_planilha.py) e cada aba é convertida em
+    DataFrame no máximo uma vez, sendo reaproveitada por todas as etapas de
+    extração do processador. Quando o layout é reconhecido, cada aba é lida
+    segundo o plano de leitura (ver layout_planilhas.py): até a última linha
+    necessária e só com as células usadas. As posições no DataFrame continuam
+    sendo as da planilha (linha 63 -> índice 62, coluna C -> índice 2).
+
+    Com `medidor`, a leitura de cada aba é registrada como uma etapa
+    (ver metricas_processamento.py).
+    """
+
+    def __init__(self, caminho_arquivo: str, medidor: Optional[MedidorProcessamento] = None,
+                 conteudo: Optional[bytes] = None, leitor: Optional[str] = None):
+        # `conteudo`: bytes já em memória (ex.: corpo do upload), sem leitura de `caminho_arquivo`
+        # `leitor`: 'calamine' ou 'openpyxl' (padrão: UPLOAD_LEITOR_PLANILHA)
+        self.caminho_arquivo = caminho_arquivo
+        self.medidor = medidor
+        if conteudo is None:
+            with open(caminho_arquivo, 'rb') as f:
+                conteudo = f.read()
+        self._conteudo = conteudo
+        self._leitor = abrir_leitor(self._conteudo, leitor)
+        self.plano = compilar_plano(self._leitor.sheetnames)
+        self._abas: Dict[str, pd.DataFrame] = {}
+        self._indices: Dict[Tuple[str, int], IndiceRotulos] = {}
+        self._hash = None
+
+    @property
+    def leitor(self) -> str:
+        """Nome do leitor efetivamente usado ('calamine' ou 'openpyxl')"""
+        return self._leitor.nome
+
+    @property
+    def sheet_names(self) -> List[str]:
+        return self._leitor.sheetnames
+
+    def possui_aba(self, nome: str) -> bool:
+        return nome in self._leitor.sheetnames
+
+    def ler_aba(self, nome: str) -> pd.DataFrame:
+        """Retorna a aba como DataFrame sem cabeçalho (header=None), lendo-a só na primeira chamada.
+
+        O DataFrame retornado é compartilhado entre as etapas e não deve ser alterado.
+        """
+        if nome not in self._abas:
+            leitura = self.plano.leitura(nome) if self.plano is not None else None
+            if self.medidor is None:
+                self._abas[nome] = self._ler_celulas(nome, leitura)
+            else:
+                with self.medidor.etapa('ler_aba', aba=nome) as registro:
+                    self._abas[nome] = self._ler_celulas(nome, leitura)
+                    registro['linhas'] = len(self._abas[nome])
+        return self._abas[nome]
+
+    def ler_abas_em_paralelo(self):
+        """
+        Lê de uma vez, em processos separados, as abas do plano ainda não lidas (cada processo
+        abre o arquivo e faz o parse XML de uma aba). As etapas de extração passam a encontrar
+        as abas prontas. Em caso de falha do pool, as abas restantes são lidas sob demanda.
+        """
+        if PROCESSOS_LEITURA_ABAS < 2 or self.plano is None or not os.path.exists(self.caminho_arquivo):
+            return
+        pendentes = [
+            nome for nome in self._leitor.sheetnames
+            if nome not in self._abas and self.plano.leitura(nome) is not None
+        ]
+        if len(pendentes) < 2:
+            return
+
+        etapa = (
+            self.medidor.etapa('ler_abas_paralelo', abas=len(pendentes), processos=PROCESSOS_LEITURA_ABAS)
+            if self.medidor is not None else nullcontext()
+        )
+        with etapa:
+            try:
+                pool = _obter_pool_leitura_abas()
+                futuros = [
+                    (nome, pool.submit(_ler_aba_em_processo, self.caminho_arquivo, nome, self.medidor is not None))
+                    for nome in pendentes
+                ]
+                for nome, futuro in futuros:
+                    self._abas[nome], etapas = futuro.result()
+                    if self.medidor is not None:
+                        self.medidor.incorporar(etapas)
+            except Exception as e:
+                warning_log(f"Leitura paralela das abas falhou; lendo sequencialmente: {str(e)}")
+                _descartar_pool_leitura_abas()
+
+    def _ler_celulas(self, nome: str, leitura: Optional[LeituraAba]) -> pd.DataFrame:
+        """Lê a aba em streaming; com `leitura`, para na última linha do plano e ignora as demais células"""
+        if leitura is None:
+            linhas_planilha, converter = self._leitor.linhas(nome)
+        else:
+            linhas_planilha, converter = self._leitor.linhas(nome, leitura.ultima_linha, leitura.ultima_coluna)
+
+        dados = []
+        ultima_linha_com_dados = -1
+        for numero, celulas in enumerate(linhas_planilha, start=1):
+            if leitura is None:
+                linha = [converter(celula) for celula in celulas]
+            else:
+                linha = [''] * min(len(celulas), leitura.ultima_coluna)
+                for coluna_inicial, coluna_final in leitura.colunas(numero):
+                    for coluna in range(coluna_inicial, min(coluna_final, len(linha)) + 1):
+                        linha[coluna - 1] = converter(celulas[coluna - 1])
+            while linha and linha[-1] == '':
+                linha.pop()
+            if linha:
+                ultima_linha_com_dados = numero - 1
+            dados.append(linha)
+
+        dados = dados[:ultima_linha_com_dados + 1]
+        if not dados:
+            return pd.DataFrame()
+        largura = max(len(linha) for linha in dados)
+        dados = [linha + [''] * (largura - len(linha)) for linha in dados]
+        return TextParser(dados, header=None, skip_blank_lines=False).read()
+
+    def indice_rotulos(self, nome: str, coluna: int = 0) -> IndiceRotulos:
+        """Índice de rótulos da coluna informada da aba, construído uma única vez"""
+        chave = (nome, coluna)
+        if chave not in self._indices:
+            self._indices[chave] = IndiceRotulos(self.ler_aba(nome), coluna)
+        return self._indices[chave]
+
+    def calcular_hash(self) -> str:
+        """Calcula o SHA256 do conteúdo já carregado, sem reler o arquivo"""
+        if self._hash is None:
+            self._hash = hashlib.sha256(self._conteudo).hexdigest()
+        return self._hash
+
+    def fechar(self):
+        try:
+            self._leitor.fechar()
+        except Exception:
+            pass
+        self._abas.clear()
+        self._indices.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.fechar()
+        return False
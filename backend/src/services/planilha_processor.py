@@ -1,9 +1,21 @@
 import pandas as pd
 import hashlib
 import os
+from contextlib import contextmanager, nullcontext
 from datetime import datetime, date
-from typing import Dict, Any, List
-from src.models.user import db, Projeto, Cenario, CategoriaFinanceira, LancamentoFinanceiro, ArquivoUpload, ConfiguracaoCenarios
+from typing import Dict, Any, List, Optional, Tuple, Union
+from src.models.user import db, Projeto, Cenario, ArquivoUpload, ConfiguracaoCenarios
+from src.services.planilha_carregada import PlanilhaCarregada
+from src.services.indice_rotulos import rotulo_maiusculo
+from src.services.layout_planilhas import LAYOUTS_PLANILHA
+from src.services.persistencia_lancamentos import inserir_cenarios, inserir_lancamentos
+from src.services.registro_categorias import registro_categorias
+from src.services.reimportacao import aplicar_diferenca, calcular_diferenca, cenario_base_do_projeto, lancamentos_atuais
+from src.services.cache_extracoes import cache_extracoes
+from src.services.cenarios_virtuais import materializar_derivados
+from src.services.metricas_processamento import MedidorProcessamento
+from src.services.validacao_rapida import resultado_validacao
+from src.utils.logger import debug_log, warning_log
 
 class ProcessadorPlanilhaHabitusForecast:
     """
@@ -12,14 +24,13 @@ class ProcessadorPlanilhaHabitusForecast:
     """
     
     def __init__(self):
-        # Suporte a três layouts de planilha: antigo, novo e novo com RECEITAS
-        self.layouts_aceitos = [
-            ['Painel Controle', 'HABITUS_FORECA$T', 'VENDAS'],  # layout antigo
-            ['REALIZADO', 'RECEITAS', 'DESPESAS', 'INVESTIMENTOS', 'FINANCIAMENTOS'],  # layout novo com RECEITAS
-            ['REALIZADO', 'DESPESAS', 'INVESTIMENTOS', 'FINANCIAMENTOS']  # layout novo sem RECEITAS
-        ]
+        # Suporte a três layouts de planilha: antigo, novo com RECEITAS e novo sem RECEITAS
+        # (abas obrigatórias e células lidas de cada aba declaradas em layout_planilhas.py)
+        self.layouts_aceitos = [list(layout['abas_obrigatorias']) for layout in LAYOUTS_PLANILHA]
         # Mantém compatibilidade com código existente que acessa 'abas_obrigatorias'
         self.abas_obrigatorias = self.layouts_aceitos[0]
+        # Rótulos da coluna B da aba 'Painel Controle' (layout antigo) lidos como parâmetros gerais
+        self.rotulos_parametros_gerais = ('Nome do Cliente', 'Data-base', 'Saldo Inicial', 'Cenário')
         self.categorias_mapeamento = {
             # Aba REALIZADO
             'FATURAMENTO': ('FATURAMENTO', 'OPERACIONAL', 'ENTRADA'),
@@ -62,77 +73,66 @@ class ProcessadorPlanilhaHabitusForecast:
                 hash_sha256.update(chunk)
         return hash_sha256.hexdigest()
     
-    def validar_planilha(self, caminho_arquivo: str) -> Dict[str, Any]:
+    @contextmanager
+    def _abrir_planilha(self, planilha: Union[str, PlanilhaCarregada]):
+        """Reaproveita uma PlanilhaCarregada ou abre o caminho recebido apenas durante o bloco"""
+        if isinstance(planilha, PlanilhaCarregada):
+            yield planilha
+        else:
+            with PlanilhaCarregada(planilha) as planilha_carregada:
+                yield planilha_carregada
+    
+    def validar_planilha(self, planilha: Union[str, PlanilhaCarregada]) -> Dict[str, Any]:
         """Valida se a planilha possui a estrutura esperada"""
-        excel_file = None
         try:
-            excel_file = pd.ExcelFile(caminho_arquivo)
-            abas_encontradas = excel_file.sheet_names
-            
-            # Detectar qual layout é atendido
-            layout_detectado = None
-            for layout in self.layouts_aceitos:
-                if all(aba in abas_encontradas for aba in layout):
-                    layout_detectado = layout
-                    break
+            with self._abrir_planilha(planilha) as excel_file:
+                abas_encontradas = list(excel_file.sheet_names)
             
-            if not layout_detectado:
-                return {
-                    'valido': False,
-                    'erro': 'Estrutura de abas não reconhecida. Esperado um dos layouts válidos.',
-                    'abas_encontradas': abas_encontradas
-                }
-            
-            return {
-                'valido': True,
-                'abas_encontradas': abas_encontradas,
-                'total_abas': len(abas_encontradas),
-                'layout': 'novo' if 'REALIZADO' in layout_detectado else 'antigo'
-            }
+            # Detectar qual layout é atendido (mesma regra da validação rápida do endpoint)
+            return resultado_validacao(abas_encontradas)
             
         except Exception as e:
             return {
                 'valido': False,
                 'erro': f'Erro ao ler planilha: {str(e)}'
             }
-        finally:
-            # Garantir que o arquivo seja fechado
-            if excel_file is not None:
-                try:
-                    excel_file.close()
-                except:
-                    pass
     
-    def extrair_parametros_gerais(self, caminho_arquivo: str) -> Dict[str, Any]:
+    def extrair_parametros_gerais(self, planilha: Union[str, PlanilhaCarregada]) -> Dict[str, Any]:
         """Extrai os parâmetros gerais da planilha (compatível com layout antigo e novo)"""
         try:
-            with pd.ExcelFile(caminho_arquivo, engine='openpyxl') as excel_file:
+            with self._abrir_planilha(planilha) as excel_file:
                 parametros = {}
                 
                 # Tentar layout antigo primeiro (aba 'Painel Controle')
                 if 'Painel Controle' in excel_file.sheet_names:
-                    df = pd.read_excel(excel_file, sheet_name='Painel Controle', header=None)
+                    df = excel_file.ler_aba('Painel Controle')
+                    if df.shape[0] > 0 and df.shape[1] < 2:
+                        raise IndexError("Aba 'Painel Controle' não possui a coluna B")
+                    
+                    # Apenas as linhas cujo rótulo (coluna B) contém algum dos parâmetros são visitadas
+                    indice = excel_file.indice_rotulos('Painel Controle', coluna=1)
+                    ocorrencias = indice.ocorrencias(self.rotulos_parametros_gerais, normalizar=str.strip)
+                    linhas = sorted({posicao for posicoes in ocorrencias.values() for posicao in posicoes})
                     
-                    for _, row in df.iterrows():
-                        if pd.notna(row.iloc[1]):
-                            texto = str(row.iloc[1]).strip()
-                            valor = row.iloc[4] if len(row) > 4 else None
-                            
-                            if 'Nome do Cliente' in texto and pd.notna(valor):
-                                parametros['nome_cliente'] = str(valor).strip()
-                            elif 'Data-base' in texto and pd.notna(valor):
-                                if isinstance(valor, str):
-                                    parametros['data_base'] = datetime.strptime(valor, '%Y-%m-%d').date()
-                                else:
-                                    parametros['data_base'] = pd.to_datetime(valor).date()
-                            elif 'Saldo Inicial' in texto and pd.notna(valor):
-                                parametros['saldo_inicial'] = float(valor)
-                            elif 'Cenário' in texto and pd.notna(valor):
-                                parametros['cenario_vendas'] = str(valor).strip()
+                    for posicao in linhas:
+                        texto = indice.rotulos[posicao].strip()
+                        valor = df.iloc[posicao, 4] if df.shape[1] > 4 else None
+                        
+                        if 'Nome do Cliente' in texto and pd.notna(valor):
+                            parametros['nome_cliente'] = str(valor).strip()
+                        elif 'Data-base' in texto and pd.notna(valor):
+                            if isinstance(valor, str):
+                                parametros['data_base'] = datetime.strptime(valor, '%Y-%m-%d').date()
+                            else:
+                                parametros['data_base'] = pd.to_datetime(valor).date()
+                        elif 'Saldo Inicial' in texto and pd.notna(valor):
+                            parametros['saldo_inicial'] = float(valor)
+                        elif 'Cenário' in texto and pd.notna(valor):
+                            parametros['cenario_vendas'] = str(valor).strip()
                 
                 # Layout novo: extrair parâmetros da aba 'REALIZADO' se disponível
                 elif 'REALIZADO' in excel_file.sheet_names:
-                    df = pd.read_excel(excel_file, sheet_name='REALIZADO', header=None)
+                    df = excel_file.ler_aba('REALIZADO')
                     
                     # Procurar por informações do cliente na célula B2
                     if df.shape[0] >= 2 and df.shape[1] >= 2:
@@ -156,7 +156,7 @@ class ProcessadorPlanilhaHabitusForecast:
             
         except Exception as e:
             # Em caso de erro, retornar valores padrão ao invés de falhar
-            print(f"Aviso: Erro ao extrair parâmetros gerais: {str(e)}")
+            warning_log(f"Erro ao extrair parâmetros gerais: {str(e)}")
             return {
                 'nome_cliente': 'Cliente Importado',
                 'data_base': date.today(),
@@ -164,7 +164,7 @@ class ProcessadorPlanilhaHabitusForecast:
                 'cenario_vendas': 'Realista'
             }
 
-    def extrair_indicadores_forecast(self, caminho_arquivo: str) -> Dict[str, Any]:
+    def extrair_indicadores_forecast(self, planilha: Union[str, PlanilhaCarregada]) -> Dict[str, Any]:
         """Extrai indicadores da aba 'indicadores forecast' se existir.
 
         Mapeamento solicitado:
@@ -179,7 +179,7 @@ class ProcessadorPlanilhaHabitusForecast:
         }
 
         try:
-            with pd.ExcelFile(caminho_arquivo, engine='openpyxl') as excel_file:
+            with self._abrir_planilha(planilha) as excel_file:
                 # Procurar aba ignorando diferença de maiúsculas/minúsculas/acentos simples
                 sheet_name = None
                 for nome in excel_file.sheet_names:
@@ -190,7 +190,7 @@ class ProcessadorPlanilhaHabitusForecast:
                 if not sheet_name:
                     return indicadores
 
-                df = pd.read_excel(excel_file, sheet_name=sheet_name, header=None)
+                df = excel_file.ler_aba(sheet_name)
 
                 def get_float(row_idx: int, col_idx: int) -> float:
                     try:
@@ -215,24 +215,26 @@ class ProcessadorPlanilhaHabitusForecast:
 
                 return indicadores
         except Exception as e:
-            print(f"Aviso: erro ao extrair indicadores forecast: {e}")
+            warning_log(f"Erro ao extrair indicadores forecast: {e}")
             return indicadores
     
-    def extrair_dados_habitus_forecast(self, caminho_arquivo: str) -> List[Dict]:
+    def extrair_dados_habitus_forecast(self, planilha: Union[str, PlanilhaCarregada]) -> List[Dict]:
         """Extrai os dados de fluxo de caixa (compatível com layout antigo e novo)"""
         try:
-            with pd.ExcelFile(caminho_arquivo, engine='openpyxl') as excel_file:
+            with self._abrir_planilha(planilha) as excel_file:
                 # Determinar qual aba usar baseado no layout disponível
                 if 'HABITUS_FORECA$T' in excel_file.sheet_names or 'PROFECIA' in excel_file.sheet_names:
                     # Layout antigo (compatibilidade com nome antigo)
                     sheet_name = 'HABITUS_FORECA$T' if 'HABITUS_FORECA$T' in excel_file.sheet_names else 'PROFECIA'
-                    df_raw = pd.read_excel(excel_file, sheet_name=sheet_name, header=None)
+                    df_raw = excel_file.ler_aba(sheet_name)
                 elif 'RECEITAS' in excel_file.sheet_names:
                     # Layout novo com aba RECEITAS - usar aba RECEITAS para dados do gráfico
-                    df_raw = pd.read_excel(excel_file, sheet_name='RECEITAS', header=None)
+                    sheet_name = 'RECEITAS'
+                    df_raw = excel_file.ler_aba(sheet_name)
                 elif 'REALIZADO' in excel_file.sheet_names:
                     # Layout novo - usar aba REALIZADO
-                    df_raw = pd.read_excel(excel_file, sheet_name='REALIZADO', header=None)
+                    sheet_name = 'REALIZADO'
+                    df_raw = excel_file.ler_aba(sheet_name)
                 else:
                     raise Exception("Nenhuma aba compatível encontrada para extração de dados")
                 
@@ -257,36 +259,31 @@ class ProcessadorPlanilhaHabitusForecast:
                     ultimo_dia = monthrange(ano_atual, mes_atual)[1]
                     meses.append(date(ano_atual, mes_atual, ultimo_dia))
                 
-                print(f"Meses gerados: {[mes.strftime('%Y-%m-%d') for mes in meses]}")
-                
                 # Extrair dados das linhas principais
                 dados_extraidos = []
                 
-                # Procurar pelas linhas de dados a partir da linha 3
-                df_dados = df_raw.iloc[3:]
+                # Procurar pelas linhas de dados a partir da linha 3, usando o índice de rótulos
+                # da coluna A (uma passada do automato por rótulo, em vez de categorias x linhas)
+                indice = excel_file.indice_rotulos(sheet_name)
+                padroes = tuple(self.categorias_mapeamento.keys())
+                linhas_categorias = indice.primeira_ocorrencia(padroes, a_partir_de=3)
                 
                 for categoria_original, (categoria_nome, tipo_fluxo, tipo_entrada_saida) in self.categorias_mapeamento.items():
-                    # Encontrar a linha que contém esta categoria
-                    linha_encontrada = None
-                    for idx, row in df_dados.iterrows():
-                        if pd.notna(row.iloc[0]) and categoria_original in str(row.iloc[0]):
-                            linha_encontrada = row
-                            break
+                    posicao = linhas_categorias[categoria_original]
                     
-                    if linha_encontrada is not None:
-                        # Extrair valores para cada mês
-                        for i, mes in enumerate(meses):
-                            if i + 2 < len(linha_encontrada):  # +2 porque as colunas de dados começam no índice 2
-                                valor = linha_encontrada.iloc[i + 2]
-                                if pd.notna(valor) and valor != 0:
-                                    dados_extraidos.append({
-                                        'categoria_nome': categoria_nome,
-                                        'tipo_fluxo': tipo_fluxo,
-                                        'tipo': tipo_entrada_saida,
-                                        'data_competencia': mes,
-                                        'valor': float(valor),
-                                        'origem': 'PROJETADO'
-                                    })
+                    if posicao is not None:
+                        # Colunas de dados começam no índice 2; os 12 meses são lidos como um único bloco
+                        valores_mensais = df_raw.iloc[posicao, 2:2 + len(meses)].to_numpy()
+                        for mes, valor in zip(meses, valores_mensais):
+                            if pd.notna(valor) and valor != 0:
+                                dados_extraidos.append({
+                                    'categoria_nome': categoria_nome,
+                                    'tipo_fluxo': tipo_fluxo,
+                                    'tipo': tipo_entrada_saida,
+                                    'data_competencia': mes,
+                                    'valor': float(valor),
+                                    'origem': 'PROJETADO'
+                                })
                 
                 # Extrair dados para o gráfico (linha verde)
                 # Layout antigo: linha 56 da aba Habitus Foreca$t
@@ -298,9 +295,6 @@ class ProcessadorPlanilhaHabitusForecast:
                     linha_56 = df_raw.iloc[55]  # Índice 55 = linha 56
                     dados_linha_56 = linha_56.iloc[2:14]  # Colunas 3-14 (índices 2-13)
                     
-                    print(f"Extraindo dados da linha 56 (Habitus Foreca$t - gráfico)")
-                    print(f"Valores encontrados na linha 56: {[float(v) if pd.notna(v) else 0 for v in dados_linha_56]}")
-                    
                     for i, valor in enumerate(dados_linha_56):
                         if pd.notna(valor) and i < len(meses):
                             valor_original = float(valor)
@@ -312,9 +306,7 @@ class ProcessadorPlanilhaHabitusForecast:
                                 'valor': valor_original,
                                 'origem': 'PROJETADO'
                             })
-                            print(f"  Mês {i+1} ({meses[i]}): R$ {valor_original}")
                     dados_grafico_encontrados = True
-                    print(f"Total de valores extraídos da linha 56: {len([v for v in dados_linha_56 if pd.notna(v)])}")
                 
                 elif 'RECEITAS' in excel_file.sheet_names:
                     # Layout novo com aba RECEITAS - linha 6, colunas E-P (índices 4-15)
@@ -322,14 +314,11 @@ class ProcessadorPlanilhaHabitusForecast:
                         linha_6 = df_raw.iloc[5]  # Índice 5 = linha 6
                         dados_receitas = linha_6.iloc[4:16]  # Colunas E-P (índices 4-15)
 
-                        print(f"Extraindo dados da linha 6 (RECEITAS - base do gráfico)")
-                        print(f"Valores encontrados: {[float(v) if pd.notna(v) else 0 for v in dados_receitas]}")
-
                         # Compor fórmula sempre - permitir composição parcial (valores ausentes = 0)
                         try:
-                            df_inv = pd.read_excel(excel_file, sheet_name='INVESTIMENTOS', header=None) if 'INVESTIMENTOS' in excel_file.sheet_names else None
-                            df_fin = pd.read_excel(excel_file, sheet_name='FINANCIAMENTOS', header=None) if 'FINANCIAMENTOS' in excel_file.sheet_names else None
-                            df_desp = pd.read_excel(excel_file, sheet_name='DESPESAS', header=None) if 'DESPESAS' in excel_file.sheet_names else None
+                            df_inv = excel_file.ler_aba('INVESTIMENTOS') if 'INVESTIMENTOS' in excel_file.sheet_names else None
+                            df_fin = excel_file.ler_aba('FINANCIAMENTOS') if 'FINANCIAMENTOS' in excel_file.sheet_names else None
+                            df_desp = excel_file.ler_aba('DESPESAS') if 'DESPESAS' in excel_file.sheet_names else None
 
                             # Linhas alvo (1-based): inv(63,61), fin(80,78), desp(217)
                             # Índices pandas (0-based): 62, 60, 79, 77, 216
@@ -339,11 +328,11 @@ class ProcessadorPlanilhaHabitusForecast:
                             serie_fin_78 = df_fin.iloc[77].iloc[4:16] if df_fin is not None and df_fin.shape[0] > 77 else None
                             serie_desp_217 = df_desp.iloc[216].iloc[4:16] if df_desp is not None and df_desp.shape[0] > 216 else None
                         except Exception as e:
-                            print(f"Falha ao ler abas INV/FIN/DESP: {e}")
+                            warning_log(f"Falha ao ler abas INV/FIN/DESP: {e}")
                             serie_inv_63 = serie_inv_61 = serie_fin_80 = serie_fin_78 = serie_desp_217 = None
 
-                        print("Compondo linha verde com valores disponíveis (ausentes=0): RECEITAS(6) + INV(63) + FIN(80) - DESP(217) - INV(61) - FIN(78)")
-                        
+                        # Linha verde composta com os valores disponíveis (ausentes=0):
+                        # RECEITAS(6) + INV(63) + FIN(80) - DESP(217) - INV(61) - FIN(78)
                         def num(s, i):
                             """Extrai número de uma série, retorna 0 se ausente"""
                             try:
@@ -372,112 +361,89 @@ class ProcessadorPlanilhaHabitusForecast:
                                 'valor': v,
                                 'origem': 'PROJETADO'
                             })
-                            print(f"  Mês {i+1} ({meses[i]}): {base_rec} + INV(63)={num(serie_inv_63, i)} + FIN(80)={num(serie_fin_80, i)} - DESP(217)={num(serie_desp_217, i)} - INV(61)={num(serie_inv_61, i)} - FIN(78)={num(serie_fin_78, i)} = {v}")
                         dados_grafico_encontrados = True
                     else:
-                        print(f"Aba RECEITAS tem apenas {df_raw.shape[0]} linhas, linha 6 não existe")
+                        debug_log(f"Aba RECEITAS tem apenas {df_raw.shape[0]} linhas, linha 6 não existe")
                 
                 elif 'REALIZADO' in excel_file.sheet_names:
-                    # Layout novo - procurar linha com "FATURAMENTO"
-                    for idx, row in df_raw.iterrows():
-                        try:
-                            primeira_col = str(row.iloc[0]).strip().upper() if pd.notna(row.iloc[0]) else ''
-                        except Exception:
-                            primeira_col = ''
+                    # Layout novo - procurar linha com "FATURAMENTO" (rótulo sem espaços e em maiúsculas)
+                    posicao_faturamento = indice.primeira_ocorrencia(
+                        ('FATURAMENTO',), normalizar=rotulo_maiusculo
+                    )['FATURAMENTO']
+                    if posicao_faturamento is not None:
+                        dados_faturamento = df_raw.iloc[posicao_faturamento, 2:14]  # Colunas 3-14
                         
-                        if 'FATURAMENTO' in primeira_col:
-                            dados_faturamento = row.iloc[2:14]  # Colunas 3-14
-                            print(f"Extraindo dados da linha FATURAMENTO (REALIZADO - gráfico)")
-                            print(f"Valores encontrados: {[float(v) if pd.notna(v) else 0 for v in dados_faturamento]}")
-                            
-                            for i, valor in enumerate(dados_faturamento):
-                                if pd.notna(valor) and i < len(meses):
-                                    valor_original = float(valor)
-                                    dados_extraidos.append({
-                                        'categoria_nome': 'HABITUS_FORECA$T-GRAFICO',
-                                        'tipo_fluxo': 'OPERACIONAL',
-                                        'tipo': 'ENTRADA',
-                                        'data_competencia': meses[i],
-                                        'valor': valor_original,
-                                        'origem': 'PROJETADO'
-                                    })
-                                    print(f"  Mês {i+1} ({meses[i]}): R$ {valor_original}")
-                            dados_grafico_encontrados = True
-                            print(f"Total de valores extraídos do FATURAMENTO: {len([v for v in dados_faturamento if pd.notna(v)])}")
-                            break
+                        for i, valor in enumerate(dados_faturamento):
+                            if pd.notna(valor) and i < len(meses):
+                                valor_original = float(valor)
+                                dados_extraidos.append({
+                                    'categoria_nome': 'HABITUS_FORECA$T-GRAFICO',
+                                    'tipo_fluxo': 'OPERACIONAL',
+                                    'tipo': 'ENTRADA',
+                                    'data_competencia': meses[i],
+                                    'valor': valor_original,
+                                    'origem': 'PROJETADO'
+                                })
+                        dados_grafico_encontrados = True
                 
                 if not dados_grafico_encontrados:
-                    print(f"AVISO: Dados para gráfico não encontrados na planilha")
+                    debug_log("Dados para gráfico não encontrados na planilha")
                 
                 return dados_extraidos
             
         except Exception as e:
             raise Exception(f"Erro ao extrair dados da Habitus Foreca$t: {str(e)}")
     
-    def garantir_categorias_existem(self):
-        """Garante que todas as categorias necessárias existem no banco"""
-        for categoria_original, (categoria_nome, tipo_fluxo, tipo_entrada_saida) in self.categorias_mapeamento.items():
-            categoria_existente = CategoriaFinanceira.query.filter_by(nome=categoria_nome).first()
-            if not categoria_existente:
-                nova_categoria = CategoriaFinanceira(
-                    nome=categoria_nome,
-                    tipo_fluxo=tipo_fluxo
-                )
-                db.session.add(nova_categoria)
-        
-        # Garantir que a categoria HABITUS_FORECA$T-GRAFICO existe (linha 56)
-        categoria_habitus_forecast_grafico = CategoriaFinanceira.query.filter_by(nome='HABITUS_FORECA$T-GRAFICO').first()
-        if not categoria_habitus_forecast_grafico:
-            # Também verificar categoria antiga para compatibilidade
-            categoria_profecia_grafico = CategoriaFinanceira.query.filter_by(nome='PROFECIA-GRAFICO').first()
-            if categoria_profecia_grafico:
-                # Renomear categoria antiga para nova
-                categoria_profecia_grafico.nome = 'HABITUS_FORECA$T-GRAFICO'
-                categoria_habitus_forecast_grafico = categoria_profecia_grafico
-            else:
-                nova_categoria = CategoriaFinanceira(
-                    nome='HABITUS_FORECA$T-GRAFICO',
-                    tipo_fluxo='OPERACIONAL'
-                )
-                db.session.add(nova_categoria)
-            print("Categoria HABITUS_FORECA$T-GRAFICO criada/atualizada")
+    def garantir_categorias_existem(self) -> Dict[str, int]:
+        """Garante que todas as categorias necessárias existem no banco e retorna o mapa nome -> id.
+
+        Usa o registro de categorias do processo: sem consultas por categoria e, quando falta
+        alguma, um único INSERT ... ON CONFLICT DO NOTHING fora da transação do upload.
+        """
+        categorias = [
+            (categoria_nome, tipo_fluxo)
+            for categoria_nome, tipo_fluxo, tipo_entrada_saida in self.categorias_mapeamento.values()
+        ]
+        # HABITUS_FORECA$T-GRAFICO (linha 56) substitui a antiga PROFECIA-GRAFICO, que é renomeada se existir
+        categorias.append(('HABITUS_FORECA$T-GRAFICO', 'OPERACIONAL'))
+        categorias.append(('FDC-REAL', 'OPERACIONAL'))
         
-        db.session.commit()
+        return registro_categorias.garantir(
+            categorias,
+            renomear={'HABITUS_FORECA$T-GRAFICO': 'PROFECIA-GRAFICO'}
+        )
     
-    def extrair_dados_fdc_real(self, caminho_arquivo: str) -> List[Dict]:
+    def extrair_dados_fdc_real(self, planilha: Union[str, PlanilhaCarregada]) -> List[Dict]:
         """Extrai os dados de FDC-REAL.
         Compatibilidade:
         - Layout antigo: aba 'FDC-REAL', linha 63, colunas 3-14
         - Layout novo: aba 'REALIZADO', linha 61, colunas F-Q (índices 5-16)
         """
         try:
-            with pd.ExcelFile(caminho_arquivo, engine='openpyxl') as excel_file:
+            with self._abrir_planilha(planilha) as excel_file:
                 dados_fdc_real = None
                 if 'FDC-REAL' in excel_file.sheet_names:
                     # Layout antigo
-                    df = pd.read_excel(excel_file, sheet_name='FDC-REAL', header=None)
+                    df = excel_file.ler_aba('FDC-REAL')
                     if df.shape[0] < 63:
-                        print(f"Aba FDC-REAL tem apenas {df.shape[0]} linhas, linha 63 não existe")
+                        debug_log(f"Aba FDC-REAL tem apenas {df.shape[0]} linhas, linha 63 não existe")
                         return []
                     linha = df.iloc[62]
                     dados_fdc_real = linha.iloc[2:14]
                 elif 'REALIZADO' in excel_file.sheet_names:
                     # Layout novo - usar linha 61, colunas F-Q (índices 5-16)
-                    df = pd.read_excel(excel_file, sheet_name='REALIZADO', header=None)
+                    df = excel_file.ler_aba('REALIZADO')
                     
                     # Verificar se a linha 61 existe
                     if df.shape[0] < 61:
-                        print(f"Aba REALIZADO tem apenas {df.shape[0]} linhas, linha 61 não existe")
+                        debug_log(f"Aba REALIZADO tem apenas {df.shape[0]} linhas, linha 61 não existe")
                         return []
                     
                     # Extrair dados da linha 61, colunas F-Q (índices 5-16)
                     linha_61 = df.iloc[60]  # Índice 60 = linha 61
                     dados_fdc_real = linha_61.iloc[5:17]  # Colunas F-Q (índices 5-16)
-                    
-                    print(f"Extraindo dados da linha 61 (REALIZADO - FDC-Real)")
-                    print(f"Valores encontrados na linha 61: {[float(v) if pd.notna(v) else 0 for v in dados_fdc_real]}")
                 else:
-                    print("Nenhuma aba compatível para FDC-REAL encontrada")
+                    debug_log("Nenhuma aba compatível para FDC-REAL encontrada")
                     return []
                 
                 # Criar lista de dados mensais
@@ -514,289 +480,426 @@ class ProcessadorPlanilhaHabitusForecast:
                             'descricao': f'Dados FDC-REAL - {data_competencia.strftime("%B %Y")}'
                         })
                 
-                print(f"Extraídos {len(lancamentos_fdc_real)} lançamentos FDC-REAL")
                 return lancamentos_fdc_real
                 
         except Exception as e:
-            print(f"Erro ao extrair dados FDC-REAL: {str(e)}")
+            warning_log(f"Erro ao extrair dados FDC-REAL: {str(e)}")
             return []
     
-    def processar_planilha_completa(self, caminho_arquivo: str, usuario_id: int, caminho_permanente: str = None) -> Dict[str, Any]:
-        """Processa a planilha completa e salva no banco de dados"""
-        try:
-            # 1. Validar planilha
-            validacao = self.validar_planilha(caminho_arquivo)
+    @staticmethod
+    def _etapa(medidor: Optional[MedidorProcessamento], nome: str, **detalhes):
+        """Etapa medida quando há medidor; sem medidor, um contexto vazio"""
+        return medidor.etapa(nome, **detalhes) if medidor is not None else nullcontext({})
+    
+    def extrair_dados_planilha(self, planilha: Union[str, PlanilhaCarregada]) -> Dict[str, Any]:
+        """Executa todas as etapas de extração da planilha (sem acesso ao banco).
+
+        Se a PlanilhaCarregada tiver um medidor, cada etapa (e a leitura de cada aba) é medida.
+        """
+        with self._abrir_planilha(planilha) as excel_file:
+            medidor = excel_file.medidor
+            with self._etapa(medidor, 'validacao'):
+                validacao = self.validar_planilha(excel_file)
             if not validacao['valido']:
                 raise Exception(validacao['erro'])
             
-            # 2. Mover arquivo para localização permanente se especificado
-            if caminho_permanente:
-                import shutil
-                shutil.move(caminho_arquivo, caminho_permanente)
-                caminho_arquivo = caminho_permanente
-                print(f"Arquivo movido para: {caminho_permanente}")
-            
-            # 3. Calcular hash do arquivo
-            hash_arquivo = self.calcular_hash_arquivo(caminho_arquivo)
+            with self._etapa(medidor, 'parametros_gerais'):
+                parametros = self.extrair_parametros_gerais(excel_file)
+            with self._etapa(medidor, 'indicadores_forecast'):
+                indicadores = self.extrair_indicadores_forecast(excel_file)
+            with self._etapa(medidor, 'dados_habitus_forecast') as registro:
+                dados_habitus_forecast = self.extrair_dados_habitus_forecast(excel_file)
+                registro['linhas'] = len(dados_habitus_forecast)
+            with self._etapa(medidor, 'dados_fdc_real') as registro:
+                dados_fdc_real = self.extrair_dados_fdc_real(excel_file)
+                registro['linhas'] = len(dados_fdc_real)
             
-            # 4. Verificar se arquivo já foi processado (apenas se for exatamente o mesmo arquivo)
-            # Removido para permitir múltiplos uploads de planilhas diferentes
-            # arquivo_existente = ArquivoUpload.query.filter_by(hash_arquivo=hash_arquivo).first()
-            # if arquivo_existente:
-            #     return {
-            #         'status': 'arquivo_ja_processado',
-            #         'projeto_id': arquivo_existente.projeto_id,
-            #         'message': 'Este arquivo já foi processado anteriormente'
-            #     }
-            
-            # 5. Extrair parâmetros gerais
-            parametros = self.extrair_parametros_gerais(caminho_arquivo)
+            return {
+                'validacao': validacao,
+                'parametros': parametros,
+                'indicadores': indicadores,
+                'dados_habitus_forecast': dados_habitus_forecast,
+                'dados_fdc_real': dados_fdc_real
+            }
+    
+    def extrair_arquivo(self, caminho_arquivo: str, medidor: Optional[MedidorProcessamento] = None,
+                        leitura_paralela: bool = True) -> Dict[str, Any]:
+        """Abre a planilha uma única vez e extrai os dados; todas as etapas reutilizam as abas já lidas.
 
-            # 5.1. Extrair indicadores da aba 'indicadores forecast', se disponível
-            indicadores = self.extrair_indicadores_forecast(caminho_arquivo)
-            
-            # 6. Criar um novo projeto para cada arquivo
-            import os
-            nome_arquivo = os.path.basename(caminho_arquivo)
-            nome_projeto = f"Projeto {nome_arquivo.split('_')[0][:8]}"
-            
-            # Sempre criar um novo projeto para cada arquivo
-            projeto = Projeto(
-                usuario_id=usuario_id,
-                nome_cliente=nome_projeto,
-                data_base_estudo=date.today(),
-                saldo_inicial_caixa=0,
-                ponto_equilibrio=indicadores.get('ponto_equilibrio', 0.0),
-                geracao_fdc_livre=indicadores.get('geracao_fdc_livre', 0.0),
-                percentual_custo_fixo=indicadores.get('percentual_custo_fixo', 0.0)
-            )
-            db.session.add(projeto)
-            db.session.flush()  # Para obter o ID
-            
-            # 7. Buscar configurações de cenários do usuário
-            config_cenarios = ConfiguracaoCenarios.query.filter_by(usuario_id=usuario_id).first()
-            
-            # Se não houver configuração, usar valores padrão (0 para todos)
-            if config_cenarios:
-                percentuais = {
-                    'pessimista': float(config_cenarios.pessimista) if config_cenarios.pessimista else 0,
-                    'realista': float(config_cenarios.realista) if config_cenarios.realista else 0,
-                    'otimista': float(config_cenarios.otimista) if config_cenarios.otimista else 0,
-                    'agressivo': float(config_cenarios.agressivo) if config_cenarios.agressivo else 0
-                }
-            else:
-                percentuais = {
-                    'pessimista': 0,
-                    'realista': 0,
-                    'otimista': 0,
-                    'agressivo': 0
-                }
-            
-            print(f"Configurações de cenários encontradas: {percentuais}")
-            
-            # 8. Garantir que categorias existem
-            self.garantir_categorias_existem()
+        Com UPLOAD_LEITURA_ABAS_PROCESSOS > 1 (e `leitura_paralela`), as abas do plano são lidas
+        em paralelo antes das etapas de extração.
+        """
+        with self._etapa(medidor, 'abrir_planilha') as registro:
+            try:
+                planilha = PlanilhaCarregada(caminho_arquivo, medidor=medidor)
+            except Exception as e:
+                raise Exception(f'Erro ao ler planilha: {str(e)}')
+            registro['leitor'] = planilha.leitor
+        try:
+            with self._etapa(medidor, 'extracao'):
+                if leitura_paralela:
+                    planilha.ler_abas_em_paralelo()
+                return self.extrair_dados_planilha(planilha)
+        finally:
+            planilha.fechar()
+    
+    def obter_extracao(self, caminho_arquivo: str, hash_arquivo: str,
+                       medidor: Optional[MedidorProcessamento] = None) -> Tuple[Dict[str, Any], bool]:
+        """Retorna (extração, veio_do_cache): usa o cache por hash e só abre o Excel se não houver entrada"""
+        with self._etapa(medidor, 'cache_extracao') as registro:
+            extracao = cache_extracoes.obter(hash_arquivo)
+            registro['encontrada'] = extracao is not None
+        if extracao is not None:
+            debug_log(f"Extração reutilizada do cache (hash {hash_arquivo[:12]})")
+            return extracao, True
+        
+        extracao = self.extrair_arquivo(caminho_arquivo, medidor)
+        cache_extracoes.salvar(hash_arquivo, extracao)
+        return extracao, False
+    
+    def processar_planilha_completa(self, caminho_arquivo: str, usuario_id: int,
+                                    hash_arquivo: str = None) -> Dict[str, Any]:
+        """Processa a planilha completa e salva no banco de dados.
+
+        `hash_arquivo` pode ser informado quando o SHA256 já foi calculado durante o recebimento do upload.
+        """
+        medidor = MedidorProcessamento()
+        try:
+            # 1. Calcular hash do conteúdo (chave do cache de extrações), se ainda não conhecido
+            if hash_arquivo is None:
+                with medidor.etapa('hash'):
+                    hash_arquivo = self.calcular_hash_arquivo(caminho_arquivo)
             
-            # 9. Extrair dados financeiros da planilha (base)
-            dados_habitus_forecast = self.extrair_dados_habitus_forecast(caminho_arquivo)
+            # 2. Validar e extrair os dados; uploads de um arquivo idêntico não abrem o Excel novamente
+            # (o mesmo arquivo pode gerar vários projetos: não há bloqueio de reenvio)
+            extracao, extracao_em_cache = self.obter_extracao(caminho_arquivo, hash_arquivo, medidor)
             
-            # 9.1. Extrair dados FDC-REAL (dados realizados - não variam por cenário)
-            dados_fdc_real = self.extrair_dados_fdc_real(caminho_arquivo)
+            return self.gerar_projeto(extracao, usuario_id, caminho_arquivo, hash_arquivo, extracao_em_cache,
+                                      medidor=medidor)
             
-            # Criar categoria FDC-REAL se não existir
-            categoria_fdc_real = CategoriaFinanceira.query.filter_by(nome='FDC-REAL').first()
-            if not categoria_fdc_real:
-                categoria_fdc_real = CategoriaFinanceira(
-                    nome='FDC-REAL',
-                    tipo_fluxo='OPERACIONAL'
+        except Exception as e:
+            db.session.rollback()
+            raise Exception(f"Erro ao processar planilha: {str(e)}")
+    
+    def reprocessar_arquivo(self, arquivo_upload: ArquivoUpload, usuario_id: int) -> Dict[str, Any]:
+        """
+        Gera um novo projeto a partir de um upload anterior, com as configurações de cenários atuais.
+        Usa a extração em cache; o .xlsx armazenado só é lido se o cache não tiver a entrada.
+        """
+        medidor = MedidorProcessamento()
+        try:
+            with medidor.etapa('cache_extracao') as registro:
+                extracao = cache_extracoes.obter(arquivo_upload.hash_arquivo)
+                registro['encontrada'] = extracao is not None
+            extracao_em_cache = extracao is not None
+            if extracao is None:
+                if not os.path.exists(arquivo_upload.caminho_storage):
+                    raise ValueError('Dados extraídos não disponíveis e arquivo original não encontrado')
+                extracao, extracao_em_cache = self.obter_extracao(
+                    arquivo_upload.caminho_storage, arquivo_upload.hash_arquivo, medidor
                 )
-                db.session.add(categoria_fdc_real)
-                db.session.flush()
-            
-            # 10. Criar 4 cenários automaticamente
-            # NOVA LÓGICA: Realista é o ponto zero (base), outros são variações relativas ao Realista
-            nome_arquivo = os.path.basename(caminho_arquivo)
             
-            # Primeiro criar o Realista (ponto zero - dados da planilha sem ajuste)
-            cenario_realista = Cenario(
-                projeto_id=projeto.id,
-                nome='Realista',
-                descricao=f'Cenário Realista baseado na planilha {nome_arquivo} (ponto zero - base)',
-                is_active=True
+            return self.gerar_projeto(
+                extracao, usuario_id, arquivo_upload.caminho_storage, arquivo_upload.hash_arquivo,
+                extracao_em_cache, nome_original=arquivo_upload.nome_original, medidor=medidor
             )
-            db.session.add(cenario_realista)
-            db.session.flush()
-            
-            # Salvar dados do Realista primeiro (será usado como base para outros cenários)
-            # Apenas dados Habitus Foreca$t (projetados), FDC-REAL será processado separadamente
-            lancamentos_realista = []
-            lancamentos_criados_realista = 0
-            
-            for dado in dados_habitus_forecast:
-                categoria = CategoriaFinanceira.query.filter_by(nome=dado['categoria_nome']).first()
-                if categoria:
-                    lancamento = LancamentoFinanceiro(
-                        cenario_id=cenario_realista.id,
-                        categoria_id=categoria.id,
-                        data_competencia=dado['data_competencia'],
-                        valor=dado['valor'],  # Sem ajuste - dados originais da planilha
-                        tipo=dado['tipo'],
-                        origem=dado['origem']
-                    )
-                    db.session.add(lancamento)
-                    # Armazenar apenas dados Habitus Foreca$t (não FDC-REAL)
-                    if dado['categoria_nome'] != 'FDC-REAL':
-                        lancamentos_realista.append({
-                            'categoria_id': categoria.id,
-                            'data_competencia': dado['data_competencia'],
-                            'valor': dado['valor'],
-                            'tipo': dado['tipo'],
-                            'origem': dado['origem']
-                        })
-                    lancamentos_criados_realista += 1
-            
-            # Processar FDC-REAL para Realista
-            if dados_fdc_real:
-                for i, dado_fdc in enumerate(dados_fdc_real):
-                    try:
-                        lancamento_fdc = LancamentoFinanceiro(
-                            cenario_id=cenario_realista.id,
-                            categoria_id=categoria_fdc_real.id,
-                            data_competencia=dado_fdc['data_competencia'],
-                            valor=dado_fdc['valor'],
-                            tipo=dado_fdc['tipo'],
-                            origem='REALIZADO'
-                        )
-                        db.session.add(lancamento_fdc)
-                        lancamentos_criados_realista += 1
-                    except Exception as e:
-                        print(f"Erro ao criar lançamento FDC-REAL {i+1} para Realista: {e}")
-                        continue
-            
-            print(f"Cenário Realista criado: ID={cenario_realista.id} ({lancamentos_criados_realista} lançamentos)")
-            
-            # Agora criar os outros cenários baseados no Realista
-            cenarios_config = [
-                {'nome': 'Pessimista', 'percentual': percentuais['pessimista'], 'is_active': False},
-                {'nome': 'Otimista', 'percentual': percentuais['otimista'], 'is_active': False},
-                {'nome': 'Agressivo', 'percentual': percentuais['agressivo'], 'is_active': False}
-            ]
-            
-            lancamentos_criados_total = lancamentos_criados_realista
-            cenarios_criados = [cenario_realista]
-            
-            for config_cenario in cenarios_config:
-                # Criar cenário
-                # Calcular multiplicador baseado no percentual (relativo ao Realista)
-                # Pessimista: negativo (ex: -15% = 0.85)
-                # Otimista/Agressivo: positivo (ex: 10% = 1.10, 30% = 1.30)
-                multiplicador = 1 + (config_cenario['percentual'] / 100)
-                
-                cenario = Cenario(
-                    projeto_id=projeto.id,
-                    nome=config_cenario['nome'],
-                    descricao=f'Cenário {config_cenario["nome"]} baseado no Realista ({config_cenario["percentual"]:+}% em relação ao Realista)',
-                    is_active=config_cenario['is_active']
-                )
-                db.session.add(cenario)
-                db.session.flush()
-                cenarios_criados.append(cenario)
-                print(f"Cenário criado: {cenario.nome} (ID: {cenario.id}, Variação: {config_cenario['percentual']:+}% do Realista, Multiplicador: {multiplicador:.4f})")
-                
-                lancamentos_criados = 0
-                
-                # Processar dados baseados no Realista (não na planilha diretamente)
-                # Apenas dados projetados (Habitus Foreca$t) - FDC-REAL é processado separadamente abaixo
-                for lancamento_realista in lancamentos_realista:
-                    valor_ajustado = lancamento_realista['valor']
-                    
-                    # Aplicar multiplicador apenas para valores de ENTRADA (receitas)
-                    # Valores de SAÍDA (despesas) permanecem iguais ao Realista
-                    if lancamento_realista['tipo'] == 'ENTRADA':
-                        valor_ajustado = lancamento_realista['valor'] * multiplicador
-                    
-                    lancamento = LancamentoFinanceiro(
-                        cenario_id=cenario.id,
-                        categoria_id=lancamento_realista['categoria_id'],
-                        data_competencia=lancamento_realista['data_competencia'],
-                        valor=valor_ajustado,
-                        tipo=lancamento_realista['tipo'],
-                        origem=lancamento_realista['origem']
-                    )
-                    db.session.add(lancamento)
-                    lancamentos_criados += 1
-                    if lancamento_realista['tipo'] == 'ENTRADA':
-                        print(f"  Lançamento {config_cenario['nome']}: {lancamento_realista['data_competencia']} = R$ {lancamento_realista['valor']:.2f} (Realista) -> R$ {valor_ajustado:.2f} ({config_cenario['percentual']:+}%)")
-                
-                # Processar dados FDC-REAL (dados realizados - iguais para todos os cenários)
-                # FDC-REAL não varia por cenário, são dados históricos/realizados
-                if dados_fdc_real:
-                    for i, dado_fdc in enumerate(dados_fdc_real):
-                        try:
-                            lancamento_fdc = LancamentoFinanceiro(
-                                cenario_id=cenario.id,
-                                categoria_id=categoria_fdc_real.id,
-                                data_competencia=dado_fdc['data_competencia'],
-                                valor=dado_fdc['valor'],
-                                tipo=dado_fdc['tipo'],
-                                origem='REALIZADO'  # Dados FDC-REAL são sempre realizados
-                            )
-                            db.session.add(lancamento_fdc)
-                            lancamentos_criados += 1
-                        except Exception as e:
-                            print(f"Erro ao criar lançamento FDC-REAL {i+1} para cenário {config_cenario['nome']}: {e}")
-                            continue
-                
-                lancamentos_criados_total += lancamentos_criados
-                print(f"  Total de lançamentos criados para {config_cenario['nome']}: {lancamentos_criados}")
-            
-            # Commit de todos os cenários e lançamentos
-            db.session.commit()
-            print(f"Processamento completo: {len(cenarios_criados)} cenários criados com {lancamentos_criados_total} lançamentos totais")
-            
-            # 9. Registrar arquivo
-            # Converter datas para strings para evitar erro de serialização JSON
-            parametros_serializaveis = {}
-            if parametros:
-                for key, value in parametros.items():
-                    if isinstance(value, date):
-                        parametros_serializaveis[key] = value.isoformat()
-                    elif isinstance(value, datetime):
-                        parametros_serializaveis[key] = value.isoformat()
-                    else:
-                        parametros_serializaveis[key] = value
-            
-            arquivo_upload = ArquivoUpload(
-                projeto_id=projeto.id,
-                nome_original=os.path.basename(caminho_arquivo),
-                caminho_storage=caminho_arquivo,
-                hash_arquivo=hash_arquivo,
-                status_processamento='processado',
-                relatorio_processamento={
-                    'lancamentos_criados': lancamentos_criados_total,
-                    'cenarios_criados': len(cenarios_criados),
-                    'categorias_processadas': len(self.categorias_mapeamento),
-                    'parametros_extraidos': parametros_serializaveis,
-                    'percentuais_aplicados': percentuais
-                }
+        
+        except ValueError:
+            db.session.rollback()
+            raise
+        except Exception as e:
+            db.session.rollback()
+            raise Exception(f"Erro ao reprocessar planilha: {str(e)}")
+    
+    def reimportar_no_projeto(self, caminho_arquivo: str, projeto_id: int, usuario_id: int,
+                              hash_arquivo: str = None) -> Dict[str, Any]:
+        """
+        Reimporta uma versão atualizada da planilha em um projeto existente (ver services/reimportacao.py):
+        grava só as diferenças no cenário base, preservando projeto, cenários e snapshots.
+        """
+        medidor = MedidorProcessamento()
+        try:
+            if hash_arquivo is None:
+                with medidor.etapa('hash'):
+                    hash_arquivo = self.calcular_hash_arquivo(caminho_arquivo)
+            extracao, extracao_em_cache = self.obter_extracao(caminho_arquivo, hash_arquivo, medidor)
+            return self.atualizar_projeto(
+                extracao, projeto_id, usuario_id, caminho_arquivo, hash_arquivo, extracao_em_cache, medidor=medidor
             )
-            
-            print(f"Criando ArquivoUpload: projeto_id={projeto.id}, nome={os.path.basename(caminho_arquivo)}")
-            db.session.add(arquivo_upload)
+        except ValueError:
+            db.session.rollback()
+            raise
+        except Exception as e:
+            db.session.rollback()
+            raise Exception(f"Erro ao reimportar planilha: {str(e)}")
+    
+    def atualizar_projeto(self, extracao: Dict[str, Any], projeto_id: int, usuario_id: int, caminho_arquivo: str,
+                          hash_arquivo: str, extracao_em_cache: bool = False, nome_original: str = None,
+                          medidor: Optional[MedidorProcessamento] = None) -> Dict[str, Any]:
+        """Aplica a extração ao projeto existente (só inserções, atualizações e exclusões necessárias)"""
+        if medidor is None:
+            medidor = MedidorProcessamento()
+        parametros = extracao['parametros']
+        indicadores = extracao['indicadores']
+        
+        with medidor.etapa('sincronizar_categorias') as registro:
+            ids_categorias = self.garantir_categorias_existem()
+            registro['linhas'] = len(ids_categorias)
+        
+        # Bloquear o projeto: reimportações simultâneas no mesmo projeto são aplicadas uma de cada vez
+        projeto = Projeto.query.filter_by(id=projeto_id).with_for_update().first()
+        if projeto is None:
+            raise ValueError('Projeto não encontrado')
+        cenario = cenario_base_do_projeto(projeto.id)
+        if cenario is None:
+            raise ValueError('O projeto não possui cenário para receber a planilha')
+        
+        with medidor.etapa('comparar_lancamentos', cenario=cenario.nome) as registro:
+            desejadas = self.montar_linhas_lancamentos(extracao, ids_categorias, cenario.id)
+            existentes = lancamentos_atuais(
+                cenario.id, set(ids_categorias.values()), categorias_realizado={ids_categorias['FDC-REAL']}
+            )
+            diferenca = calcular_diferenca(existentes, desejadas)
+            registro['linhas'] = len(existentes)
+        
+        with medidor.etapa('gravar_diferenca', cenario=cenario.nome) as registro:
+            if diferenca.inserir or diferenca.atualizar or diferenca.remover:
+                # Derivados congelados ficam com os valores atuais; os ativos acompanham a nova planilha
+                materializar_derivados(cenario, apenas_congelados=True)
+            aplicar_diferenca(diferenca, cenario.id)
+            registro['linhas'] = len(diferenca.inserir) + len(diferenca.atualizar) + len(diferenca.remover)
+        
+        # Indicadores do projeto vêm da aba de indicadores da nova planilha
+        for campo in ('ponto_equilibrio', 'geracao_fdc_livre', 'percentual_custo_fixo'):
+            setattr(projeto, campo, indicadores.get(campo, 0.0))
+        
+        cenarios_nao_atualizados = [
+            {'id': outro.id, 'nome': outro.nome}
+            for outro in Cenario.query.filter_by(projeto_id=projeto.id).order_by(Cenario.id).all()
+            if outro.id != cenario.id and outro.cenario_base_id != cenario.id
+        ]
+        alteracoes = diferenca.resumo()
+        
+        with medidor.etapa('commit'):
             db.session.commit()
-            print(f"ArquivoUpload criado com ID: {arquivo_upload.id}")
-            
-            return {
-                'status': 'sucesso',
+        
+        metricas = medidor.resumo()
+        arquivo_upload = ArquivoUpload(
+            projeto_id=projeto.id,
+            nome_original=nome_original or os.path.basename(caminho_arquivo),
+            caminho_storage=caminho_arquivo,
+            hash_arquivo=hash_arquivo,
+            status_processamento='processado',
+            relatorio_processamento={
+                'modo': 'reimportacao',
+                'lancamentos_criados': alteracoes['inseridos'],
+                'cenario_id': cenario.id,
+                'alteracoes': alteracoes,
+                'alteracoes_detalhadas': diferenca.alteracoes,
+                'cenarios_nao_atualizados': cenarios_nao_atualizados,
+                'parametros_extraidos': self._parametros_serializaveis(parametros),
+                'extracao_em_cache': extracao_em_cache,
+                'metricas': metricas
+            }
+        )
+        db.session.add(arquivo_upload)
+        db.session.commit()
+        medidor.registrar_log(
+            'Reimportação de planilha concluída',
+            projeto_id=projeto.id, arquivo_upload_id=arquivo_upload.id, hash_arquivo=hash_arquivo,
+            extracao_em_cache=extracao_em_cache, alteracoes=alteracoes
+        )
+        
+        return {
+            'status': 'sucesso',
+            'projeto_id': projeto.id,
+            'arquivo_upload_id': arquivo_upload.id,
+            'cenario_id': cenario.id,
+            'alteracoes': alteracoes,
+            'cenarios_nao_atualizados': cenarios_nao_atualizados,
+            'parametros': parametros,
+            'validacao': extracao['validacao'],
+            'hash_arquivo': hash_arquivo,
+            'extracao_em_cache': extracao_em_cache
+        }
+    
+    @staticmethod
+    def _parametros_serializaveis(parametros: Dict[str, Any]) -> Dict[str, Any]:
+        """Converte datas para strings para evitar erro de serialização JSON"""
+        parametros_serializaveis = {}
+        if parametros:
+            for key, value in parametros.items():
+                if isinstance(value, date):
+                    parametros_serializaveis[key] = value.isoformat()
+                elif isinstance(value, datetime):
+                    parametros_serializaveis[key] = value.isoformat()
+                else:
+                    parametros_serializaveis[key] = value
+        return parametros_serializaveis
+    
+    @staticmethod
+    def montar_linhas_lancamentos(extracao: Dict[str, Any], ids_categorias: Dict[str, int],
+                                  cenario_id: int) -> List[Tuple]:
+        """Lançamentos da planilha como tuplas na ordem de COLUNAS_LANCAMENTO (dados sem ajuste de cenário)"""
+        linhas = []
+        for dado in extracao['dados_habitus_forecast']:
+            categoria_id = ids_categorias.get(dado['categoria_nome'])
+            if categoria_id:
+                linhas.append((
+                    cenario_id, categoria_id, dado['data_competencia'],
+                    dado['valor'], dado['tipo'], dado['origem']
+                ))
+        
+        # Dados FDC-REAL (dados realizados - iguais para todos os cenários)
+        linhas.extend(
+            (cenario_id, ids_categorias['FDC-REAL'], dado_fdc['data_competencia'], dado_fdc['valor'], dado_fdc['tipo'], 'REALIZADO')
+            for dado_fdc in (extracao['dados_fdc_real'] or [])
+        )
+        return linhas
+    
+    def gerar_projeto(self, extracao: Dict[str, Any], usuario_id: int, caminho_arquivo: str, hash_arquivo: str,
+                      extracao_em_cache: bool = False, nome_original: str = None,
+                      medidor: Optional[MedidorProcessamento] = None) -> Dict[str, Any]:
+        """Cria projeto, cenários, lançamentos e o registro do arquivo a partir de uma extração.
+
+        As métricas das etapas (`medidor`, com as etapas anteriores do processamento) são gravadas
+        em relatorio_processamento['metricas'] e enviadas ao log estruturado.
+        """
+        if medidor is None:
+            medidor = MedidorProcessamento()
+        parametros = extracao['parametros']
+        indicadores = extracao['indicadores']
+        
+        # 4. Garantir que categorias existem (antes de qualquer escrita na transação do upload)
+        with medidor.etapa('sincronizar_categorias') as registro:
+            ids_categorias = self.garantir_categorias_existem()
+            registro['linhas'] = len(ids_categorias)
+        
+        # 5. Criar um novo projeto para cada arquivo
+        nome_arquivo = os.path.basename(caminho_arquivo)
+        nome_projeto = f"Projeto {nome_arquivo.split('_')[0][:8]}"
+        
+        # Sempre criar um novo projeto para cada arquivo
+        projeto = Projeto(
+            usuario_id=usuario_id,
+            nome_cliente=nome_projeto,
+            data_base_estudo=date.today(),
+            saldo_inicial_caixa=0,
+            ponto_equilibrio=indicadores.get('ponto_equilibrio', 0.0),
+            geracao_fdc_livre=indicadores.get('geracao_fdc_livre', 0.0),
+            percentual_custo_fixo=indicadores.get('percentual_custo_fixo', 0.0)
+        )
+        db.session.add(projeto)
+        db.session.flush()  # Para obter o ID
+        
+        # 6. Buscar configurações de cenários do usuário
+        config_cenarios = ConfiguracaoCenarios.query.filter_by(usuario_id=usuario_id).first()
+        
+        # Se não houver configuração, usar valores padrão (0 para todos)
+        if config_cenarios:
+            percentuais = {
+                'pessimista': float(config_cenarios.pessimista) if config_cenarios.pessimista else 0,
+                'realista': float(config_cenarios.realista) if config_cenarios.realista else 0,
+                'otimista': float(config_cenarios.otimista) if config_cenarios.otimista else 0,
+                'agressivo': float(config_cenarios.agressivo) if config_cenarios.agressivo else 0
+            }
+        else:
+            percentuais = {
+                'pessimista': 0,
+                'realista': 0,
+                'otimista': 0,
+                'agressivo': 0
+            }
+        
+        debug_log(f"Configurações de cenários encontradas: {percentuais}")
+        
+        # 7. Criar 4 cenários automaticamente
+        # NOVA LÓGICA: Realista é o ponto zero (base), outros são variações relativas ao Realista
+        cenario_realista_id = inserir_cenarios([{
+            'projeto_id': projeto.id,
+            'nome': 'Realista',
+            'descricao': f'Cenário Realista baseado na planilha {nome_arquivo} (ponto zero - base)',
+            'is_active': True
+        }])[0]
+        
+        # 7.1. Os outros cenários são derivados do Realista: guardam apenas o percentual e não copiam lançamentos.
+        # Na leitura, as ENTRADAS projetadas do Realista são multiplicadas por 1 + percentual/100;
+        # SAÍDAS e FDC-REAL permanecem iguais (ver services/cenarios_virtuais.py)
+        cenarios_config = [
+            {'nome': 'Pessimista', 'percentual': percentuais['pessimista'], 'is_active': False},
+            {'nome': 'Otimista', 'percentual': percentuais['otimista'], 'is_active': False},
+            {'nome': 'Agressivo', 'percentual': percentuais['agressivo'], 'is_active': False}
+        ]
+        # Derivados não gravam lançamentos: a etapa mede só a inserção dos cenários
+        with medidor.etapa('gravar_cenarios_derivados', cenarios=len(cenarios_config)) as registro:
+            ids_derivados = inserir_cenarios([{
                 'projeto_id': projeto.id,
+                'nome': config_cenario['nome'],
+                'descricao': f'Cenário {config_cenario["nome"]} baseado no Realista ({config_cenario["percentual"]:+}% em relação ao Realista)',
+                'is_active': config_cenario['is_active'],
+                'cenario_base_id': cenario_realista_id,
+                'percentual_variacao': config_cenario['percentual']
+            } for config_cenario in cenarios_config])
+            registro['linhas'] = 0
+        
+        with medidor.etapa('gravar_cenario', cenario='Realista') as registro:
+            # Salvar dados do Realista (dados originais da planilha, sem ajuste). Os derivados já existem,
+            # então o resumo mensal deles é somado junto, com o valor de cada lançamento ajustado
+            linhas_realista = self.montar_linhas_lancamentos(extracao, ids_categorias, cenario_realista_id)
+            lancamentos_gravados = inserir_lancamentos(linhas_realista)
+            registro['linhas'] = lancamentos_gravados
+        
+        cenarios_criados = [{'id': cenario_realista_id, 'nome': 'Realista'}] + [
+            {'id': cenario_id, 'nome': config_cenario['nome']}
+            for cenario_id, config_cenario in zip(ids_derivados, cenarios_config)
+        ]
+        
+        # Lançamentos visíveis no projeto (os cenários derivados têm a mesma quantidade do Realista)
+        lancamentos_criados_total = lancamentos_gravados * len(cenarios_criados)
+        
+        # Commit de todos os cenários e lançamentos
+        with medidor.etapa('commit'):
+            db.session.commit()
+        debug_log(f"Processamento completo: {len(cenarios_criados)} cenários criados com {lancamentos_criados_total} lançamentos totais")
+        
+        # 8. Registrar arquivo
+        parametros_serializaveis = self._parametros_serializaveis(parametros)
+        
+        metricas = medidor.resumo()
+        arquivo_upload = ArquivoUpload(
+            projeto_id=projeto.id,
+            nome_original=nome_original or os.path.basename(caminho_arquivo),
+            caminho_storage=caminho_arquivo,
+            hash_arquivo=hash_arquivo,
+            status_processamento='processado',
+            relatorio_processamento={
                 'lancamentos_criados': lancamentos_criados_total,
+                'lancamentos_gravados': lancamentos_gravados,
                 'cenarios_criados': len(cenarios_criados),
-                'parametros': parametros,
-                'validacao': validacao,
-                'hash_arquivo': hash_arquivo,
-                'cenarios': [{'id': c.id, 'nome': c.nome} for c in cenarios_criados]
+                'categorias_processadas': len(self.categorias_mapeamento),
+                'parametros_extraidos': parametros_serializaveis,
+                'percentuais_aplicados': percentuais,
+                'extracao_em_cache': extracao_em_cache,
+                'metricas': metricas
             }
-            
-        except Exception as e:
-            db.session.rollback()
-            raise Exception(f"Erro ao processar planilha: {str(e)}")
+        )
+        
+        db.session.add(arquivo_upload)
+        db.session.commit()
+        medidor.registrar_log(
+            'Processamento de planilha concluído',
+            projeto_id=projeto.id, arquivo_upload_id=arquivo_upload.id,
+            hash_arquivo=hash_arquivo, extracao_em_cache=extracao_em_cache
+        )
+        
+        return {
+            'status': 'sucesso',
+            'projeto_id': projeto.id,
+            'lancamentos_criados': lancamentos_criados_total,
+            'cenarios_criados': len(cenarios_criados),
+            'parametros': parametros,
+            'validacao': extracao['validacao'],
+            'hash_arquivo': hash_arquivo,
+            'cenarios': cenarios_criados,
+            'extracao_em_cache': extracao_em_cache
+        }
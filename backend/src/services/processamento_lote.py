@@ -0,0 +1,220 @@
+"""
+Importação em lote de planilhas (ZIP ou vários arquivos em um único upload).
+
+A leitura das planilhas (pandas/openpyxl) usa CPU e roda em paralelo em um
+pool de processos. Os processos filhos só extraem os dados, sem acessar o
+banco. A gravação é feita no processo da requisição, com uma transação por
+planilha, à medida que cada extração termina. Planilhas já extraídas antes
+(mesmo hash) vêm do cache de extrações e não passam pelo pool.
+"""
+import multiprocessing
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.models.user import db, LogSistema
+from src.services.armazenamento_upload import ArquivoEmArmazenamento, caminho_definitivo
+from src.services.cache_extracoes import cache_extracoes
+from src.services.metricas_processamento import MedidorProcessamento
+from src.services.planilha_processor import ProcessadorPlanilhaHabitusForecast
+from src.utils.logger import debug_log, error_log, exception_log
+
+EXTENSOES_PLANILHA = ('.xlsx', '.xls')
+MAX_ARQUIVOS_LOTE = int(os.getenv('UPLOAD_LOTE_MAX_ARQUIVOS', '100'))
+# Limite do corpo da requisição do lote e do conteúdo descompactado do ZIP (proteção contra ZIP bomb)
+MAX_TAMANHO_LOTE = int(os.getenv('UPLOAD_LOTE_MAX_BYTES', str(200 * 1024 * 1024)))
+MAX_TAMANHO_PLANILHA = 16 * 1024 * 1024
+
+MENSAGEM_ERRO_ARQUIVO = 'Erro ao processar planilha. Verifique se o arquivo está no formato correto e tente novamente.'
+
+
+class ErroLote(ValueError):
+    """Lote inválido como um todo (ZIP corrompido, arquivos demais, tamanho excedido)"""
+
+
+def e_planilha(nome: str) -> bool:
+    return (nome or '').lower().endswith(EXTENSOES_PLANILHA)
+
+
+def _extrair_em_processo(caminho_arquivo: str) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """Executado nos processos do pool: apenas lê a planilha, sem acesso ao banco.
+
+    Retorna a extração e as métricas das etapas, que seguem para o processo da requisição.
+    """
+    medidor = MedidorProcessamento()
+    # O lote já paraleliza por planilha: as abas de cada uma são lidas no próprio processo
+    extracao = ProcessadorPlanilhaHabitusForecast().extrair_arquivo(caminho_arquivo, medidor, leitura_paralela=False)
+    return extracao, medidor.etapas
+
+
+def descompactar_zip(arquivo_zip) -> List[Dict[str, Any]]:
+    """
+    Grava as planilhas do ZIP no armazenamento definitivo (hash calculado na escrita).
+
+    Entradas que não são planilhas (pastas, __MACOSX, arquivos ocultos) são ignoradas.
+    """
+    try:
+        zf = zipfile.ZipFile(arquivo_zip)
+    except zipfile.BadZipFile:
+        raise ErroLote('Arquivo ZIP inválido ou corrompido')
+
+    arquivos = []
+    total_descompactado = 0
+    try:
+        with zf:
+            entradas = [
+                entrada for entrada in zf.infolist()
+                if not entrada.is_dir()
+                and not entrada.filename.startswith('__MACOSX/')
+                and not os.path.basename(entrada.filename).startswith('.')
+                and e_planilha(entrada.filename)
+            ]
+            if len(entradas) > MAX_ARQUIVOS_LOTE:
+                raise ErroLote(f'O ZIP contém {len(entradas)} planilhas. Máximo por lote: {MAX_ARQUIVOS_LOTE}')
+
+            for entrada in entradas:
+                nome_original = os.path.basename(entrada.filename)
+                destino = ArquivoEmArmazenamento(caminho_definitivo(nome_original))
+                arquivos.append({'nome': nome_original, 'armazenado': destino})
+                with zf.open(entrada) as origem:
+                    # O tamanho declarado no ZIP não é confiável: contar os bytes efetivamente descompactados
+                    for bloco in iter(lambda: origem.read(1024 * 1024), b''):
+                        total_descompactado += len(bloco)
+                        if total_descompactado > MAX_TAMANHO_LOTE:
+                            raise ErroLote('Conteúdo descompactado do ZIP excede o limite do lote')
+                        destino.write(bloco)
+                destino.close()
+    except Exception:
+        for arquivo in arquivos:
+            arquivo['armazenado'].descartar()
+        raise
+
+    return arquivos
+
+
+class ProcessadorLote:
+    """Extrai em paralelo e grava (uma transação por planilha) um lote de planilhas já armazenadas"""
+
+    def __init__(self, max_workers: int = None):
+        if max_workers is None:
+            max_workers = int(os.getenv('UPLOAD_LOTE_WORKERS', str(os.cpu_count() or 1)))
+        self.max_workers = max(1, max_workers)
+        self.processador = ProcessadorPlanilhaHabitusForecast()
+
+    def _registrar_log(self, usuario_id: int, acao: str, detalhes: Dict[str, Any]):
+        db.session.add(LogSistema(usuario_id=usuario_id, acao=acao, detalhes=dict(detalhes, tipo='LOTE')))
+        db.session.commit()
+
+    def _validar_arquivo(self, armazenado: ArquivoEmArmazenamento):
+        if armazenado.tamanho > MAX_TAMANHO_PLANILHA:
+            raise ValueError(f'Arquivo muito grande. Máximo: {MAX_TAMANHO_PLANILHA / 1024 / 1024}MB')
+        if not armazenado.assinatura_excel:
+            raise ValueError('O arquivo não é uma planilha Excel válida')
+
+    def _gravar(self, item: Dict[str, Any], extracao: Dict[str, Any], extracao_em_cache: bool, usuario_id: int,
+                etapas: Optional[List[Dict[str, Any]]] = None):
+        armazenado = item['armazenado']
+        resultado = self.processador.gerar_projeto(
+            extracao, usuario_id, armazenado.caminho, armazenado.hash_arquivo, extracao_em_cache,
+            medidor=MedidorProcessamento(etapas)
+        )
+        item['resultado'] = {
+            'arquivo': item['nome'],
+            'status': 'sucesso',
+            'projeto_id': resultado['projeto_id'],
+            'lancamentos_criados': resultado['lancamentos_criados'],
+            'cenarios_criados': resultado['cenarios_criados'],
+            'extracao_em_cache': extracao_em_cache
+        }
+        self._registrar_log(usuario_id, 'PLANILHA_UPLOADED', {
+            'filename': item['nome'],
+            'projeto_id': resultado['projeto_id'],
+            'status': resultado['status'],
+            'lancamentos_criados': resultado['lancamentos_criados']
+        })
+
+    def _falhar(self, item: Dict[str, Any], erro: Exception, usuario_id: int):
+        db.session.rollback()
+        if isinstance(erro, ValueError):
+            mensagem = str(erro)
+            error_log(f"Planilha do lote rejeitada ({item['nome']}): {mensagem}")
+        else:
+            mensagem = MENSAGEM_ERRO_ARQUIVO
+            exception_log(f"Erro ao processar planilha do lote ({item['nome']}): {str(erro)}")
+        item['resultado'] = {'arquivo': item['nome'], 'status': 'erro', 'erro': mensagem}
+        item['armazenado'].descartar()
+        self._registrar_log(usuario_id, 'PLANILHA_UPLOAD_ERROR', {'filename': item['nome'], 'erro': str(erro)})
+
+    def _processar_item(self, item, extracao, extracao_em_cache, usuario_id, etapas=None):
+        try:
+            self._gravar(item, extracao, extracao_em_cache, usuario_id, etapas)
+        except Exception as e:
+            self._falhar(item, e, usuario_id)
+
+    def processar(self, arquivos: List[Dict[str, Any]], usuario_id: int) -> List[Dict[str, Any]]:
+        """
+        Processa os arquivos ({'nome', 'armazenado'}) e retorna o manifesto na ordem recebida.
+        A falha de uma planilha não afeta as demais.
+        """
+        # Planilhas idênticas no mesmo lote são extraídas uma única vez
+        pendentes: Dict[str, List[Dict[str, Any]]] = {}
+        for item in arquivos:
+            armazenado = item['armazenado']
+            armazenado.manter()
+            armazenado.close()
+            try:
+                self._validar_arquivo(armazenado)
+            except ValueError as e:
+                self._falhar(item, e, usuario_id)
+                continue
+
+            medidor = MedidorProcessamento()
+            with medidor.etapa('cache_extracao') as registro:
+                extracao = cache_extracoes.obter(armazenado.hash_arquivo)
+                registro['encontrada'] = extracao is not None
+            if extracao is not None:
+                self._processar_item(item, extracao, True, usuario_id, medidor.etapas)
+            else:
+                pendentes.setdefault(armazenado.hash_arquivo, []).append(item)
+
+        if pendentes:
+            debug_log(f"Lote: extraindo {len(pendentes)} planilha(s) com até {self.max_workers} processo(s)")
+            for hash_arquivo, itens, resultado, erro in self._extrair(pendentes):
+                extracao, etapas = resultado if erro is None else (None, None)
+                if erro is None:
+                    try:
+                        cache_extracoes.salvar(hash_arquivo, extracao)
+                    except Exception as e:
+                        exception_log(f"Erro ao gravar extração em cache: {str(e)}")
+                for item in itens:
+                    if erro is not None:
+                        self._falhar(item, erro, usuario_id)
+                    else:
+                        self._processar_item(item, extracao, False, usuario_id, etapas)
+
+        return [item['resultado'] for item in arquivos]
+
+    def _extrair(self, pendentes: Dict[str, List[Dict[str, Any]]]):
+        """Gera (hash, itens, (extração, etapas medidas), erro) conforme cada extração termina"""
+        if self.max_workers == 1 or len(pendentes) == 1:
+            for hash_arquivo, itens in pendentes.items():
+                try:
+                    yield hash_arquivo, itens, _extrair_em_processo(itens[0]['armazenado'].caminho), None
+                except Exception as e:
+                    yield hash_arquivo, itens, None, e
+            return
+
+        # 'spawn': os workers do gunicorn mantêm threads (fila assíncrona, pool do banco); fork não é seguro
+        contexto = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=min(self.max_workers, len(pendentes)), mp_context=contexto) as pool:
+            futuros = {
+                pool.submit(_extrair_em_processo, itens[0]['armazenado'].caminho): hash_arquivo
+                for hash_arquivo, itens in pendentes.items()
+            }
+            for futuro in as_completed(futuros):
+                hash_arquivo = futuros[futuro]
+                try:
+                    yield hash_arquivo, pendentes[hash_arquivo], futuro.result(), None
+                except Exception as e:
+                    yield hash_arquivo, pendentes[hash_arquivo], None, e
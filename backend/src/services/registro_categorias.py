@@ -0,0 +1,130 @@
+"""
+Registro em processo das categorias financeiras (nome -> id).
+
+A tabela de categorias é pequena e quase estática, então é carregada uma vez
+por processo e recarregada apenas quando sua versão muda (banco, quantidade de
+linhas e maior id). Categorias ausentes são criadas com um único
+INSERT ... ON CONFLICT DO NOTHING em uma transação curta e própria, de modo que
+uploads concorrentes não disputam a constraint UNIQUE de `nome` nem ficam
+bloqueados até o fim da transação do upload.
+"""
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, select, update
+
+from src.models.user import db, CategoriaFinanceira
+
+
+class RegistroCategorias:
+    """Cache nome -> id de CategoriaFinanceira compartilhado pelas requisições do processo"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids: Dict[str, int] = {}
+        self._categorias: List[Dict] = []
+        self._versao: Optional[Tuple[str, int, Optional[int]]] = None
+
+    def _versao_atual(self, conexao) -> Tuple[str, int, Optional[int]]:
+        tabela = CategoriaFinanceira.__table__
+        linha = conexao.execute(select(func.count(tabela.c.id), func.max(tabela.c.id))).one()
+        return (str(conexao.engine.url), linha[0], linha[1])
+
+    def _carregar(self, conexao, versao):
+        tabela = CategoriaFinanceira.__table__
+        linhas = conexao.execute(
+            select(tabela.c.id, tabela.c.nome, tabela.c.categoria_pai_id, tabela.c.tipo_fluxo)
+            .order_by(tabela.c.nome)
+        ).all()
+        self._categorias = [{
+            'id': linha.id,
+            'nome': linha.nome,
+            'categoria_pai_id': linha.categoria_pai_id,
+            'tipo_fluxo': linha.tipo_fluxo
+        } for linha in linhas]
+        self._ids = {categoria['nome']: categoria['id'] for categoria in self._categorias}
+        self._versao = versao
+
+    def _atualizar_se_necessario(self, conexao):
+        versao = self._versao_atual(conexao)
+        if versao != self._versao:
+            self._carregar(conexao, versao)
+
+    def obter_ids(self) -> Dict[str, int]:
+        """Mapa nome -> id, recarregado somente se a tabela mudou"""
+        with self._lock:
+            with db.engine.connect() as conexao:
+                self._atualizar_se_necessario(conexao)
+            return dict(self._ids)
+
+    def listar(self) -> List[Dict]:
+        """Todas as categorias (mesmo formato de CategoriaFinanceira.to_dict), ordenadas por nome"""
+        with self._lock:
+            with db.engine.connect() as conexao:
+                self._atualizar_se_necessario(conexao)
+            return [dict(categoria) for categoria in self._categorias]
+
+    def invalidar(self):
+        with self._lock:
+            self._versao = None
+
+    def _inserir_ignorando_conflitos(self, conexao, novas: List[Dict]):
+        dialeto = conexao.dialect.name
+        if dialeto == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        elif dialeto == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            dialect_insert = None
+
+        if dialect_insert is not None:
+            conexao.execute(
+                dialect_insert(CategoriaFinanceira.__table__)
+                .on_conflict_do_nothing(index_elements=['nome']),
+                novas
+            )
+            return
+
+        # Bancos sem ON CONFLICT: inserir apenas os nomes que ainda não existem
+        tabela = CategoriaFinanceira.__table__
+        existentes = set(conexao.execute(
+            select(tabela.c.nome).where(tabela.c.nome.in_([nova['nome'] for nova in novas]))
+        ).scalars())
+        faltantes = [nova for nova in novas if nova['nome'] not in existentes]
+        if faltantes:
+            conexao.execute(tabela.insert(), faltantes)
+
+    def garantir(self, categorias: Iterable[Tuple[str, str]],
+                 renomear: Optional[Dict[str, str]] = None) -> Dict[str, int]:
+        """
+        Garante que as categorias (nome, tipo_fluxo) existam e retorna o mapa nome -> id.
+
+        `renomear` mapeia nome novo -> nome antigo: se apenas o nome antigo existir,
+        a categoria é renomeada em vez de criada.
+        """
+        categorias = list(categorias)
+        with self._lock:
+            with db.engine.connect() as conexao:
+                self._atualizar_se_necessario(conexao)
+                faltantes = [(nome, tipo_fluxo) for nome, tipo_fluxo in categorias if nome not in self._ids]
+                if not faltantes:
+                    return dict(self._ids)
+
+                # Encerra a transação implícita da leitura antes de abrir a de escrita
+                conexao.rollback()
+                with conexao.begin():
+                    tabela = CategoriaFinanceira.__table__
+                    for nome_novo, nome_antigo in (renomear or {}).items():
+                        if nome_novo not in self._ids and nome_antigo in self._ids:
+                            conexao.execute(
+                                update(tabela).where(tabela.c.nome == nome_antigo).values(nome=nome_novo)
+                            )
+                    novas = {nome: {'nome': nome, 'tipo_fluxo': tipo_fluxo} for nome, tipo_fluxo in faltantes}
+                    self._inserir_ignorando_conflitos(conexao, list(novas.values()))
+
+                # Renomeações não alteram a versão (quantidade/maior id): recarregar sempre após escrever
+                self._carregar(conexao, self._versao_atual(conexao))
+                return dict(self._ids)
+
+
+registro_categorias = RegistroCategorias()
@@ -0,0 +1,167 @@
+"""
+Reimportação de uma planilha atualizada em um projeto existente.
+
+Em vez de criar um novo projeto, os lançamentos extraídos da nova planilha são
+comparados com os do cenário base do projeto (o Realista, do qual os cenários
+derivados são calculados) pela chave (cenário, categoria, data_competencia,
+origem). Só as diferenças são gravadas, em lote: INSERT das chaves novas,
+UPDATE dos valores/tipos alterados e DELETE das chaves que saíram da planilha.
+Os ids do projeto, dos cenários e dos lançamentos inalterados, além dos
+snapshots (historico_cenarios), são preservados.
+
+Apenas lançamentos das categorias geradas pela importação são considerados:
+lançamentos incluídos manualmente em outras categorias permanecem, assim como
+os REALIZADOS fora do FDC-REAL (importados de extratos bancários). Cenários
+independentes (materializados por edição ou de projetos antigos) não são
+alterados e aparecem no relatório como não atualizados, assim como os
+derivados congelados, materializados antes da gravação.
+"""
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import delete, or_, select, update
+
+from src.models.user import db, Cenario, LancamentoFinanceiro
+from src.services.persistencia_lancamentos import LinhaLancamento, inserir_lancamentos
+from src.services.resumo_mensal import mes_competencia, recalcular_resumo
+
+CENTAVOS = Decimal('0.01')
+TAMANHO_LOTE_EXCLUSAO = 500
+# Quantidade máxima de alterações detalhadas no relatório do upload (os totais são sempre completos)
+MAX_ALTERACOES_RELATORIO = 200
+
+
+def _centavos(valor) -> Decimal:
+    return Decimal(str(valor if valor is not None else 0)).quantize(CENTAVOS, rounding=ROUND_HALF_UP)
+
+
+def cenario_base_do_projeto(projeto_id: int) -> Optional[Cenario]:
+    """Cenário que recebe os dados da planilha: o base dos derivados, senão o Realista, senão o mais antigo"""
+    base_dos_derivados = (
+        select(Cenario.cenario_base_id)
+        .where(Cenario.projeto_id == projeto_id, Cenario.cenario_base_id.isnot(None))
+        .scalar_subquery()
+    )
+    cenario = Cenario.query.filter(Cenario.id == base_dos_derivados).first()
+    if cenario is None:
+        cenario = Cenario.query.filter_by(projeto_id=projeto_id, nome='Realista').order_by(Cenario.id).first()
+    if cenario is None:
+        cenario = Cenario.query.filter_by(projeto_id=projeto_id).order_by(Cenario.id).first()
+    return cenario
+
+
+class DiferencaLancamentos:
+    """Resultado da comparação entre os lançamentos atuais do cenário e os da nova planilha"""
+
+    def __init__(self):
+        self.inserir: List[LinhaLancamento] = []
+        self.atualizar: List[Dict[str, Any]] = []
+        self.remover: List[int] = []
+        self.inalterados = 0
+        self.alteracoes: List[Dict[str, Any]] = []
+        # Meses com alguma alteração: só eles têm o resumo mensal recalculado
+        self.meses: Set[date] = set()
+
+    def _registrar(self, acao: str, categoria_id: int, data_competencia, origem: str, anterior=None, novo=None):
+        self.meses.add(mes_competencia(data_competencia))
+        if len(self.alteracoes) < MAX_ALTERACOES_RELATORIO:
+            self.alteracoes.append({
+                'acao': acao,
+                'categoria_id': categoria_id,
+                'data_competencia': data_competencia.isoformat(),
+                'origem': origem,
+                'valor_anterior': float(anterior) if anterior is not None else None,
+                'valor_novo': float(novo) if novo is not None else None,
+            })
+
+    def resumo(self) -> Dict[str, int]:
+        return {
+            'inseridos': len(self.inserir),
+            'atualizados': len(self.atualizar),
+            'removidos': len(self.remover),
+            'inalterados': self.inalterados,
+        }
+
+
+def calcular_diferenca(existentes: Iterable[Tuple], desejadas: Sequence[LinhaLancamento]) -> DiferencaLancamentos:
+    """
+    Compara as linhas atuais (id, categoria_id, data_competencia, origem, tipo, valor) com as
+    desejadas (tuplas na ordem de COLUNAS_LANCAMENTO, todas do mesmo cenário).
+
+    Chaves repetidas são pareadas na ordem (linhas atuais por id); as sobras viram inserções
+    ou exclusões. Valores são comparados em centavos, como gravados em Numeric(15, 2).
+    """
+    atuais = defaultdict(list)
+    for linha in sorted(existentes, key=lambda linha: linha[0]):
+        lancamento_id, categoria_id, data_competencia, origem, tipo, valor = linha
+        atuais[(categoria_id, data_competencia, origem)].append((lancamento_id, tipo, valor))
+
+    diferenca = DiferencaLancamentos()
+    pareadas = defaultdict(int)
+    for desejada in desejadas:
+        _, categoria_id, data_competencia, valor, tipo, origem = desejada
+        chave = (categoria_id, data_competencia, origem)
+        posicao = pareadas[chave]
+        pareadas[chave] += 1
+        candidatas = atuais.get(chave, ())
+        if posicao >= len(candidatas):
+            diferenca.inserir.append(desejada)
+            diferenca._registrar('inserido', categoria_id, data_competencia, origem, novo=valor)
+            continue
+
+        lancamento_id, tipo_atual, valor_atual = candidatas[posicao]
+        if tipo_atual == tipo and _centavos(valor_atual) == _centavos(valor):
+            diferenca.inalterados += 1
+        else:
+            diferenca.atualizar.append({'id': lancamento_id, 'valor': valor, 'tipo': tipo})
+            diferenca._registrar('atualizado', categoria_id, data_competencia, origem, valor_atual, valor)
+
+    for chave, candidatas in atuais.items():
+        for lancamento_id, _, valor_atual in candidatas[pareadas.get(chave, 0):]:
+            diferenca.remover.append(lancamento_id)
+            diferenca._registrar('removido', chave[0], chave[1], chave[2], anterior=valor_atual)
+    return diferenca
+
+
+def lancamentos_atuais(cenario_id: int, categorias: Iterable[int],
+                       categorias_realizado: Optional[Iterable[int]] = None) -> List[Tuple]:
+    """
+    Linhas (id, categoria_id, data_competencia, origem, tipo, valor) do cenário nas categorias informadas.
+
+    Com `categorias_realizado`, lançamentos REALIZADOS só são considerados nessas categorias
+    (os demais, como os importados de extratos bancários, não pertencem à planilha).
+    """
+    consulta = select(
+        LancamentoFinanceiro.id, LancamentoFinanceiro.categoria_id, LancamentoFinanceiro.data_competencia,
+        LancamentoFinanceiro.origem, LancamentoFinanceiro.tipo, LancamentoFinanceiro.valor
+    ).where(
+        LancamentoFinanceiro.cenario_id == cenario_id,
+        LancamentoFinanceiro.categoria_id.in_(list(categorias))
+    )
+    if categorias_realizado is not None:
+        consulta = consulta.where(or_(
+            LancamentoFinanceiro.origem != 'REALIZADO',
+            LancamentoFinanceiro.categoria_id.in_(list(categorias_realizado))
+        ))
+    return db.session.execute(consulta).all()
+
+
+def aplicar_diferenca(diferenca: DiferencaLancamentos, cenario_id: int):
+    """
+    Grava a diferença na transação atual: um DELETE por lote de ids, um UPDATE em lote e um INSERT
+    em lote. O resumo mensal do cenário é recalculado nos meses alterados.
+    """
+    for inicio in range(0, len(diferenca.remover), TAMANHO_LOTE_EXCLUSAO):
+        lote = diferenca.remover[inicio:inicio + TAMANHO_LOTE_EXCLUSAO]
+        db.session.execute(
+            delete(LancamentoFinanceiro)
+            .where(LancamentoFinanceiro.id.in_(lote))
+            .execution_options(synchronize_session=False)
+        )
+    if diferenca.atualizar:
+        # UPDATE por chave primária em lote (executemany)
+        db.session.execute(update(LancamentoFinanceiro), diferenca.atualizar)
+    inserir_lancamentos(diferenca.inserir, atualizar_resumo=False)
+    recalcular_resumo(cenario_id, diferenca.meses)
@@ -0,0 +1,260 @@
+"""
+Resumo mensal dos lançamentos (tabela resumos_mensais_lancamentos).
+
+Gráficos, análises, comparações, dashboards e relatórios somam os lançamentos
+por mês, categoria e tipo. Em vez de agregar todas as linhas de
+lancamentos_financeiros a cada requisição, eles leem este resumo: uma linha
+por (cenário, mês, categoria, tipo, origem) com a soma e a quantidade, ou seja,
+algumas dezenas de linhas por cenário.
+
+O resumo é mantido na mesma transação que altera os lançamentos:
+- inserções em lote (importação de planilhas e extratos, materialização de
+  cenários derivados) somam as linhas novas ao resumo (somar_lancamentos);
+- edições, exclusões, reimportações e restaurações de snapshot recalculam, a
+  partir dos lançamentos, os meses afetados ou o cenário inteiro
+  (recalcular_resumo).
+
+Cenários derivados (ver cenarios_virtuais) também têm resumo próprio, calculado
+das linhas do cenário base com o valor de cada lançamento ajustado e arredondado
+como na listagem, de modo que os totais batem com a soma dos lançamentos
+listados. Ele acompanha o cenário base: somar_lancamentos e recalcular_resumo
+atualizam junto o resumo dos derivados. scripts/recalcular_resumo_mensal.py
+reconstrói e confere o resumo.
+"""
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, func, insert, select
+
+from src.models.user import db, Cenario, CategoriaFinanceira, LancamentoFinanceiro, ResumoMensalLancamento
+
+CENTAVOS = Decimal('0.01')
+COLUNAS_CHAVE = ('cenario_id', 'mes', 'categoria_id', 'tipo', 'origem')
+
+ChaveResumo = Tuple[int, date, int, str, str]
+
+
+def mes_competencia(data_competencia: date) -> date:
+    return data_competencia.replace(day=1)
+
+
+def _proximo_mes(mes: date) -> date:
+    return date(mes.year + 1, 1, 1) if mes.month == 12 else date(mes.year, mes.month + 1, 1)
+
+
+def centavos(valor) -> Decimal:
+    """Valor como gravado em Numeric(15, 2): arredondado ao centavo (a extração traz floats como 120263.04999999999)"""
+    return Decimal(str(valor if valor is not None else 0)).quantize(CENTAVOS, rounding=ROUND_HALF_UP)
+
+
+def fator_variacao(percentual) -> Decimal:
+    """Multiplicador das ENTRADAS projetadas de um cenário derivado com o percentual de variação"""
+    return Decimal(1) + Decimal(str(percentual or 0)) / Decimal(100)
+
+
+def ajustar_valor(valor, tipo: str, origem: str, fator: Decimal) -> Decimal:
+    """Valor de um lançamento do cenário base em um cenário derivado (só ENTRADAS projetadas mudam, ao centavo)"""
+    valor = centavos(valor)
+    if tipo == 'ENTRADA' and origem == 'PROJETADO':
+        valor = (valor * fator).quantize(CENTAVOS, rounding=ROUND_HALF_UP)
+    return valor
+
+
+def _derivados(cenario_ids: Iterable[int]) -> Dict[int, List[Tuple[int, Decimal]]]:
+    """Cenário base -> [(id do cenário derivado, fator)] dos cenários informados que tenham derivados"""
+    derivados = defaultdict(list)
+    consulta = select(Cenario.id, Cenario.cenario_base_id, Cenario.percentual_variacao).where(
+        Cenario.cenario_base_id.in_(list(cenario_ids))
+    ).order_by(Cenario.id)
+    for cenario_id, base_id, percentual in db.session.execute(consulta):
+        derivados[base_id].append((cenario_id, fator_variacao(percentual)))
+    return derivados
+
+
+def _linhas(acumulado: Dict[ChaveResumo, List]) -> List[Dict]:
+    return [
+        dict(zip(COLUNAS_CHAVE, chave), total=total.quantize(CENTAVOS), quantidade=quantidade)
+        for chave, (total, quantidade) in acumulado.items()
+    ]
+
+
+def somar_lancamentos(linhas: Iterable[Tuple]):
+    """
+    Soma lançamentos recém-inseridos ao resumo (tuplas na ordem de
+    persistencia_lancamentos.COLUNAS_LANCAMENTO) com um INSERT ... ON CONFLICT em lote.
+    Os cenários derivados dos cenários das linhas recebem as mesmas linhas, com o valor ajustado.
+    """
+    linhas = list(linhas)
+    if not linhas:
+        return
+    derivados = _derivados({linha[0] for linha in linhas})
+
+    acumulado: Dict[ChaveResumo, List] = defaultdict(lambda: [Decimal(0), 0])
+    for cenario_id, categoria_id, data_competencia, valor, tipo, origem in linhas:
+        mes = mes_competencia(data_competencia)
+        # Soma o valor como ele é gravado e listado, não o float da extração
+        valor = centavos(valor)
+        item = acumulado[(cenario_id, mes, categoria_id, tipo, origem)]
+        item[0] += valor
+        item[1] += 1
+        for derivado_id, fator in derivados.get(cenario_id, ()):
+            item = acumulado[(derivado_id, mes, categoria_id, tipo, origem)]
+            item[0] += ajustar_valor(valor, tipo, origem, fator)
+            item[1] += 1
+
+    dialeto = db.session.connection().dialect.name
+    if dialeto == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as insert_dialeto
+    elif dialeto == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as insert_dialeto
+    else:
+        # Sem upsert no dialeto: recalcular os meses das linhas a partir dos lançamentos (e os derivados junto)
+        meses_por_cenario = defaultdict(set)
+        for cenario_id, _, data_competencia, _, _, _ in linhas:
+            meses_por_cenario[cenario_id].add(mes_competencia(data_competencia))
+        for cenario_id, meses in meses_por_cenario.items():
+            recalcular_resumo(cenario_id, meses)
+        return
+
+    tabela = ResumoMensalLancamento.__table__
+    instrucao = insert_dialeto(tabela)
+    instrucao = instrucao.on_conflict_do_update(
+        index_elements=list(COLUNAS_CHAVE),
+        set_={
+            'total': tabela.c.total + instrucao.excluded.total,
+            'quantidade': tabela.c.quantidade + instrucao.excluded.quantidade,
+        }
+    )
+    db.session.execute(instrucao, _linhas(acumulado))
+
+
+def _calcular(cenario_id: int, meses: Optional[set] = None) -> Dict[ChaveResumo, List]:
+    """
+    Soma e quantidade por chave do resumo a partir dos lançamentos do cenário (só dos `meses`, se
+    informados). Em um cenário derivado, das linhas do cenário base com o valor de cada uma ajustado
+    """
+    fonte_id, fator = cenario_id, None
+    cenario = db.session.execute(
+        select(Cenario.cenario_base_id, Cenario.percentual_variacao).where(Cenario.id == cenario_id)
+    ).first()
+    if cenario is not None and cenario.cenario_base_id is not None:
+        fonte_id, fator = cenario.cenario_base_id, fator_variacao(cenario.percentual_variacao)
+
+    agrupamento = [
+        LancamentoFinanceiro.categoria_id, LancamentoFinanceiro.tipo, LancamentoFinanceiro.origem,
+        LancamentoFinanceiro.data_competencia
+    ]
+    if fator is not None:
+        # O ajuste é arredondado por lançamento: linhas de mesmo valor são ajustadas uma vez e multiplicadas
+        agrupamento.append(LancamentoFinanceiro.valor)
+    consulta = select(
+        *agrupamento, func.sum(LancamentoFinanceiro.valor), func.count(LancamentoFinanceiro.id)
+    ).where(LancamentoFinanceiro.cenario_id == fonte_id).group_by(*agrupamento)
+    if meses is not None:
+        consulta = consulta.where(
+            LancamentoFinanceiro.data_competencia >= min(meses),
+            LancamentoFinanceiro.data_competencia < _proximo_mes(max(meses))
+        )
+
+    # A soma vem agrupada por data (independente do dialeto) e é dobrada por mês aqui
+    acumulado: Dict[ChaveResumo, List] = defaultdict(lambda: [Decimal(0), 0])
+    for linha in db.session.execute(consulta):
+        categoria_id, tipo, origem, data_competencia = linha[:4]
+        total, quantidade = linha[-2:]
+        mes = mes_competencia(data_competencia)
+        if meses is not None and mes not in meses:
+            continue
+        item = acumulado[(cenario_id, mes, categoria_id, tipo, origem)]
+        if fator is not None:
+            item[0] += ajustar_valor(linha[4], tipo, origem, fator) * quantidade
+        else:
+            item[0] += Decimal(str(total if total is not None else 0))
+        item[1] += quantidade
+    return acumulado
+
+
+def recalcular_resumo(cenario_id: int, meses: Optional[Iterable[date]] = None) -> int:
+    """
+    Regrava o resumo do cenário a partir dos lançamentos: apenas os meses informados
+    (datas quaisquer dentro do mês) ou, sem `meses`, o cenário inteiro. Os cenários derivados
+    dele são recalculados junto. Retorna as linhas gravadas do cenário.
+    """
+    if meses is not None:
+        meses = {mes_competencia(mes) for mes in meses if mes is not None}
+        if not meses:
+            return 0
+    linhas = _regravar(cenario_id, meses)
+    for derivado_id, _ in _derivados([cenario_id]).get(cenario_id, ()):
+        _regravar(derivado_id, meses)
+    return linhas
+
+
+def _regravar(cenario_id: int, meses: Optional[set]) -> int:
+    exclusao = delete(ResumoMensalLancamento).where(ResumoMensalLancamento.cenario_id == cenario_id)
+    if meses is not None:
+        exclusao = exclusao.where(ResumoMensalLancamento.mes.in_(sorted(meses)))
+
+    acumulado = _calcular(cenario_id, meses)
+    db.session.execute(exclusao.execution_options(synchronize_session=False))
+    if acumulado:
+        db.session.execute(insert(ResumoMensalLancamento.__table__), _linhas(acumulado))
+    return len(acumulado)
+
+
+def cenarios_com_resumo() -> List[int]:
+    """Cenários com lançamentos, derivados ou com linhas de resumo (estas podem estar sobrando)"""
+    com_lancamentos = select(LancamentoFinanceiro.cenario_id).distinct()
+    derivados = select(Cenario.id).where(Cenario.cenario_base_id.isnot(None))
+    com_resumo = select(ResumoMensalLancamento.cenario_id).distinct()
+    return sorted(db.session.execute(com_lancamentos.union(derivados, com_resumo)).scalars())
+
+
+def divergencias_resumo(cenario_id: int) -> List[Tuple[ChaveResumo, Optional[Tuple], Optional[Tuple]]]:
+    """Chaves em que o resumo gravado difere dos lançamentos: (chave, (total, quantidade) gravado, calculado)"""
+    calculado = {
+        chave: (total.quantize(CENTAVOS), quantidade)
+        for chave, (total, quantidade) in _calcular(cenario_id).items()
+    }
+    gravado = {
+        (cenario_id, linha.mes, linha.categoria_id, linha.tipo, linha.origem):
+            (Decimal(str(linha.total)).quantize(CENTAVOS), linha.quantidade)
+        for linha in ResumoMensalLancamento.query.filter_by(cenario_id=cenario_id)
+    }
+    return [
+        (chave, gravado.get(chave), calculado.get(chave))
+        for chave in sorted(set(calculado) | set(gravado))
+        if gravado.get(chave) != calculado.get(chave)
+    ]
+
+
+def preencher_resumo_vazio() -> int:
+    """
+    Calcula o resumo de todos os cenários se a tabela estiver vazia e houver lançamentos
+    (banco criado antes do resumo, sem a migração). Retorna os cenários calculados.
+    """
+    if db.session.query(ResumoMensalLancamento.id).first() is not None:
+        return 0
+    if db.session.query(LancamentoFinanceiro.id).first() is None:
+        return 0
+    cenarios = cenarios_com_resumo()
+    for cenario_id in cenarios:
+        recalcular_resumo(cenario_id)
+    return len(cenarios)
+
+
+def consultar_resumo(cenario_id: int, desde: Optional[date] = None) -> List:
+    """Linhas do resumo do cenário com o nome da categoria, em ordem de mês (a partir de `desde`, se informado)"""
+    consulta = select(
+        ResumoMensalLancamento.mes, ResumoMensalLancamento.categoria_id, CategoriaFinanceira.nome,
+        ResumoMensalLancamento.tipo, ResumoMensalLancamento.origem,
+        ResumoMensalLancamento.total, ResumoMensalLancamento.quantidade
+    ).join(
+        CategoriaFinanceira, CategoriaFinanceira.id == ResumoMensalLancamento.categoria_id
+    ).where(
+        ResumoMensalLancamento.cenario_id == cenario_id
+    ).order_by(ResumoMensalLancamento.mes, ResumoMensalLancamento.categoria_id)
+    if desde is not None:
+        consulta = consulta.where(ResumoMensalLancamento.mes >= mes_competencia(desde))
+    return db.session.execute(consulta).all()
@@ -0,0 +1,261 @@
+"""
+Upload de planilhas grandes em partes, com sessões retomáveis.
+
+O cliente cria uma sessão informando nome e tamanho do arquivo, envia as partes
+numeradas (uma por requisição, com o SHA256 da parte no cabeçalho X-Parte-SHA256)
+e finaliza a sessão. Na finalização, as partes são concatenadas no armazenamento
+definitivo, calculando hash e assinatura na mesma passada, como no upload direto.
+Em seguida a planilha é enfileirada na fila de processamento.
+
+Cada parte é gravada em um arquivo temporário e só depois renomeada, portanto uma
+parte presente em disco está completa e conferida. Um upload interrompido é
+retomado consultando a sessão (partes_pendentes) e reenviando apenas o que falta.
+Como cada requisição transfere no máximo uma parte, um worker do gunicorn fica
+preso em uma conexão lenta só pelo tempo de uma parte, não do arquivo inteiro.
+"""
+import hashlib
+import os
+import shutil
+import uuid
+from datetime import datetime, timedelta
+from typing import BinaryIO, Iterable, List, Optional
+
+from sqlalchemy import select, update
+
+from src.models.user import db, SessaoUpload
+from src.services.armazenamento_upload import UPLOAD_DIR, ArquivoEmArmazenamento, caminho_definitivo
+from src.services.fila_processamento import fila_processamento
+from src.utils.logger import debug_log
+
+DIRETORIO_SESSOES = os.path.join(UPLOAD_DIR, 'sessoes')
+# Tamanho padrão (e máximo) de cada parte; precisa caber em MAX_CONTENT_LENGTH (16MB)
+TAMANHO_PARTE = min(int(os.getenv('UPLOAD_SESSAO_TAMANHO_PARTE', str(5 * 1024 * 1024))), 16 * 1024 * 1024)
+TAMANHO_PARTE_MINIMO = 256 * 1024
+MAX_TAMANHO_SESSAO = int(os.getenv('UPLOAD_SESSAO_MAX_BYTES', str(100 * 1024 * 1024)))
+VALIDADE_SESSAO = timedelta(hours=int(os.getenv('UPLOAD_SESSAO_VALIDADE_HORAS', '24')))
+TAMANHO_BLOCO = 1024 * 1024
+SUFIXO_PARTE = '.parte'
+
+
+class ErroSessaoUpload(ValueError):
+    """Requisição inválida para o estado da sessão; `status_http` é o código a devolver ao cliente"""
+
+    def __init__(self, mensagem: str, status_http: int = 400, **detalhes):
+        super().__init__(mensagem)
+        self.status_http = status_http
+        self.detalhes = detalhes
+
+
+def _diretorio_sessao(sessao_id: str) -> str:
+    return os.path.join(DIRETORIO_SESSOES, sessao_id)
+
+
+def _caminho_parte(sessao_id: str, numero: int) -> str:
+    return os.path.join(_diretorio_sessao(sessao_id), f'{numero:06d}{SUFIXO_PARTE}')
+
+
+def tamanho_esperado_parte(sessao: SessaoUpload, numero: int) -> int:
+    """Todas as partes têm tamanho_parte bytes, exceto a última (o restante do arquivo)"""
+    if numero < sessao.total_partes:
+        return sessao.tamanho_parte
+    return sessao.tamanho - sessao.tamanho_parte * (sessao.total_partes - 1)
+
+
+def partes_recebidas(sessao: SessaoUpload) -> List[int]:
+    """Números das partes já gravadas e conferidas"""
+    diretorio = _diretorio_sessao(sessao.id)
+    if not os.path.isdir(diretorio):
+        return []
+    return sorted(
+        int(nome[:-len(SUFIXO_PARTE)]) for nome in os.listdir(diretorio)
+        if nome.endswith(SUFIXO_PARTE) and nome[:-len(SUFIXO_PARTE)].isdigit()
+    )
+
+
+def _remover_partes(sessao_id: str):
+    shutil.rmtree(_diretorio_sessao(sessao_id), ignore_errors=True)
+
+
+def remover_partes_sessoes(sessao_ids: Iterable[str]):
+    """Remove do disco as partes de sessões já excluídas do banco (ex.: exclusão do usuário)"""
+    for sessao_id in sessao_ids:
+        _remover_partes(sessao_id)
+
+
+def remover_sessoes_expiradas():
+    """Marca como expiradas as sessões vencidas ainda não finalizadas e remove suas partes do disco"""
+    tabela = SessaoUpload.__table__
+    vencidas = db.session.execute(
+        select(tabela.c.id)
+        .where(tabela.c.status.in_(('aberta', 'finalizando')), tabela.c.expira_em < datetime.utcnow())
+    ).scalars().all()
+    if not vencidas:
+        return
+    db.session.execute(
+        update(tabela)
+        .where(tabela.c.id.in_(vencidas), tabela.c.status.in_(('aberta', 'finalizando')))
+        .values(status='expirada')
+    )
+    db.session.commit()
+    for sessao_id in vencidas:
+        _remover_partes(sessao_id)
+    debug_log(f"{len(vencidas)} sessões de upload expiradas removidas")
+
+
+def criar_sessao(usuario_id: int, nome_arquivo: str, tamanho: int, tamanho_parte: Optional[int] = None,
+                 sha256: Optional[str] = None, projeto_id: Optional[int] = None) -> SessaoUpload:
+    """Abre uma sessão de upload; o cliente pode pedir partes menores que o padrão (conexões lentas)"""
+    if tamanho <= 0:
+        raise ErroSessaoUpload('Tamanho do arquivo inválido')
+    if tamanho > MAX_TAMANHO_SESSAO:
+        raise ErroSessaoUpload(f'Arquivo muito grande. Máximo: {MAX_TAMANHO_SESSAO / 1024 / 1024:.0f}MB', 413)
+    tamanho_parte = tamanho_parte or TAMANHO_PARTE
+    if not TAMANHO_PARTE_MINIMO <= tamanho_parte <= TAMANHO_PARTE:
+        raise ErroSessaoUpload(f'tamanho_parte deve estar entre {TAMANHO_PARTE_MINIMO} e {TAMANHO_PARTE} bytes')
+    if sha256 is not None and (len(sha256) != 64 or any(c not in '0123456789abcdef' for c in sha256.lower())):
+        raise ErroSessaoUpload('sha256 inválido (esperado hexadecimal com 64 caracteres)')
+
+    remover_sessoes_expiradas()
+    sessao = SessaoUpload(
+        id=str(uuid.uuid4()),
+        usuario_id=usuario_id,
+        nome_arquivo=nome_arquivo,
+        tamanho=tamanho,
+        tamanho_parte=tamanho_parte,
+        total_partes=-(-tamanho // tamanho_parte),
+        sha256=sha256.lower() if sha256 else None,
+        projeto_id=projeto_id,
+        status='aberta',
+        expira_em=datetime.utcnow() + VALIDADE_SESSAO
+    )
+    db.session.add(sessao)
+    db.session.commit()
+    os.makedirs(_diretorio_sessao(sessao.id), exist_ok=True)
+    return sessao
+
+
+def _verificar_aberta(sessao: SessaoUpload):
+    if sessao.status == 'aberta' and sessao.expira_em < datetime.utcnow():
+        raise ErroSessaoUpload('Sessão de upload expirada. Crie uma nova sessão.', 410)
+    if sessao.status != 'aberta':
+        raise ErroSessaoUpload(f'Sessão de upload não está aberta (status: {sessao.status})', 409)
+
+
+def gravar_parte(sessao: SessaoUpload, numero: int, fluxo: BinaryIO, tamanho_informado: Optional[int],
+                 sha256_informado: Optional[str]) -> int:
+    """
+    Grava uma parte lida do corpo da requisição, conferindo tamanho e SHA256.
+    Reenviar uma parte já recebida a substitui. Retorna o tamanho gravado.
+    """
+    _verificar_aberta(sessao)
+    if not 1 <= numero <= sessao.total_partes:
+        raise ErroSessaoUpload(f'Parte inválida: {numero} (a sessão tem {sessao.total_partes} partes)')
+    if not sha256_informado:
+        raise ErroSessaoUpload('Informe o SHA256 da parte no cabeçalho X-Parte-SHA256')
+    esperado = tamanho_esperado_parte(sessao, numero)
+    if tamanho_informado != esperado:
+        raise ErroSessaoUpload(f'A parte {numero} deve ter {esperado} bytes (Content-Length)')
+
+    os.makedirs(_diretorio_sessao(sessao.id), exist_ok=True)
+    destino = _caminho_parte(sessao.id, numero)
+    # Nome temporário único: reenvios simultâneos da mesma parte não se misturam
+    temporario = f'{destino}.{uuid.uuid4().hex}.tmp'
+    sha256 = hashlib.sha256()
+    recebido = 0
+    try:
+        with open(temporario, 'wb') as arquivo:
+            for bloco in iter(lambda: fluxo.read(TAMANHO_BLOCO), b''):
+                recebido += len(bloco)
+                if recebido > esperado:
+                    break
+                sha256.update(bloco)
+                arquivo.write(bloco)
+        if recebido != esperado:
+            raise ErroSessaoUpload(f'Parte {numero} incompleta: {recebido} de {esperado} bytes recebidos')
+        if sha256.hexdigest() != sha256_informado.strip().lower():
+            raise ErroSessaoUpload(f'SHA256 da parte {numero} não confere. Reenvie a parte.', 422)
+        os.replace(temporario, destino)
+    finally:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+    return recebido
+
+
+def cancelar_sessao(sessao: SessaoUpload):
+    """Cancela uma sessão ainda não finalizada e remove as partes recebidas"""
+    if sessao.status in ('finalizando', 'finalizada'):
+        raise ErroSessaoUpload(f'Sessão de upload já {sessao.status}', 409)
+    sessao.status = 'cancelada'
+    db.session.commit()
+    _remover_partes(sessao.id)
+
+
+def _montar_arquivo(sessao: SessaoUpload) -> ArquivoEmArmazenamento:
+    """Concatena as partes no caminho definitivo, calculando hash, tamanho e assinatura na mesma passada"""
+    destino = ArquivoEmArmazenamento(caminho_definitivo(sessao.nome_arquivo))
+    try:
+        for numero in range(1, sessao.total_partes + 1):
+            with open(_caminho_parte(sessao.id, numero), 'rb') as parte:
+                for bloco in iter(lambda: parte.read(TAMANHO_BLOCO), b''):
+                    destino.write(bloco)
+        if destino.tamanho != sessao.tamanho:
+            raise ErroSessaoUpload('Tamanho do arquivo montado não confere com o informado na sessão', 422)
+        if sessao.sha256 and destino.hash_arquivo != sessao.sha256:
+            raise ErroSessaoUpload('SHA256 do arquivo montado não confere com o informado na sessão', 422)
+        if not destino.assinatura_excel:
+            raise ErroSessaoUpload('O arquivo parece estar corrompido ou em formato inválido. Verifique se é um arquivo Excel válido.', 422)
+    except Exception:
+        destino.descartar()
+        raise
+    destino.manter()
+    destino.close()
+    return destino
+
+
+def finalizar_sessao(sessao: SessaoUpload) -> str:
+    """
+    Monta o arquivo e enfileira o processamento (tipo 'upload_planilha'); retorna o job_id.
+    Finalizar novamente uma sessão já finalizada devolve o mesmo job.
+    """
+    if sessao.status == 'finalizada':
+        return sessao.job_id
+    _verificar_aberta(sessao)
+    pendentes = sessao.to_dict(partes_recebidas(sessao))['partes_pendentes']
+    if pendentes:
+        raise ErroSessaoUpload('Ainda há partes pendentes', 409, partes_pendentes=pendentes)
+
+    # Reserva com UPDATE condicional: apenas uma finalização simultânea monta o arquivo
+    tabela = SessaoUpload.__table__
+    reservada = db.session.execute(
+        update(tabela).where(tabela.c.id == sessao.id, tabela.c.status == 'aberta').values(status='finalizando')
+    )
+    db.session.commit()
+    if reservada.rowcount != 1:
+        db.session.refresh(sessao)
+        raise ErroSessaoUpload(f'Sessão de upload não está aberta (status: {sessao.status})', 409)
+
+    try:
+        arquivo = _montar_arquivo(sessao)
+    except Exception:
+        # Devolver a sessão ao estado aberto: o cliente pode reenviar partes e finalizar de novo
+        db.session.rollback()
+        db.session.execute(update(tabela).where(tabela.c.id == sessao.id).values(status='aberta'))
+        db.session.commit()
+        raise
+
+    parametros_job = {
+        'caminho_arquivo': arquivo.caminho,
+        'filename': sessao.nome_arquivo,
+        'hash_arquivo': arquivo.hash_arquivo,
+        'sessao_upload_id': sessao.id
+    }
+    if sessao.projeto_id is not None:
+        parametros_job['projeto_id'] = sessao.projeto_id
+    job = fila_processamento.enfileirar(sessao.usuario_id, 'upload_planilha', parametros_job)
+
+    sessao.status = 'finalizada'
+    sessao.job_id = job.id
+    db.session.commit()
+    _remover_partes(sessao.id)
+    debug_log(f"Sessão de upload {sessao.id} finalizada: job {job.id}")
+    return job.id
@@ -0,0 +1,315 @@
+"""
+Validação rápida de planilhas a partir do cabeçalho do arquivo.
+
+Lê apenas os nomes das abas, sem carregar a planilha nem gravar arquivo
+temporário, e detecta o layout (layout_planilhas.py):
+- .xlsx: abre o ZIP e lê só a lista <sheets> de xl/workbook.xml (localizado
+  por _rels/.rels), interrompendo o XML ao fim da lista;
+- .xls (OLE2/BIFF): percorre o diretório do arquivo composto até o fluxo
+  Workbook/Book e lê os registros BOUNDSHEET do início desse fluxo.
+
+Usado por /api/validar-planilha, chamado pelo frontend a cada arquivo
+selecionado.
+"""
+import posixpath
+import struct
+import zipfile
+import xml.etree.ElementTree as ET
+from typing import Any, Dict, Iterator, List, Tuple
+
+from src.services.layout_planilhas import detectar_layout
+
+ASSINATURA_ZIP = b'\x50\x4B\x03\x04'
+ASSINATURA_OLE2 = b'\xD0\xCF\x11\xE0\xA1\xB1\x1A\xE1'
+# Formatos que o processamento (PlanilhaCarregada) consegue ler; o openpyxl, usado sem o calamine, não lê .xls
+FORMATOS_PROCESSAVEIS = ('xlsx',)
+# xl/workbook.xml guarda só metadados; um arquivo maior que isso não é uma planilha legítima
+MAX_TAMANHO_WORKBOOK_XML = 4 * 1024 * 1024
+
+TIPO_RELACAO_DOCUMENTO = '/officeDocument'
+ATRIBUTO_ID_RELACAO = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id'
+
+# Arquivo composto (OLE2): setores especiais da FAT
+SETOR_FIM_CADEIA = 0xFFFFFFFE
+SETOR_LIVRE = 0xFFFFFFFF
+# Registros BIFF usados
+REGISTRO_EOF = 0x000A
+REGISTRO_FILEPASS = 0x002F
+REGISTRO_BOUNDSHEET = 0x0085
+
+
+class PlanilhaIlegivel(ValueError):
+    """Arquivo cujo cabeçalho não pôde ser lido como planilha Excel"""
+
+
+def _nome_local(tag: str) -> str:
+    return tag.rsplit('}', 1)[-1]
+
+
+# ---------------------------------------------------------------------------
+# .xlsx
+# ---------------------------------------------------------------------------
+
+def _caminho_workbook(zf: zipfile.ZipFile) -> str:
+    """Parte principal do pacote segundo _rels/.rels (padrão: xl/workbook.xml)"""
+    try:
+        with zf.open('_rels/.rels') as f:
+            for elemento in ET.parse(f).getroot():
+                if elemento.get('Type', '').endswith(TIPO_RELACAO_DOCUMENTO):
+                    return elemento.get('Target', '').lstrip('/')
+    except KeyError:
+        pass
+    return 'xl/workbook.xml'
+
+
+def abas_xlsx(arquivo) -> List[str]:
+    """Nomes das abas de um .xlsx, na ordem da planilha (inclui abas ocultas, como o openpyxl)"""
+    try:
+        zf = zipfile.ZipFile(arquivo)
+    except zipfile.BadZipFile:
+        raise PlanilhaIlegivel('Arquivo .xlsx corrompido (ZIP inválido)')
+
+    with zf:
+        try:
+            info = zf.getinfo(_caminho_workbook(zf))
+        except KeyError:
+            raise PlanilhaIlegivel('O arquivo não contém uma pasta de trabalho Excel')
+        if info.file_size > MAX_TAMANHO_WORKBOOK_XML:
+            raise PlanilhaIlegivel('Pasta de trabalho Excel inválida')
+
+        abas = []
+        try:
+            with zf.open(info) as f:
+                for _, elemento in ET.iterparse(f):
+                    nome = _nome_local(elemento.tag)
+                    if nome == 'sheet':
+                        abas.append(elemento.get('name'))
+                    elif nome == 'sheets':
+                        break
+        except ET.ParseError as e:
+            raise PlanilhaIlegivel(f'Pasta de trabalho Excel inválida: {e}')
+        return abas
+
+
+def partes_abas_xlsx(zf: zipfile.ZipFile) -> Dict[str, zipfile.ZipInfo]:
+    """Parte do ZIP (ex.: xl/worksheets/sheet1.xml) de cada aba, pelo nome (workbook.xml e seus relacionamentos)"""
+    caminho_workbook = _caminho_workbook(zf)
+    diretorio, _, arquivo = caminho_workbook.rpartition('/')
+    alvos = {}
+    try:
+        with zf.open(f'{diretorio}/_rels/{arquivo}.rels' if diretorio else f'_rels/{arquivo}.rels') as f:
+            for elemento in ET.parse(f).getroot():
+                alvo = elemento.get('Target', '')
+                alvos[elemento.get('Id')] = alvo.lstrip('/') if alvo.startswith('/') else posixpath.normpath(
+                    posixpath.join(diretorio, alvo)
+                )
+    except KeyError:
+        return {}
+
+    partes = {}
+    with zf.open(caminho_workbook) as f:
+        for _, elemento in ET.iterparse(f):
+            nome = _nome_local(elemento.tag)
+            if nome == 'sheet':
+                alvo = alvos.get(elemento.get(ATRIBUTO_ID_RELACAO))
+                if alvo is not None and alvo in zf.NameToInfo:
+                    partes[elemento.get('name')] = zf.NameToInfo[alvo]
+            elif nome == 'sheets':
+                break
+    return partes
+
+
+# ---------------------------------------------------------------------------
+# .xls (arquivo composto OLE2 + BIFF)
+# ---------------------------------------------------------------------------
+
+class _ArquivoComposto:
+    """Leitura mínima de um arquivo composto OLE2: FAT, diretório e fluxos"""
+
+    def __init__(self, dados: bytes):
+        if len(dados) < 512 or not dados.startswith(ASSINATURA_OLE2):
+            raise PlanilhaIlegivel('Arquivo .xls inválido')
+        self.dados = dados
+        self.tamanho_setor = 1 << struct.unpack_from('<H', dados, 0x1E)[0]
+        self.tamanho_mini_setor = 1 << struct.unpack_from('<H', dados, 0x20)[0]
+        if self.tamanho_setor not in (512, 4096):
+            raise PlanilhaIlegivel('Arquivo .xls inválido')
+        (self.primeiro_setor_diretorio,) = struct.unpack_from('<I', dados, 0x30)
+        (self.limite_mini_fluxo, self.primeiro_setor_minifat, total_minifat,
+         primeiro_setor_difat, total_difat) = struct.unpack_from('<IIIII', dados, 0x38)
+        # O cabeçalho ocupa o primeiro setor; o último setor pode estar incompleto
+        self.total_setores = max((len(dados) + self.tamanho_setor - 1) // self.tamanho_setor - 1, 0)
+        self.fat = self._ler_fat(primeiro_setor_difat, total_difat)
+        self._minifat = None
+
+    def _setor(self, numero: int) -> bytes:
+        if numero >= self.total_setores:
+            raise PlanilhaIlegivel('Arquivo .xls truncado')
+        inicio = (numero + 1) * self.tamanho_setor
+        return self.dados[inicio:inicio + self.tamanho_setor]
+
+    def _ler_fat(self, setor_difat: int, total_difat: int) -> Tuple[int, ...]:
+        entradas_por_setor = self.tamanho_setor // 4
+        setores_fat = [s for s in struct.unpack_from('<109I', self.dados, 0x4C) if s != SETOR_LIVRE]
+        for _ in range(total_difat):
+            if setor_difat in (SETOR_FIM_CADEIA, SETOR_LIVRE):
+                break
+            entradas = struct.unpack(f'<{entradas_por_setor}I', self._setor(setor_difat))
+            setores_fat.extend(s for s in entradas[:-1] if s != SETOR_LIVRE)
+            setor_difat = entradas[-1]
+        fat = []
+        for setor in setores_fat:
+            fat.extend(struct.unpack(f'<{entradas_por_setor}I', self._setor(setor)))
+        return tuple(fat)
+
+    def _cadeia(self, inicio: int, tabela: Tuple[int, ...]) -> Iterator[int]:
+        """Setores de uma cadeia, com proteção contra ciclos em arquivos corrompidos"""
+        setor = inicio
+        for _ in range(len(tabela) + 1):
+            if setor == SETOR_FIM_CADEIA:
+                return
+            if setor >= len(tabela):
+                raise PlanilhaIlegivel('Arquivo .xls corrompido')
+            yield setor
+            setor = tabela[setor]
+        raise PlanilhaIlegivel('Arquivo .xls corrompido')
+
+    def _entradas_diretorio(self) -> Iterator[Tuple[str, int, int, int]]:
+        """(nome, tipo, setor inicial, tamanho) de cada entrada do diretório"""
+        for setor in self._cadeia(self.primeiro_setor_diretorio, self.fat):
+            bloco = self._setor(setor)
+            for deslocamento in range(0, len(bloco), 128):
+                entrada = bloco[deslocamento:deslocamento + 128]
+                (tamanho_nome,) = struct.unpack_from('<H', entrada, 64)
+                tipo = entrada[66]
+                inicio, tamanho = struct.unpack_from('<II', entrada, 116)
+                nome = entrada[:max(tamanho_nome - 2, 0)].decode('utf-16-le', errors='replace')
+                yield nome, tipo, inicio, tamanho
+
+    def fluxo(self, *nomes: str) -> Iterator[bytes]:
+        """Blocos do primeiro fluxo encontrado com um dos nomes (na ordem do diretório)"""
+        raiz = None
+        for nome, tipo, inicio, tamanho in self._entradas_diretorio():
+            if tipo == 5:
+                raiz = (inicio, tamanho)
+            elif tipo == 2 and nome in nomes:
+                if tamanho >= self.limite_mini_fluxo:
+                    return self._blocos(self._cadeia(inicio, self.fat), self._setor, tamanho)
+                if raiz is None:
+                    raise PlanilhaIlegivel('Arquivo .xls corrompido')
+                return self._blocos_mini(raiz, inicio, tamanho)
+        raise PlanilhaIlegivel('O arquivo .xls não contém uma pasta de trabalho Excel')
+
+    @staticmethod
+    def _blocos(setores: Iterator[int], ler, tamanho: int) -> Iterator[bytes]:
+        restante = tamanho
+        for setor in setores:
+            if restante <= 0:
+                return
+            bloco = ler(setor)[:restante]
+            restante -= len(bloco)
+            yield bloco
+
+    def _blocos_mini(self, raiz: Tuple[int, int], inicio: int, tamanho: int) -> Iterator[bytes]:
+        if self._minifat is None:
+            minifat = b''.join(self._setor(s) for s in self._cadeia(self.primeiro_setor_minifat, self.fat))
+            self._minifat = struct.unpack(f'<{len(minifat) // 4}I', minifat)
+        mini_fluxo = b''.join(self._blocos(self._cadeia(raiz[0], self.fat), self._setor, raiz[1]))
+
+        def ler_mini(setor):
+            deslocamento = setor * self.tamanho_mini_setor
+            return mini_fluxo[deslocamento:deslocamento + self.tamanho_mini_setor]
+
+        return self._blocos(self._cadeia(inicio, self._minifat), ler_mini, tamanho)
+
+
+def _registros_biff(blocos: Iterator[bytes]) -> Iterator[Tuple[int, bytes]]:
+    """(tipo, dados) de cada registro BIFF, lendo o fluxo só até onde for consumido"""
+    buffer = b''
+    for bloco in blocos:
+        buffer += bloco
+        while len(buffer) >= 4:
+            tipo, tamanho = struct.unpack_from('<HH', buffer, 0)
+            if len(buffer) < 4 + tamanho:
+                break
+            yield tipo, buffer[4:4 + tamanho]
+            buffer = buffer[4 + tamanho:]
+
+
+def _nome_boundsheet(dados: bytes, biff8: bool) -> str:
+    if biff8:
+        # ShortXLUnicodeString: cch, flags (bit 0 = caracteres de 2 bytes), caracteres
+        quantidade, flags = dados[6], dados[7]
+        if flags & 0x01:
+            return dados[8:8 + 2 * quantidade].decode('utf-16-le', errors='replace')
+        return dados[8:8 + quantidade].decode('latin-1')
+    quantidade = dados[6]
+    return dados[7:7 + quantidade].decode('cp1252', errors='replace')
+
+
+def abas_xls(arquivo) -> List[str]:
+    """Nomes das abas de um .xls (BIFF5/BIFF8), lidos dos registros BOUNDSHEET"""
+    composto = _ArquivoComposto(arquivo.read())
+    # 'Workbook' no BIFF8 (Excel 97+); 'Book' no BIFF5 (Excel 5/95)
+    biff8 = True
+    try:
+        blocos = composto.fluxo('Workbook')
+    except PlanilhaIlegivel:
+        blocos = composto.fluxo('Book')
+        biff8 = False
+
+    abas = []
+    for tipo, dados in _registros_biff(blocos):
+        if tipo == REGISTRO_FILEPASS:
+            raise PlanilhaIlegivel('Planilha protegida por senha')
+        if tipo == REGISTRO_BOUNDSHEET and len(dados) >= 8:
+            abas.append(_nome_boundsheet(dados, biff8))
+        elif tipo == REGISTRO_EOF:
+            # Fim do bloco global: as abas vêm depois e não precisam ser lidas
+            break
+    return abas
+
+
+# ---------------------------------------------------------------------------
+# Validação
+# ---------------------------------------------------------------------------
+
+def resultado_validacao(abas: List[str]) -> Dict[str, Any]:
+    """Resultado da validação estrutural a partir dos nomes das abas"""
+    layout = detectar_layout(abas)
+    if layout is None:
+        return {
+            'valido': False,
+            'erro': 'Estrutura de abas não reconhecida. Esperado um dos layouts válidos.',
+            'abas_encontradas': abas
+        }
+    return {
+        'valido': True,
+        'abas_encontradas': abas,
+        'total_abas': len(abas),
+        'layout': 'novo' if 'REALIZADO' in layout['abas_obrigatorias'] else 'antigo'
+    }
+
+
+def validar_cabecalho(arquivo) -> Dict[str, Any]:
+    """
+    Valida a planilha a partir de um arquivo/fluxo posicionável (ex.: FileStorage.stream),
+    lendo só os nomes das abas. Lança PlanilhaIlegivel se o arquivo não puder ser lido.
+    """
+    arquivo.seek(0)
+    assinatura = arquivo.read(len(ASSINATURA_OLE2))
+    arquivo.seek(0)
+
+    if assinatura.startswith(ASSINATURA_ZIP):
+        formato, abas = 'xlsx', abas_xlsx(arquivo)
+    elif assinatura == ASSINATURA_OLE2:
+        formato, abas = 'xls', abas_xls(arquivo)
+    else:
+        raise PlanilhaIlegivel('O arquivo não é uma planilha Excel válida')
+
+    validacao = resultado_validacao(abas)
+    validacao['formato'] = formato
+    if validacao['valido'] and formato not in FORMATOS_PROCESSAVEIS:
+        validacao['valido'] = False
+        validacao['erro'] = 'Planilhas .xls (Excel 97-2003) não são processadas. Salve o arquivo como .xlsx e envie novamente.'
+    return validacao
@@ -28,12 +28,14 @@ class JSONFormatter(logging.Formatter):
             log_data['request_id'] = record.request_id
         if hasattr(record, 'ip_address'):
             log_data['ip_address'] = record.ip_address
+        if hasattr(record, 'metricas'):
+            log_data['metricas'] = record.metricas
         
         # Adicionar exception info se existir
         if record.exc_info:
             log_data['exception'] = self.formatException(record.exc_info)
         
-        return json.dumps(log_data)
+        return json.dumps(log_data, default=str)
 
 def setup_logging(app):
     """Configura logging estruturado"""
@@ -41,6 +43,10 @@ def setup_logging(app):
     # Nível de log baseado em ambiente
     log_level = os.getenv('LOG_LEVEL', 'INFO').upper()
     app.logger.setLevel(getattr(logging, log_level, logging.INFO))
+    # Logger usado pelos serviços (src/utils/logger.py) recebe os mesmos handlers da aplicação
+    servicos_logger = logging.getLogger('habitus_forecast')
+    servicos_logger.setLevel(getattr(logging, log_level, logging.INFO))
+    servicos_logger.propagate = False
     
     # Formato baseado em ambiente
     use_json = os.getenv('LOG_FORMAT', 'json').lower() == 'json'
@@ -65,12 +71,14 @@ def setup_logging(app):
         file_handler.setLevel(logging.INFO)
         file_handler.setFormatter(formatter)
         app.logger.addHandler(file_handler)
+        servicos_logger.addHandler(file_handler)
     
     # Handler para console
     console_handler = logging.StreamHandler()
     console_handler.setLevel(logging.DEBUG if app.debug else logging.INFO)
     console_handler.setFormatter(formatter)
     app.logger.addHandler(console_handler)
+    servicos_logger.addHandler(console_handler)
     
     # Desabilitar logs verbosos de bibliotecas
     logging.getLogger('werkzeug').setLevel(logging.WARNING)
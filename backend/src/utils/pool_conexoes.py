@@ -0,0 +1,294 @@
+"""
+Configuração e métricas do pool de conexões do SQLAlchemy.
+
+O perfil (DB_PERFIL_POOL) define os padrões do pool de cada processo:
+- desenvolvimento (padrão fora de produção): pool padrão do SQLAlchemy, com pre-ping;
+- producao (padrão com FLASK_ENV=production): PostgreSQL direto; o pool é
+  dimensionado para as threads do processo que usam o banco (THREADS do
+  gunicorn + UPLOAD_ASYNC_WORKERS da fila), com pre-ping, reciclagem das
+  conexões e statement_timeout definido na abertura da conexão;
+- pgbouncer: PgBouncer em modo transaction. O processo não mantém conexões
+  (NullPool; quem reaproveita é o PgBouncer) e nenhum parâmetro de sessão é
+  enviado na conexão: o statement_timeout é aplicado com SET LOCAL no início
+  de cada transação.
+
+Cada valor do perfil pode ser sobrescrito por DB_POOL_SIZE, DB_MAX_OVERFLOW,
+DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PRE_PING, DB_STATEMENT_TIMEOUT_MS e
+DB_CONNECT_TIMEOUT. Com DB_LIMITE_CONEXOES (conexões do servidor reservadas à
+aplicação), a inicialização avisa se WORKERS x (pool + overflow) passar dele.
+
+As métricas (espera no checkout, saturação, timeouts, conexões criadas e
+invalidadas) são do processo: cada worker do gunicorn tem as suas. Ficam em
+GET /api/admin/metricas/banco e esperas longas vão para o log estruturado.
+"""
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import NullPool, QueuePool
+
+from src.utils.logger import warning_log
+
+PERFIS = {
+    'desenvolvimento': {
+        'pool_size': None, 'max_overflow': None, 'pool_timeout': None, 'pool_recycle': None,
+        'pool_pre_ping': True, 'statement_timeout_ms': 0, 'connect_timeout': 5,
+    },
+    'producao': {
+        'pool_size': None,  # threads do processo que usam o banco (ver _threads_com_banco)
+        'max_overflow': 2, 'pool_timeout': 10, 'pool_recycle': 1800,
+        'pool_pre_ping': True, 'statement_timeout_ms': 60000, 'connect_timeout': 5,
+    },
+    'pgbouncer': {
+        'pool_size': 0,  # NullPool
+        'max_overflow': 0, 'pool_timeout': None, 'pool_recycle': None,
+        'pool_pre_ping': False, 'statement_timeout_ms': 60000, 'connect_timeout': 5,
+    },
+}
+
+VARIAVEIS = {
+    'pool_size': ('DB_POOL_SIZE', int),
+    'max_overflow': ('DB_MAX_OVERFLOW', int),
+    'pool_timeout': ('DB_POOL_TIMEOUT', float),
+    'pool_recycle': ('DB_POOL_RECYCLE', int),
+    'pool_pre_ping': ('DB_POOL_PRE_PING', lambda valor: valor.lower() == 'true'),
+    'statement_timeout_ms': ('DB_STATEMENT_TIMEOUT_MS', int),
+    'connect_timeout': ('DB_CONNECT_TIMEOUT', int),
+}
+
+# Esperas no checkout acima deste tempo vão para o log (no máximo um aviso por intervalo)
+ALERTA_ESPERA_MS = float(os.getenv('DB_POOL_ALERTA_ESPERA_MS', '1000'))
+INTERVALO_ALERTA_SEGUNDOS = 60
+
+FAIXAS_ESPERA_MS = (1, 5, 10, 50, 100, 500, 1000, 5000)
+
+
+def _threads_com_banco() -> int:
+    """Threads de um processo que podem segurar uma conexão ao mesmo tempo (requisições + fila)"""
+    return int(os.getenv('THREADS', '1')) + int(os.getenv('UPLOAD_ASYNC_WORKERS', '2'))
+
+
+def resolver_configuracao() -> Dict[str, Any]:
+    """Parâmetros do pool: padrões do perfil sobrescritos pelas variáveis de ambiente"""
+    padrao = 'producao' if os.getenv('FLASK_ENV', 'development') == 'production' else 'desenvolvimento'
+    perfil = os.getenv('DB_PERFIL_POOL', padrao).strip().lower()
+    if perfil not in PERFIS:
+        raise ValueError(f"DB_PERFIL_POOL inválido: '{perfil}' (use {', '.join(PERFIS)})")
+
+    configuracao = dict(PERFIS[perfil], perfil=perfil)
+    if perfil == 'producao':
+        configuracao['pool_size'] = _threads_com_banco()
+    for chave, (variavel, converter) in VARIAVEIS.items():
+        valor = os.getenv(variavel)
+        if valor not in (None, ''):
+            try:
+                configuracao[chave] = converter(valor)
+            except ValueError:
+                raise ValueError(f"{variavel} inválida: '{valor}'")
+    return configuracao
+
+
+class MetricasPool:
+    """Contadores do pool no processo (atualizados pelas threads que pegam conexões)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ultimo_alerta = 0.0
+        self.zerar()
+
+    def zerar(self):
+        with self._lock:
+            self.checkouts = 0
+            self.espera_total_ms = 0.0
+            self.espera_maxima_ms = 0.0
+            self.esperas_por_faixa = [0] * (len(FAIXAS_ESPERA_MS) + 1)
+            self.timeouts = 0
+            self.conexoes_criadas = 0
+            self.conexoes_invalidadas = 0
+            self.em_uso = 0
+            self.em_uso_maximo = 0
+
+    def _alertar(self) -> bool:
+        """Chamado com o lock: no máximo um aviso no log por intervalo (com o pool esgotado, são muitos)"""
+        agora = time.monotonic()
+        if agora - self._ultimo_alerta < INTERVALO_ALERTA_SEGUNDOS:
+            return False
+        self._ultimo_alerta = agora
+        return True
+
+    def registrar_espera(self, espera_ms: float):
+        with self._lock:
+            self.espera_total_ms += espera_ms
+            self.espera_maxima_ms = max(self.espera_maxima_ms, espera_ms)
+            faixa = next((i for i, limite in enumerate(FAIXAS_ESPERA_MS) if espera_ms <= limite), len(FAIXAS_ESPERA_MS))
+            self.esperas_por_faixa[faixa] += 1
+            alertar = espera_ms >= ALERTA_ESPERA_MS and self._alertar()
+        if alertar:
+            warning_log('Espera longa por conexão do pool', extra={'metricas': {
+                'espera_ms': round(espera_ms, 2), 'em_uso': self.em_uso, 'processo': os.getpid()
+            }})
+
+    def registrar_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+            alertar = self._alertar()
+        if alertar:
+            warning_log('Timeout aguardando conexão do pool', extra={'metricas': {
+                'em_uso': self.em_uso, 'timeouts': self.timeouts, 'processo': os.getpid()
+            }})
+
+    def registrar_checkout(self):
+        with self._lock:
+            self.checkouts += 1
+            self.em_uso += 1
+            self.em_uso_maximo = max(self.em_uso_maximo, self.em_uso)
+
+    def registrar_checkin(self):
+        with self._lock:
+            self.em_uso = max(self.em_uso - 1, 0)
+
+    def registrar_conexao(self):
+        with self._lock:
+            self.conexoes_criadas += 1
+
+    def registrar_invalidacao(self):
+        with self._lock:
+            self.conexoes_invalidadas += 1
+
+
+metricas_pool = MetricasPool()
+
+
+class _MedirEspera:
+    """Mede o tempo que a thread espera por uma conexão (fila do pool ou abertura da conexão)"""
+
+    def _do_get(self):
+        inicio = time.perf_counter()
+        try:
+            conexao = super()._do_get()
+        except exc.TimeoutError:
+            metricas_pool.registrar_timeout()
+            raise
+        metricas_pool.registrar_espera((time.perf_counter() - inicio) * 1000)
+        return conexao
+
+
+class QueuePoolMedido(_MedirEspera, QueuePool):
+    pass
+
+
+class NullPoolMedido(_MedirEspera, NullPool):
+    pass
+
+
+def opcoes_engine(url: str, configuracao: Dict[str, Any]) -> Dict[str, Any]:
+    """SQLALCHEMY_ENGINE_OPTIONS para a URL do banco conforme a configuração do pool"""
+    if url.startswith('sqlite') and (':memory:' in url or url.rstrip('/') == 'sqlite:'):
+        return {}  # StaticPool do Flask-SQLAlchemy
+
+    opcoes: Dict[str, Any] = {}
+    if configuracao['pool_size'] == 0:
+        opcoes['poolclass'] = NullPoolMedido
+    else:
+        opcoes['poolclass'] = QueuePoolMedido
+        for chave in ('pool_size', 'max_overflow', 'pool_timeout', 'pool_recycle'):
+            if configuracao[chave] is not None:
+                opcoes[chave] = configuracao[chave]
+        opcoes['pool_pre_ping'] = configuracao['pool_pre_ping']
+
+    if url.startswith('postgresql'):
+        connect_args: Dict[str, Any] = {'application_name': 'habitus-forecast'}
+        if configuracao['connect_timeout']:
+            connect_args['connect_timeout'] = configuracao['connect_timeout']
+        if configuracao['statement_timeout_ms'] and configuracao['perfil'] != 'pgbouncer':
+            # Parâmetro de sessão na abertura da conexão (o PgBouncer em modo transaction recusaria)
+            connect_args['options'] = f"-c statement_timeout={configuracao['statement_timeout_ms']}"
+        opcoes['connect_args'] = connect_args
+    return opcoes
+
+
+def _capacidade(pool) -> Optional[int]:
+    if isinstance(pool, QueuePool):
+        return pool.size() + max(pool._max_overflow, 0)
+    return None
+
+
+def registrar_eventos(engine, configuracao: Dict[str, Any]):
+    """Liga as métricas aos eventos do pool e, no perfil pgbouncer, o statement_timeout por transação"""
+    event.listen(engine, 'connect', lambda *_: metricas_pool.registrar_conexao())
+    event.listen(engine, 'checkout', lambda *_: metricas_pool.registrar_checkout())
+    event.listen(engine, 'checkin', lambda *_: metricas_pool.registrar_checkin())
+    event.listen(engine, 'invalidate', lambda *_: metricas_pool.registrar_invalidacao())
+
+    if (configuracao['perfil'] == 'pgbouncer' and configuracao['statement_timeout_ms']
+            and engine.dialect.name == 'postgresql'):
+        instrucao = f"SET LOCAL statement_timeout = {int(configuracao['statement_timeout_ms'])}"
+
+        @event.listens_for(engine, 'begin')
+        def _statement_timeout_transacao(conexao):
+            conexao.exec_driver_sql(instrucao)
+
+
+def verificar_orcamento_conexoes(configuracao: Dict[str, Any]) -> Optional[str]:
+    """Mensagem de aviso se os workers puderem abrir mais conexões do que DB_LIMITE_CONEXOES"""
+    limite = os.getenv('DB_LIMITE_CONEXOES')
+    if not limite or configuracao['pool_size'] in (None, 0):
+        return None
+    workers = int(os.getenv('WORKERS', '1'))
+    por_processo = configuracao['pool_size'] + max(configuracao['max_overflow'] or 0, 0)
+    if workers * por_processo <= int(limite):
+        return None
+    return (f"⚠️ Até {workers * por_processo} conexões ({workers} workers x {por_processo}) "
+            f"para DB_LIMITE_CONEXOES={limite}: reduza DB_POOL_SIZE/DB_MAX_OVERFLOW ou use DB_PERFIL_POOL=pgbouncer")
+
+
+def configurar_pool(app) -> Dict[str, Any]:
+    """Define SQLALCHEMY_ENGINE_OPTIONS a partir do perfil (chamar antes de db.init_app)"""
+    configuracao = resolver_configuracao()
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = opcoes_engine(app.config['SQLALCHEMY_DATABASE_URI'], configuracao)
+    app.extensions['pool_conexoes'] = configuracao
+    aviso = verificar_orcamento_conexoes(configuracao)
+    if aviso:
+        app.logger.warning(aviso)
+    return configuracao
+
+
+def resumo_pool(engine, configuracao: Dict[str, Any]) -> Dict[str, Any]:
+    """Estado do pool e métricas acumuladas do processo, pronto para JSON"""
+    pool = engine.pool
+    metricas = metricas_pool
+    capacidade = _capacidade(pool)
+    with metricas._lock:
+        em_uso = pool.checkedout() if isinstance(pool, QueuePool) else metricas.em_uso
+        esperas = sum(metricas.esperas_por_faixa)
+        return {
+            'processo': os.getpid(),
+            'configuracao': dict(configuracao),
+            'pool': {
+                'classe': type(pool).__name__,
+                'capacidade': capacidade,
+                'em_uso': em_uso,
+                'ociosas': pool.checkedin() if isinstance(pool, QueuePool) else 0,
+                'overflow': pool.overflow() if isinstance(pool, QueuePool) else None,
+                'em_uso_maximo': metricas.em_uso_maximo,
+                'saturacao': round(em_uso / capacidade, 3) if capacidade else None,
+                'saturacao_maxima': round(metricas.em_uso_maximo / capacidade, 3) if capacidade else None,
+            },
+            'checkout': {
+                'total': metricas.checkouts,
+                'espera_media_ms': round(metricas.espera_total_ms / esperas, 3) if esperas else 0,
+                'espera_maxima_ms': round(metricas.espera_maxima_ms, 3),
+                # Esperas entre a faixa anterior e `ate_ms` (a última, sem limite, as maiores que 5 s)
+                'esperas_por_faixa': [
+                    {'ate_ms': limite, 'quantidade': quantidade}
+                    for limite, quantidade in zip(FAIXAS_ESPERA_MS + (None,), metricas.esperas_por_faixa)
+                ],
+                'timeouts': metricas.timeouts,
+            },
+            'conexoes': {
+                'criadas': metricas.conexoes_criadas,
+                'invalidadas': metricas.conexoes_invalidadas,
+            },
+        }
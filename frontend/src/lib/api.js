@@ -11,6 +11,14 @@ const api = axios.create({
   },
 });
 
+// Chave de idempotência de uma operação: retentativas com a mesma chave (proxy, rede)
+// recebem a resposta da primeira requisição em vez de reprocessar
+const newIdempotencyKey = () => (
+  globalThis.crypto?.randomUUID
+    ? globalThis.crypto.randomUUID()
+    : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}-${Math.random().toString(36).slice(2)}`
+);
+
 // Interceptor para adicionar token de autenticação
 api.interceptors.request.use(
   (config) => {
@@ -79,7 +87,7 @@ export const projectsAPI = {
       }
     });
   },
-  downloadComparisonReport: (cenarioIds, format, periodo = 'todos') => {
+  downloadComparisonReport: (cenarioIds, format, periodo = 'todos', idempotencyKey = newIdempotencyKey()) => {
     const endpoint = format === 'pdf' 
       ? '/cenarios/relatorio-comparativo/pdf'
       : '/cenarios/relatorio-comparativo/excel';
@@ -90,7 +98,8 @@ export const projectsAPI = {
       responseType: 'blob',
       // Expor headers customizados
       headers: {
-        'Accept': format === 'pdf' ? 'application/pdf' : 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        'Accept': format === 'pdf' ? 'application/pdf' : 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        'Idempotency-Key': idempotencyKey,
       }
     });
   },
@@ -99,7 +108,8 @@ export const projectsAPI = {
   restoreVersion: (cenarioId, historicoId) => api.post(`/cenarios/${cenarioId}/restaurar/${historicoId}`),
   // Relatórios
   listReports: () => api.get('/relatorios'),
-  createReport: (data) => api.post('/relatorios', data),
+  createReport: (data, idempotencyKey = newIdempotencyKey()) =>
+    api.post('/relatorios', data, { headers: { 'Idempotency-Key': idempotencyKey } }),
   getReport: (id) => api.get(`/relatorios/${id}`),
   updateReport: (id, data) => api.put(`/relatorios/${id}`, data),
   deleteReport: (id) => api.delete(`/relatorios/${id}`),
@@ -107,12 +117,13 @@ export const projectsAPI = {
 
 // Funções de upload
 export const uploadAPI = {
-  uploadSpreadsheet: (file) => {
+  uploadSpreadsheet: (file, idempotencyKey = newIdempotencyKey()) => {
     const formData = new FormData();
     formData.append('file', file);
     return api.post('/upload-planilha', formData, {
       headers: {
         'Content-Type': 'multipart/form-data',
+        'Idempotency-Key': idempotencyKey,
       },
       timeout: 300000, // 5 minutos para uploads grandes
       onUploadProgress: (progressEvent) => {